@@ -1,20 +1,69 @@
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.contrib.auth.decorators import login_required
-from .models import Visita, MovimientoResidente
+from .models import PaseConsumido, Presencia, Visita, MovimientoResidente
 from viviendas.models import Residente, Vivienda
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+from django.urls import reverse
 from django.utils import timezone
-import qrcode
-import io
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_datetime
+from datetime import datetime, timezone as dt_timezone
 import base64
 from django.views.decorators.http import require_GET, require_POST
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from accesos.qr_firma_utils import generar_firma_qr, verificar_firma_qr
+from accesos.qr import (
+    ESCALA_MAXIMA_PNG, ESCALA_PNG, FORMATOS_QR, codigo_qr_visita, datos_qr, etiqueta_qr, png_qr, svg_qr
+)
+from accesos.indice_visitas import visita_abierta
+from accesos.lotes import LIMITE_LOTE_EVENTOS, edificio_guardia, registrar_eventos
+from accesos.presencia import contadores_presencia, totales_presencia
+from accesos.qr_firma_utils import (
+    TOLERANCIA_RELOJ_QR, PaseQRInvalido, aceptar_pases_v1, datos_claves_publicas, leer_pase_qr, verificar_firma_qr,
+    version_pase_qr,
+)
 import json
 
+# Segundos que la app puede reutilizar la imagen del QR sin volver a pedirla
+TIEMPO_CACHE_QR = 60 * 60 * 24
+
+# Segundos que una garita puede usar las claves públicas antes de volver a pedirlas
+TIEMPO_CACHE_CLAVES_QR = 60 * 60
+
+# Pases usados que se reciben o se devuelven por sincronización
+LIMITE_LOTE_PASES = 500
+
+def _incluir_base64(valor):
+    """
+    Si la respuesta lleva la imagen en base64: lo indica el parámetro
+    incluir_base64 de la petición o, si no viene, el ajuste QR_INCLUIR_BASE64
+    """
+    if valor is None:
+        return getattr(settings, 'QR_INCLUIR_BASE64', True)
+    return valor in (True, '1', 'true')
+
+def _datos_qr_visita(request, codigo, incluir_base64=False):
+    """
+    Contenido firmado del QR y URL de la imagen (PNG o SVG) y de la matriz;
+    la imagen incrustada en el JSON solo con incluir_base64
+    """
+    datos = {
+        'carga': codigo.carga,
+        'version': codigo.version,
+        'valido_hasta': codigo.valido_hasta.isoformat() if codigo.valido_hasta else None,
+        **{
+            clave: request.build_absolute_uri(reverse('api-qr-visita-archivo', args=[codigo.visita_id, formato]))
+            for clave, formato in [('qr_url', 'png'), ('qr_svg_url', 'svg'), ('qr_matriz_url', 'json')]
+        },
+    }
+    if incluir_base64:
+        # Compatibilidad con versiones de la app que esperan la imagen en el JSON
+        datos['qr_base64'] = base64.b64encode(png_qr(codigo.matriz)).decode()
+    return datos
+
 @login_required
 def historial_visitas(request):
     """API endpoint para obtener el historial de visitas completadas (con salida registrada)"""
@@ -63,63 +112,250 @@ def residentes_por_vivienda(request, vivienda_id):
 @login_required
 def generar_qr_visita(request, visita_id):
     try:
-        visita = Visita.objects.get(pk=visita_id, residente_autoriza__usuario=request.user)
-
-        datos_qr = {
+        visita = Visita.objects.only('id').get(pk=visita_id, residente_autoriza__usuario=request.user)
+        codigo = codigo_qr_visita(visita.id)
+        return JsonResponse({
             "id": visita.id,
-            "nombre_visitante": visita.nombre_visitante,
-            "documento_visitante": visita.documento_visitante,
-            "vivienda": str(visita.vivienda_destino),
-            "autorizado_por": str(visita.residente_autoriza),
-            "fecha": visita.fecha_hora_entrada.strftime("%Y-%m-%d %H:%M"),
-            "firma": generar_firma_qr(visita.id)
-        }
-
-        qr = qrcode.make(datos_qr)
-        buffer = io.BytesIO()
-        qr.save(buffer, format='PNG')
-        qr_base64 = base64.b64encode(buffer.getvalue()).decode()
-
-        return JsonResponse({"qr_base64": qr_base64})
+            **_datos_qr_visita(request, codigo, _incluir_base64(request.GET.get('incluir_base64'))),
+        })
     
     except Visita.DoesNotExist:
         return JsonResponse({"error": "Visita no encontrada o no autorizada para este usuario"}, status=404)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def qr_visita_archivo(request, visita_id, formato):
+    """
+    QR de una visita como imagen PNG (escala opcional en píxeles por módulo),
+    SVG o matriz JSON. La respuesta lleva ETag y se puede guardar en el
+    teléfono: mientras la firma no cambie, la app recibe 304 sin contenido.
+    """
+    if formato not in FORMATOS_QR:
+        return JsonResponse({"error": "Formato no soportado"}, status=404)
+    if not Visita.objects.filter(pk=visita_id, residente_autoriza__usuario=request.user).exists():
+        return JsonResponse({"error": "Visita no encontrada o no autorizada para este usuario"}, status=404)
+
+    try:
+        escala = min(max(int(request.GET.get('escala', ESCALA_PNG)), 1), ESCALA_MAXIMA_PNG) if formato == 'png' else 1
+    except ValueError:
+        return JsonResponse({"error": "Escala inválida"}, status=400)
+
+    etiqueta = etiqueta_qr(visita_id, formato, escala)
+    if etiqueta in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        codigo = codigo_qr_visita(visita_id)
+        if formato == 'png':
+            contenido = png_qr(codigo.matriz, escala)
+        elif formato == 'svg':
+            contenido = svg_qr(codigo.matriz)
+        else:
+            contenido = json.dumps(datos_qr(codigo), separators=(',', ':'))
+        response = HttpResponse(contenido, content_type=FORMATOS_QR[formato])
+
+    response['ETag'] = etiqueta
+    patch_cache_control(response, private=True, max_age=TIEMPO_CACHE_QR)
+    return response
+
 @api_view(['POST'])
+# Autenticación por defecto: el JWT se comprueba contra el usuario, así un guardia desactivado deja de verificar
 @permission_classes([IsAuthenticated])
 def verificar_qr_visita(request):
     data = request.data
-    visita_id = data.get('id')
-    firma = data.get('firma')
+    pase = data.get('pase')
 
-    if not visita_id or not firma:
-        return Response({'valido': False, 'mensaje': 'ID y firma requeridos.'}, status=400)
+    if pase:
+        # Pase v2: firma Ed25519 y ventana de validez, sin secreto compartido
+        try:
+            visita_id = leer_pase_qr(pase)['id']
+        except PaseQRInvalido as e:
+            return Response({'valido': False, 'mensaje': str(e)}, status=403)
+    else:
+        visita_id = data.get('id')
+        firma = data.get('firma')
 
-    # Verificar la firma antes de continuar
-    if not verificar_firma_qr(int(visita_id), firma):
-        return Response({'valido': False, 'mensaje': 'QR inválido o alterado.'}, status=403)
+        if not visita_id or not firma:
+            return Response({'valido': False, 'mensaje': 'ID y firma requeridos.'}, status=400)
+
+        if not aceptar_pases_v1():
+            return Response({'valido': False, 'mensaje': 'Este QR ya no se acepta; pida uno nuevo al residente.'}, status=403)
+
+        # Verificar la firma antes de continuar
+        if not verificar_firma_qr(int(visita_id), firma):
+            return Response({'valido': False, 'mensaje': 'QR inválido o alterado.'}, status=403)
 
     try:
-        visita = Visita.objects.get(id=visita_id)
+        # Las visitas abiertas se leen del índice en memoria, sin consultar la base
+        datos = visita_abierta(int(visita_id))
 
-        if visita.fecha_hora_salida:
+        if datos is None:
             return Response({'valido': False, 'mensaje': 'Esta visita ya fue finalizada.'})
 
         return Response({
             'valido': True,
             'mensaje': 'QR verificado correctamente.',
-            'visitante': visita.nombre_visitante,
-            'documento': visita.documento_visitante,
-            'vivienda': str(visita.vivienda_destino),
-            'fecha': visita.fecha_hora_entrada.strftime('%Y-%m-%d %H:%M'),
-            'motivo': visita.motivo,
-            'autorizado_por': str(visita.residente_autoriza)
+            **datos,
         })
 
     except Visita.DoesNotExist:
         return Response({'valido': False, 'mensaje': 'No se encontró una visita válida con ese ID.'}, status=404)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def claves_qr(request):
+    """Claves públicas con que las garitas verifican los pases v2 sin conexión"""
+    response = Response({
+        'version': version_pase_qr(),
+        'acepta_v1': aceptar_pases_v1(),
+        'tolerancia_reloj': getattr(settings, 'TOLERANCIA_RELOJ_QR', TOLERANCIA_RELOJ_QR),
+        'claves': datos_claves_publicas(),
+    })
+    patch_cache_control(response, private=True, max_age=TIEMPO_CACHE_CLAVES_QR)
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def sincronizar_pases_consumidos(request):
+    """
+    Sincronización por lotes de las garitas. Recibe los pases v2 usados
+    ({'pase', 'fecha'}) desde la última sincronización y devuelve los pases
+    usados en cualquier garita después del cursor 'desde' que aún no
+    vencieron, con el cursor para la próxima vez.
+    """
+    data = request.data
+    consumidos = data.get('consumidos') or []
+    if not isinstance(consumidos, list) or len(consumidos) > LIMITE_LOTE_PASES:
+        return Response(
+            {'error': f'consumidos debe ser una lista de hasta {LIMITE_LOTE_PASES} pases'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        desde = int(data.get('desde') or 0)
+        edificio_id = int(data['edificio_id']) if data.get('edificio_id') else None
+    except (TypeError, ValueError):
+        return Response({'error': 'desde y edificio_id deben ser números'}, status=status.HTTP_400_BAD_REQUEST)
+
+    ahora = timezone.now()
+    nuevos = {}
+    rechazados = []
+    for posicion, consumido in enumerate(consumidos):
+        try:
+            if not isinstance(consumido, dict):
+                raise PaseQRInvalido('QR inválido o alterado.')
+            # Un pase puede informarse después de vencer: solo se verifica la firma
+            pase = leer_pase_qr(consumido.get('pase'), verificar_vigencia=False)
+            fecha = parse_datetime(str(consumido.get('fecha') or '')) or ahora
+        except (PaseQRInvalido, ValueError) as e:
+            rechazados.append({'posicion': posicion, 'mensaje': str(e)})
+            continue
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        nuevos.setdefault(pase['n'], PaseConsumido(
+            nonce=pase['n'],
+            visita_id=pase['id'],
+            edificio_id=pase['ed'],
+            dispositivo=str(data.get('dispositivo') or '')[:100],
+            fecha_consumo=fecha,
+            valido_hasta=datetime.fromtimestamp(pase['na'], tz=dt_timezone.utc),
+        ))
+
+    repetidos = set(PaseConsumido.objects.filter(nonce__in=nuevos).values_list('nonce', flat=True))
+    existentes = set(Visita.objects.filter(pk__in={pase.visita_id for pase in nuevos.values()}).values_list('pk', flat=True))
+    registrar = []
+    for nonce, pase in nuevos.items():
+        if pase.visita_id not in existentes:
+            rechazados.append({'nonce': nonce, 'mensaje': 'No se encontró una visita válida con ese ID.'})
+        elif nonce not in repetidos:
+            registrar.append(pase)
+    # ignore_conflicts cubre a dos garitas que informan el mismo pase a la vez
+    PaseConsumido.objects.bulk_create(registrar, ignore_conflicts=True)
+
+    pendientes = PaseConsumido.objects.filter(pk__gt=desde, valido_hasta__gte=ahora).order_by('pk')
+    if edificio_id:
+        pendientes = pendientes.filter(edificio_id=edificio_id)
+    pendientes = list(pendientes.values('pk', 'nonce', 'visita_id', 'valido_hasta')[:LIMITE_LOTE_PASES + 1])
+    completo = len(pendientes) <= LIMITE_LOTE_PASES
+    pendientes = pendientes[:LIMITE_LOTE_PASES]
+
+    return Response({
+        'registrados': len(registrar),
+        'repetidos': len(repetidos),
+        'rechazados': rechazados,
+        'consumidos': [
+            {'nonce': pase['nonce'], 'visita_id': pase['visita_id'], 'valido_hasta': int(pase['valido_hasta'].timestamp())}
+            for pase in pendientes
+        ],
+        'cursor': pendientes[-1]['pk'] if pendientes else desde,
+        'completo': completo,
+    })
+
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def registrar_eventos_lote(request):
+    """
+    Entradas y salidas de visitas y residentes acumuladas en la garita:
+    {'eventos': [{'clave', 'tipo', 'accion', 'fecha', ...}]}. Devuelve un
+    resultado por evento en el mismo orden.
+    """
+    eventos = request.data.get('eventos')
+    if not isinstance(eventos, list) or not eventos or len(eventos) > LIMITE_LOTE_EVENTOS:
+        return Response(
+            {'error': f'eventos debe ser una lista de 1 a {LIMITE_LOTE_EVENTOS} eventos'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        edificio_id = edificio_guardia(request.user)
+    except PermissionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+
+    resultados = registrar_eventos(request.user, edificio_id, eventos)
+    return Response({
+        'registrados': sum(resultado['estado'] == 'registrado' for resultado in resultados),
+        'duplicados': sum(resultado['estado'] == 'duplicado' for resultado in resultados),
+        'rechazados': sum(resultado['estado'] == 'rechazado' for resultado in resultados),
+        'resultados': resultados,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def presencia_edificios(request):
+    """
+    Personas y vehículos dentro de cada edificio, leídos de los contadores.
+    Con ?edificio=ID&detalle=1 incluye quién está dentro.
+    """
+    try:
+        edificio_id = edificio_guardia(request.user)
+    except PermissionError as e:
+        return Response({'error': str(e)}, status=status.HTTP_403_FORBIDDEN)
+    if edificio_id is None and request.GET.get('edificio'):
+        try:
+            edificio_id = int(request.GET['edificio'])
+        except ValueError:
+            return Response({'error': 'Edificio inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+    datos = {
+        'edificios': contadores_presencia(edificio_id),
+        'totales': totales_presencia(edificio_id),
+    }
+    if edificio_id and request.GET.get('detalle') == '1':
+        datos['personas'] = [
+            {
+                'tipo': persona.tipo,
+                'nombre': persona.nombre,
+                'vivienda': str(persona.vivienda) if persona.vivienda else None,
+                'vehiculo': persona.vehiculo,
+                'placa_vehiculo': persona.placa_vehiculo,
+                'desde': persona.desde.isoformat(),
+            }
+            for persona in Presencia.objects.filter(edificio_id=edificio_id).select_related('vivienda').order_by('tipo', 'desde')
+        ]
+    return Response(datos)
+
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -146,20 +382,13 @@ def crear_visita(request):
             registrado_por=request.user,
             fecha_hora_entrada=timezone.now()
         )
-        # 📦 Generar el QR
-        datos_qr = {
-            "id": visita.id,
-            "firma": generar_firma_qr(visita.id)
-        }
-        qr = qrcode.make(json.dumps(datos_qr))
-        buffer = io.BytesIO()
-        qr.save(buffer, format='PNG')
-        qr_base64 = base64.b64encode(buffer.getvalue()).decode()
+        # 📦 Generar el QR una sola vez; las siguientes aperturas lo leen guardado
+        codigo = codigo_qr_visita(visita.id)
 
         return Response({
             'mensaje': 'Visita registrada correctamente',
             'id': visita.id,
-            'qr_base64': qr_base64
+            **_datos_qr_visita(request, codigo, _incluir_base64(data.get('incluir_base64'))),
         })
 
     except Vivienda.DoesNotExist:
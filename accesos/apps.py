@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AccesosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accesos'
+
+    def ready(self):
+        """
+        Importar las señales que mantienen el índice de visitas abiertas.
+        """
+        import accesos.signals  # noqa
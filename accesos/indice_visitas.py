@@ -0,0 +1,184 @@
+# accesos/indice_visitas.py - Índice en memoria de las visitas abiertas para verificar QR sin consultar la base
+#
+# Cada proceso tiene su propio índice. Se carga completo con una consulta la
+# primera vez que se usa y luego cada REFRESCO_INDICE_VISITAS segundos en un
+# hilo aparte, sin detener la verificación; las señales de Visita lo actualizan
+# en el proceso que registra el cambio. Las salidas se anotan además en la
+# caché de Django y se consultan antes de dar por abierta una visita del
+# índice, para que una salida registrada en otro proceso se vea al instante
+# (entre procesos, con una caché compartida como Redis o Memcached).
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Visita
+
+logger = logging.getLogger(__name__)
+
+# Segundos que se usa el índice antes de recargarlo, si no se configura REFRESCO_INDICE_VISITAS
+REFRESCO_INDICE_VISITAS = 30
+
+# Segundos que se conserva la marca de una salida: deben cubrir la recarga de todos los procesos
+MARGEN_VISITAS_CERRADAS = 60
+
+_indice = None
+_cargado = 0.0
+_reconstruyendo = False
+_pendientes = []
+_lock = threading.Lock()
+_lock_reconstruccion = threading.RLock()
+
+
+def _visitas():
+    # Relaciones que usan los __str__ de la vivienda y del residente
+    return Visita.objects.select_related(
+        'vivienda_destino', 'residente_autoriza__usuario', 'residente_autoriza__vivienda'
+    )
+
+
+def datos_visita(visita):
+    """Campos que muestra la garita al verificar el QR de una visita"""
+    return {
+        'visitante': visita.nombre_visitante,
+        'documento': visita.documento_visitante,
+        'vivienda': str(visita.vivienda_destino),
+        'fecha': visita.fecha_hora_entrada.strftime('%Y-%m-%d %H:%M'),
+        'motivo': visita.motivo,
+        'autorizado_por': str(visita.residente_autoriza),
+    }
+
+
+def _aplicar(visita_id, datos):
+    """Agrega o actualiza (o quita, con datos None) una visita del índice"""
+    with _lock:
+        if _indice is not None:
+            if datos is None:
+                _indice.pop(visita_id, None)
+            else:
+                _indice[visita_id] = datos
+        if _reconstruyendo:
+            # La consulta de la recarga en curso puede ser anterior a este cambio
+            _pendientes.append((visita_id, datos))
+
+
+def reconstruir(cargar=True):
+    """
+    Carga todas las visitas abiertas en una consulta y reemplaza el índice.
+    Con cargar=False el índice queda vacío y se completa con cada consulta a
+    la base. Devuelve la cantidad de visitas cargadas.
+    """
+    global _indice, _cargado, _reconstruyendo
+    with _lock_reconstruccion:
+        with _lock:
+            _reconstruyendo = True
+            _pendientes.clear()
+        try:
+            indice = {}
+            if cargar:
+                visitas = _visitas().filter(fecha_hora_salida__isnull=True)
+                indice = {visita.id: datos_visita(visita) for visita in visitas.iterator(chunk_size=2000)}
+        finally:
+            with _lock:
+                for visita_id, datos in _pendientes:
+                    if datos is None:
+                        indice.pop(visita_id, None)
+                    else:
+                        indice[visita_id] = datos
+                _pendientes.clear()
+                _reconstruyendo = False
+                _indice, _cargado = indice, time.monotonic()
+    return len(indice)
+
+
+def descartar():
+    """Descarta el índice; el siguiente uso lo vuelve a cargar"""
+    global _indice
+    with _lock:
+        _indice = None
+
+
+def _refresco():
+    return getattr(settings, 'REFRESCO_INDICE_VISITAS', REFRESCO_INDICE_VISITAS)
+
+
+def _vencido():
+    return _indice is None or time.monotonic() - _cargado > _refresco()
+
+
+def _clave_cerrada(visita_id):
+    return f'accesos:visita_cerrada:{visita_id}'
+
+
+def _marcar_cerrada(visita_id):
+    cache.set(_clave_cerrada(visita_id), True, timeout=_refresco() + MARGEN_VISITAS_CERRADAS)
+
+
+def _recargar_en_segundo_plano():
+    try:
+        reconstruir()
+    except Exception:
+        logger.exception("Error al recargar el índice de visitas")
+    finally:
+        # El hilo tiene su propia conexión a la base
+        connection.close()
+
+
+def _indice_vigente():
+    if _indice is None:
+        # Primera carga: la verificación necesita el índice completo
+        with _lock_reconstruccion:
+            # Otro hilo pudo cargarlo mientras se esperaba el lock
+            if _indice is None:
+                reconstruir()
+    elif _vencido():
+        with _lock:
+            iniciar = not _reconstruyendo
+            if iniciar:
+                _reconstruyendo = True
+        if iniciar:
+            # Mientras tanto se sigue respondiendo con el índice anterior
+            threading.Thread(target=_recargar_en_segundo_plano, daemon=True).start()
+    return _indice or {}
+
+
+def visita_abierta(visita_id):
+    """
+    Datos de la visita si sigue abierta, o None si ya finalizó; lanza
+    Visita.DoesNotExist si no existe. Normalmente se responde desde el
+    índice; las visitas que no están en él (creadas en otro proceso desde la
+    última carga, finalizadas o inexistentes) se buscan en la base.
+    """
+    datos = _indice_vigente().get(visita_id)
+    if datos is not None:
+        if not cache.get(_clave_cerrada(visita_id)):
+            return datos
+        # Salida registrada en otro proceso desde la última carga
+        _aplicar(visita_id, None)
+        return None
+    visita = _visitas().get(pk=visita_id)
+    if visita.fecha_hora_salida:
+        return None
+    datos = datos_visita(visita)
+    _aplicar(visita.id, datos)
+    return datos
+
+
+def actualizar_visita(visita_id):
+    """Vuelve a leer una visita tras guardarla: se agrega al índice si está abierta y se quita si finalizó"""
+    if _indice is None and not _reconstruyendo:
+        # El índice aún no se cargó en este proceso: lo leerá completo al usarse
+        return
+    visita = _visitas().filter(pk=visita_id, fecha_hora_salida__isnull=True).first()
+    if visita:
+        cache.delete(_clave_cerrada(visita_id))
+    _aplicar(visita_id, datos_visita(visita) if visita else None)
+
+
+def quitar_visita(visita_id):
+    """Quita una visita finalizada o borrada del índice de este proceso y avisa a los demás"""
+    _marcar_cerrada(visita_id)
+    _aplicar(visita_id, None)
@@ -0,0 +1,296 @@
+# accesos/lotes.py - Registro por lotes de entradas y salidas desde las garitas
+#
+# Una garita acumula eventos mientras atiende la fila y los envía juntos. El
+# edificio del guardia se resuelve una vez, las viviendas, residentes y visitas
+# del lote se leen con una consulta por modelo y todo se guarda con
+# bulk_create / bulk_update en una transacción.
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from usuarios.models import Usuario
+from viviendas.models import Residente, Vivienda
+from . import indice_visitas, presencia
+from .models import ClaveIdempotencia, MovimientoResidente, Visita
+
+# Eventos que se aceptan por lote
+LIMITE_LOTE_EVENTOS = 500
+
+# Diferencia máxima entre el reloj de la garita y el del servidor para eventos "en el futuro"
+TOLERANCIA_RELOJ_EVENTOS = timedelta(minutes=5)
+
+# Antigüedad máxima de un evento que la garita no pudo enviar antes
+ANTIGUEDAD_MAXIMA_EVENTOS = timedelta(days=7)
+
+TIPOS_EVENTO = {('visita', 'entrada'), ('visita', 'salida'), ('residente', 'entrada'), ('residente', 'salida')}
+
+
+class EventoRechazado(Exception):
+    """El evento no se registra; el mensaje vuelve a la garita"""
+
+
+def edificio_guardia(usuario):
+    """
+    Edificio en que el usuario registra accesos: None para administradores
+    (todos), el asignado para gerentes y vigilantes. Lanza PermissionError
+    para los demás. Una sola consulta con el rol y las asignaciones.
+    """
+    usuario = Usuario.objects.select_related('rol', 'gerente', 'vigilante').get(pk=usuario.pk)
+    if usuario.is_superuser or usuario.es_administrador:
+        return None
+    for rol, asignacion in (('Gerente', 'gerente'), ('Vigilante', 'vigilante')):
+        if usuario.rol and usuario.rol.nombre == rol:
+            if not hasattr(usuario, asignacion):
+                raise PermissionError(f"No tiene un edificio asignado como {rol.lower()}")
+            return getattr(usuario, asignacion).edificio_id
+    raise PermissionError("No tiene permisos para registrar accesos")
+
+
+def _fecha_evento(evento, ahora):
+    if not evento.get('fecha'):
+        return ahora
+    try:
+        fecha = parse_datetime(str(evento['fecha']))
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise EventoRechazado("Fecha inválida")
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    if fecha > ahora + TOLERANCIA_RELOJ_EVENTOS:
+        raise EventoRechazado("La fecha del evento está en el futuro")
+    if fecha < ahora - ANTIGUEDAD_MAXIMA_EVENTOS:
+        raise EventoRechazado("El evento es demasiado antiguo")
+    return fecha
+
+
+def _entero(evento, campo):
+    try:
+        return int(evento[campo])
+    except (KeyError, TypeError, ValueError):
+        raise EventoRechazado(f"{campo} es obligatorio y debe ser un número")
+
+
+def _ids(eventos, tipo, campo):
+    ids = set()
+    for evento in eventos:
+        if isinstance(evento, dict) and evento.get('tipo') == tipo:
+            try:
+                ids.add(int(evento[campo]))
+            except (KeyError, TypeError, ValueError):
+                pass
+    return ids
+
+
+class _Lote:
+    """Estado del lote: lo leído de la base y lo que se va a guardar, para validar cada evento contra los anteriores"""
+
+    def __init__(self, usuario, edificio_id, eventos):
+        self.usuario = usuario
+        self.edificio_id = edificio_id
+        self.viviendas = dict(
+            Vivienda.objects.filter(pk__in=_ids(eventos, 'visita', 'vivienda_id')).values_list('pk', 'edificio_id')
+        )
+        residente_ids = _ids(eventos, 'residente', 'residente_id') | _ids(eventos, 'visita', 'residente_autoriza_id')
+        self.residentes = {
+            residente['pk']: residente
+            for residente in Residente.objects.filter(pk__in=residente_ids).values('pk', 'activo', 'vivienda__edificio_id')
+        }
+        self.visitas = {
+            visita.pk: visita
+            for visita in Visita.objects.filter(pk__in=_ids(eventos, 'visita', 'visita_id')).only(
+                'pk', 'fecha_hora_entrada', 'fecha_hora_salida', 'vivienda_destino__edificio_id',
+            ).select_related('vivienda_destino')
+        }
+        # Entrada sin salida de cada residente del lote, la última si hubiera varias
+        self.entradas_abiertas = {
+            movimiento.residente_id: movimiento
+            for movimiento in MovimientoResidente.objects.filter(
+                residente_id__in=residente_ids, fecha_hora_entrada__isnull=False, fecha_hora_salida__isnull=True,
+            ).order_by('id')
+        }
+        self.visitas_nuevas = []
+        self.visitas_cerradas = []
+        self.movimientos_nuevos = []
+        self.movimientos_cerrados = []
+
+    def _validar_edificio(self, edificio_id, mensaje):
+        if self.edificio_id is not None and edificio_id != self.edificio_id:
+            raise EventoRechazado(mensaje)
+
+    def _residente(self, residente_id):
+        residente = self.residentes.get(residente_id)
+        if residente is None or not residente['activo']:
+            raise EventoRechazado("Residente no encontrado o inactivo")
+        self._validar_edificio(residente['vivienda__edificio_id'], "El residente no pertenece a su edificio asignado")
+        return residente
+
+    def entrada_visita(self, evento, fecha):
+        nombre = str(evento.get('nombre_visitante') or '').strip()
+        documento = str(evento.get('documento_visitante') or '').strip()
+        # Las mismas reglas que el formulario de visitas
+        if len(nombre.split()) < 2:
+            raise EventoRechazado("Ingrese nombre y apellido completos")
+        if len(documento) < 6:
+            raise EventoRechazado("El documento debe tener al menos 6 caracteres")
+        vivienda_id = _entero(evento, 'vivienda_id')
+        if vivienda_id not in self.viviendas:
+            raise EventoRechazado("Vivienda no encontrada")
+        self._validar_edificio(self.viviendas[vivienda_id], "No puede registrar visitas para viviendas fuera de su edificio asignado")
+        residente_id = _entero(evento, 'residente_autoriza_id')
+        if self._residente(residente_id)['vivienda__edificio_id'] != self.viviendas[vivienda_id]:
+            raise EventoRechazado("El residente que autoriza debe pertenecer al mismo edificio de la vivienda destino")
+
+        visita = Visita(
+            nombre_visitante=nombre[:100],
+            documento_visitante=documento[:20],
+            vivienda_destino_id=vivienda_id,
+            residente_autoriza_id=residente_id,
+            motivo=str(evento.get('motivo') or ''),
+            registrado_por=self.usuario,
+            fecha_hora_entrada=fecha,
+        )
+        self.visitas_nuevas.append(visita)
+        return visita
+
+    def salida_visita(self, evento, fecha):
+        visita = self.visitas.get(_entero(evento, 'visita_id'))
+        if visita is None:
+            raise EventoRechazado("No se encontró una visita válida con ese ID")
+        self._validar_edificio(visita.vivienda_destino.edificio_id, "No tiene permisos para registrar la salida de esta visita")
+        if visita.fecha_hora_salida:
+            raise EventoRechazado("La visita ya tiene salida registrada")
+        if fecha < visita.fecha_hora_entrada:
+            raise EventoRechazado("La salida es anterior a la entrada de la visita")
+        visita.fecha_hora_salida = fecha
+        self.visitas_cerradas.append(visita)
+        return visita
+
+    def entrada_residente(self, evento, fecha):
+        residente_id = _entero(evento, 'residente_id')
+        self._residente(residente_id)
+        vehiculo, placa = bool(evento.get('vehiculo')), str(evento.get('placa_vehiculo') or '').strip()
+        if vehiculo and not placa:
+            raise EventoRechazado("Si ingresa con vehículo, debe especificar la placa")
+        if residente_id in self.entradas_abiertas:
+            raise EventoRechazado("El residente ya tiene una entrada registrada sin salida correspondiente")
+        movimiento = MovimientoResidente(
+            residente_id=residente_id, fecha_hora_entrada=fecha, vehiculo=vehiculo, placa_vehiculo=placa[:10],
+        )
+        self.movimientos_nuevos.append(movimiento)
+        self.entradas_abiertas[residente_id] = movimiento
+        return movimiento
+
+    def salida_residente(self, evento, fecha):
+        residente_id = _entero(evento, 'residente_id')
+        self._residente(residente_id)
+        vehiculo, placa = bool(evento.get('vehiculo')), str(evento.get('placa_vehiculo') or '').strip()
+        if vehiculo and not placa:
+            raise EventoRechazado("Si sale con vehículo, debe especificar la placa")
+        movimiento = self.entradas_abiertas.pop(residente_id, None)
+        if movimiento is None:
+            # Sin entrada registrada la salida queda sola, como en el formulario
+            movimiento = MovimientoResidente(
+                residente_id=residente_id, fecha_hora_salida=fecha, vehiculo=vehiculo, placa_vehiculo=placa[:10],
+            )
+            self.movimientos_nuevos.append(movimiento)
+            return movimiento
+        if fecha < movimiento.fecha_hora_entrada:
+            self.entradas_abiertas[residente_id] = movimiento
+            raise EventoRechazado("La salida es anterior a la entrada del residente")
+        movimiento.fecha_hora_salida = fecha
+        if movimiento.pk:
+            self.movimientos_cerrados.append(movimiento)
+        return movimiento
+
+    def guardar(self):
+        """Guarda todo con una inserción o actualización por modelo"""
+        # bulk_create pone la hora del servidor en la entrada (auto_now_add): después se guarda la de la garita
+        entradas = [visita.fecha_hora_entrada for visita in self.visitas_nuevas]
+        Visita.objects.bulk_create(self.visitas_nuevas)
+        for visita, fecha in zip(self.visitas_nuevas, entradas):
+            visita.fecha_hora_entrada = fecha
+        Visita.objects.bulk_update(self.visitas_nuevas, ['fecha_hora_entrada'])
+        Visita.objects.bulk_update(self.visitas_cerradas, ['fecha_hora_salida'])
+        MovimientoResidente.objects.bulk_create(self.movimientos_nuevos)
+        MovimientoResidente.objects.bulk_update(self.movimientos_cerrados, ['fecha_hora_salida'])
+
+
+def _procesar(usuario, edificio_id, eventos):
+    ahora = timezone.now()
+    claves = {str(evento['clave']) for evento in eventos if isinstance(evento, dict) and evento.get('clave')}
+    anteriores = dict(
+        ClaveIdempotencia.objects.filter(usuario=usuario, clave__in=claves).values_list('clave', 'resultado')
+    )
+    lote = _Lote(usuario, edificio_id, eventos)
+    acciones = {
+        ('visita', 'entrada'): lote.entrada_visita,
+        ('visita', 'salida'): lote.salida_visita,
+        ('residente', 'entrada'): lote.entrada_residente,
+        ('residente', 'salida'): lote.salida_residente,
+    }
+
+    resultados = []
+    registrados = []
+    vistas = set()
+    for evento in eventos:
+        clave = str(evento.get('clave') or '') if isinstance(evento, dict) else ''
+        if clave in anteriores:
+            resultados.append({**anteriores[clave], 'estado': 'duplicado'})
+            continue
+        try:
+            if not clave or len(clave) > 100:
+                raise EventoRechazado("Cada evento necesita una clave de hasta 100 caracteres")
+            if clave in vistas:
+                raise EventoRechazado("Clave repetida en el lote")
+            vistas.add(clave)
+            tipo = (evento.get('tipo'), evento.get('accion'))
+            if tipo not in TIPOS_EVENTO:
+                raise EventoRechazado("tipo debe ser visita o residente y accion entrada o salida")
+            objeto = acciones[tipo](evento, _fecha_evento(evento, ahora))
+        except EventoRechazado as e:
+            resultados.append({'clave': clave, 'estado': 'rechazado', 'mensaje': str(e)})
+            continue
+        resultado = {'clave': clave, 'estado': 'registrado', 'tipo': tipo[0], 'accion': tipo[1]}
+        resultados.append(resultado)
+        registrados.append((resultado, objeto))
+
+    with transaction.atomic():
+        lote.guardar()
+        # Sin señales de bulk_create / bulk_update: la presencia se sincroniza una vez por lote
+        presencia.sincronizar_visitas(visita.pk for visita in lote.visitas_nuevas + lote.visitas_cerradas)
+        presencia.sincronizar_residentes(
+            movimiento.residente_id for movimiento in lote.movimientos_nuevos + lote.movimientos_cerrados
+        )
+        for resultado, objeto in registrados:
+            # Los ids existen después de bulk_create
+            resultado['id'] = objeto.pk
+        ClaveIdempotencia.objects.bulk_create([
+            ClaveIdempotencia(
+                usuario=usuario,
+                clave=resultado['clave'],
+                resultado={campo: valor for campo, valor in resultado.items() if campo != 'estado'},
+            )
+            for resultado, _ in registrados
+        ])
+        # bulk_update no envía señales: el índice de visitas se actualiza aquí
+        cerradas = [visita.pk for visita in lote.visitas_cerradas]
+        transaction.on_commit(lambda: [indice_visitas.quitar_visita(visita_id) for visita_id in cerradas])
+    return resultados
+
+
+def registrar_eventos(usuario, edificio_id, eventos):
+    """
+    Registra un lote de entradas y salidas de visitas y residentes con la
+    hora de la garita. Cada evento lleva una clave de idempotencia: si ya se
+    registró, se devuelve el resultado guardado con estado 'duplicado'. Los
+    eventos se aplican en orden y uno rechazado no impide los demás.
+    Devuelve un resultado por evento, en el mismo orden.
+    """
+    try:
+        return _procesar(usuario, edificio_id, eventos)
+    except IntegrityError:
+        # Otro envío del mismo lote guardó las claves a la vez: ahora se leen como duplicados
+        return _procesar(usuario, edificio_id, eventos)
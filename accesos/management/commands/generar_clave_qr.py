@@ -0,0 +1,36 @@
+# accesos/management/commands/generar_clave_qr.py
+import base64
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand
+
+from accesos.qr_firma_utils import clave_privada_qr, id_clave
+
+
+class Command(BaseCommand):
+    help = 'Genera una clave Ed25519 para firmar los pases QR de visitas'
+
+    def handle(self, *args, **options):
+        clave = Ed25519PrivateKey.generate()
+        privada = clave.private_bytes(
+            serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption()
+        )
+        self.stdout.write(f'🔑 Clave nueva (id {id_clave(clave.public_key())}). Agréguela al entorno:')
+        self.stdout.write(f'QR_CLAVE_PRIVADA={base64.b64encode(privada).decode()}')
+
+        try:
+            actual = clave_privada_qr().public_key()
+        except ImproperlyConfigured:
+            # Primera clave del entorno: no hay pases emitidos que conservar
+            actual = None
+        if actual is not None:
+            self.stdout.write(
+                f'♻️ Para que los pases ya emitidos sigan valiendo hasta vencer, agregue la clave pública actual '
+                f'(id {id_clave(actual)}) a QR_CLAVES_PUBLICAS_ANTERIORES:'
+            )
+            self.stdout.write(base64.b64encode(
+                actual.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+            ).decode())
+        self.stdout.write(self.style.WARNING('⚠️ La clave privada es secreta: no la guarde en el repositorio'))
@@ -0,0 +1,99 @@
+# accesos/management/commands/medir_verificacion_qr.py
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accesos import indice_visitas
+from accesos.api import verificar_qr_visita
+from accesos.models import Visita
+from accesos.qr_firma_utils import generar_firma_qr
+from usuarios.models import Usuario
+from viviendas.models import Edificio, Residente, Vivienda
+
+
+class Command(BaseCommand):
+    help = 'Mide las verificaciones de QR por segundo con el índice de visitas vacío (en frío) y cargado'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--visitas',
+            type=int,
+            default=2000,
+            help='Visitas abiertas de prueba; cada una se verifica una vez en frío y una vez con el índice cargado (por defecto 2000)',
+        )
+
+    def handle(self, *args, **options):
+        if options['visitas'] < 1:
+            raise CommandError('--visitas debe ser al menos 1')
+
+        factory = APIRequestFactory()
+        # Los datos de prueba se crean en una transacción que se deshace al terminar
+        with transaction.atomic():
+            usuario = Usuario.objects.create_user(username=f'medicion_qr_{time.time_ns()}', password=None)
+            edificio = Edificio.objects.create(nombre='Edificio de medición', direccion='Medición', pisos=1)
+            vivienda = Vivienda.objects.create(edificio=edificio, numero='M01', piso=1, metros_cuadrados=50)
+            residente = Residente.objects.create(usuario=usuario, vivienda=vivienda)
+            Visita.objects.bulk_create(
+                Visita(
+                    nombre_visitante=f'Visitante {numero}',
+                    documento_visitante=f'{numero:08d}',
+                    vivienda_destino=vivienda,
+                    residente_autoriza=residente,
+                    registrado_por=usuario,
+                )
+                for numero in range(options['visitas'])
+            )
+            visitas = list(Visita.objects.filter(vivienda_destino=vivienda).values_list('id', flat=True))
+            try:
+                # En frío cada lectura va a la base, como antes del índice
+                indice_visitas.reconstruir(cargar=False)
+                frio = self._medir(factory, usuario, visitas)
+
+                inicio = time.perf_counter()
+                cargadas = indice_visitas.reconstruir()
+                carga = time.perf_counter() - inicio
+                caliente = self._medir(factory, usuario, visitas)
+            finally:
+                # El índice tiene visitas que desaparecen con la transacción
+                indice_visitas.descartar()
+                transaction.set_rollback(True)
+
+        self.stdout.write(f'📇 Índice cargado con {cargadas} visita(s) abiertas en {carga * 1000:.1f} ms')
+        for nombre, (segundos, consultas) in (('En frío', frio), ('Con índice', caliente)):
+            self.stdout.write(
+                f'🔍 {nombre:<10} | {len(visitas) / segundos:9.0f} verificaciones/s | '
+                f'{segundos / len(visitas) * 1000:6.2f} ms c/u | {consultas} consulta(s)'
+            )
+        self.stdout.write(self.style.SUCCESS(f'✅ Con el índice las verificaciones son {frio[0] / caliente[0]:.1f} veces más rápidas'))
+
+    def _medir(self, factory, usuario, visitas):
+        """Segundos y consultas a la base de verificar el QR de cada visita"""
+        solicitudes = []
+        for visita_id in visitas:
+            request = factory.post(
+                reverse('verificar-qr-visita'),
+                {'id': visita_id, 'firma': generar_firma_qr(visita_id)},
+                format='json',
+            )
+            force_authenticate(request, user=usuario)
+            solicitudes.append(request)
+
+        consultas = 0
+
+        def contar(execute, sql, params, many, context):
+            nonlocal consultas
+            consultas += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(contar):
+            inicio = time.perf_counter()
+            for request in solicitudes:
+                response = verificar_qr_visita(request)
+                if not response.data.get('valido'):
+                    raise CommandError(f'Verificación rechazada: {json.dumps(response.data, ensure_ascii=False)}')
+            segundos = time.perf_counter() - inicio
+        return segundos, consultas
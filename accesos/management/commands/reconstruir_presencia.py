@@ -0,0 +1,17 @@
+# accesos/management/commands/reconstruir_presencia.py
+from django.core.management.base import BaseCommand
+
+from accesos.presencia import contadores_presencia, reconstruir_presencia
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla de presencia por edificio desde el historial de visitas y movimientos'
+
+    def handle(self, *args, **options):
+        total = reconstruir_presencia()
+        for contador in contadores_presencia():
+            self.stdout.write(
+                f"🏢 {contador['edificio']}: {contador['visitas']} visita(s), "
+                f"{contador['residentes']} residente(s), {contador['vehiculos']} vehículo(s)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"✅ Presencia reconstruida: {total} persona(s) dentro"))
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.10 on 2026-10-18 08:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodigoQRVisita',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('firma', models.CharField(max_length=200)),
+                ('carga', models.TextField(help_text='Contenido firmado del QR')),
+                ('matriz', models.TextField(help_text="Filas de módulos sin margen: '1' oscuro, '0' claro, separadas por saltos de línea")),
+                ('fecha_generacion', models.DateTimeField(auto_now=True)),
+                ('visita', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='codigo_qr', to='accesos.visita')),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.10 on 2026-10-18 08:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viviendas', '0002_alter_edificio_options_alter_residente_options_and_more'),
+        ('accesos', '0003_codigo_qr_visita'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='codigoqrvisita',
+            name='valido_hasta',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='codigoqrvisita',
+            name='version',
+            field=models.PositiveSmallIntegerField(default=1, help_text='1: firma HMAC; 2: pase Ed25519 con vencimiento'),
+        ),
+        migrations.CreateModel(
+            name='PaseConsumido',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nonce', models.CharField(max_length=32, unique=True)),
+                ('dispositivo', models.CharField(blank=True, help_text='Garita que registró el uso', max_length=100)),
+                ('fecha_consumo', models.DateTimeField(help_text='Hora del uso según el reloj de la garita')),
+                ('valido_hasta', models.DateTimeField(db_index=True)),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+                ('edificio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pases_consumidos', to='viviendas.edificio')),
+                ('visita', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pases_consumidos', to='accesos.visita')),
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.10 on 2026-10-18 08:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viviendas', '0002_alter_edificio_options_alter_residente_options_and_more'),
+        ('accesos', '0005_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorPresencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visitas', models.IntegerField(default=0)),
+                ('residentes', models.IntegerField(default=0)),
+                ('vehiculos', models.IntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('edificio', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='contador_presencia', to='viviendas.edificio')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Presencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('VISITA', 'Visita'), ('RESIDENTE', 'Residente')], max_length=10)),
+                ('nombre', models.CharField(max_length=200)),
+                ('vehiculo', models.BooleanField(default=False)),
+                ('placa_vehiculo', models.CharField(blank=True, max_length=10)),
+                ('desde', models.DateTimeField()),
+                ('edificio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='presencias', to='viviendas.edificio')),
+                ('residente', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='presencia', to='viviendas.residente')),
+                ('visita', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='presencia', to='accesos.visita')),
+                ('vivienda', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='presencias', to='viviendas.vivienda')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['edificio', 'tipo'], name='accesos_pre_edifici_af306e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:30
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def inicializar_presencia(apps, schema_editor):
+    """
+    Carga Presencia y los contadores con quienes ya están dentro al migrar:
+    sin esto las visitas activas del dashboard y los conteos de evacuación
+    solo cuentan a quienes entren después del despliegue. Repite con los
+    modelos históricos las consultas de accesos.presencia.reconstruir_presencia().
+    """
+    ContadorPresencia = apps.get_model('accesos', 'ContadorPresencia')
+    MovimientoResidente = apps.get_model('accesos', 'MovimientoResidente')
+    Presencia = apps.get_model('accesos', 'Presencia')
+    Visita = apps.get_model('accesos', 'Visita')
+    Residente = apps.get_model('viviendas', 'Residente')
+
+    lote = []
+
+    def agregar(presencia):
+        lote.append(presencia)
+        if len(lote) >= 1000:
+            Presencia.objects.bulk_create(lote)
+            lote.clear()
+
+    visitas = Visita.objects.filter(fecha_hora_salida__isnull=True).select_related('vivienda_destino')
+    for visita in visitas.iterator(chunk_size=1000):
+        agregar(Presencia(
+            edificio_id=visita.vivienda_destino.edificio_id,
+            tipo='VISITA',
+            visita_id=visita.pk,
+            nombre=visita.nombre_visitante,
+            vivienda_id=visita.vivienda_destino_id,
+            desde=visita.fecha_hora_entrada,
+        ))
+
+    # Residentes cuyo último movimiento es una entrada sin salida
+    ultimo = MovimientoResidente.objects.filter(residente=OuterRef('pk')).annotate(
+        momento=Coalesce('fecha_hora_salida', 'fecha_hora_entrada'),
+    ).order_by('-momento', '-id').values('id')[:1]
+    movimientos = MovimientoResidente.objects.filter(
+        pk__in=Residente.objects.annotate(ultimo=Subquery(ultimo)).values('ultimo'),
+        fecha_hora_entrada__isnull=False,
+        fecha_hora_salida__isnull=True,
+        residente__vivienda__isnull=False,
+    ).select_related('residente__usuario', 'residente__vivienda')
+    for movimiento in movimientos.iterator(chunk_size=1000):
+        residente = movimiento.residente
+        usuario = residente.usuario
+        agregar(Presencia(
+            edificio_id=residente.vivienda.edificio_id,
+            tipo='RESIDENTE',
+            residente_id=residente.pk,
+            nombre=f'{usuario.first_name} {usuario.last_name}'.strip() or usuario.username,
+            vivienda_id=residente.vivienda_id,
+            vehiculo=movimiento.vehiculo,
+            placa_vehiculo=movimiento.placa_vehiculo,
+            desde=movimiento.fecha_hora_entrada,
+        ))
+    if lote:
+        Presencia.objects.bulk_create(lote)
+
+    ContadorPresencia.objects.bulk_create(
+        ContadorPresencia(**conteo)
+        for conteo in Presencia.objects.order_by().values('edificio_id').annotate(
+            visitas=Count('id', filter=Q(tipo='VISITA')),
+            residentes=Count('id', filter=Q(tipo='RESIDENTE')),
+            vehiculos=Count('id', filter=Q(vehiculo=True)),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0006_alter_clientepotencial_options_and_more'),
+        ('viviendas', '0002_alter_edificio_options_alter_residente_options_and_more'),
+        ('accesos', '0006_presencia'),
+    ]
+
+    operations = [
+        migrations.RunPython(inicializar_presencia, migrations.RunPython.noop),
+    ]
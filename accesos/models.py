@@ -1,6 +1,7 @@
 from django.db import models
+from django.utils import timezone
 from usuarios.models import Usuario
-from viviendas.models import Vivienda, Residente
+from viviendas.models import Edificio, Vivienda, Residente
 
 class Visita(models.Model):
     nombre_visitante = models.CharField(max_length=100)
@@ -26,3 +27,82 @@ class MovimientoResidente(models.Model):
         tipo = "Entrada" if self.fecha_hora_entrada and not self.fecha_hora_salida else "Salida"
         fecha = self.fecha_hora_entrada if tipo == "Entrada" else self.fecha_hora_salida
         return f"{self.residente} - {tipo} - {fecha.strftime('%d/%m/%Y %H:%M') if fecha else 'N/A'}"
+
+class CodigoQRVisita(models.Model):
+    """Código QR de una visita: se genera una vez por firma y se sirve como PNG, SVG o matriz"""
+    visita = models.OneToOneField(Visita, on_delete=models.CASCADE, related_name='codigo_qr')
+    firma = models.CharField(max_length=200)
+    carga = models.TextField(help_text="Contenido firmado del QR")
+    matriz = models.TextField(help_text="Filas de módulos sin margen: '1' oscuro, '0' claro, separadas por saltos de línea")
+    version = models.PositiveSmallIntegerField(default=1, help_text="1: firma HMAC; 2: pase Ed25519 con vencimiento")
+    valido_hasta = models.DateTimeField(null=True, blank=True)
+    fecha_generacion = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"QR de la visita {self.visita_id}"
+
+class PaseConsumido(models.Model):
+    """Pase QR v2 ya usado en una garita; las garitas se sincronizan por lotes para no aceptarlo de nuevo"""
+    nonce = models.CharField(max_length=32, unique=True)
+    visita = models.ForeignKey(Visita, on_delete=models.CASCADE, related_name='pases_consumidos')
+    edificio = models.ForeignKey(Edificio, on_delete=models.CASCADE, related_name='pases_consumidos')
+    dispositivo = models.CharField(max_length=100, blank=True, help_text="Garita que registró el uso")
+    fecha_consumo = models.DateTimeField(help_text="Hora del uso según el reloj de la garita")
+    valido_hasta = models.DateTimeField(db_index=True)
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Pase {self.nonce} de la visita {self.visita_id}"
+
+class ClaveIdempotencia(models.Model):
+    """Evento de acceso ya registrado por lote: si la garita lo reenvía se devuelve el mismo resultado"""
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE, related_name='claves_idempotencia')
+    clave = models.CharField(max_length=100)
+    resultado = models.JSONField()
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='clave_idempotencia_unica_por_usuario'),
+        ]
+    
+    def __str__(self):
+        return f"{self.clave} ({self.usuario_id})"
+
+class Presencia(models.Model):
+    """Persona dentro de un edificio ahora: una visita sin salida o un residente cuyo último movimiento es una entrada"""
+    TIPOS = [
+        ('VISITA', 'Visita'),
+        ('RESIDENTE', 'Residente'),
+    ]
+    
+    edificio = models.ForeignKey(Edificio, on_delete=models.CASCADE, related_name='presencias')
+    tipo = models.CharField(max_length=10, choices=TIPOS)
+    visita = models.OneToOneField(Visita, on_delete=models.CASCADE, null=True, blank=True, related_name='presencia')
+    residente = models.OneToOneField(Residente, on_delete=models.CASCADE, null=True, blank=True, related_name='presencia')
+    nombre = models.CharField(max_length=200)
+    vivienda = models.ForeignKey(Vivienda, on_delete=models.SET_NULL, null=True, blank=True, related_name='presencias')
+    vehiculo = models.BooleanField(default=False)
+    placa_vehiculo = models.CharField(max_length=10, blank=True)
+    desde = models.DateTimeField()
+    
+    class Meta:
+        indexes = [models.Index(fields=['edificio', 'tipo'])]
+    
+    def __str__(self):
+        return f"{self.nombre} ({self.get_tipo_display()}) en {self.edificio_id}"
+
+class ContadorPresencia(models.Model):
+    """Totales de Presencia por edificio, actualizados con cada entrada y salida para leerlos sin contar filas"""
+    edificio = models.OneToOneField(Edificio, on_delete=models.CASCADE, related_name='contador_presencia')
+    visitas = models.IntegerField(default=0)
+    residentes = models.IntegerField(default=0)
+    vehiculos = models.IntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(default=timezone.now)
+    
+    @property
+    def total(self):
+        return self.visitas + self.residentes
+    
+    def __str__(self):
+        return f"Presencia en {self.edificio_id}: {self.total}"
@@ -0,0 +1,242 @@
+# accesos/presencia.py - Quién está dentro de cada edificio, mantenido con cada entrada y salida
+#
+# Presencia tiene una fila por persona dentro: las visitas sin salida y los
+# residentes cuyo último movimiento es una entrada. ContadorPresencia guarda
+# sus totales por edificio para leerlos sin contar filas. Las señales y el
+# registro por lotes sincronizan solo las visitas o residentes afectados;
+# reconstruir_presencia() rehace todo desde el historial.
+import logging
+from collections import defaultdict
+from itertools import chain, islice
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from viviendas.models import Residente
+from .models import ContadorPresencia, MovimientoResidente, Presencia, Visita
+
+logger = logging.getLogger(__name__)
+
+# Filas que se leen o insertan por vez al reconstruir
+TAMANO_LOTE_PRESENCIA = 1000
+
+# Campos que se copian a una fila de Presencia existente cuando cambia
+CAMPOS_PRESENCIA = ['edificio', 'tipo', 'nombre', 'vivienda', 'vehiculo', 'placa_vehiculo', 'desde']
+
+
+def _presencia_visita(visita):
+    return Presencia(
+        edificio_id=visita.vivienda_destino.edificio_id,
+        tipo='VISITA',
+        visita_id=visita.pk,
+        nombre=visita.nombre_visitante,
+        vivienda_id=visita.vivienda_destino_id,
+        desde=visita.fecha_hora_entrada,
+    )
+
+
+def _presencia_residente(movimiento):
+    residente = movimiento.residente
+    return Presencia(
+        edificio_id=residente.vivienda.edificio_id,
+        tipo='RESIDENTE',
+        residente_id=residente.pk,
+        nombre=residente.usuario.get_full_name() or residente.usuario.username,
+        vivienda_id=residente.vivienda_id,
+        vehiculo=movimiento.vehiculo,
+        placa_vehiculo=movimiento.placa_vehiculo,
+        desde=movimiento.fecha_hora_entrada,
+    )
+
+
+def _visitas_dentro(visitas):
+    visitas = visitas.filter(fecha_hora_salida__isnull=True).select_related('vivienda_destino')
+    return (_presencia_visita(visita) for visita in visitas.iterator(chunk_size=TAMANO_LOTE_PRESENCIA))
+
+
+def _residentes_dentro(residentes):
+    """
+    Presencia de los residentes cuyo último movimiento (por la hora de su
+    salida o, si no tiene, de su entrada) es una entrada sin salida
+    """
+    ultimo = MovimientoResidente.objects.filter(residente=OuterRef('pk')).annotate(
+        momento=Coalesce('fecha_hora_salida', 'fecha_hora_entrada'),
+    ).order_by('-momento', '-id').values('id')[:1]
+    movimientos = MovimientoResidente.objects.filter(
+        pk__in=residentes.annotate(ultimo=Subquery(ultimo)).values('ultimo'),
+        fecha_hora_entrada__isnull=False,
+        fecha_hora_salida__isnull=True,
+        residente__vivienda__isnull=False,
+    ).select_related('residente__usuario', 'residente__vivienda')
+    return (_presencia_residente(movimiento) for movimiento in movimientos.iterator(chunk_size=TAMANO_LOTE_PRESENCIA))
+
+
+def _aporte(presencia):
+    """Lo que suma una fila a los contadores de su edificio: visitas, residentes y vehículos"""
+    return (int(presencia.tipo == 'VISITA'), int(presencia.tipo == 'RESIDENTE'), int(presencia.vehiculo))
+
+
+def _valores(presencia):
+    return tuple(getattr(presencia, Presencia._meta.get_field(nombre).attname) for nombre in CAMPOS_PRESENCIA)
+
+
+def _ajustar_contadores(cambios):
+    """Suma las diferencias {edificio_id: [visitas, residentes, vehiculos]} a los contadores, sin leerlos"""
+    ahora = timezone.now()
+    for edificio_id, (visitas, residentes, vehiculos) in cambios.items():
+        if not (visitas or residentes or vehiculos):
+            continue
+        contador = ContadorPresencia.objects.filter(edificio_id=edificio_id)
+        valores = {
+            'visitas': F('visitas') + visitas,
+            'residentes': F('residentes') + residentes,
+            'vehiculos': F('vehiculos') + vehiculos,
+            'fecha_actualizacion': ahora,
+        }
+        if not contador.update(**valores):
+            # Primera persona en el edificio
+            ContadorPresencia.objects.get_or_create(edificio_id=edificio_id)
+            contador.update(**valores)
+
+
+def _sincronizar(campo, ids, deseadas):
+    """
+    Deja en Presencia exactamente las filas deseadas para las visitas o
+    residentes ids (campo 'visita' o 'residente') y ajusta los contadores
+    con la diferencia. Una consulta para leer las filas actuales y una por
+    tipo de cambio, sin importar cuántos ids sean.
+    """
+    clave = f'{campo}_id'
+    deseadas = {getattr(presencia, clave): presencia for presencia in deseadas}
+    actuales = {getattr(presencia, clave): presencia for presencia in Presencia.objects.filter(**{f'{clave}__in': ids})}
+    cambios = defaultdict(lambda: [0, 0, 0])
+
+    def sumar(presencia, signo):
+        for posicion, valor in enumerate(_aporte(presencia)):
+            cambios[presencia.edificio_id][posicion] += signo * valor
+
+    crear, modificar, borrar = [], [], []
+    for identificador, presencia in deseadas.items():
+        actual = actuales.get(identificador)
+        if actual is None:
+            crear.append(presencia)
+            sumar(presencia, 1)
+        elif _valores(actual) != _valores(presencia):
+            sumar(actual, -1)
+            sumar(presencia, 1)
+            presencia.pk = actual.pk
+            modificar.append(presencia)
+    for identificador, actual in actuales.items():
+        if identificador not in deseadas:
+            borrar.append(actual.pk)
+            sumar(actual, -1)
+
+    if borrar:
+        Presencia.objects.filter(pk__in=borrar).delete()
+    Presencia.objects.bulk_create(crear)
+    Presencia.objects.bulk_update(modificar, CAMPOS_PRESENCIA)
+    _ajustar_contadores(cambios)
+
+
+def _sincronizar_seguro(campo, ids, deseadas):
+    # Un error no debe impedir registrar la entrada o salida: se corrige al reconstruir
+    try:
+        with transaction.atomic():
+            _sincronizar(campo, ids, deseadas)
+    except Exception:
+        logger.exception(f"Error al actualizar la presencia de {campo} {sorted(ids)[:10]}")
+
+
+def sincronizar_visitas(visita_ids):
+    """Actualiza la presencia de visitas creadas, finalizadas o modificadas"""
+    visita_ids = set(visita_ids)
+    if visita_ids:
+        _sincronizar_seguro('visita', visita_ids, _visitas_dentro(Visita.objects.filter(pk__in=visita_ids)))
+
+
+def sincronizar_residentes(residente_ids):
+    """Actualiza la presencia de residentes con movimientos nuevos, modificados o eliminados"""
+    residente_ids = set(residente_ids)
+    if residente_ids:
+        _sincronizar_seguro('residente', residente_ids, _residentes_dentro(Residente.objects.filter(pk__in=residente_ids)))
+
+
+def quitar_visitas(visita_ids):
+    """Saca de la presencia visitas que se van a eliminar"""
+    _sincronizar_seguro('visita', set(visita_ids), [])
+
+
+def quitar_residentes(residente_ids):
+    """Saca de la presencia residentes que se van a eliminar"""
+    _sincronizar_seguro('residente', set(residente_ids), [])
+
+
+def reconstruir_presencia():
+    """
+    Rehace Presencia y los contadores desde el historial de visitas y
+    movimientos en una transacción. Devuelve la cantidad de personas dentro.
+    """
+    with transaction.atomic():
+        Presencia.objects.all().delete()
+        filas = chain(_visitas_dentro(Visita.objects.all()), _residentes_dentro(Residente.objects.all()))
+        total = 0
+        while lote := list(islice(filas, TAMANO_LOTE_PRESENCIA)):
+            Presencia.objects.bulk_create(lote)
+            total += len(lote)
+
+        ContadorPresencia.objects.all().delete()
+        ahora = timezone.now()
+        ContadorPresencia.objects.bulk_create(
+            ContadorPresencia(fecha_actualizacion=ahora, **conteo)
+            for conteo in Presencia.objects.order_by().values('edificio_id').annotate(
+                visitas=Count('id', filter=Q(tipo='VISITA')),
+                residentes=Count('id', filter=Q(tipo='RESIDENTE')),
+                vehiculos=Count('id', filter=Q(vehiculo=True)),
+            )
+        )
+    logger.info(f"Presencia reconstruida: {total} persona(s) dentro")
+    return total
+
+
+def contadores_presencia(edificio_id=None):
+    """Personas y vehículos dentro de cada edificio con alguien dentro, leídos de los contadores"""
+    contadores = ContadorPresencia.objects.select_related('edificio').order_by('edificio__nombre')
+    if edificio_id:
+        contadores = contadores.filter(edificio_id=edificio_id)
+    return [
+        {
+            'edificio_id': contador.edificio_id,
+            'edificio': contador.edificio.nombre,
+            'visitas': contador.visitas,
+            'residentes': contador.residentes,
+            'vehiculos': contador.vehiculos,
+            'total': contador.total,
+        }
+        for contador in contadores
+    ]
+
+
+def conteo_evacuacion():
+    """Personas dentro por edificio y en total, para las alertas de incendio y sismo"""
+    edificios = contadores_presencia()
+    return {
+        'edificios': edificios,
+        'total': sum(edificio['total'] for edificio in edificios),
+        'fecha': timezone.now().isoformat(),
+    }
+
+
+def totales_presencia(edificio_id=None):
+    """Suma de los contadores de todos los edificios, o de uno: una fila por edificio, sin recorrer visitas ni movimientos"""
+    contadores = ContadorPresencia.objects.all()
+    if edificio_id:
+        contadores = contadores.filter(edificio_id=edificio_id)
+    totales = contadores.aggregate(
+        visitas=Coalesce(Sum('visitas'), 0),
+        residentes=Coalesce(Sum('residentes'), 0),
+        vehiculos=Coalesce(Sum('vehiculos'), 0),
+    )
+    totales['total'] = totales['visitas'] + totales['residentes']
+    return totales
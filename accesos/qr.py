@@ -0,0 +1,154 @@
+# accesos/qr.py - Códigos QR de las visitas: la matriz se genera una vez y se sirve como PNG, SVG o datos
+import json
+import re
+import struct
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+
+from .models import CodigoQRVisita, Visita
+from .qr_firma_utils import (
+    VIGENCIA_PASE_QR, contenido_pase_qr, firmar_pase_qr, generar_firma_qr, id_clave_qr, version_pase_qr
+)
+
+# Módulos de margen claro alrededor del código, como pide el estándar QR
+MARGEN_QR = 4
+
+# Píxeles por módulo del PNG si no se indica otra escala, y máximo aceptado
+ESCALA_PNG = 8
+ESCALA_MAXIMA_PNG = 20
+
+FORMATOS_QR = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'json': 'application/json',
+}
+
+
+def carga_qr(visita_id, firma):
+    """Contenido firmado del QR v1, el mismo en todos los endpoints: JSON compacto con el id y la firma"""
+    return json.dumps({'id': visita_id, 'firma': firma}, separators=(',', ':'))
+
+
+def carga_pase_qr(pase):
+    """Contenido del QR v2: el pase firmado, en JSON para que la app lo envíe tal como lo lee"""
+    return json.dumps({'pase': pase}, separators=(',', ':'))
+
+
+def _matriz(carga):
+    """
+    Módulos del QR sin margen, una fila por línea. El nivel de corrección M
+    (15 %) alcanza para leer desde la pantalla de un teléfono y mantiene el
+    código chico. qrcode (y Pillow, que importa) solo se cargan aquí.
+    """
+    import qrcode
+    from qrcode.constants import ERROR_CORRECT_M
+
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_M, border=0)
+    qr.add_data(carga)
+    qr.make(fit=True)
+    return '\n'.join(''.join('1' if modulo else '0' for modulo in fila) for fila in qr.get_matrix())
+
+
+def _codigo_vigente(codigo, version):
+    """El código guardado sirve si es de la versión que se emite y de la firma o clave actual"""
+    if codigo is None or codigo.version != version:
+        return False
+    if version == 1:
+        return codigo.firma == generar_firma_qr(codigo.visita_id)
+    return contenido_pase_qr(json.loads(codigo.carga)['pase']).get('k') == id_clave_qr()
+
+
+def codigo_qr_visita(visita_id):
+    """
+    Código QR guardado de una visita. Se genera la primera vez y de nuevo
+    solo si cambia la versión de pase que se emite o la firma (por ejemplo,
+    al rotar la clave). El pase v2 vale desde la entrada de la visita
+    durante VIGENCIA_PASE_QR segundos.
+    """
+    version = version_pase_qr()
+    codigo = CodigoQRVisita.objects.filter(visita_id=visita_id).first()
+    if not _codigo_vigente(codigo, version):
+        valido_hasta = None
+        if version == 1:
+            firma = generar_firma_qr(visita_id)
+            carga = carga_qr(visita_id, firma)
+        else:
+            visita = Visita.objects.values('fecha_hora_entrada', 'vivienda_destino__edificio_id').get(pk=visita_id)
+            desde = visita['fecha_hora_entrada']
+            valido_hasta = desde + timedelta(seconds=getattr(settings, 'VIGENCIA_PASE_QR', VIGENCIA_PASE_QR))
+            pase = firmar_pase_qr(visita_id, visita['vivienda_destino__edificio_id'], desde, valido_hasta)
+            firma = pase.rsplit('.', 1)[1]
+            carga = carga_pase_qr(pase)
+        codigo, _ = CodigoQRVisita.objects.update_or_create(visita_id=visita_id, defaults={
+            'firma': firma,
+            'carga': carga,
+            'matriz': _matriz(carga),
+            'version': version,
+            'valido_hasta': valido_hasta,
+        })
+    return codigo
+
+
+def etiqueta_qr(visita_id, formato, escala=ESCALA_PNG):
+    """ETag del archivo: cambia con la versión y la firma o clave, sin leer el código guardado"""
+    if version_pase_qr() == 1:
+        return f'"qr-{visita_id}-{generar_firma_qr(visita_id)[:16]}-{formato}-{escala}"'
+    return f'"qr-{visita_id}-v2-{id_clave_qr()}-{formato}-{escala}"'
+
+
+def _filas_con_margen(matriz):
+    filas = matriz.split('\n')
+    lado = len(filas) + 2 * MARGEN_QR
+    vacia = '0' * lado
+    margen = '0' * MARGEN_QR
+    return [vacia] * MARGEN_QR + [margen + fila + margen for fila in filas] + [vacia] * MARGEN_QR
+
+
+def png_qr(matriz, escala=ESCALA_PNG):
+    """PNG en escala de grises de 1 bit por píxel, escrito directamente con zlib y sin Pillow"""
+    filas = _filas_con_margen(matriz)
+    lado = len(filas) * escala
+    relleno = '0' * (-lado % 8)
+    datos = bytearray()
+    for fila in filas:
+        # En escala de grises de 1 bit el 0 es negro: los módulos oscuros van en 0
+        bits = ''.join(('0' if modulo == '1' else '1') * escala for modulo in fila) + relleno
+        linea = b'\x00' + int(bits, 2).to_bytes(len(bits) // 8, 'big')
+        datos += linea * escala
+
+    def bloque(tipo, contenido):
+        return struct.pack('>I', len(contenido)) + tipo + contenido + struct.pack('>I', zlib.crc32(tipo + contenido))
+
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + bloque(b'IHDR', struct.pack('>IIBBBBB', lado, lado, 1, 0, 0, 0, 0))
+        + bloque(b'IDAT', zlib.compress(bytes(datos), 9))
+        + bloque(b'IEND', b'')
+    )
+
+
+def svg_qr(matriz):
+    """SVG con un solo trazo: cada tramo horizontal de módulos oscuros es un rectángulo"""
+    filas = _filas_con_margen(matriz)
+    lado = len(filas)
+    trazos = ''.join(
+        f'M{tramo.start()} {y}h{len(tramo.group())}v1h-{len(tramo.group())}z'
+        for y, fila in enumerate(filas)
+        for tramo in re.finditer('1+', fila)
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {lado} {lado}" shape-rendering="crispEdges">'
+        f'<rect width="{lado}" height="{lado}" fill="#fff"/><path d="{trazos}" fill="#000"/></svg>'
+    )
+
+
+def datos_qr(codigo):
+    """Matriz para que la app dibuje el código: filas de '1' y '0' y el margen que debe dejar"""
+    return {
+        'carga': codigo.carga,
+        'version': codigo.version,
+        'margen': MARGEN_QR,
+        'matriz': codigo.matriz.split('\n'),
+    }
@@ -1,13 +1,206 @@
+import base64
 import hmac
 import hashlib
+import json
+import secrets
+import time
+from functools import lru_cache
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+# Clave HMAC de los pases v1 cuando no se configura QR_SECRET_KEY; solo con DEBUG
+CLAVE_QR_V1_DESARROLLO = "clave-secreta-segura"
+
+# Versión de los pases que se emiten si no se configura QR_VERSION_PASE: 1 (HMAC) o 2 (Ed25519)
+VERSION_PASE_QR = 2
+
+# Segundos de validez de un pase v2 desde la entrada de la visita, si no se configura VIGENCIA_PASE_QR
+VIGENCIA_PASE_QR = 24 * 60 * 60
+
+# Segundos de diferencia de reloj que se toleran al comparar con la ventana de validez
+TOLERANCIA_RELOJ_QR = 5 * 60
 
-SECRET_QR_KEY = getattr(settings, "QR_SECRET_KEY", "clave-secreta-segura")
+def _clave_qr_v1():
+    """Clave HMAC de los pases v1: QR_SECRET_KEY, o la de desarrollo solo con DEBUG"""
+    clave = getattr(settings, 'QR_SECRET_KEY', '')
+    if clave:
+        return clave
+    if settings.DEBUG:
+        return CLAVE_QR_V1_DESARROLLO
+    raise ImproperlyConfigured("Configure QR_SECRET_KEY para emitir o verificar pases QR v1")
 
 def generar_firma_qr(id_visita: int) -> str:
     msg = f"visita:{id_visita}"
-    return hmac.new(SECRET_QR_KEY.encode(), msg.encode(), hashlib.sha256).hexdigest()
+    return hmac.new(_clave_qr_v1().encode(), msg.encode(), hashlib.sha256).hexdigest()
 
 def verificar_firma_qr(id_visita: int, firma_recibida: str) -> bool:
     firma_valida = generar_firma_qr(id_visita)
     return hmac.compare_digest(firma_valida, firma_recibida)
+
+
+# ---------------------------------------------------------------------------
+# Pases v2: "v2.<cuerpo>.<firma>", ambos en base64url sin relleno. El cuerpo es
+# JSON compacto con la visita (id), el edificio (ed), la ventana de validez en
+# segundos Unix (nb, na), un nonce (n) y el id de la clave (k). La firma
+# Ed25519 es sobre el texto del cuerpo, así que una garita verifica el pase
+# sin conexión con solo la clave pública.
+# ---------------------------------------------------------------------------
+
+class PaseQRInvalido(ValueError):
+    """El pase no se puede aceptar; el mensaje es el que ve el guardia"""
+
+
+def version_pase_qr():
+    return getattr(settings, 'QR_VERSION_PASE', VERSION_PASE_QR)
+
+
+def aceptar_pases_v1():
+    """
+    Los pases HMAC se siguen aceptando hasta que QR_ACEPTAR_PASES_V1 sea False.
+    Fuera de DEBUG se necesita además QR_SECRET_KEY: con la clave de desarrollo,
+    que está en el repositorio, cualquiera podría firmarlos.
+    """
+    if not getattr(settings, 'QR_ACEPTAR_PASES_V1', True):
+        return False
+    return settings.DEBUG or bool(getattr(settings, 'QR_SECRET_KEY', ''))
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b'=').decode()
+
+
+def _desde_b64(texto):
+    return base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4))
+
+
+@lru_cache(maxsize=None)
+def clave_privada_qr():
+    """
+    Clave Ed25519 de QR_CLAVE_PRIVADA (PEM, o los 32 bytes en base64). Sin
+    configurar solo se admite con DEBUG: se deriva de SECRET_KEY, que tiene un
+    valor por defecto en el repositorio y no sirve para firmar pases reales.
+    """
+    clave = getattr(settings, 'QR_CLAVE_PRIVADA', '')
+    if not clave:
+        if not settings.DEBUG:
+            raise ImproperlyConfigured(
+                "Configure QR_CLAVE_PRIVADA para firmar los pases QR (manage.py generar_clave_qr)"
+            )
+        semilla = HKDF(algorithm=hashes.SHA256(), length=32, salt=b'accesos.pase_qr', info=b'ed25519').derive(
+            settings.SECRET_KEY.encode()
+        )
+        return Ed25519PrivateKey.from_private_bytes(semilla)
+    if clave.lstrip().startswith('-----BEGIN'):
+        privada = serialization.load_pem_private_key(clave.encode(), password=None)
+        if not isinstance(privada, Ed25519PrivateKey):
+            raise ValueError("QR_CLAVE_PRIVADA debe ser una clave Ed25519")
+        return privada
+    return Ed25519PrivateKey.from_private_bytes(base64.b64decode(clave))
+
+
+@receiver(setting_changed)
+def _descartar_claves(setting, **kwargs):
+    # Las claves se leen una vez por proceso; se vuelven a leer si cambia su ajuste
+    if setting in ('QR_CLAVE_PRIVADA', 'QR_CLAVES_PUBLICAS_ANTERIORES', 'SECRET_KEY', 'DEBUG'):
+        clave_privada_qr.cache_clear()
+        claves_publicas_qr.cache_clear()
+
+
+def _bytes_publicos(clave_publica):
+    return clave_publica.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+
+
+def id_clave(clave_publica):
+    """Id corto de una clave pública, para elegirla al verificar tras una rotación"""
+    return hashlib.sha256(_bytes_publicos(clave_publica)).hexdigest()[:8]
+
+
+@lru_cache(maxsize=None)
+def claves_publicas_qr():
+    """
+    Claves que verifican pases, por id: la actual y las de
+    QR_CLAVES_PUBLICAS_ANTERIORES (32 bytes en base64), para que los pases
+    emitidos antes de rotar la clave sigan valiendo hasta vencer.
+    """
+    claves = [clave_privada_qr().public_key()] + [
+        Ed25519PublicKey.from_public_bytes(base64.b64decode(anterior))
+        for anterior in getattr(settings, 'QR_CLAVES_PUBLICAS_ANTERIORES', [])
+    ]
+    return {id_clave(clave): clave for clave in claves}
+
+
+def id_clave_qr():
+    """Id de la clave con que se firman los pases nuevos"""
+    return id_clave(clave_privada_qr().public_key())
+
+
+def datos_claves_publicas():
+    """Claves públicas para las garitas, en base64 y por id"""
+    return [
+        {'id': identificador, 'algoritmo': 'Ed25519', 'publica': base64.b64encode(_bytes_publicos(clave)).decode()}
+        for identificador, clave in claves_publicas_qr().items()
+    ]
+
+
+def firmar_pase_qr(visita_id, edificio_id, desde, hasta, nonce=None):
+    """Pase v2 firmado para una visita, válido entre los datetime desde y hasta"""
+    cuerpo = _b64(json.dumps({
+        'v': 2,
+        'id': visita_id,
+        'ed': edificio_id,
+        'nb': int(desde.timestamp()),
+        'na': int(hasta.timestamp()),
+        'n': nonce or secrets.token_urlsafe(9),
+        'k': id_clave_qr(),
+    }, separators=(',', ':')).encode())
+    return f'v2.{cuerpo}.{_b64(clave_privada_qr().sign(cuerpo.encode()))}'
+
+
+def _partes_pase(pase):
+    partes = pase.split('.') if isinstance(pase, str) else []
+    if len(partes) != 3 or partes[0] != 'v2':
+        raise PaseQRInvalido('QR inválido o alterado.')
+    try:
+        datos = json.loads(_desde_b64(partes[1]))
+        firma = _desde_b64(partes[2])
+    except ValueError:
+        raise PaseQRInvalido('QR inválido o alterado.')
+    if not isinstance(datos, dict):
+        raise PaseQRInvalido('QR inválido o alterado.')
+    return partes[1], datos, firma
+
+
+def contenido_pase_qr(pase):
+    """Datos del pase sin verificar la firma, para decidir si hay que volver a emitirlo"""
+    return _partes_pase(pase)[1]
+
+
+def leer_pase_qr(pase, ahora=None, verificar_vigencia=True):
+    """
+    Verifica la firma y la ventana de validez de un pase v2 y devuelve sus
+    datos. Lanza PaseQRInvalido con el motivo si no se puede aceptar.
+    """
+    cuerpo, datos, firma = _partes_pase(pase)
+    clave = claves_publicas_qr().get(datos.get('k'))
+    if clave is None:
+        raise PaseQRInvalido('QR inválido o alterado.')
+    try:
+        clave.verify(firma, cuerpo.encode())
+    except InvalidSignature:
+        raise PaseQRInvalido('QR inválido o alterado.')
+
+    if verificar_vigencia:
+        ahora = time.time() if ahora is None else ahora
+        tolerancia = getattr(settings, 'TOLERANCIA_RELOJ_QR', TOLERANCIA_RELOJ_QR)
+        if ahora + tolerancia < datos['nb']:
+            raise PaseQRInvalido('El pase QR aún no es válido.')
+        if ahora - tolerancia > datos['na']:
+            raise PaseQRInvalido('El pase QR está vencido.')
+    return datos
@@ -0,0 +1,55 @@
+# accesos/signals.py - Señales que mantienen al día el índice de visitas abiertas y la presencia por edificio
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from viviendas.models import Residente
+from . import indice_visitas, presencia
+from .models import MovimientoResidente, Visita
+
+
+@receiver(post_save, sender=Visita)
+def actualizar_indice_visita(sender, instance, **kwargs):
+    """Al registrar una visita o su salida se actualiza el índice, una vez confirmada la transacción"""
+    visita_id = instance.pk
+    if instance.fecha_hora_salida:
+        transaction.on_commit(lambda: indice_visitas.quitar_visita(visita_id))
+    else:
+        transaction.on_commit(lambda: indice_visitas.actualizar_visita(visita_id))
+
+
+@receiver(post_delete, sender=Visita)
+def quitar_visita_del_indice(sender, instance, **kwargs):
+    visita_id = instance.pk
+    transaction.on_commit(lambda: indice_visitas.quitar_visita(visita_id))
+
+
+@receiver(post_save, sender=Visita)
+def actualizar_presencia_visita(sender, instance, **kwargs):
+    """La presencia se actualiza en la misma transacción que la entrada o salida"""
+    presencia.sincronizar_visitas([instance.pk])
+
+
+@receiver(pre_delete, sender=Visita)
+def quitar_presencia_visita(sender, instance, **kwargs):
+    # Antes de que el borrado en cascada se lleve la fila sin descontarla
+    presencia.quitar_visitas([instance.pk])
+
+
+@receiver(post_save, sender=MovimientoResidente)
+@receiver(post_delete, sender=MovimientoResidente)
+def actualizar_presencia_movimiento(sender, instance, **kwargs):
+    """El residente está dentro si su último movimiento es una entrada: se recalcula al cambiar cualquiera"""
+    presencia.sincronizar_residentes([instance.residente_id])
+
+
+@receiver(post_save, sender=Residente)
+def actualizar_presencia_residente(sender, instance, created, **kwargs):
+    # Un cambio de vivienda puede mover al residente de edificio
+    if not created:
+        presencia.sincronizar_residentes([instance.pk])
+
+
+@receiver(pre_delete, sender=Residente)
+def quitar_presencia_residente(sender, instance, **kwargs):
+    presencia.quitar_residentes([instance.pk])
@@ -1,11 +1,28 @@
-from django.test import TestCase, Client
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from .models import Visita, MovimientoResidente
-from usuarios.models import Rol
+from . import indice_visitas, presencia
+from .models import ClaveIdempotencia, CodigoQRVisita, ContadorPresencia, PaseConsumido, Presencia, Visita, MovimientoResidente
+from .qr_firma_utils import clave_privada_qr, firmar_pase_qr, generar_firma_qr, leer_pase_qr
+from usuarios.models import Rol, Vigilante
 from viviendas.models import Edificio, Vivienda, Residente
 from datetime import timedelta
+import base64
+import io
+import json
+
+# Fuera de DEBUG las claves de los pases QR deben estar configuradas
+claves_qr_prueba = override_settings(
+    QR_CLAVE_PRIVADA='AAECAwQFBgcICQoLDA0ODxAREhMUFRYXGBkaGxwdHh8=',
+    QR_SECRET_KEY='clave-qr-de-prueba',
+)
+
 
 class VisitaModelTest(TestCase):
     """
@@ -388,4 +405,548 @@ class MovimientoResidenteViewsTest(TestCase):
         self.assertIsNone(nuevo_movimiento.fecha_hora_entrada)
         self.assertIsNotNone(nuevo_movimiento.fecha_hora_salida)
         self.assertTrue(nuevo_movimiento.vehiculo)
-        self.assertEqual(nuevo_movimiento.placa_vehiculo, 'XYZ789')
\ No newline at end of file
+        self.assertEqual(nuevo_movimiento.placa_vehiculo, 'XYZ789')
+
+@claves_qr_prueba
+class QRVisitaAPITest(TestCase):
+    """
+    Pruebas para los códigos QR de las visitas: generación única y archivos cacheables
+    """
+    
+    def setUp(self):
+        User = get_user_model()
+        self.usuario = User.objects.create_user(username='residente', password='password')
+        edificio = Edificio.objects.create(nombre='Edificio Test', direccion='Calle Test 123', pisos=10)
+        self.vivienda = Vivienda.objects.create(edificio=edificio, numero='101', piso=1, metros_cuadrados=80)
+        Residente.objects.create(usuario=self.usuario, vivienda=self.vivienda, es_propietario=True)
+        self.client.force_login(self.usuario)
+        # El índice de visitas es del proceso y no se deshace con la transacción de cada prueba
+        indice_visitas.descartar()
+        cache.clear()
+    
+    def _crear_visita(self, **extra):
+        response = self.client.post(reverse('api-crear-visita'), data=json.dumps({
+            'nombre_visitante': 'Ana Gómez',
+            'documento_visitante': '12345678',
+            'vivienda_destino_id': self.vivienda.id,
+            **extra,
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    @override_settings(QR_INCLUIR_BASE64=False)
+    def test_misma_carga_firmada_en_ambos_endpoints(self):
+        """Verificar que el QR se genera una vez y que crear y consultar devuelven la misma carga, sin imagen"""
+        creada = self._crear_visita()
+        
+        self.assertNotIn('qr_base64', creada)
+        self.assertEqual(creada['version'], 2)
+        self.assertEqual(leer_pase_qr(json.loads(creada['carga'])['pase'])['id'], creada['id'])
+        self.assertEqual(CodigoQRVisita.objects.count(), 1)
+        
+        # Sesión, usuario, visita y QR guardado
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('api-generar-qr-visita', args=[creada['id']]))
+        consultada = response.json()
+        self.assertEqual(consultada['carga'], creada['carga'])
+        self.assertEqual(consultada['qr_url'], creada['qr_url'])
+        self.assertEqual(CodigoQRVisita.objects.count(), 1)
+        
+        # La carga se verifica con el endpoint de los guardias
+        response = self.client.post(
+            reverse('verificar-qr-visita'), data=consultada['carga'], content_type='application/json'
+        )
+        self.assertTrue(response.json()['valido'])
+    
+    def test_png_svg_y_matriz_con_etag(self):
+        """Verificar los archivos del QR y que la app recibe 304 con el ETag guardado"""
+        from PIL import Image
+        
+        visita_id = self._crear_visita()['id']
+        url_png = reverse('api-qr-visita-archivo', args=[visita_id, 'png'])
+        
+        response = self.client.get(url_png, {'escala': 4})
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('private', response['Cache-Control'])
+        matriz = CodigoQRVisita.objects.get().matriz.split('\n')
+        imagen = Image.open(io.BytesIO(response.content))
+        lado = (len(matriz) + 8) * 4
+        self.assertEqual(imagen.size, (lado, lado))
+        # Esquina del patrón de posición oscura, margen claro
+        self.assertEqual(imagen.convert('L').getpixel((16, 16)), 0)
+        self.assertEqual(imagen.convert('L').getpixel((0, 0)), 255)
+        
+        response = self.client.get(url_png, {'escala': 4}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        
+        response = self.client.get(reverse('api-qr-visita-archivo', args=[visita_id, 'svg']))
+        self.assertTrue(response.content.startswith(b'<svg'))
+        
+        datos = json.loads(self.client.get(reverse('api-qr-visita-archivo', args=[visita_id, 'json'])).content)
+        self.assertEqual(datos['matriz'], matriz)
+        self.assertEqual(matriz[0][:7], '1111111')
+        
+        self.assertEqual(self.client.get(reverse('api-qr-visita-archivo', args=[visita_id, 'gif'])).status_code, 404)
+    
+    def test_imagen_base64_para_apps_anteriores(self):
+        """Verificar que la imagen en base64 se incluye por defecto y que la app puede omitirla"""
+        creada = self._crear_visita()
+        self.assertTrue(base64.b64decode(creada['qr_base64']).startswith(b'\x89PNG'))
+        
+        url = reverse('api-generar-qr-visita', args=[creada['id']])
+        self.assertIn('qr_base64', self.client.get(url).json())
+        self.assertNotIn('qr_base64', self.client.get(url, {'incluir_base64': '0'}).json())
+        with override_settings(QR_INCLUIR_BASE64=False):
+            self.assertNotIn('qr_base64', self.client.get(url).json())
+            self.assertIn('qr_base64', self.client.get(url, {'incluir_base64': '1'}).json())
+    
+    def test_otro_usuario_no_accede_al_qr(self):
+        """Verificar que solo el residente que autorizó la visita obtiene su QR"""
+        visita_id = self._crear_visita(incluir_base64=True)['id']
+        otro = get_user_model().objects.create_user(username='otro', password='password')
+        self.client.force_login(otro)
+        
+        response = self.client.get(reverse('api-qr-visita-archivo', args=[visita_id, 'png']))
+        self.assertEqual(response.status_code, 404)
+
+
+@claves_qr_prueba
+class IndiceVisitasTest(TestCase):
+    """
+    Pruebas para el índice en memoria que usa la verificación de QR
+    """
+    
+    def setUp(self):
+        User = get_user_model()
+        self.usuario = User.objects.create_user(username='guardia', password='password')
+        edificio = Edificio.objects.create(nombre='Edificio Test', direccion='Calle Test 123', pisos=10)
+        self.vivienda = Vivienda.objects.create(edificio=edificio, numero='101', piso=1, metros_cuadrados=80)
+        self.residente = Residente.objects.create(usuario=self.usuario, vivienda=self.vivienda)
+        self.visita = Visita.objects.create(
+            nombre_visitante='Ana Gómez',
+            documento_visitante='12345678',
+            vivienda_destino=self.vivienda,
+            residente_autoriza=self.residente,
+            motivo='Visita familiar',
+        )
+        self.client.force_login(self.usuario)
+        indice_visitas.descartar()
+        cache.clear()
+        self.addCleanup(indice_visitas.descartar)
+    
+    def _verificar(self, visita):
+        return self.client.post(reverse('verificar-qr-visita'), data=json.dumps({
+            'id': visita.id,
+            'firma': generar_firma_qr(visita.id),
+        }), content_type='application/json')
+    
+    def test_verificacion_desde_indice(self):
+        """Verificar que con el índice cargado la visita se verifica sin consultar la tabla de visitas"""
+        self.assertEqual(indice_visitas.reconstruir(), 1)
+        
+        # Solo la sesión y el usuario de la autenticación por sesión
+        with self.assertNumQueries(2):
+            response = self._verificar(self.visita)
+        
+        datos = response.json()
+        self.assertTrue(datos['valido'])
+        self.assertEqual(datos['visitante'], 'Ana Gómez')
+        self.assertEqual(datos['vivienda'], str(self.vivienda))
+        self.assertEqual(datos['autorizado_por'], str(self.residente))
+    
+    def test_salida_actualiza_indice(self):
+        """Verificar que al registrar la salida la visita deja de figurar abierta en el índice"""
+        indice_visitas.reconstruir()
+        
+        self.visita.fecha_hora_salida = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.visita.save()
+        
+        self.assertIsNone(indice_visitas.visita_abierta(self.visita.id))
+        response = self._verificar(self.visita)
+        self.assertFalse(response.json()['valido'])
+        self.assertEqual(response.json()['mensaje'], 'Esta visita ya fue finalizada.')
+    
+    def test_salida_en_otro_proceso(self):
+        """Verificar que una salida anotada por otro proceso invalida la visita del índice sin esperar la recarga"""
+        indice_visitas.reconstruir()
+        # Otro proceso registra la salida: aquí solo llega la marca en la caché compartida
+        Visita.objects.filter(pk=self.visita.pk).update(fecha_hora_salida=timezone.now())
+        indice_visitas._marcar_cerrada(self.visita.id)
+        
+        with self.assertNumQueries(0):
+            self.assertIsNone(indice_visitas.visita_abierta(self.visita.id))
+        response = self._verificar(self.visita)
+        self.assertFalse(response.json()['valido'])
+    
+    def test_visita_fuera_del_indice(self):
+        """Verificar que una visita que no está en el índice se busca en la base y queda en él"""
+        indice_visitas.reconstruir()
+        # Visita registrada en otro proceso: este índice no recibe la señal
+        otra = Visita.objects.create(
+            nombre_visitante='Luis Pérez',
+            documento_visitante='87654321',
+            vivienda_destino=self.vivienda,
+            residente_autoriza=self.residente,
+        )
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(indice_visitas.visita_abierta(otra.id)['visitante'], 'Luis Pérez')
+        with self.assertNumQueries(0):
+            indice_visitas.visita_abierta(otra.id)
+        
+        with self.assertRaises(Visita.DoesNotExist):
+            indice_visitas.visita_abierta(otra.id + 1000)
+    
+    def test_comando_medir_verificacion_qr(self):
+        """Verificar que la medición deshace sus visitas de prueba"""
+        salida = io.StringIO()
+        call_command('medir_verificacion_qr', visitas=5, stdout=salida)
+        
+        self.assertIn('Con índice', salida.getvalue())
+        self.assertEqual(Visita.objects.count(), 1)
+
+
+@claves_qr_prueba
+class PaseQRV2Test(TestCase):
+    """
+    Pruebas para los pases QR v2 firmados con Ed25519 y la sincronización de las garitas
+    """
+    
+    def setUp(self):
+        User = get_user_model()
+        self.usuario = User.objects.create_user(username='residente', password='password')
+        self.edificio = Edificio.objects.create(nombre='Edificio Test', direccion='Calle Test 123', pisos=10)
+        self.vivienda = Vivienda.objects.create(edificio=self.edificio, numero='101', piso=1, metros_cuadrados=80)
+        Residente.objects.create(usuario=self.usuario, vivienda=self.vivienda, es_propietario=True)
+        self.client.force_login(self.usuario)
+        indice_visitas.descartar()
+        cache.clear()
+        self.addCleanup(indice_visitas.descartar)
+        
+        response = self.client.post(reverse('api-crear-visita'), data=json.dumps({
+            'nombre_visitante': 'Ana Gómez',
+            'documento_visitante': '12345678',
+            'vivienda_destino_id': self.vivienda.id,
+        }), content_type='application/json')
+        self.visita_id = response.json()['id']
+        self.pase = json.loads(response.json()['carga'])['pase']
+    
+    def _verificar(self, datos):
+        return self.client.post(reverse('verificar-qr-visita'), data=json.dumps(datos), content_type='application/json')
+    
+    def test_pase_verificable_con_la_clave_publica(self):
+        """Verificar que una garita valida el pase con la clave pública publicada, sin el servidor"""
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+        
+        claves = self.client.get(reverse('api-claves-qr')).json()
+        self.assertEqual(claves['version'], 2)
+        
+        version, cuerpo, firma = self.pase.split('.')
+        datos = json.loads(base64.urlsafe_b64decode(cuerpo + '=' * (-len(cuerpo) % 4)))
+        clave = next(clave for clave in claves['claves'] if clave['id'] == datos['k'])
+        Ed25519PublicKey.from_public_bytes(base64.b64decode(clave['publica'])).verify(
+            base64.urlsafe_b64decode(firma + '=' * (-len(firma) % 4)), cuerpo.encode()
+        )
+        self.assertEqual((datos['id'], datos['ed']), (self.visita_id, self.edificio.id))
+        self.assertGreater(datos['na'], datos['nb'])
+        
+        response = self._verificar({'pase': self.pase})
+        self.assertTrue(response.json()['valido'])
+        self.assertEqual(response.json()['visitante'], 'Ana Gómez')
+    
+    def test_pase_vencido_o_alterado(self):
+        """Verificar que se rechazan los pases fuera de su ventana y los modificados"""
+        ahora = timezone.now()
+        vencido = firmar_pase_qr(self.visita_id, self.edificio.id, ahora - timedelta(days=2), ahora - timedelta(days=1))
+        response = self._verificar({'pase': vencido})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['mensaje'], 'El pase QR está vencido.')
+        
+        # Otro cuerpo con la firma de este pase
+        _, cuerpo, firma = self.pase.split('.')
+        _, otro_cuerpo, _ = vencido.split('.')
+        response = self._verificar({'pase': f'v2.{otro_cuerpo}.{firma}'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['mensaje'], 'QR inválido o alterado.')
+    
+    def test_pases_v1_durante_la_migracion(self):
+        """Verificar que los QR con firma HMAC se aceptan hasta desactivarlos"""
+        datos = {'id': self.visita_id, 'firma': generar_firma_qr(self.visita_id)}
+        self.assertTrue(self._verificar(datos).json()['valido'])
+        
+        with override_settings(QR_ACEPTAR_PASES_V1=False):
+            self.assertEqual(self._verificar(datos).status_code, 403)
+        # Sin clave propia la de desarrollo está en el repositorio: no se acepta fuera de DEBUG
+        with override_settings(QR_SECRET_KEY=''):
+            self.assertEqual(self._verificar(datos).status_code, 403)
+        
+        # La app puede seguir recibiendo QR v1 mientras se actualizan las garitas
+        with override_settings(QR_VERSION_PASE=1):
+            response = self.client.get(reverse('api-generar-qr-visita', args=[self.visita_id]))
+        self.assertEqual(json.loads(response.json()['carga']), datos)
+        self.assertEqual(CodigoQRVisita.objects.get().version, 1)
+    
+    def test_clave_obligatoria_fuera_de_debug(self):
+        """Verificar que sin QR_CLAVE_PRIVADA no se deriva la clave de SECRET_KEY en producción"""
+        with override_settings(QR_CLAVE_PRIVADA=''):
+            with self.assertRaises(ImproperlyConfigured):
+                clave_privada_qr()
+            with override_settings(DEBUG=True):
+                self.assertIsNotNone(clave_privada_qr())
+    
+    def test_sincronizar_pases_consumidos(self):
+        """Verificar que los pases usados en una garita llegan a las demás una sola vez"""
+        url = reverse('api-pases-consumidos')
+        response = self.client.post(url, data=json.dumps({
+            'dispositivo': 'Garita norte',
+            'consumidos': [
+                {'pase': self.pase, 'fecha': timezone.now().isoformat()},
+                {'pase': self.pase},
+                {'pase': 'v2.falso.falso'},
+            ],
+        }), content_type='application/json')
+        datos = response.json()
+        self.assertEqual(datos['registrados'], 1)
+        self.assertEqual(len(datos['rechazados']), 1)
+        self.assertEqual(PaseConsumido.objects.get().dispositivo, 'Garita norte')
+        
+        # Otra garita recibe el pase; con el cursor no se repite
+        datos = self.client.post(url, data=json.dumps({'edificio_id': self.edificio.id}), content_type='application/json').json()
+        self.assertEqual([pase['visita_id'] for pase in datos['consumidos']], [self.visita_id])
+        self.assertTrue(datos['completo'])
+        datos = self.client.post(url, data=json.dumps({
+            'desde': datos['cursor'],
+            'consumidos': [{'pase': self.pase}],
+        }), content_type='application/json').json()
+        self.assertEqual((datos['registrados'], datos['repetidos'], datos['consumidos']), (0, 1, []))
+
+
+class LoteEventosTest(TestCase):
+    """
+    Pruebas para el registro por lotes de entradas y salidas desde las garitas
+    """
+    
+    def setUp(self):
+        User = get_user_model()
+        rol_vigilante = Rol.objects.create(nombre='Vigilante', descripcion='Vigilante de garita')
+        self.edificio = Edificio.objects.create(nombre='Edificio A', direccion='Calle A 1', pisos=5)
+        otro_edificio = Edificio.objects.create(nombre='Edificio B', direccion='Calle B 2', pisos=5)
+        self.vivienda = Vivienda.objects.create(edificio=self.edificio, numero='101', piso=1, metros_cuadrados=80)
+        otra_vivienda = Vivienda.objects.create(edificio=otro_edificio, numero='101', piso=1, metros_cuadrados=80)
+        
+        self.guardia = User.objects.create_user(username='guardia', password='password', rol=rol_vigilante)
+        Vigilante.objects.create(usuario=self.guardia, edificio=self.edificio)
+        self.residentes = [
+            Residente.objects.create(
+                usuario=User.objects.create_user(username=f'residente{numero}', password='password'),
+                vivienda=self.vivienda,
+            )
+            for numero in range(3)
+        ]
+        self.residente_ajeno = Residente.objects.create(
+            usuario=User.objects.create_user(username='ajeno', password='password'), vivienda=otra_vivienda,
+        )
+        self.visita = Visita.objects.create(
+            nombre_visitante='Luis Pérez',
+            documento_visitante='87654321',
+            vivienda_destino=self.vivienda,
+            residente_autoriza=self.residentes[0],
+        )
+        self.client.force_login(self.guardia)
+        self.hace_un_rato = timezone.now() - timedelta(minutes=10)
+    
+    def _enviar(self, eventos):
+        return self.client.post(
+            reverse('api-eventos-lote'), data=json.dumps({'eventos': eventos}), content_type='application/json'
+        )
+    
+    def _entradas(self, residentes, prefijo='e'):
+        return [
+            {'clave': f'{prefijo}{residente.id}', 'tipo': 'residente', 'accion': 'entrada', 'residente_id': residente.id}
+            for residente in residentes
+        ]
+    
+    def test_lote_con_hora_de_la_garita(self):
+        """Verificar que se registran visitas y movimientos con la hora informada por la garita"""
+        residente = self.residentes[1]
+        response = self._enviar([
+            {
+                'clave': 'v1', 'tipo': 'visita', 'accion': 'entrada', 'fecha': self.hace_un_rato.isoformat(),
+                'nombre_visitante': 'Ana Gómez', 'documento_visitante': '12345678',
+                'vivienda_id': self.vivienda.id, 'residente_autoriza_id': residente.id,
+            },
+            {'clave': 'v2', 'tipo': 'visita', 'accion': 'salida', 'visita_id': self.visita.id},
+            {
+                'clave': 'r1', 'tipo': 'residente', 'accion': 'entrada', 'residente_id': residente.id,
+                'fecha': self.hace_un_rato.isoformat(), 'vehiculo': True, 'placa_vehiculo': 'ABC-123',
+            },
+            {'clave': 'r2', 'tipo': 'residente', 'accion': 'salida', 'residente_id': residente.id},
+        ])
+        datos = response.json()
+        self.assertEqual(datos['registrados'], 4, datos)
+        
+        nueva = Visita.objects.get(pk=datos['resultados'][0]['id'])
+        self.assertEqual(nueva.fecha_hora_entrada, self.hace_un_rato)
+        self.assertEqual(nueva.registrado_por, self.guardia)
+        self.visita.refresh_from_db()
+        self.assertIsNotNone(self.visita.fecha_hora_salida)
+        # La salida cierra la entrada del mismo lote
+        movimiento = MovimientoResidente.objects.get(residente=residente)
+        self.assertEqual(movimiento.fecha_hora_entrada, self.hace_un_rato)
+        self.assertIsNotNone(movimiento.fecha_hora_salida)
+        self.assertEqual(datos['resultados'][3]['id'], movimiento.id)
+    
+    def test_reenvio_con_las_mismas_claves(self):
+        """Verificar que un lote reenviado devuelve los mismos resultados sin duplicar registros"""
+        eventos = self._entradas(self.residentes)
+        primero = self._enviar(eventos).json()
+        segundo = self._enviar(eventos).json()
+        
+        self.assertEqual((segundo['registrados'], segundo['duplicados']), (0, 3))
+        self.assertEqual(
+            [resultado['id'] for resultado in segundo['resultados']],
+            [resultado['id'] for resultado in primero['resultados']],
+        )
+        self.assertEqual(MovimientoResidente.objects.count(), 3)
+        self.assertEqual(ClaveIdempotencia.objects.filter(usuario=self.guardia).count(), 3)
+    
+    def test_eventos_rechazados_no_impiden_los_demas(self):
+        """Verificar que se rechazan los eventos de otro edificio, repetidos o sin placa y se registran los demás"""
+        residente = self.residentes[0]
+        datos = self._enviar([
+            *self._entradas([residente]),
+            {'clave': 'x1', 'tipo': 'residente', 'accion': 'entrada', 'residente_id': residente.id},
+            {'clave': 'x2', 'tipo': 'residente', 'accion': 'entrada', 'residente_id': self.residente_ajeno.id},
+            {'clave': 'x3', 'tipo': 'residente', 'accion': 'salida', 'residente_id': self.residentes[1].id, 'vehiculo': True},
+            {'clave': 'x4', 'tipo': 'visita', 'accion': 'salida', 'visita_id': self.visita.id,
+             'fecha': (timezone.now() + timedelta(hours=1)).isoformat()},
+        ]).json()
+        
+        self.assertEqual([resultado['estado'] for resultado in datos['resultados']], ['registrado'] + ['rechazado'] * 4)
+        self.assertEqual(MovimientoResidente.objects.count(), 1)
+        self.assertFalse(ClaveIdempotencia.objects.filter(clave__startswith='x').exists())
+    
+    def test_consultas_independientes_del_tamano_del_lote(self):
+        """Verificar que un lote más grande no hace más consultas"""
+        User = get_user_model()
+        residentes = [
+            Residente.objects.create(
+                usuario=User.objects.create_user(username=f'otro{numero}', password='password'), vivienda=self.vivienda,
+            )
+            for numero in range(20)
+        ]
+        
+        with CaptureQueriesContext(connection) as chico:
+            self._enviar(self._entradas(residentes[:2], 'a'))
+        with CaptureQueriesContext(connection) as grande:
+            self._enviar(self._entradas(residentes[2:], 'b'))
+        
+        self.assertEqual(len(grande), len(chico))
+        self.assertEqual(MovimientoResidente.objects.count(), 20)
+    
+    def test_solo_personal_de_garita(self):
+        """Verificar que un residente no puede registrar accesos por lote"""
+        self.client.force_login(self.residentes[0].usuario)
+        
+        response = self._enviar(self._entradas(self.residentes))
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(MovimientoResidente.objects.exists())
+
+
+class PresenciaTest(TestCase):
+    """
+    Pruebas para la tabla de presencia por edificio y sus contadores
+    """
+    
+    def setUp(self):
+        User = get_user_model()
+        rol_vigilante = Rol.objects.create(nombre='Vigilante', descripcion='Vigilante de garita')
+        self.edificio = Edificio.objects.create(nombre='Edificio A', direccion='Calle A 1', pisos=5)
+        self.vivienda = Vivienda.objects.create(edificio=self.edificio, numero='101', piso=1, metros_cuadrados=80)
+        self.residente = Residente.objects.create(
+            usuario=User.objects.create_user(username='residente', password='password', first_name='Ana', last_name='Gómez'),
+            vivienda=self.vivienda,
+        )
+        self.guardia = User.objects.create_user(username='guardia', password='password', rol=rol_vigilante)
+        Vigilante.objects.create(usuario=self.guardia, edificio=self.edificio)
+    
+    def _contador(self):
+        contador = ContadorPresencia.objects.get(edificio=self.edificio)
+        return contador.visitas, contador.residentes, contador.vehiculos
+    
+    def _visita(self):
+        return Visita.objects.create(
+            nombre_visitante='Luis Pérez',
+            documento_visitante='87654321',
+            vivienda_destino=self.vivienda,
+            residente_autoriza=self.residente,
+        )
+    
+    def test_entradas_y_salidas_actualizan_contadores(self):
+        """Verificar que cada entrada y salida de visitas y residentes actualiza la presencia"""
+        visita = self._visita()
+        MovimientoResidente.objects.create(
+            residente=self.residente, fecha_hora_entrada=timezone.now(), vehiculo=True, placa_vehiculo='ABC-123',
+        )
+        self.assertEqual(self._contador(), (1, 1, 1))
+        self.assertEqual(Presencia.objects.get(residente=self.residente).placa_vehiculo, 'ABC-123')
+        
+        # La salida en una fila aparte también saca al residente
+        MovimientoResidente.objects.create(residente=self.residente, fecha_hora_salida=timezone.now())
+        visita.fecha_hora_salida = timezone.now()
+        visita.save()
+        self.assertEqual(self._contador(), (0, 0, 0))
+        self.assertFalse(Presencia.objects.exists())
+        
+        # Una visita eliminada se descuenta
+        otra = self._visita()
+        otra.delete()
+        self.assertEqual(self._contador(), (0, 0, 0))
+    
+    def test_reconstruir_desde_historial(self):
+        """Verificar que la reconstrucción deja los mismos contadores que las actualizaciones"""
+        self._visita()
+        MovimientoResidente.objects.create(residente=self.residente, fecha_hora_salida=timezone.now() - timedelta(hours=2))
+        MovimientoResidente.objects.create(residente=self.residente, fecha_hora_entrada=timezone.now() - timedelta(hours=1))
+        esperado = self._contador()
+        self.assertEqual(esperado, (1, 1, 0))
+        
+        Presencia.objects.all().delete()
+        ContadorPresencia.objects.update(visitas=7, residentes=7)
+        salida = io.StringIO()
+        call_command('reconstruir_presencia', stdout=salida)
+        
+        self.assertEqual(self._contador(), esperado)
+        self.assertEqual(Presencia.objects.count(), 2)
+        self.assertIn('2 persona(s) dentro', salida.getvalue())
+    
+    def test_lote_actualiza_presencia_y_lectura_constante(self):
+        """Verificar que el registro por lotes mantiene la presencia y que leerla es una consulta"""
+        self.client.force_login(self.guardia)
+        response = self.client.post(reverse('api-eventos-lote'), data=json.dumps({'eventos': [
+            {'clave': 'e1', 'tipo': 'residente', 'accion': 'entrada', 'residente_id': self.residente.id},
+        ]}), content_type='application/json')
+        self.assertEqual(response.json()['registrados'], 1)
+        
+        with self.assertNumQueries(1):
+            totales = presencia.totales_presencia(self.edificio.id)
+        self.assertEqual((totales['residentes'], totales['total']), (1, 1))
+        
+        datos = self.client.get(reverse('api-presencia'), {'detalle': '1'}).json()
+        self.assertEqual(datos['totales']['total'], 1)
+        self.assertEqual(datos['personas'][0]['nombre'], 'Ana Gómez')
+    
+    def test_conteo_en_alertas_de_evacuacion(self):
+        """Verificar que las alertas de incendio incluyen el conteo de personas dentro"""
+        from alertas.models import Alerta
+        from alertas.serializers import AlertaSerializer
+        
+        self._visita()
+        incendio = Alerta.objects.create(tipo='Incendio', descripcion='Humo en el piso 3', enviado_por=self.guardia)
+        reunion = Alerta.objects.create(tipo='Reunión', descripcion='Asamblea', enviado_por=self.guardia)
+        
+        datos = AlertaSerializer([incendio, reunion], many=True).data
+        self.assertEqual(datos[0]['conteo_evacuacion']['total'], 1)
+        self.assertEqual(datos[0]['conteo_evacuacion']['edificios'][0]['visitas'], 1)
+        self.assertIsNone(datos[1]['conteo_evacuacion'])
@@ -22,7 +22,12 @@ urlpatterns = [
     path('api/visitas-historial/', api_visitas_historial, name='api-visitas-historial'),
     # API MOVILES
     path('api/visitas/<int:visita_id>/qr/', api.generar_qr_visita, name='api-generar-qr-visita'),
+    path('api/visitas/<int:visita_id>/qr.<str:formato>', api.qr_visita_archivo, name='api-qr-visita-archivo'),
     path('api/visitas/crear/', api.crear_visita, name='api-crear-visita'),
     path('api/visitas/verificar_qr/', api.verificar_qr_visita, name='verificar-qr-visita'),
+    path('api/presencia/', api.presencia_edificios, name='api-presencia'),
+    path('api/eventos/lote/', api.registrar_eventos_lote, name='api-eventos-lote'),
+    path('api/qr/claves/', api.claves_qr, name='api-claves-qr'),
+    path('api/qr/pases-consumidos/', api.sincronizar_pases_consumidos, name='api-pases-consumidos'),
 
 ]
\ No newline at end of file
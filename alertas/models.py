@@ -11,6 +11,9 @@ class Alerta(models.Model):
         ('Reunión', 'Reunión'),
     ]
     
+    # Alertas en que se necesita saber cuántas personas hay que evacuar
+    TIPOS_EVACUACION = ('Incendio', 'Sismo')
+    
     ESTADOS = [
         ('pendiente', 'Pendiente'),
         ('en_proceso', 'En Proceso'),
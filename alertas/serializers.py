@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from accesos.presencia import conteo_evacuacion
 from .models import Alerta
 
 User = get_user_model()
@@ -12,15 +13,25 @@ class UserSerializer(serializers.ModelSerializer):
 class AlertaSerializer(serializers.ModelSerializer):
     enviado_por_info = UserSerializer(source='enviado_por', read_only=True)
     atendido_por_info = UserSerializer(source='atendido_por', read_only=True)
+    conteo_evacuacion = serializers.SerializerMethodField()
     
     class Meta:
         model = Alerta
         fields = [
             'id', 'tipo', 'descripcion', 'enviado_por', 'fecha', 
             'estado', 'atendido_por', 'fecha_atencion',
-            'enviado_por_info', 'atendido_por_info'
+            'enviado_por_info', 'atendido_por_info', 'conteo_evacuacion'
         ]
         read_only_fields = ['id', 'fecha', 'enviado_por']
+    
+    def get_conteo_evacuacion(self, alerta):
+        """Personas dentro de cada edificio ahora, para las alertas de incendio y sismo"""
+        if alerta.tipo not in Alerta.TIPOS_EVACUACION:
+            return None
+        # Se lee una vez por respuesta aunque se serialicen varias alertas
+        if 'conteo_evacuacion' not in self.context:
+            self.context['conteo_evacuacion'] = conteo_evacuacion()
+        return self.context['conteo_evacuacion']
 
 class CrearAlertaSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,6 +9,7 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 import json
+from accesos.presencia import conteo_evacuacion
 from .models import Alerta
 from .serializers import AlertaSerializer, CrearAlertaSerializer
 
@@ -115,6 +116,7 @@ def lista_alertas(request):
     
     # Calcular estadísticas
     alertas_pendientes = alertas.filter(estado='pendiente').count()
+    evacuacion_activa = alertas.filter(tipo__in=Alerta.TIPOS_EVACUACION).exclude(estado='resuelto').exists()
     alertas_proceso = alertas.filter(estado='en_proceso').count()
     alertas_resueltas = alertas.filter(estado='resuelto').count()
     
@@ -124,6 +126,7 @@ def lista_alertas(request):
         'alertas_pendientes': alertas_pendientes,
         'alertas_proceso': alertas_proceso,
         'alertas_resueltas': alertas_resueltas,
+        'evacuacion': conteo_evacuacion() if evacuacion_activa else None,
     }
     
     return render(request, 'alertas/lista_alertas.html', context)
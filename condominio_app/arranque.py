@@ -0,0 +1,70 @@
+# condominio_app/arranque.py - Medición del arranque en frío de un worker web
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+
+# Dependencias que solo usan algunas vistas (PDF, gráficos, Excel, QR) y no deben cargarse al arrancar
+MODULOS_PESADOS = (
+    'matplotlib', 'numpy', 'pandas', 'weasyprint', 'reportlab', 'qrcode', 'PIL', 'xlsxwriter', 'openpyxl', 'pypdf',
+)
+
+# Presupuesto por worker: tiempo de importación y memoria residente tras cargar la aplicación y las URLs
+PRESUPUESTO_SEGUNDOS = 3.0
+PRESUPUESTO_RSS_MB = 150
+
+_MARCA = 'ARRANQUE '
+
+# Se ejecuta en un intérprete nuevo: importa la aplicación WSGI como lo hace gunicorn
+# y resuelve las URLs, que importan todos los módulos de vistas
+_SCRIPT = '''
+import importlib, json, sys, time
+inicio = time.perf_counter()
+importlib.import_module(sys.argv[1])
+from django.urls import get_resolver
+get_resolver().url_patterns
+segundos = time.perf_counter() - inicio
+rss_kb = 0
+try:
+    with open('/proc/self/status') as status:
+        for linea in status:
+            if linea.startswith('VmRSS:'):
+                rss_kb = int(linea.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+pesados = sorted({nombre.split('.')[0] for nombre in sys.modules} & set(sys.argv[2].split(',')))
+print(%r + json.dumps({'segundos': segundos, 'rss_mb': rss_kb / 1024, 'modulos_pesados': pesados}))
+''' % _MARCA
+
+
+def medir_una_vez():
+    """Arranca un intérprete nuevo, carga la aplicación y devuelve tiempo, memoria y módulos pesados cargados"""
+    modulo_wsgi = settings.WSGI_APPLICATION.rsplit('.', 1)[0]
+    resultado = subprocess.run(
+        [sys.executable, '-c', _SCRIPT, modulo_wsgi, ','.join(MODULOS_PESADOS)],
+        cwd=settings.BASE_DIR,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    for linea in reversed(resultado.stdout.splitlines()):
+        if linea.startswith(_MARCA):
+            return json.loads(linea[len(_MARCA):])
+    raise RuntimeError(f"El arranque de prueba falló:\n{resultado.stderr[-2000:]}")
+
+
+def medir_arranque(repeticiones=3):
+    """
+    Mide varios arranques en frío. Devuelve la mediana del tiempo, la mayor
+    memoria residente, los módulos pesados cargados y cada medición.
+    """
+    mediciones = [medir_una_vez() for _ in range(repeticiones)]
+    return {
+        'segundos': statistics.median(medicion['segundos'] for medicion in mediciones),
+        'rss_mb': max(medicion['rss_mb'] for medicion in mediciones),
+        'modulos_pesados': sorted({nombre for medicion in mediciones for nombre in medicion['modulos_pesados']}),
+        'mediciones': mediciones,
+    }
@@ -288,6 +288,17 @@ LOGGING = {
     },
 }
 
+# Pases QR de visitas: clave Ed25519 en PEM o sus 32 bytes en base64 (manage.py generar_clave_qr).
+# Obligatoria fuera de DEBUG; con DEBUG, sin configurar se deriva de SECRET_KEY
+QR_CLAVE_PRIVADA = env('QR_CLAVE_PRIVADA', default='')
+# Clave HMAC de los pases v1. Sin configurar, fuera de DEBUG los pases v1 no se aceptan
+QR_SECRET_KEY = env('QR_SECRET_KEY', default='')
+# Claves públicas anteriores (base64, separadas por comas): sus pases siguen valiendo hasta vencer
+QR_CLAVES_PUBLICAS_ANTERIORES = env.list('QR_CLAVES_PUBLICAS_ANTERIORES', default=[])
+# Incluir la imagen del QR en base64 en el JSON de las visitas, como esperan las versiones
+# de la app anteriores a las URL de imagen. Desactivar cuando la app actualizada esté publicada
+QR_INCLUIR_BASE64 = env.bool('QR_INCLUIR_BASE64', default=True)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
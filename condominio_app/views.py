@@ -9,6 +9,7 @@ from django.utils import timezone
 from datetime import datetime, timedelta
 from viviendas.models import Edificio, Vivienda, Residente
 from accesos.models import Visita, MovimientoResidente
+from accesos.presencia import totales_presencia
 from personal.models import Empleado, Asignacion
 from usuarios.views import tiene_acceso_web
 from django.core.mail import send_mail
@@ -128,19 +129,6 @@ def dashboard(request):
         propietarios_count = residente_stats['propietarios']
         inquilinos_count = residente_stats['inquilinos']
         
-        # Estadísticas de visitas
-        if edificio_id:
-            visitas_activas = Visita.objects.filter(
-                vivienda_destino__edificio_id=edificio_id,
-                vivienda_destino__activo=True,
-                fecha_hora_salida__isnull=True
-            ).count()
-        else:
-            visitas_activas = Visita.objects.filter(
-                vivienda_destino__activo=True,
-                fecha_hora_salida__isnull=True
-            ).count()
-        
         # Estadísticas de personal
         total_personal = Empleado.objects.filter(activo=True).count()
         
@@ -157,7 +145,6 @@ def dashboard(request):
             'total_residentes': total_residentes,
             'propietarios_count': propietarios_count,
             'inquilinos_count': inquilinos_count,
-            'visitas_activas': visitas_activas,
             'total_personal': total_personal,
             'total_asignaciones_pendientes': total_asignaciones_pendientes,
         }
@@ -172,10 +159,12 @@ def dashboard(request):
     total_residentes = cached_stats['total_residentes']
     propietarios_count = cached_stats['propietarios_count']
     inquilinos_count = cached_stats['inquilinos_count']
-    visitas_activas = cached_stats['visitas_activas']
     total_personal = cached_stats['total_personal']
     total_asignaciones_pendientes = cached_stats['total_asignaciones_pendientes']
     
+    # Quién está dentro: contadores mantenidos con cada entrada y salida, se leen sin caché
+    presencia = totales_presencia(edificio_seleccionado)
+    
     # Obtener datos recientes (no cacheados para mostrar información actualizada)
     # Últimas visitas
     if edificio_id:
@@ -223,7 +212,10 @@ def dashboard(request):
         'total_residentes': total_residentes,
         'propietarios_count': propietarios_count,
         'inquilinos_count': inquilinos_count,
-        'visitas_activas': visitas_activas,
+        'visitas_activas': presencia['visitas'],
+        'residentes_presentes': presencia['residentes'],
+        'vehiculos_presentes': presencia['vehiculos'],
+        'personas_presentes': presencia['total'],
         'ultimas_visitas': ultimas_visitas,
         'ultimos_movimientos': ultimos_movimientos,
         'total_personal': total_personal,
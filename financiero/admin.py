@@ -2,12 +2,20 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from .models import (
     ConceptoCuota, Cuota, Pago, PagoCuota,
-    CategoriaGasto, Gasto, EstadoCuenta
+    CategoriaGasto, Gasto, EstadoCuenta, ResumenMensual, SaldoVivienda
 )
+from .asignacion import verificar_pagos
+from .estados_cuenta import recalcular_estados_cuenta
+from .facturacion import generar_cuotas_masivas
+from .recargos import recalcular_recargos
+from .resumenes import actualizar_resumenes
+from .saldos import actualizar_saldos
+from viviendas.models import Vivienda
 
 @admin.register(ConceptoCuota)
 class ConceptoCuotaAdmin(admin.ModelAdmin):
@@ -44,7 +52,7 @@ class ConceptoCuotaAdmin(admin.ModelAdmin):
 
 @admin.register(Cuota)
 class CuotaAdmin(admin.ModelAdmin):
-    list_display = ['concepto', 'vivienda', 'monto', 'recargo', 'total_display', 'fecha_emision', 'fecha_vencimiento', 'pagada', 'estado_vencimiento']
+    list_display = ['concepto', 'vivienda', 'monto', 'recargo', 'total_display', 'saldo_pendiente', 'fecha_emision', 'fecha_vencimiento', 'pagada', 'estado_vencimiento']
     list_filter = ['concepto', 'pagada', 'fecha_emision', 'fecha_vencimiento', 'vivienda__edificio']
     search_fields = ['concepto__nombre', 'vivienda__numero', 'vivienda__edificio__nombre']
     ordering = ['-fecha_vencimiento', 'vivienda__edificio__nombre', 'vivienda__numero']
@@ -59,14 +67,14 @@ class CuotaAdmin(admin.ModelAdmin):
             'fields': ('fecha_emision', 'fecha_vencimiento')
         }),
         ('Estado y Recargos', {
-            'fields': ('pagada', 'recargo')
+            'fields': ('pagada', 'recargo', 'monto_pagado', 'saldo_pendiente')
         }),
         ('Notas', {
             'fields': ('notas',)
         }),
     )
     
-    readonly_fields = ['recargo']
+    readonly_fields = ['recargo', 'monto_pagado', 'saldo_pendiente']
     
     def total_display(self, obj):
         total = obj.total_a_pagar()
@@ -272,11 +280,77 @@ class EstadoCuentaAdmin(admin.ModelAdmin):
         if not change:  # Nuevo estado de cuenta
             obj.calcular_totales()
 
+@admin.register(ResumenMensual)
+class ResumenMensualAdmin(admin.ModelAdmin):
+    list_display = ['mes', 'edificio', 'vivienda', 'ingresos', 'gastos', 'cuotas_emitidas', 'recargos', 'saldo_pendiente']
+    list_filter = ['edificio', 'mes']
+    search_fields = ['vivienda__numero', 'edificio__nombre']
+    date_hierarchy = 'mes'
+    
+    # Los resúmenes se mantienen con señales y con el comando reconstruir_resumenes
+    readonly_fields = [
+        'edificio', 'vivienda', 'mes', 'ingresos', 'gastos', 'cuotas_emitidas', 'monto_cuotas',
+        'recargos', 'cuotas_pendientes', 'saldo_pendiente', 'fecha_actualizacion'
+    ]
+    
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(SaldoVivienda)
+class SaldoViviendaAdmin(admin.ModelAdmin):
+    list_display = ['vivienda', 'saldo', 'total_adeudado', 'total_vencido', 'cuotas_pendientes', 'cuotas_vencidas', 'ultimo_pago']
+    list_filter = ['vivienda__edificio']
+    search_fields = ['vivienda__numero', 'vivienda__edificio__nombre']
+    list_select_related = ['vivienda', 'vivienda__edificio']
+    # Ordenar por deuda usa los índices de total_adeudado y total_vencido
+    ordering = ['-total_adeudado']
+    
+    # Los saldos se mantienen con señales y con el comando reconstruir_saldos
+    readonly_fields = [
+        'vivienda', 'saldo', 'total_adeudado', 'total_vencido', 'cuotas_pendientes',
+        'cuotas_vencidas', 'ultimo_pago', 'fecha_corte', 'fecha_actualizacion'
+    ]
+    
+    def has_add_permission(self, request):
+        return False
+
 # ===== ACCIONES PERSONALIZADAS =====
 
+def generar_cuotas_mes_actual(modeladmin, request, queryset):
+    """Acción para generar las cuotas del mes actual de los conceptos seleccionados"""
+    hoy = timezone.now().date()
+    fecha_emision = hoy.replace(day=1)
+    fecha_vencimiento = fecha_emision + timezone.timedelta(days=30)
+    viviendas = Vivienda.objects.filter(activo=True)
+    
+    creadas = 0
+    omitidas = 0
+    for concepto in queryset.filter(activo=True):
+        resultado = generar_cuotas_masivas(concepto, viviendas, fecha_emision, fecha_vencimiento)
+        creadas += resultado['creadas']
+        omitidas += resultado['omitidas']
+    
+    modeladmin.message_user(
+        request,
+        f'{creadas} cuota(s) generada(s) para el mes actual, {omitidas} omitida(s) por existir previamente.'
+    )
+generar_cuotas_mes_actual.short_description = "Generar cuotas del mes actual"
+
 def marcar_cuotas_como_pagadas(modeladmin, request, queryset):
     """Acción para marcar cuotas seleccionadas como pagadas (usar con cuidado)"""
-    count = queryset.filter(pagada=False).update(pagada=True)
+    with transaction.atomic():
+        pendientes = list(queryset.filter(pagada=False).values_list('id', 'vivienda_id', 'fecha_emision'))
+        # Igual que Cuota.marcar_como_pagada(): sin recargo ni saldo, y lo pagado cubre el monto
+        count = Cuota.objects.filter(id__in=[cuota_id for cuota_id, _, _ in pendientes], pagada=False).update(
+            pagada=True,
+            recargo=0,
+            saldo_pendiente=0,
+            monto_pagado=Greatest('monto_pagado', 'monto'),
+        )
+        # update() no dispara señales: actualizar resúmenes y saldos afectados
+        claves_resumen = {(vivienda_id, fecha_emision) for _, vivienda_id, fecha_emision in pendientes}
+        actualizar_resumenes(claves_resumen)
+        actualizar_saldos(vivienda_id for vivienda_id, _ in claves_resumen)
     modeladmin.message_user(
         request,
         f'{count} cuota(s) marcada(s) como pagadas. ATENCIÓN: Verifique que realmente fueron pagadas.'
@@ -285,29 +359,24 @@ marcar_cuotas_como_pagadas.short_description = "⚠️ Marcar como pagadas (CUID
 
 def actualizar_recargos_cuotas(modeladmin, request, queryset):
     """Acción para actualizar recargos de cuotas vencidas"""
-    count = 0
-    for cuota in queryset.filter(pagada=False):
-        recargo_anterior = cuota.recargo
-        cuota.actualizar_recargo()
-        if cuota.recargo != recargo_anterior:
-            count += 1
+    # Las cuotas seleccionadas que ya no están en mora vuelven a recargo cero
+    resultado = recalcular_recargos(cuotas=queryset, reiniciar_sin_mora=True)
     
     modeladmin.message_user(
         request,
-        f'Recargos actualizados en {count} cuota(s).'
+        f'Recargos actualizados en {resultado["actualizadas"]} cuota(s) vencida(s), '
+        f'{resultado["reiniciadas"]} cuota(s) sin mora con recargo reiniciado a cero.'
     )
 actualizar_recargos_cuotas.short_description = "Actualizar recargos"
 
 def verificar_pagos_pendientes(modeladmin, request, queryset):
     """Acción para verificar pagos pendientes seleccionados"""
-    count = 0
-    for pago in queryset.filter(estado='PENDIENTE'):
-        pago.verificar_pago(request.user)
-        count += 1
+    resultado = verificar_pagos(queryset, request.user)
     
     modeladmin.message_user(
         request,
-        f'{count} pago(s) verificado(s).'
+        f'{resultado["verificados"]} pago(s) verificado(s), '
+        f'{resultado["cuotas_pagadas"]} cuota(s) pagada(s).'
     )
 verificar_pagos_pendientes.short_description = "Verificar pagos seleccionados"
 
@@ -339,10 +408,7 @@ marcar_gastos_como_pagados.short_description = "Marcar como pagados"
 
 def generar_estados_cuenta_automaticos(modeladmin, request, queryset):
     """Acción para generar estados de cuenta automáticamente"""
-    count = 0
-    for estado in queryset.filter(total_cuotas=0, total_pagos=0):
-        estado.calcular_totales()
-        count += 1
+    count = recalcular_estados_cuenta(queryset.filter(total_cuotas=0, total_pagos=0))
     
     modeladmin.message_user(
         request,
@@ -351,6 +417,7 @@ def generar_estados_cuenta_automaticos(modeladmin, request, queryset):
 generar_estados_cuenta_automaticos.short_description = "Recalcular totales"
 
 # Agregar acciones a los modelos
+ConceptoCuotaAdmin.actions = [generar_cuotas_mes_actual]
 CuotaAdmin.actions = [marcar_cuotas_como_pagadas, actualizar_recargos_cuotas]
 PagoAdmin.actions = [verificar_pagos_pendientes, rechazar_pagos_pendientes]
 GastoAdmin.actions = [marcar_gastos_como_pagados]
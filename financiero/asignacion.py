@@ -0,0 +1,188 @@
+# financiero/asignacion.py - Asignación de pagos a cuotas en bloque
+import logging
+from decimal import Decimal
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import Cuota, Pago, PagoCuota
+from .resumenes import actualizar_resumenes
+from .saldos import actualizar_saldos
+
+logger = logging.getLogger(__name__)
+
+# Campos de Cuota que cambian al aplicar o revertir un pago
+CAMPOS_PAGO_CUOTA = ['pagada', 'recargo', 'monto_pagado', 'saldo_pendiente']
+
+
+def _asignar_pagos_vivienda(vivienda_id, pagos):
+    """
+    Reparte los pagos de una vivienda entre sus cuotas pendientes, de la más
+    antigua a la más reciente. Debe llamarse dentro de una transacción.
+
+    Las cuotas pendientes se bloquean y se leen una sola vez, la cascada se
+    calcula en memoria y se escribe con un bulk_create de PagoCuota y un
+    bulk_update de Cuota, sin disparar las señales de cada fila.
+    """
+    cuotas = list(
+        Cuota.objects.select_for_update().filter(
+            vivienda_id=vivienda_id,
+            pagada=False,
+            saldo_pendiente__gt=0
+        ).order_by('fecha_vencimiento', 'id')
+    )
+
+    nuevos = []
+    modificadas = {}
+    asignado = Decimal('0')
+    indice = 0
+
+    for pago in pagos:
+        monto_restante = pago.monto
+        while monto_restante > Decimal('0') and indice < len(cuotas):
+            cuota = cuotas[indice]
+            saldo = cuota.saldo_pendiente
+            monto_aplicado = min(monto_restante, saldo)
+
+            nuevos.append(PagoCuota(pago=pago, cuota=cuota, monto_aplicado=monto_aplicado))
+            monto_restante -= monto_aplicado
+            asignado += monto_aplicado
+
+            # El monto original se conserva; el pago parcial solo reduce el saldo
+            cuota.registrar_pago(monto_aplicado)
+            if monto_aplicado >= saldo:
+                indice += 1
+            modificadas[cuota.id] = cuota
+
+        if monto_restante > Decimal('0'):
+            logger.info(f"Pago {pago.id}: ${monto_restante} sin cuotas pendientes a las que asignar")
+
+    if nuevos:
+        PagoCuota.objects.bulk_create(nuevos)
+        Cuota.objects.bulk_update(modificadas.values(), CAMPOS_PAGO_CUOTA)
+
+    return {
+        'asignado': asignado,
+        'detalles': len(nuevos),
+        'cuotas_pagadas': sum(1 for cuota in modificadas.values() if cuota.pagada),
+        'claves_resumen': {(cuota.vivienda_id, cuota.fecha_emision) for cuota in modificadas.values()},
+    }
+
+
+def aplicar_detalles_pagos(pago_ids, signo=1):
+    """
+    Suma (signo=1) o descuenta (signo=-1) de cada cuota los montos que los
+    pagos indicados ya tienen asignados en PagoCuota. Se usa al verificar o
+    rechazar pagos con cuotas asignadas a mano. Debe llamarse dentro de una
+    transacción.
+
+    Devuelve el conjunto de pares (vivienda_id, fecha_emision) modificados.
+    """
+    detalles = list(
+        PagoCuota.objects.filter(pago_id__in=pago_ids).values_list('cuota_id', 'monto_aplicado')
+    )
+    if not detalles:
+        return set()
+
+    # El concepto se necesita para recalcular el recargo de las cuotas que se reabren
+    cuotas = Cuota.objects.select_for_update(of=('self',)).select_related('concepto').in_bulk(
+        {cuota_id for cuota_id, _ in detalles}
+    )
+    for cuota_id, monto_aplicado in detalles:
+        cuotas[cuota_id].registrar_pago(signo * monto_aplicado)
+    Cuota.objects.bulk_update(cuotas.values(), CAMPOS_PAGO_CUOTA)
+
+    return {(cuota.vivienda_id, cuota.fecha_emision) for cuota in cuotas.values()}
+
+
+def asignar_pago_a_cuotas(pago):
+    """
+    Asigna un pago verificado a las cuotas pendientes más antiguas de su vivienda.
+    Si el pago ya tiene cuotas asignadas no hace nada.
+    """
+    with transaction.atomic():
+        # Bloquear el pago evita que dos verificaciones simultáneas lo asignen dos veces
+        pago = Pago.objects.select_for_update().get(pk=pago.pk)
+        if pago.estado != 'VERIFICADO' or PagoCuota.objects.filter(pago=pago).exists():
+            return {'asignado': Decimal('0'), 'detalles': 0, 'cuotas_pagadas': 0}
+
+        resultado = _asignar_pagos_vivienda(pago.vivienda_id, [pago])
+        # bulk_create/bulk_update no disparan señales: actualizar resúmenes y saldo aquí
+        actualizar_resumenes(resultado.pop('claves_resumen'))
+        actualizar_saldos([pago.vivienda_id])
+
+    logger.info(
+        f"Pago {pago.id}: ${resultado['asignado']} asignado en {resultado['detalles']} cuota(s)"
+    )
+    return resultado
+
+
+def verificar_pagos(pagos, usuario):
+    """
+    Verifica en bloque los pagos pendientes indicados (QuerySet, lista de pagos
+    o de IDs) y los asigna a cuotas agrupando por vivienda, de modo que las
+    cuotas de cada vivienda se bloquean y se leen una sola vez.
+
+    Devuelve un diccionario con los pagos verificados, el monto asignado y las
+    cuotas que quedaron pagadas.
+    """
+    if isinstance(pagos, QuerySet):
+        pago_ids = list(pagos.values_list('pk', flat=True))
+    else:
+        pago_ids = [getattr(pago, 'pk', pago) for pago in pagos]
+    ahora = timezone.now()
+
+    verificados = 0
+    asignado = Decimal('0')
+    cuotas_pagadas = 0
+    claves_resumen = set()
+
+    with transaction.atomic():
+        pendientes = list(
+            Pago.objects.select_for_update().filter(
+                pk__in=pago_ids,
+                estado='PENDIENTE'
+            ).order_by('vivienda_id', 'fecha_pago', 'id')
+        )
+        if not pendientes:
+            return {'verificados': 0, 'asignado': asignado, 'cuotas_pagadas': 0}
+
+        Pago.objects.filter(pk__in=[pago.pk for pago in pendientes]).update(
+            estado='VERIFICADO',
+            verificado_por=usuario,
+            fecha_verificacion=ahora
+        )
+        verificados = len(pendientes)
+
+        # Los pagos con cuotas ya asignadas a mano conservan esa asignación,
+        # que pasa a contar en el monto pagado de esas cuotas
+        con_detalle = set(
+            PagoCuota.objects.filter(pago__in=pendientes).values_list('pago_id', flat=True)
+        )
+
+        claves_resumen |= aplicar_detalles_pagos(con_detalle)
+
+        for vivienda_id, pagos_vivienda in groupby(pendientes, key=lambda pago: pago.vivienda_id):
+            pagos_vivienda = list(pagos_vivienda)
+            for pago in pagos_vivienda:
+                claves_resumen.add((vivienda_id, pago.fecha_pago))
+            por_asignar = [pago for pago in pagos_vivienda if pago.pk not in con_detalle]
+            if not por_asignar:
+                continue
+
+            resultado = _asignar_pagos_vivienda(vivienda_id, por_asignar)
+            asignado += resultado['asignado']
+            cuotas_pagadas += resultado['cuotas_pagadas']
+            claves_resumen |= resultado['claves_resumen']
+
+        # update() y bulk_update no disparan señales: actualizar resúmenes y saldos aquí
+        actualizar_resumenes(claves_resumen)
+        actualizar_saldos(vivienda_id for vivienda_id, _ in claves_resumen)
+
+    logger.info(
+        f"{verificados} pago(s) verificado(s) por {usuario}: ${asignado} asignado, "
+        f"{cuotas_pagadas} cuota(s) pagada(s)"
+    )
+    return {'verificados': verificados, 'asignado': asignado, 'cuotas_pagadas': cuotas_pagadas}
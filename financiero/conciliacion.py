@@ -0,0 +1,106 @@
+# financiero/conciliacion.py - Conciliación del monto pagado y el saldo de las cuotas
+import logging
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Cuota, PagoCuota
+from .resumenes import actualizar_resumenes
+from .saldos import actualizar_saldos
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE_CONCILIACION = 1000
+
+
+def conciliar_cuotas(edificio=None, cuotas=None, dry_run=False, batch_size=TAMANO_LOTE_CONCILIACION):
+    """
+    Recalcula en bloque monto_pagado y saldo_pendiente de las cuotas a partir
+    de los PagoCuota de pagos verificados y corrige las que no coinciden.
+
+    Las cuotas se leen por lotes con el total pagado anotado como subconsulta
+    (una consulta por lote) y solo las filas con diferencias se escriben con
+    bulk_update, en una transacción corta por lote.
+
+    - edificio: limita el proceso a las viviendas de un edificio
+    - cuotas: QuerySet base opcional
+    - dry_run: no escribe nada y devuelve la lista de diferencias
+
+    Devuelve un diccionario con las cuotas procesadas, corregidas, las
+    diferencias (solo en dry_run) y el tiempo total.
+    """
+    inicio = time.perf_counter()
+
+    pagado = PagoCuota.objects.filter(
+        cuota=OuterRef('pk'),
+        pago__estado='VERIFICADO',
+    ).order_by().values('cuota').annotate(total=Sum('monto_aplicado')).values('total')
+
+    base = cuotas if cuotas is not None else Cuota.objects.all()
+    if edificio is not None:
+        base = base.filter(vivienda__edificio=edificio)
+    base = base.annotate(
+        pagado_real=Coalesce(
+            Subquery(pagado, output_field=DecimalField()),
+            Value(Decimal('0')),
+            output_field=DecimalField(),
+        )
+    ).order_by('id')
+
+    procesadas = 0
+    corregidas = 0
+    diferencias = []
+    ultimo_id = 0
+
+    while True:
+        # Paginación por clave para no mantener un cursor abierto entre lotes
+        lote = list(
+            base.filter(id__gt=ultimo_id).values_list(
+                'id', 'monto', 'recargo', 'pagada', 'monto_pagado', 'saldo_pendiente',
+                'pagado_real', 'vivienda_id', 'fecha_emision'
+            )[:batch_size]
+        )
+        if not lote:
+            break
+        ultimo_id = lote[-1][0]
+        procesadas += len(lote)
+
+        modificadas = []
+        claves_resumen = set()
+        for (cuota_id, monto, recargo, pagada, monto_pagado, saldo_actual,
+             pagado_real, vivienda_id, fecha_emision) in lote:
+            saldo = Decimal('0') if pagada else max(monto + recargo - pagado_real, Decimal('0'))
+            if pagado_real != monto_pagado or saldo != saldo_actual:
+                modificadas.append(Cuota(id=cuota_id, monto_pagado=pagado_real, saldo_pendiente=saldo))
+                claves_resumen.add((vivienda_id, fecha_emision))
+                if dry_run:
+                    diferencias.append({
+                        'cuota_id': cuota_id,
+                        'monto_pagado_anterior': monto_pagado,
+                        'monto_pagado_nuevo': pagado_real,
+                        'saldo_anterior': saldo_actual,
+                        'saldo_nuevo': saldo,
+                    })
+
+        corregidas += len(modificadas)
+        if modificadas and not dry_run:
+            with transaction.atomic():
+                Cuota.objects.bulk_update(modificadas, ['monto_pagado', 'saldo_pendiente'])
+                # bulk_update no dispara señales: actualizar resúmenes y saldos afectados
+                actualizar_resumenes(claves_resumen)
+                actualizar_saldos(vivienda_id for vivienda_id, _ in claves_resumen)
+
+    resultado = {
+        'procesadas': procesadas,
+        'corregidas': corregidas,
+        'diferencias': diferencias,
+        'tiempo': round(time.perf_counter() - inicio, 4),
+    }
+    logger.info(
+        f"Conciliación de cuotas{' (simulación)' if dry_run else ''}: "
+        f"{corregidas} de {procesadas} cuotas corregidas en {resultado['tiempo']}s"
+    )
+    return resultado
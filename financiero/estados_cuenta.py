@@ -0,0 +1,172 @@
+# financiero/estados_cuenta.py - Generación de estados de cuenta en bloque
+import logging
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+
+from viviendas.models import Vivienda
+from .models import Cuota, EstadoCuenta, Pago
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE_ESTADOS = 1000
+CERO = Decimal('0')
+
+
+def _totales_periodo(vivienda_ids, fecha_inicio, fecha_fin):
+    """
+    Totales de cuotas, recargos y pagos verificados del período para un lote
+    de viviendas: una consulta agrupada sobre cuotas y otra sobre pagos.
+    Devuelve {vivienda_id: (total_cuotas, total_recargos, total_pagos)}.
+    """
+    cuotas = {
+        registro['vivienda_id']: registro
+        for registro in Cuota.objects.filter(
+            vivienda_id__in=vivienda_ids,
+            fecha_emision__gte=fecha_inicio,
+            fecha_emision__lte=fecha_fin,
+        ).order_by().values('vivienda_id').annotate(
+            total_monto=Sum('monto'),
+            total_recargo=Sum('recargo'),
+        )
+    }
+    pagos = dict(
+        Pago.objects.filter(
+            vivienda_id__in=vivienda_ids,
+            fecha_pago__gte=fecha_inicio,
+            fecha_pago__lte=fecha_fin,
+            estado='VERIFICADO',
+        ).order_by().values('vivienda_id').annotate(total=Sum('monto')).values_list('vivienda_id', 'total')
+    )
+
+    totales = {}
+    for vivienda_id in vivienda_ids:
+        cuota = cuotas.get(vivienda_id, {})
+        totales[vivienda_id] = (
+            cuota.get('total_monto') or CERO,
+            cuota.get('total_recargo') or CERO,
+            pagos.get(vivienda_id) or CERO,
+        )
+    return totales
+
+
+def generar_estados_cuenta_masivos(viviendas, fecha_inicio, fecha_fin, batch_size=TAMANO_LOTE_ESTADOS):
+    """
+    Genera los estados de cuenta de un período para varias viviendas
+    (QuerySet, lista de viviendas o de IDs) con un número fijo de consultas
+    por lote, independiente de la cantidad de viviendas:
+
+    - períodos ya generados: una consulta
+    - saldo anterior (saldo final del último estado previo): una subconsulta
+    - totales de cuotas, recargos y pagos: una consulta agrupada por tabla
+    - inserción: un bulk_create
+
+    Las viviendas que ya tienen estado de cuenta en el período se omiten.
+    Devuelve un diccionario con los estados creados, omitidos y el tiempo.
+    """
+    if fecha_fin < fecha_inicio:
+        raise ValueError('La fecha de fin debe ser posterior a la fecha de inicio.')
+
+    inicio = time.perf_counter()
+    if hasattr(viviendas, 'values_list'):
+        vivienda_ids = list(viviendas.order_by('id').values_list('id', flat=True))
+    else:
+        vivienda_ids = sorted({getattr(vivienda, 'pk', vivienda) for vivienda in viviendas})
+
+    creados = 0
+    for desde in range(0, len(vivienda_ids), batch_size):
+        lote = vivienda_ids[desde:desde + batch_size]
+
+        existentes = set(
+            EstadoCuenta.objects.filter(
+                vivienda_id__in=lote,
+                fecha_inicio=fecha_inicio,
+                fecha_fin=fecha_fin,
+            ).values_list('vivienda_id', flat=True)
+        )
+        pendientes = [vivienda_id for vivienda_id in lote if vivienda_id not in existentes]
+        if not pendientes:
+            continue
+
+        ultimo_saldo = EstadoCuenta.objects.filter(
+            vivienda=OuterRef('pk'),
+            fecha_fin__lt=fecha_inicio,
+        ).order_by('-fecha_fin').values('saldo_final')[:1]
+        saldos_anteriores = dict(
+            Vivienda.objects.filter(pk__in=pendientes).annotate(
+                saldo_anterior=Subquery(ultimo_saldo)
+            ).values_list('id', 'saldo_anterior')
+        )
+        totales = _totales_periodo(pendientes, fecha_inicio, fecha_fin)
+
+        nuevos = []
+        for vivienda_id in pendientes:
+            saldo_anterior = saldos_anteriores.get(vivienda_id) or CERO
+            total_cuotas, total_recargos, total_pagos = totales[vivienda_id]
+            nuevos.append(EstadoCuenta(
+                vivienda_id=vivienda_id,
+                fecha_inicio=fecha_inicio,
+                fecha_fin=fecha_fin,
+                saldo_anterior=saldo_anterior,
+                total_cuotas=total_cuotas,
+                total_recargos=total_recargos,
+                total_pagos=total_pagos,
+                saldo_final=saldo_anterior + total_cuotas + total_recargos - total_pagos,
+            ))
+
+        del_periodo = EstadoCuenta.objects.filter(
+            vivienda_id__in=pendientes,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+        )
+        with transaction.atomic():
+            antes = del_periodo.count()
+            # ignore_conflicts evita duplicar un período generado en paralelo y descarta
+            # esas filas, así que se recuentan las presentes tras la inserción
+            EstadoCuenta.objects.bulk_create(nuevos, ignore_conflicts=True)
+            creados += del_periodo.count() - antes
+
+    resultado = {
+        'creados': creados,
+        'omitidos': len(vivienda_ids) - creados,
+        'tiempo': round(time.perf_counter() - inicio, 4),
+    }
+    logger.info(
+        f"Estados de cuenta {fecha_inicio} a {fecha_fin}: {creados} creados, "
+        f"{resultado['omitidos']} omitidos en {resultado['tiempo']}s"
+    )
+    return resultado
+
+
+def recalcular_estados_cuenta(estados):
+    """
+    Recalcula los totales y el saldo final de estados de cuenta existentes,
+    agrupando por período para usar las mismas consultas agrupadas que la
+    generación. El saldo anterior de cada estado se conserva.
+    Devuelve la cantidad de estados actualizados.
+    """
+    por_periodo = {}
+    for estado in estados:
+        por_periodo.setdefault((estado.fecha_inicio, estado.fecha_fin), []).append(estado)
+
+    actualizados = []
+    for (fecha_inicio, fecha_fin), estados_periodo in por_periodo.items():
+        totales = {}
+        vivienda_ids = [estado.vivienda_id for estado in estados_periodo]
+        for desde in range(0, len(vivienda_ids), TAMANO_LOTE_ESTADOS):
+            totales.update(_totales_periodo(vivienda_ids[desde:desde + TAMANO_LOTE_ESTADOS], fecha_inicio, fecha_fin))
+        for estado in estados_periodo:
+            estado.total_cuotas, estado.total_recargos, estado.total_pagos = totales[estado.vivienda_id]
+            estado.saldo_final = (
+                estado.saldo_anterior + estado.total_cuotas + estado.total_recargos - estado.total_pagos
+            )
+            actualizados.append(estado)
+
+    EstadoCuenta.objects.bulk_update(
+        actualizados,
+        ['total_cuotas', 'total_recargos', 'total_pagos', 'saldo_final'],
+        batch_size=TAMANO_LOTE_ESTADOS,
+    )
+    return len(actualizados)
@@ -0,0 +1,393 @@
+# financiero/estados_cuenta_pdf.py - Renderizado y caché de PDFs de estados de cuenta
+import hashlib
+import io
+import json
+import logging
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from .models import Cuota, EstadoCuenta, Pago
+
+logger = logging.getLogger(__name__)
+
+# Cambiar al modificar el diseño del PDF para invalidar los archivos ya generados
+VERSION_PLANTILLA = 1
+
+# Estados de cuenta que se leen y se dibujan por lote: acota la memoria usada
+TAMANO_LOTE_PDF = 50
+
+# Procesos que dibujan el ZIP de una petición web si no se configura
+# PROCESOS_PDF_ESTADOS_CUENTA; con 1 se dibuja en el proceso de la petición.
+# Los comandos de exportación y precarga usan todos los núcleos por defecto.
+PROCESOS_PDF_ESTADOS_CUENTA = 1
+
+
+class CanvasNumerado(canvas.Canvas):
+    """
+    Canvas que difiere el cierre de cada página para escribir en el pie
+    'Página X de N' cuando ya se conoce el total de páginas
+    """
+
+    def __init__(self, *args, pie='', **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pie = pie
+        self._paginas = []
+
+    def showPage(self):
+        self._paginas.append(dict(self.__dict__))
+        self._startPage()
+
+    def save(self):
+        total = len(self._paginas)
+        for numero, pagina in enumerate(self._paginas, start=1):
+            self.__dict__.update(pagina)
+            self._dibujar_pie(numero, total)
+            super().showPage()
+        super().save()
+
+    def _dibujar_pie(self, numero, total):
+        ancho, _ = self._pagesize
+        self.setFont("Helvetica", 8)
+        self.drawString(30, 30, self._pie)
+        self.drawRightString(ancho - 30, 30, f"Página {numero} de {total}")
+
+
+def datos_estados_cuenta(estados):
+    """
+    Datos que se dibujan en el PDF de cada estado de cuenta, como diccionarios
+    simples que pueden enviarse a otro proceso. Las cuotas y los pagos se leen
+    con una consulta por período, no por estado de cuenta.
+    Devuelve {estado_id: datos}.
+    """
+    estados = list(estados)
+    por_periodo = {}
+    for estado in estados:
+        por_periodo.setdefault((estado.fecha_inicio, estado.fecha_fin), []).append(estado)
+
+    cuotas = {}
+    pagos = {}
+    for (fecha_inicio, fecha_fin), estados_periodo in por_periodo.items():
+        vivienda_ids = [estado.vivienda_id for estado in estados_periodo]
+        for cuota in Cuota.objects.filter(
+            vivienda_id__in=vivienda_ids,
+            fecha_emision__gte=fecha_inicio,
+            fecha_emision__lte=fecha_fin,
+        ).select_related('concepto').order_by('fecha_emision', 'id'):
+            cuotas.setdefault((cuota.vivienda_id, fecha_inicio, fecha_fin), []).append({
+                'concepto': str(cuota.concepto)[:30],
+                'emision': cuota.fecha_emision.strftime('%d/%m/%Y'),
+                'vencimiento': cuota.fecha_vencimiento.strftime('%d/%m/%Y'),
+                'monto': str(cuota.monto),
+                'estado': "Pagada" if cuota.pagada else "Pendiente",
+            })
+        for pago in Pago.objects.filter(
+            vivienda_id__in=vivienda_ids,
+            fecha_pago__gte=fecha_inicio,
+            fecha_pago__lte=fecha_fin,
+            estado='VERIFICADO',
+        ).order_by('fecha_pago', 'id'):
+            pagos.setdefault((pago.vivienda_id, fecha_inicio, fecha_fin), []).append({
+                'fecha': pago.fecha_pago.strftime('%d/%m/%Y'),
+                'monto': str(pago.monto),
+                'metodo': pago.get_metodo_pago_display(),
+                'referencia': pago.referencia[:30],
+                'estado': pago.get_estado_display(),
+            })
+
+    datos = {}
+    for estado in estados:
+        clave = (estado.vivienda_id, estado.fecha_inicio, estado.fecha_fin)
+        datos[estado.id] = {
+            'version': VERSION_PLANTILLA,
+            'id': estado.id,
+            'vivienda': str(estado.vivienda),
+            'numero_vivienda': estado.vivienda.numero,
+            'fecha_inicio': estado.fecha_inicio.strftime('%d/%m/%Y'),
+            'fecha_fin': estado.fecha_fin.strftime('%d/%m/%Y'),
+            'fecha_generacion': estado.fecha_generacion.strftime('%d/%m/%Y %H:%M'),
+            'saldo_anterior': str(estado.saldo_anterior),
+            'total_cuotas': str(estado.total_cuotas),
+            'total_recargos': str(estado.total_recargos),
+            'total_pagos': str(estado.total_pagos),
+            'saldo_final': str(estado.saldo_final),
+            'cuotas': cuotas.get(clave, []),
+            'pagos': pagos.get(clave, []),
+        }
+    return datos
+
+
+def huella_estado_cuenta(datos):
+    """Hash SHA-256 de los datos del PDF: cambia solo si cambia lo que se dibuja"""
+    contenido = json.dumps(datos, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def nombre_archivo_pdf(estado_id, huella):
+    """Ruta en el almacenamiento del PDF de un estado de cuenta para una huella"""
+    return f"estados_cuenta/estado_{estado_id}_{huella[:16]}.pdf"
+
+
+def dibujar_estado_cuenta(datos):
+    """
+    Dibuja el PDF de un estado de cuenta a partir de sus datos y devuelve los
+    bytes. No accede a la base de datos, por lo que puede ejecutarse en otro proceso.
+    """
+    buffer = io.BytesIO()
+    # invariant fija los metadatos para que los mismos datos generen el mismo archivo
+    p = CanvasNumerado(
+        buffer,
+        pagesize=letter,
+        invariant=1,
+        pie=f"Sistema Torre Segura - Estado de Cuenta #{datos['id']}",
+    )
+    width, height = letter
+
+    # Título
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(30, height - 50, "Estado de Cuenta")
+
+    # Información básica
+    p.setFont("Helvetica", 12)
+    p.drawString(30, height - 80, f"Vivienda: {datos['vivienda']}")
+    p.drawString(30, height - 100, f"Período: {datos['fecha_inicio']} - {datos['fecha_fin']}")
+    p.drawString(30, height - 120, f"Generado el: {datos['fecha_generacion']}")
+
+    # Detalle de saldos
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(30, height - 160, "Resumen de Saldos")
+
+    p.setFont("Helvetica", 12)
+    p.drawString(50, height - 180, f"Saldo Anterior: ${datos['saldo_anterior']}")
+    p.drawString(50, height - 200, f"Total Cuotas: ${datos['total_cuotas']}")
+    p.drawString(50, height - 220, f"Total Recargos: ${datos['total_recargos']}")
+    p.drawString(50, height - 240, f"Total Pagos: ${datos['total_pagos']}")
+
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(50, height - 270, f"Saldo Final: ${datos['saldo_final']}")
+
+    y_pos = _dibujar_tabla(
+        p, height - 320, height, "Detalle de Cuotas",
+        [(30, "Concepto"), (200, "Emisión"), (280, "Vencimiento"), (380, "Monto"), (450, "Estado")],
+        [
+            [cuota['concepto'], cuota['emision'], cuota['vencimiento'], f"${cuota['monto']}", cuota['estado']]
+            for cuota in datos['cuotas']
+        ],
+        "No hay cuotas en este período",
+    )
+    _dibujar_tabla(
+        p, y_pos - 20, height, "Detalle de Pagos",
+        [(30, "Fecha"), (100, "Monto"), (170, "Método"), (250, "Referencia"), (400, "Estado")],
+        [
+            [pago['fecha'], f"${pago['monto']}", pago['metodo'], pago['referencia'], pago['estado']]
+            for pago in datos['pagos']
+        ],
+        "No hay pagos en este período",
+    )
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def _dibujar_tabla(p, y_pos, height, titulo, columnas, filas, sin_filas):
+    """Dibuja una tabla con cabecera repetida en cada página; devuelve la posición final"""
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(30, y_pos, titulo)
+    y_pos -= 20
+
+    p.setFont("Helvetica", 10)
+    if not filas:
+        p.drawString(30, y_pos, sin_filas)
+        return y_pos - 15
+
+    def cabecera(y):
+        for x, texto in columnas:
+            p.drawString(x, y, texto)
+        return y - 20
+
+    y_pos = cabecera(y_pos)
+    for fila in filas:
+        if y_pos < 50:  # Nueva página si no hay espacio (el pie ocupa los últimos 50 puntos)
+            p.showPage()
+            y_pos = height - 50
+
+            p.setFont("Helvetica-Bold", 14)
+            p.drawString(30, y_pos, f"{titulo} (continuación)")
+            y_pos -= 20
+
+            p.setFont("Helvetica", 10)
+            y_pos = cabecera(y_pos)
+
+        for (x, _), texto in zip(columnas, fila):
+            p.drawString(x, y_pos, texto)
+        y_pos -= 15
+    return y_pos
+
+
+def _guardar_pdf(estado, huella, contenido):
+    """Guarda el PDF de una huella nueva y elimina el archivo anterior"""
+    anterior = estado.pdf_generado.name if estado.pdf_generado else None
+    nombre = default_storage.save(nombre_archivo_pdf(estado.id, huella), ContentFile(contenido))
+
+    # update() evita volver a ejecutar la lógica de save() del estado de cuenta
+    EstadoCuenta.objects.filter(pk=estado.pk).update(pdf_generado=nombre, pdf_huella=huella)
+    estado.pdf_generado.name = nombre
+    estado.pdf_huella = huella
+
+    if anterior and anterior != nombre:
+        default_storage.delete(anterior)
+    return nombre
+
+
+def _pdf_vigente(estado, huella):
+    """Indica si el archivo guardado corresponde a la huella actual"""
+    return (
+        estado.pdf_huella == huella
+        and estado.pdf_generado
+        and default_storage.exists(estado.pdf_generado.name)
+    )
+
+
+def obtener_pdf_estado_cuenta(estado):
+    """
+    Devuelve la ruta en el almacenamiento del PDF de un estado de cuenta. Solo
+    se vuelve a dibujar si cambió la huella de sus datos o falta el archivo.
+    """
+    datos = datos_estados_cuenta([estado])[estado.id]
+    huella = huella_estado_cuenta(datos)
+    if _pdf_vigente(estado, huella):
+        return estado.pdf_generado.name
+
+    nombre = _guardar_pdf(estado, huella, dibujar_estado_cuenta(datos))
+    logger.info(f"PDF del estado de cuenta {estado.id} generado ({huella[:12]})")
+    return nombre
+
+
+def _iterar_pdfs(estados, procesos=None, batch_size=TAMANO_LOTE_PDF):
+    """
+    Recorre los estados de cuenta por lotes y produce, en orden,
+    (estado, nombre, contenido) para cada uno. Los PDF desactualizados se
+    dibujan en un pool de procesos y se guardan a medida que terminan; para
+    los vigentes el contenido es None. Con procesos=1 todo se ejecuta en
+    este proceso.
+    """
+    estado_ids = list(estados.order_by('vivienda__numero', 'fecha_inicio', 'id').values_list('id', flat=True))
+    pool = None
+    try:
+        for desde in range(0, len(estado_ids), batch_size):
+            lote = EstadoCuenta.objects.filter(pk__in=estado_ids[desde:desde + batch_size]).select_related(
+                'vivienda', 'vivienda__edificio'
+            ).order_by('vivienda__numero', 'fecha_inicio', 'id')
+            lote = list(lote)
+            datos = datos_estados_cuenta(lote)
+
+            huellas = {}
+            for estado in lote:
+                huella = huella_estado_cuenta(datos[estado.id])
+                if not _pdf_vigente(estado, huella):
+                    huellas[estado.id] = huella
+
+            por_dibujar = [datos[estado.id] for estado in lote if estado.id in huellas]
+            if procesos == 1 or len(por_dibujar) <= 1:
+                contenidos = map(dibujar_estado_cuenta, por_dibujar)
+            else:
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=procesos)
+                contenidos = pool.map(dibujar_estado_cuenta, por_dibujar)
+
+            for estado in lote:
+                if estado.id in huellas:
+                    contenido = next(contenidos)
+                    yield estado, _guardar_pdf(estado, huellas[estado.id], contenido), contenido
+                else:
+                    yield estado, estado.pdf_generado.name, None
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def prerenderizar_estados_cuenta(estados, procesos=None):
+    """
+    Genera los PDF desactualizados de varios estados de cuenta. El dibujo se
+    reparte en un pool de procesos; la lectura de datos y el guardado se hacen
+    en el proceso principal. Con procesos=1 todo se ejecuta en este proceso.
+
+    Devuelve un diccionario con los estados revisados, generados, vigentes y el tiempo.
+    """
+    inicio = time.perf_counter()
+    revisados = 0
+    generados = 0
+    for _, _, contenido in _iterar_pdfs(estados, procesos):
+        revisados += 1
+        if contenido is not None:
+            generados += 1
+
+    resultado = {
+        'revisados': revisados,
+        'generados': generados,
+        'vigentes': revisados - generados,
+        'tiempo': round(time.perf_counter() - inicio, 4),
+    }
+    logger.info(
+        f"PDF de estados de cuenta: {resultado['generados']} generados, "
+        f"{resultado['vigentes']} vigentes en {resultado['tiempo']}s"
+    )
+    return resultado
+
+
+class _SalidaZip:
+    """
+    Destino de solo escritura para ZipFile. Al no poder posicionarse, zipfile
+    escribe cada entrada de forma secuencial y los bytes pueden entregarse y
+    descartarse en cuanto se escriben.
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def nombre_entrada_zip(estado):
+    """Nombre del PDF de un estado de cuenta dentro del ZIP exportado"""
+    return f"Estado_Cuenta_{estado.vivienda.numero}_{estado.fecha_inicio.strftime('%Y%m%d')}.pdf"
+
+
+def iterar_zip_estados_cuenta(estados, procesos=None):
+    """
+    Produce por partes un ZIP con el PDF de cada estado de cuenta. Cada
+    entrada se entrega en cuanto su PDF se dibuja o se lee del almacenamiento,
+    por lo que en memoria solo queda un lote de PDF a la vez. Los PDF (ya
+    comprimidos) se guardan sin volver a comprimir.
+    """
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_STORED) as archivo:
+        for estado, nombre, contenido in _iterar_pdfs(estados, procesos):
+            if contenido is None:
+                with default_storage.open(nombre, 'rb') as pdf:
+                    contenido = pdf.read()
+            archivo.writestr(nombre_entrada_zip(estado), contenido)
+            yield salida.vaciar()
+    # Directorio central del ZIP
+    yield salida.vaciar()
@@ -0,0 +1,119 @@
+# financiero/facturacion.py - Motor de facturación masiva de cuotas
+import logging
+import time
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import QuerySet
+
+from .models import Cuota
+from .resumenes import actualizar_resumenes
+from .saldos import actualizar_saldos
+from viviendas.models import Vivienda
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE_CUOTAS = 500
+
+
+def generar_cuotas_masivas(concepto, viviendas, fecha_emision, fecha_vencimiento,
+                           monto=None, batch_size=TAMANO_LOTE_CUOTAS):
+    """
+    Genera cuotas de un concepto para un conjunto de viviendas en bloque.
+
+    Las claves existentes (concepto, vivienda, fecha_emision) se leen en una sola
+    consulta, la validación se hace en memoria y las cuotas faltantes se insertan
+    con bulk_create por lotes dentro de una transacción. La restricción única de
+    Cuota garantiza que volver a ejecutar la generación no duplique cuotas.
+
+    Devuelve un diccionario con las cuotas creadas, omitidas y los tiempos.
+    """
+    inicio = time.perf_counter()
+
+    # Validaciones equivalentes a Cuota.clean() y Cuota.save()
+    if fecha_vencimiento < fecha_emision:
+        raise ValidationError({'fecha_vencimiento': 'La fecha de vencimiento debe ser posterior a la fecha de emisión.'})
+
+    monto = Decimal(monto) if monto else concepto.monto_base
+    if monto < 0:
+        raise ValidationError({'monto': 'El monto de la cuota no puede ser negativo.'})
+
+    # Aceptar QuerySet, lista de viviendas o lista de IDs
+    if isinstance(viviendas, QuerySet):
+        vivienda_ids = list(viviendas.filter(activo=True).order_by().values_list('id', flat=True))
+    else:
+        vivienda_ids = [getattr(v, 'pk', v) for v in viviendas]
+        vivienda_ids = list(
+            Vivienda.objects.filter(id__in=vivienda_ids, activo=True).order_by().values_list('id', flat=True)
+        )
+
+    # Claves ya existentes en una sola consulta (a lo sumo una por vivienda)
+    existentes = set(
+        Cuota.objects.filter(
+            concepto=concepto,
+            fecha_emision=fecha_emision,
+        ).order_by().values_list('vivienda_id', flat=True)
+    ) & set(vivienda_ids)
+    tiempo_consulta = time.perf_counter() - inicio
+
+    # El recargo es idéntico para todas las cuotas del lote: se calcula una vez
+    plantilla = Cuota(
+        concepto=concepto,
+        monto=monto,
+        fecha_emision=fecha_emision,
+        fecha_vencimiento=fecha_vencimiento,
+    )
+    try:
+        recargo = Decimal(plantilla.calcular_recargo())
+    except Exception as e:
+        logger.error(f"Error al calcular recargo inicial para concepto {concepto.id}: {e}")
+        recargo = Decimal('0')
+
+    nuevas = [
+        Cuota(
+            concepto=concepto,
+            vivienda_id=vivienda_id,
+            monto=monto,
+            fecha_emision=fecha_emision,
+            fecha_vencimiento=fecha_vencimiento,
+            recargo=recargo,
+            saldo_pendiente=monto + recargo,
+        )
+        for vivienda_id in vivienda_ids
+        if vivienda_id not in existentes
+    ]
+
+    inicio_insercion = time.perf_counter()
+    creadas = 0
+    if nuevas:
+        with transaction.atomic():
+            Cuota.objects.bulk_create(nuevas, batch_size=batch_size, ignore_conflicts=True)
+            # ignore_conflicts descarta las filas que otra ejecución ya insertó,
+            # así que se recuentan las claves presentes tras la inserción
+            ahora = set(
+                Cuota.objects.filter(
+                    concepto=concepto,
+                    fecha_emision=fecha_emision,
+                ).order_by().values_list('vivienda_id', flat=True)
+            ) & set(vivienda_ids)
+            creadas = len(ahora) - len(existentes)
+            # bulk_create no dispara señales: actualizar el resumen del mes y los saldos aquí
+            actualizar_resumenes((vivienda_id, fecha_emision) for vivienda_id in ahora - existentes)
+            actualizar_saldos(ahora - existentes)
+    tiempo_insercion = time.perf_counter() - inicio_insercion
+
+    resultado = {
+        'creadas': creadas,
+        'omitidas': len(vivienda_ids) - creadas,
+        'tiempos': {
+            'consulta': round(tiempo_consulta, 4),
+            'insercion': round(tiempo_insercion, 4),
+            'total': round(time.perf_counter() - inicio, 4),
+        },
+    }
+    logger.info(
+        f"Facturación concepto {concepto.id} ({fecha_emision}): "
+        f"{resultado['creadas']} creadas, {resultado['omitidas']} omitidas en {resultado['tiempos']['total']}s"
+    )
+    return resultado
@@ -215,7 +215,7 @@ class PagoForm(forms.ModelForm):
                 
                 choices = []
                 for cuota in cuotas_pendientes:
-                    total_pagar = cuota.total_a_pagar()
+                    total_pagar = cuota.saldo_pendiente
                     vencida = " (VENCIDA)" if cuota.fecha_vencimiento < timezone.now().date() else ""
                     label = f"{cuota.concepto.nombre} - Vence: {cuota.fecha_vencimiento.strftime('%d/%m/%Y')} - ${total_pagar}{vencida}"
                     choices.append((cuota.id, label))
@@ -280,7 +280,7 @@ class PagoForm(forms.ModelForm):
                 
             try:
                 cuota = Cuota.objects.get(pk=cuota_id, pagada=False)
-                monto_aplicado = min(monto_restante, cuota.total_a_pagar())
+                monto_aplicado = min(monto_restante, cuota.saldo_pendiente)
                 
                 if monto_aplicado > 0:
                     PagoCuota.objects.create(
@@ -0,0 +1,61 @@
+# financiero/management/commands/conciliar_cuotas.py
+from django.core.management.base import BaseCommand, CommandError
+
+from financiero.conciliacion import conciliar_cuotas, TAMANO_LOTE_CONCILIACION
+from viviendas.models import Edificio
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el monto pagado y el saldo pendiente de las cuotas a partir de los pagos verificados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--edificio', type=int, help='Conciliar solo un edificio')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar las diferencias sin corregirlas',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TAMANO_LOTE_CONCILIACION,
+            help='Cantidad de cuotas por lote',
+        )
+
+    def handle(self, *args, **options):
+        edificios = Edificio.objects.all().order_by('id')
+        if options['edificio']:
+            edificios = edificios.filter(pk=options['edificio'])
+            if not edificios.exists():
+                raise CommandError(f"No existe el edificio {options['edificio']}")
+
+        dry_run = options['dry_run']
+        if dry_run:
+            self.stdout.write(self.style.WARNING('🔍 Simulación: no se guardará ningún cambio'))
+
+        total_procesadas = 0
+        total_corregidas = 0
+        for edificio in edificios:
+            resultado = conciliar_cuotas(
+                edificio=edificio,
+                dry_run=dry_run,
+                batch_size=options['batch_size'],
+            )
+            total_procesadas += resultado['procesadas']
+            total_corregidas += resultado['corregidas']
+
+            self.stdout.write(
+                f"🏢 {edificio.nombre}: {resultado['corregidas']} de "
+                f"{resultado['procesadas']} cuotas ({resultado['tiempo']}s)"
+            )
+            for diferencia in resultado['diferencias']:
+                self.stdout.write(
+                    f"   Cuota {diferencia['cuota_id']}: pagado "
+                    f"${diferencia['monto_pagado_anterior']} -> ${diferencia['monto_pagado_nuevo']}, saldo "
+                    f"${diferencia['saldo_anterior']} -> ${diferencia['saldo_nuevo']}"
+                )
+
+        verbo = 'a corregir' if dry_run else 'corregidas'
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {total_corregidas} cuotas {verbo} de {total_procesadas} revisadas"
+        ))
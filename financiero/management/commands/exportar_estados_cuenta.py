@@ -0,0 +1,70 @@
+# financiero/management/commands/exportar_estados_cuenta.py
+import os
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from financiero.estados_cuenta_pdf import iterar_zip_estados_cuenta
+from financiero.models import EstadoCuenta
+from viviendas.models import Edificio
+
+
+class Command(BaseCommand):
+    help = 'Exporta a un ZIP los PDF de los estados de cuenta de un edificio y período'
+
+    def add_arguments(self, parser):
+        parser.add_argument('edificio', type=int, help='ID del edificio')
+        parser.add_argument(
+            '--desde',
+            type=date.fromisoformat,
+            default=None,
+            help='Fecha de inicio del período (YYYY-MM-DD). Por defecto, el primer día del mes anterior',
+        )
+        parser.add_argument(
+            '--hasta',
+            type=date.fromisoformat,
+            default=None,
+            help='Fecha de fin del período (YYYY-MM-DD). Por defecto, el último día del mes anterior',
+        )
+        parser.add_argument('--salida', help='Ruta del archivo ZIP. Por defecto, en el directorio actual')
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Cantidad de procesos para dibujar los PDF',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            edificio = Edificio.objects.get(pk=options['edificio'])
+        except Edificio.DoesNotExist:
+            raise CommandError(f"No existe el edificio {options['edificio']}")
+        if options['procesos'] < 1:
+            raise CommandError('La cantidad de procesos debe ser al menos 1.')
+
+        fin_mes_anterior = date.today().replace(day=1) - timedelta(days=1)
+        fecha_inicio = options['desde'] or fin_mes_anterior.replace(day=1)
+        fecha_fin = options['hasta'] or fin_mes_anterior
+
+        estados = EstadoCuenta.objects.filter(
+            vivienda__edificio=edificio,
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+        )
+        total = estados.count()
+        if not total:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ No hay estados de cuenta de {edificio.nombre} del {fecha_inicio} al {fecha_fin}"
+            ))
+            return
+
+        salida = options['salida'] or (
+            f"estados_cuenta_{edificio.id}_{fecha_inicio.strftime('%Y%m%d')}_{fecha_fin.strftime('%Y%m%d')}.zip"
+        )
+        with open(salida, 'wb') as archivo:
+            for parte in iterar_zip_estados_cuenta(estados, procesos=options['procesos']):
+                archivo.write(parte)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {total} estados de cuenta de {edificio.nombre} exportados a {salida}"
+        ))
@@ -0,0 +1,69 @@
+# financiero/management/commands/generar_cuotas.py
+from datetime import date, timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from financiero.facturacion import generar_cuotas_masivas, TAMANO_LOTE_CUOTAS
+from financiero.models import ConceptoCuota
+from viviendas.models import Vivienda
+
+
+class Command(BaseCommand):
+    help = 'Genera en bloque las cuotas de un concepto para las viviendas activas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('concepto', type=int, help='ID del concepto de cuota')
+        parser.add_argument(
+            '--fecha-emision',
+            type=date.fromisoformat,
+            default=None,
+            help='Fecha de emisión (YYYY-MM-DD). Por defecto, hoy',
+        )
+        parser.add_argument(
+            '--fecha-vencimiento',
+            type=date.fromisoformat,
+            default=None,
+            help='Fecha de vencimiento (YYYY-MM-DD). Por defecto, 30 días después de la emisión',
+        )
+        parser.add_argument('--edificio', type=int, help='Limitar a las viviendas de un edificio')
+        parser.add_argument('--monto', help='Monto personalizado (por defecto el monto base del concepto)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TAMANO_LOTE_CUOTAS,
+            help='Cantidad de cuotas por INSERT',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            concepto = ConceptoCuota.objects.get(pk=options['concepto'])
+        except ConceptoCuota.DoesNotExist:
+            raise CommandError(f"No existe el concepto de cuota {options['concepto']}")
+
+        fecha_emision = options['fecha_emision'] or date.today()
+        fecha_vencimiento = options['fecha_vencimiento'] or fecha_emision + timedelta(days=30)
+
+        viviendas = Vivienda.objects.filter(activo=True)
+        if options['edificio']:
+            viviendas = viviendas.filter(edificio_id=options['edificio'])
+
+        try:
+            resultado = generar_cuotas_masivas(
+                concepto=concepto,
+                viviendas=viviendas,
+                fecha_emision=fecha_emision,
+                fecha_vencimiento=fecha_vencimiento,
+                monto=options['monto'],
+                batch_size=options['batch_size'],
+            )
+        except ValidationError as e:
+            raise CommandError('; '.join(e.messages))
+
+        tiempos = resultado['tiempos']
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultado['creadas']} cuotas creadas, {resultado['omitidas']} omitidas"
+        ))
+        self.stdout.write(
+            f"   Consulta: {tiempos['consulta']}s | Inserción: {tiempos['insercion']}s | Total: {tiempos['total']}s"
+        )
@@ -0,0 +1,66 @@
+# financiero/management/commands/generar_estados_cuenta.py
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from financiero.estados_cuenta import generar_estados_cuenta_masivos, TAMANO_LOTE_ESTADOS
+from viviendas.models import Edificio, Vivienda
+
+
+class Command(BaseCommand):
+    help = 'Genera en bloque los estados de cuenta de un período, edificio por edificio'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=date.fromisoformat,
+            default=None,
+            help='Fecha de inicio (YYYY-MM-DD). Por defecto, el primer día del mes anterior',
+        )
+        parser.add_argument(
+            '--hasta',
+            type=date.fromisoformat,
+            default=None,
+            help='Fecha de fin (YYYY-MM-DD). Por defecto, el último día del mes anterior',
+        )
+        parser.add_argument('--edificio', type=int, help='Generar solo las viviendas de un edificio')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TAMANO_LOTE_ESTADOS,
+            help='Cantidad de viviendas por lote',
+        )
+
+    def handle(self, *args, **options):
+        edificios = Edificio.objects.all().order_by('id')
+        if options['edificio']:
+            edificios = edificios.filter(pk=options['edificio'])
+            if not edificios.exists():
+                raise CommandError(f"No existe el edificio {options['edificio']}")
+
+        fin_mes_anterior = date.today().replace(day=1) - timedelta(days=1)
+        fecha_inicio = options['desde'] or fin_mes_anterior.replace(day=1)
+        fecha_fin = options['hasta'] or fin_mes_anterior
+        if fecha_fin < fecha_inicio:
+            raise CommandError('La fecha de fin debe ser posterior a la fecha de inicio.')
+
+        total_creados = 0
+        total_omitidos = 0
+        for edificio in edificios:
+            resultado = generar_estados_cuenta_masivos(
+                Vivienda.objects.filter(edificio=edificio, activo=True),
+                fecha_inicio,
+                fecha_fin,
+                batch_size=options['batch_size'],
+            )
+            total_creados += resultado['creados']
+            total_omitidos += resultado['omitidos']
+            self.stdout.write(
+                f"🏢 {edificio.nombre}: {resultado['creados']} creados, "
+                f"{resultado['omitidos']} ya existentes ({resultado['tiempo']}s)"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {total_creados} estados de cuenta generados del {fecha_inicio} al {fecha_fin} "
+            f"({total_omitidos} ya existían)"
+        ))
@@ -0,0 +1,70 @@
+# financiero/management/commands/prerenderizar_estados_cuenta.py
+import os
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from financiero.estados_cuenta_pdf import prerenderizar_estados_cuenta
+from financiero.models import EstadoCuenta
+from viviendas.models import Edificio
+
+
+class Command(BaseCommand):
+    help = 'Genera por adelantado los PDF desactualizados de los estados de cuenta de un período'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=date.fromisoformat,
+            default=None,
+            help='Fecha de inicio del período (YYYY-MM-DD). Por defecto, el primer día del mes anterior',
+        )
+        parser.add_argument(
+            '--hasta',
+            type=date.fromisoformat,
+            default=None,
+            help='Fecha de fin del período (YYYY-MM-DD). Por defecto, el último día del mes anterior',
+        )
+        parser.add_argument('--edificio', type=int, help='Procesar solo las viviendas de un edificio')
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Cantidad de procesos para dibujar los PDF',
+        )
+
+    def handle(self, *args, **options):
+        edificios = Edificio.objects.all().order_by('id')
+        if options['edificio']:
+            edificios = edificios.filter(pk=options['edificio'])
+            if not edificios.exists():
+                raise CommandError(f"No existe el edificio {options['edificio']}")
+        if options['procesos'] < 1:
+            raise CommandError('La cantidad de procesos debe ser al menos 1.')
+
+        fin_mes_anterior = date.today().replace(day=1) - timedelta(days=1)
+        fecha_inicio = options['desde'] or fin_mes_anterior.replace(day=1)
+        fecha_fin = options['hasta'] or fin_mes_anterior
+
+        total_generados = 0
+        total_revisados = 0
+        for edificio in edificios:
+            resultado = prerenderizar_estados_cuenta(
+                EstadoCuenta.objects.filter(
+                    vivienda__edificio=edificio,
+                    fecha_inicio=fecha_inicio,
+                    fecha_fin=fecha_fin,
+                ),
+                procesos=options['procesos'],
+            )
+            total_generados += resultado['generados']
+            total_revisados += resultado['revisados']
+            self.stdout.write(
+                f"🏢 {edificio.nombre}: {resultado['generados']} generados, "
+                f"{resultado['vigentes']} vigentes ({resultado['tiempo']}s)"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {total_generados} PDF generados de {total_revisados} estados de cuenta "
+            f"del {fecha_inicio} al {fecha_fin}"
+        ))
@@ -0,0 +1,75 @@
+# financiero/management/commands/procesar_recargos.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from financiero.recargos import recalcular_recargos, TAMANO_LOTE_RECARGOS
+from financiero.saldos import refrescar_saldos_vencidos
+from viviendas.models import Edificio
+
+
+class Command(BaseCommand):
+    help = 'Recalcula en bloque los recargos de las cuotas vencidas, edificio por edificio'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--as-of',
+            dest='fecha_corte',
+            type=date.fromisoformat,
+            default=None,
+            help='Fecha de corte para calcular la mora (YYYY-MM-DD). Por defecto, hoy',
+        )
+        parser.add_argument('--edificio', type=int, help='Procesar solo un edificio')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Mostrar los cambios sin guardarlos',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TAMANO_LOTE_RECARGOS,
+            help='Cantidad de cuotas por lote',
+        )
+
+    def handle(self, *args, **options):
+        edificios = Edificio.objects.all().order_by('id')
+        if options['edificio']:
+            edificios = edificios.filter(pk=options['edificio'])
+            if not edificios.exists():
+                raise CommandError(f"No existe el edificio {options['edificio']}")
+
+        dry_run = options['dry_run']
+        fecha_corte = options['fecha_corte'] or date.today()
+        if dry_run:
+            self.stdout.write(self.style.WARNING('🔍 Simulación: no se guardará ningún cambio'))
+
+        total_procesadas = 0
+        total_actualizadas = 0
+        for edificio in edificios:
+            resultado = recalcular_recargos(
+                fecha_corte=fecha_corte,
+                edificio=edificio,
+                dry_run=dry_run,
+                batch_size=options['batch_size'],
+            )
+            total_procesadas += resultado['procesadas']
+            total_actualizadas += resultado['actualizadas']
+            if not dry_run:
+                # Lo vencido de cada saldo depende de la fecha: se recalcula al cambiar de día
+                refrescar_saldos_vencidos(edificio.id, fecha_corte=fecha_corte)
+
+            self.stdout.write(
+                f"🏢 {edificio.nombre}: {resultado['actualizadas']} de "
+                f"{resultado['procesadas']} cuotas ({resultado['tiempo']}s)"
+            )
+            for cambio in resultado['cambios']:
+                self.stdout.write(
+                    f"   Cuota {cambio['cuota_id']}: "
+                    f"${cambio['recargo_anterior']} -> ${cambio['recargo_nuevo']}"
+                )
+
+        verbo = 'a actualizar' if dry_run else 'actualizadas'
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {total_actualizadas} cuotas {verbo} de {total_procesadas} vencidas al {fecha_corte}"
+        ))
@@ -0,0 +1,64 @@
+# financiero/management/commands/reconstruir_resumenes.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+
+from financiero.models import Cuota, Gasto, Pago
+from financiero.resumenes import inicio_de_mes, inicio_mes_siguiente, reconstruir_resumenes
+from viviendas.models import Edificio
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los resúmenes financieros mensuales en un rango de fechas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde',
+            type=date.fromisoformat,
+            default=None,
+            help='Fecha inicial (YYYY-MM-DD). Por defecto, el primer movimiento registrado',
+        )
+        parser.add_argument(
+            '--hasta',
+            type=date.fromisoformat,
+            default=None,
+            help='Fecha final (YYYY-MM-DD). Por defecto, hoy',
+        )
+        parser.add_argument('--edificio', type=int, help='Reconstruir solo las viviendas de un edificio')
+
+    def handle(self, *args, **options):
+        edificio = None
+        if options['edificio']:
+            try:
+                edificio = Edificio.objects.get(pk=options['edificio'])
+            except Edificio.DoesNotExist:
+                raise CommandError(f"No existe el edificio {options['edificio']}")
+
+        hasta = options['hasta'] or date.today()
+        desde = options['desde'] or self._primer_movimiento() or hasta
+        if desde > hasta:
+            raise CommandError('La fecha inicial debe ser anterior a la final.')
+
+        # Mes a mes para acotar la memoria usada en historiales largos
+        mes = inicio_de_mes(desde)
+        total = 0
+        while mes <= hasta:
+            filas = reconstruir_resumenes(mes, mes, edificio=edificio)
+            total += filas
+            self.stdout.write(f"📅 {mes:%m/%Y}: {filas} resúmenes")
+            mes = inicio_mes_siguiente(mes)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {total} resúmenes reconstruidos entre {desde} y {hasta}"
+        ))
+
+    def _primer_movimiento(self):
+        """Fecha más antigua entre pagos, cuotas y gastos"""
+        fechas = [
+            Pago.objects.aggregate(fecha=Min('fecha_pago'))['fecha'],
+            Cuota.objects.aggregate(fecha=Min('fecha_emision'))['fecha'],
+            Gasto.objects.aggregate(fecha=Min('fecha'))['fecha'],
+        ]
+        fechas = [fecha for fecha in fechas if fecha]
+        return min(fechas) if fechas else None
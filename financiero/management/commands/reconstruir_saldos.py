@@ -0,0 +1,49 @@
+# financiero/management/commands/reconstruir_saldos.py
+from django.core.management.base import BaseCommand, CommandError
+
+from financiero.saldos import reconstruir_saldos, verificar_saldos, TAMANO_LOTE_SALDOS
+from viviendas.models import Edificio
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye o verifica el saldo de cuenta corriente de las viviendas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--edificio', type=int, help='Procesar solo las viviendas de un edificio')
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help='Solo comparar los saldos guardados con las tablas de cuotas y pagos',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=TAMANO_LOTE_SALDOS,
+            help='Cantidad de viviendas por lote',
+        )
+
+    def handle(self, *args, **options):
+        edificio = None
+        if options['edificio']:
+            try:
+                edificio = Edificio.objects.get(pk=options['edificio'])
+            except Edificio.DoesNotExist:
+                raise CommandError(f"No existe el edificio {options['edificio']}")
+
+        if options['verificar']:
+            diferencias = verificar_saldos(edificio=edificio, batch_size=options['batch_size'])
+            for diferencia in diferencias:
+                self.stdout.write(
+                    f"   Vivienda {diferencia['vivienda_id']}: {diferencia['campo']} "
+                    f"{diferencia['guardado']} -> {diferencia['calculado']}"
+                )
+            if diferencias:
+                self.stdout.write(self.style.WARNING(f"⚠️ {len(diferencias)} diferencias encontradas"))
+            else:
+                self.stdout.write(self.style.SUCCESS('✅ Los saldos coinciden con las cuotas y pagos'))
+            return
+
+        resultado = reconstruir_saldos(edificio=edificio, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Saldos reconstruidos para {resultado['viviendas']} viviendas ({resultado['tiempo']}s)"
+        ))
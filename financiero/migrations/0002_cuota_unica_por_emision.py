@@ -0,0 +1,71 @@
+# Generated by Django 4.2.10 on 2026-10-18 07:25
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def eliminar_cuotas_duplicadas(apps, schema_editor):
+    """
+    Deja una sola cuota por (concepto, vivienda, fecha_emision) antes de crear
+    la restricción de unicidad.
+
+    De cada grupo se conserva la cuota que tiene pagos aplicados o, si ninguna
+    los tiene, la más antigua; las demás se eliminan. Si más de una cuota del
+    grupo tiene pagos no se puede decidir cuál conservar sin perder pagos, y la
+    migración se aborta indicando las cuotas a revisar.
+    """
+    Cuota = apps.get_model('financiero', 'Cuota')
+    PagoCuota = apps.get_model('financiero', 'PagoCuota')
+
+    grupos = (
+        Cuota.objects.order_by()
+        .values('concepto_id', 'vivienda_id', 'fecha_emision')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+    )
+
+    eliminar = []
+    conflictos = []
+    for grupo in grupos.iterator():
+        ids = list(
+            Cuota.objects.filter(
+                concepto_id=grupo['concepto_id'],
+                vivienda_id=grupo['vivienda_id'],
+                fecha_emision=grupo['fecha_emision'],
+            ).order_by('id').values_list('id', flat=True)
+        )
+        con_pagos = set(
+            PagoCuota.objects.filter(cuota_id__in=ids).values_list('cuota_id', flat=True)
+        )
+        if len(con_pagos) > 1:
+            conflictos.append(sorted(con_pagos))
+            continue
+        conservar = min(con_pagos) if con_pagos else ids[0]
+        eliminar.extend(i for i in ids if i != conservar)
+
+    if conflictos:
+        detalle = '; '.join(', '.join(str(i) for i in ids) for ids in conflictos[:20])
+        raise RuntimeError(
+            f"Hay {len(conflictos)} grupos de cuotas duplicadas (mismo concepto, vivienda y "
+            f"fecha de emisión) con pagos aplicados a más de una cuota. Reasigne los pagos y "
+            f"elimine los duplicados antes de migrar. Cuotas: {detalle}"
+        )
+
+    for inicio in range(0, len(eliminar), 1000):
+        Cuota.objects.filter(id__in=eliminar[inicio:inicio + 1000]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viviendas', '0002_alter_edificio_options_alter_residente_options_and_more'),
+        ('financiero', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(eliminar_cuotas_duplicadas, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cuota',
+            unique_together={('concepto', 'vivienda', 'fecha_emision')},
+        ),
+    ]
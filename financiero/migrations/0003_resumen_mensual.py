@@ -0,0 +1,39 @@
+# Generated by Django 4.2.10 on 2026-10-18 07:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viviendas', '0002_alter_edificio_options_alter_residente_options_and_more'),
+        ('financiero', '0002_cuota_unica_por_emision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primer día del mes resumido')),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('gastos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cuotas_emitidas', models.PositiveIntegerField(default=0)),
+                ('monto_cuotas', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('recargos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cuotas_pendientes', models.PositiveIntegerField(default=0)),
+                ('saldo_pendiente', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('edificio', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_mensuales', to='viviendas.edificio')),
+                ('vivienda', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_mensuales', to='viviendas.vivienda')),
+            ],
+            options={
+                'verbose_name': 'Resumen Mensual',
+                'verbose_name_plural': 'Resúmenes Mensuales',
+                'ordering': ['-mes'],
+                'indexes': [models.Index(fields=['mes'], name='financiero__mes_2ad6d3_idx'), models.Index(fields=['edificio', 'mes'], name='financiero__edifici_6a2118_idx')],
+                'unique_together': {('vivienda', 'mes')},
+            },
+        ),
+    ]
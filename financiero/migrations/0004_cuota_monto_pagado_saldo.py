@@ -0,0 +1,65 @@
+# Generated by Django 4.2.10 on 2026-10-18 07:41
+
+from decimal import Decimal
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def inicializar_saldos(apps, schema_editor):
+    """
+    Calcula monto_pagado y saldo_pendiente de las cuotas existentes.
+
+    Hasta ahora un pago parcial reducía cuota.monto al resto por pagar; en esas
+    cuotas se restituye el monto (resto + pagado) para que el saldo pendiente
+    siga siendo el mismo resto.
+    """
+    Cuota = apps.get_model('financiero', 'Cuota')
+    PagoCuota = apps.get_model('financiero', 'PagoCuota')
+
+    pagado = dict(
+        PagoCuota.objects.filter(pago__estado='VERIFICADO').order_by().values('cuota_id').annotate(
+            total=Sum('monto_aplicado')
+        ).values_list('cuota_id', 'total')
+    )
+
+    lote = []
+    for cuota in Cuota.objects.only('id', 'monto', 'recargo', 'pagada').iterator(chunk_size=2000):
+        cuota.monto_pagado = pagado.get(cuota.id, Decimal('0'))
+        if cuota.pagada:
+            cuota.saldo_pendiente = Decimal('0')
+        else:
+            cuota.saldo_pendiente = cuota.monto + cuota.recargo
+            cuota.monto = cuota.monto + cuota.monto_pagado
+        lote.append(cuota)
+        if len(lote) >= 2000:
+            Cuota.objects.bulk_update(lote, ['monto', 'monto_pagado', 'saldo_pendiente'])
+            lote = []
+    if lote:
+        Cuota.objects.bulk_update(lote, ['monto', 'monto_pagado', 'saldo_pendiente'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financiero', '0003_resumen_mensual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cuota',
+            name='monto_pagado',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Suma de los montos aplicados por pagos verificados', max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='cuota',
+            name='saldo_pendiente',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Monto más recargo menos lo pagado; cero si la cuota está pagada', max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddIndex(
+            model_name='cuota',
+            index=models.Index(fields=['vivienda', 'saldo_pendiente'], name='financiero__viviend_f7c79a_idx'),
+        ),
+        migrations.RunPython(inicializar_saldos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.10 on 2026-10-18 07:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viviendas', '0002_alter_edificio_options_alter_residente_options_and_more'),
+        ('financiero', '0004_cuota_monto_pagado_saldo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoVivienda',
+            fields=[
+                ('vivienda', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='saldo', serialize=False, to='viviendas.vivienda')),
+                ('saldo', models.DecimalField(decimal_places=2, default=0, help_text='Total adeudado menos los pagos verificados sin asignar a cuotas', max_digits=12)),
+                ('total_adeudado', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_vencido', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cuotas_pendientes', models.PositiveIntegerField(default=0)),
+                ('cuotas_vencidas', models.PositiveIntegerField(default=0)),
+                ('ultimo_pago', models.DateField(blank=True, null=True)),
+                ('fecha_corte', models.DateField(help_text='Fecha a la que se calculó lo vencido')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Saldo de Vivienda',
+                'verbose_name_plural': 'Saldos de Viviendas',
+                'ordering': ['-total_adeudado'],
+                'indexes': [models.Index(fields=['-total_adeudado'], name='financiero__total_a_605a9c_idx'), models.Index(fields=['-total_vencido'], name='financiero__total_v_1a63ec_idx')],
+            },
+        ),
+    ]
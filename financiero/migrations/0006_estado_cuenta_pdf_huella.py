@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financiero', '0005_saldo_vivienda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadocuenta',
+            name='pdf_huella',
+            field=models.CharField(blank=True, help_text='Hash de los datos con los que se generó el PDF', max_length=64),
+        ),
+    ]
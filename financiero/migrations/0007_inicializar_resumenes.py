@@ -0,0 +1,70 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:10
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+
+
+def inicializar_resumenes(apps, schema_editor):
+    """
+    Llena ResumenMensual con el historial existente, con las mismas consultas
+    agrupadas que financiero.resumenes.reconstruir_resumenes, para que las series
+    y los reportes no muestren en cero los meses anteriores a la migración.
+    """
+    Cuota = apps.get_model('financiero', 'Cuota')
+    Gasto = apps.get_model('financiero', 'Gasto')
+    Pago = apps.get_model('financiero', 'Pago')
+    ResumenMensual = apps.get_model('financiero', 'ResumenMensual')
+
+    filas = {}
+
+    def fila(vivienda_id, edificio_id, mes):
+        clave = (vivienda_id, mes)
+        if clave not in filas:
+            filas[clave] = ResumenMensual(vivienda_id=vivienda_id, edificio_id=edificio_id, mes=mes)
+        return filas[clave]
+
+    pagos = Pago.objects.filter(estado='VERIFICADO').annotate(
+        mes=TruncMonth('fecha_pago')
+    ).order_by().values('vivienda_id', 'vivienda__edificio_id', 'mes').annotate(total=Sum('monto'))
+    for registro in pagos:
+        fila(registro['vivienda_id'], registro['vivienda__edificio_id'], registro['mes']).ingresos = registro['total']
+
+    cuotas = Cuota.objects.annotate(
+        mes=TruncMonth('fecha_emision')
+    ).order_by().values('vivienda_id', 'vivienda__edificio_id', 'mes').annotate(
+        emitidas=Count('id'),
+        total_monto=Sum('monto'),
+        total_recargo=Sum('recargo'),
+        pendientes=Count('id', filter=Q(pagada=False)),
+        saldo=Coalesce(Sum('saldo_pendiente'), Decimal('0'), output_field=DecimalField()),
+    )
+    for registro in cuotas:
+        resumen = fila(registro['vivienda_id'], registro['vivienda__edificio_id'], registro['mes'])
+        resumen.cuotas_emitidas = registro['emitidas']
+        resumen.monto_cuotas = registro['total_monto']
+        resumen.recargos = registro['total_recargo']
+        resumen.cuotas_pendientes = registro['pendientes']
+        resumen.saldo_pendiente = registro['saldo']
+
+    gastos = Gasto.objects.filter(estado='PAGADO').annotate(
+        mes=TruncMonth('fecha')
+    ).order_by().values('mes').annotate(total=Sum('monto'))
+    for registro in gastos:
+        fila(None, None, registro['mes']).gastos = registro['total']
+
+    ResumenMensual.objects.all().delete()
+    ResumenMensual.objects.bulk_create(filas.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financiero', '0006_estado_cuenta_pdf_huella'),
+    ]
+
+    operations = [
+        migrations.RunPython(inicializar_resumenes, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,23 @@
+from decimal import Decimal
+
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
 
 from usuarios.models import Usuario
 from viviendas.models import Vivienda, Residente
 
+def calcular_meses_retraso(fecha_vencimiento, fecha_corte):
+    """Meses completos de retraso de una cuota vencida (al menos uno)"""
+    meses_retraso = (fecha_corte.year - fecha_vencimiento.year) * 12 + (fecha_corte.month - fecha_vencimiento.month)
+    if fecha_corte.day < fecha_vencimiento.day:
+        meses_retraso -= 1
+    
+    # Asegurar que al menos hay un mes de retraso
+    return max(1, meses_retraso)
+
 class ConceptoCuota(models.Model):
     """
     Modelo para definir los diferentes conceptos de cuotas
@@ -51,6 +60,10 @@ class Cuota(models.Model):
     fecha_vencimiento = models.DateField()
     pagada = models.BooleanField(default=False)
     recargo = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    monto_pagado = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)],
+                                       help_text="Suma de los montos aplicados por pagos verificados")
+    saldo_pendiente = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)],
+                                          help_text="Monto más recargo menos lo pagado; cero si la cuota está pagada")
     notas = models.TextField(blank=True)
     
     def __str__(self):
@@ -60,13 +73,7 @@ class Cuota(models.Model):
         """Calcula el recargo si la cuota está vencida y aplica recargo"""
         if not self.pagada and self.concepto.aplica_recargo and timezone.now().date() > self.fecha_vencimiento:
             # Calcular meses de retraso
-            hoy = timezone.now().date()
-            meses_retraso = (hoy.year - self.fecha_vencimiento.year) * 12 + (hoy.month - self.fecha_vencimiento.month)
-            if hoy.day < self.fecha_vencimiento.day:
-                meses_retraso -= 1
-            
-            # Asegurar que al menos hay un mes de retraso
-            meses_retraso = max(1, meses_retraso)
+            meses_retraso = calcular_meses_retraso(self.fecha_vencimiento, timezone.now().date())
             
             # Calcular recargo acumulado
             porcentaje_recargo_mensual = self.concepto.porcentaje_recargo / 100
@@ -80,12 +87,34 @@ class Cuota(models.Model):
         nuevo_recargo = self.calcular_recargo()
         if nuevo_recargo != self.recargo:
             self.recargo = nuevo_recargo
-            self.save(update_fields=['recargo'])
+            self.save(update_fields=['recargo', 'saldo_pendiente'])
     
     def total_a_pagar(self):
         """Devuelve el monto total a pagar incluyendo recargos"""
         return self.monto + self.recargo
     
+    def calcular_saldo(self):
+        """Devuelve lo que falta pagar de la cuota, incluyendo recargos"""
+        if self.pagada:
+            return Decimal('0')
+        return max(self.monto + self.recargo - self.monto_pagado, Decimal('0'))
+    
+    def registrar_pago(self, monto):
+        """
+        Suma un monto pagado a la cuota (negativo para revertirlo) y actualiza
+        el estado y el saldo pendiente en memoria, sin guardar
+        """
+        self.monto_pagado = max(self.monto_pagado + monto, Decimal('0'))
+        if self.monto_pagado >= self.total_a_pagar():
+            # Cuota completamente pagada: se limpian los recargos
+            self.pagada = True
+            self.recargo = Decimal('0')
+        elif self.pagada and monto < 0:
+            # Pago revertido: la cuota vuelve a estar pendiente y recupera su recargo
+            self.pagada = False
+            self.recargo = Decimal(self.calcular_recargo()).quantize(Decimal('0.01'))
+        self.saldo_pendiente = self.calcular_saldo()
+    
     def marcar_como_pagada(self):
         """Marca la cuota como pagada y elimina recargos"""
         self.pagada = True
@@ -105,15 +134,20 @@ class Cuota(models.Model):
         if not self.pk and self.monto == 0:
             self.monto = self.concepto.monto_base
         
+        # El saldo se recalcula de nuevo en pre_save, tras actualizar el recargo
+        self.saldo_pendiente = self.calcular_saldo()
+        
         super().save(*args, **kwargs)
     
     class Meta:
         verbose_name = "Cuota"
         verbose_name_plural = "Cuotas"
         ordering = ['-fecha_vencimiento']
+        unique_together = ('concepto', 'vivienda', 'fecha_emision')
         indexes = [
             models.Index(fields=['vivienda', 'pagada']),
             models.Index(fields=['fecha_vencimiento']),
+            models.Index(fields=['vivienda', 'saldo_pendiente']),
         ]
 
 class Pago(models.Model):
@@ -167,13 +201,8 @@ class Pago(models.Model):
         self.fecha_verificacion = timezone.now()
         if motivo:
             self.notas = f"{self.notas}\nRechazado: {motivo}".strip()
+        # Al guardar, las señales descuentan de cada cuota lo que este pago había aplicado
         self.save()
-        
-        # Desmarcar las cuotas como pagadas
-        for pago_cuota in self.pagocuota_set.all():
-            cuota = pago_cuota.cuota
-            cuota.pagada = False
-            cuota.save()
     
     def get_cuotas_pendientes(self):
         """Devuelve las cuotas pendientes de la vivienda"""
@@ -321,6 +350,7 @@ class EstadoCuenta(models.Model):
     enviado = models.BooleanField(default=False)
     fecha_envio = models.DateTimeField(null=True, blank=True)
     pdf_generado = models.FileField(upload_to='estados_cuenta/', null=True, blank=True)
+    pdf_huella = models.CharField(max_length=64, blank=True, help_text="Hash de los datos con los que se generó el PDF")
     
     def __str__(self):
         return f"Estado de Cuenta - {self.vivienda} - {self.fecha_inicio} a {self.fecha_fin}"
@@ -416,38 +446,62 @@ class EstadoCuenta(models.Model):
             models.Index(fields=['vivienda', 'fecha_fin']),
         ]
 
-# Señales y hooks
-
-@receiver(post_save, sender=PagoCuota)
-def actualizar_cuota_al_pagar(sender, instance, created, **kwargs):
+class ResumenMensual(models.Model):
     """
-    Cuando se crea o actualiza un PagoCuota, actualiza el estado de la cuota
+    Resumen financiero precalculado por edificio, vivienda y mes.
+    Las filas sin vivienda acumulan los gastos del condominio, que no
+    están asociados a ningún edificio.
     """
-    cuota = instance.cuota
-    
-    # Si el pago está verificado, marcar la cuota como pagada
-    if instance.pago.estado == 'VERIFICADO':
-        # Verificar si el monto aplicado cubre el total
-        if instance.monto_aplicado >= cuota.total_a_pagar():
-            cuota.pagada = True
-            cuota.recargo = 0
-        else:
-            # Pago parcial, reducir el monto pendiente
-            cuota.monto = cuota.monto - instance.monto_aplicado
-            cuota.pagada = False
-        
-        cuota.save()
+    edificio = models.ForeignKey('viviendas.Edificio', on_delete=models.CASCADE, null=True, blank=True, related_name='resumenes_mensuales')
+    vivienda = models.ForeignKey(Vivienda, on_delete=models.CASCADE, null=True, blank=True, related_name='resumenes_mensuales')
+    mes = models.DateField(help_text="Primer día del mes resumido")
+    ingresos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    gastos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cuotas_emitidas = models.PositiveIntegerField(default=0)
+    monto_cuotas = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    recargos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cuotas_pendientes = models.PositiveIntegerField(default=0)
+    saldo_pendiente = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
-@receiver(post_delete, sender=PagoCuota)
-def revertir_pago_al_eliminar(sender, instance, **kwargs):
+    def __str__(self):
+        ambito = self.vivienda or 'Condominio'
+        return f"Resumen {self.mes:%m/%Y} - {ambito}"
+
+    class Meta:
+        verbose_name = "Resumen Mensual"
+        verbose_name_plural = "Resúmenes Mensuales"
+        ordering = ['-mes']
+        unique_together = ('vivienda', 'mes')
+        indexes = [
+            models.Index(fields=['mes']),
+            models.Index(fields=['edificio', 'mes']),
+        ]
+
+class SaldoVivienda(models.Model):
     """
-    Cuando se elimina un PagoCuota, revierte el estado de la cuota si es necesario
+    Saldo de cuenta corriente de cada vivienda, mantenido al día por las
+    señales y los procesos masivos para consultarlo por clave primaria.
     """
-    cuota = instance.cuota
-    
-    # Si la cuota estaba marcada como pagada y el pago estaba verificado
-    if cuota.pagada and instance.pago.estado == 'VERIFICADO':
-        # Restaurar el estado de la cuota
-        cuota.pagada = False
-        cuota.actualizar_recargo()  # Recalcular recargos
-        cuota.save()
\ No newline at end of file
+    vivienda = models.OneToOneField(Vivienda, on_delete=models.CASCADE, primary_key=True, related_name='saldo')
+    saldo = models.DecimalField(max_digits=12, decimal_places=2, default=0,
+                                help_text="Total adeudado menos los pagos verificados sin asignar a cuotas")
+    total_adeudado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_vencido = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    cuotas_pendientes = models.PositiveIntegerField(default=0)
+    cuotas_vencidas = models.PositiveIntegerField(default=0)
+    ultimo_pago = models.DateField(null=True, blank=True)
+    fecha_corte = models.DateField(help_text="Fecha a la que se calculó lo vencido")
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Saldo {self.vivienda} - ${self.saldo}"
+
+    class Meta:
+        verbose_name = "Saldo de Vivienda"
+        verbose_name_plural = "Saldos de Viviendas"
+        ordering = ['-total_adeudado']
+        indexes = [
+            models.Index(fields=['-total_adeudado']),
+            models.Index(fields=['-total_vencido']),
+        ]
@@ -0,0 +1,146 @@
+# financiero/recargos.py - Recálculo masivo de recargos por mora
+import logging
+import time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Cuota, calcular_meses_retraso
+from .resumenes import actualizar_resumenes
+from .saldos import actualizar_saldos
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE_RECARGOS = 1000
+CENTAVOS = Decimal('0.01')
+
+
+def recalcular_recargos(fecha_corte=None, edificio=None, cuotas=None, dry_run=False,
+                        batch_size=TAMANO_LOTE_RECARGOS, reiniciar_sin_mora=False):
+    """
+    Recalcula en bloque el recargo de las cuotas vencidas y no pagadas.
+
+    Las cuotas se leen por lotes con values_list (id, monto, recargo, monto pagado,
+    vencimiento y porcentaje del concepto), el recargo y el saldo pendiente se
+    calculan en memoria con la misma fórmula que Cuota.calcular_recargo() y solo
+    las filas que cambian se escriben con bulk_update, en una transacción corta
+    por lote.
+
+    - fecha_corte: fecha a la que se calcula la mora (hoy por defecto)
+    - edificio: limita el proceso a las viviendas de un edificio
+    - cuotas: QuerySet base opcional (por ejemplo, una selección del admin)
+    - dry_run: no escribe nada y devuelve la lista de cambios
+    - reiniciar_sin_mora: además deja en cero el recargo de las cuotas no pagadas
+      que ya no están vencidas o cuyo concepto no aplica recargo, como hacía
+      Cuota.actualizar_recargo() con cada cuota de la selección
+
+    Devuelve un diccionario con las cuotas procesadas, actualizadas, reiniciadas,
+    los cambios (solo en dry_run) y el tiempo total.
+    """
+    inicio = time.perf_counter()
+    fecha_corte = fecha_corte or timezone.now().date()
+
+    todas = cuotas if cuotas is not None else Cuota.objects.all()
+    if edificio is not None:
+        todas = todas.filter(vivienda__edificio=edificio)
+    base = todas.filter(
+        fecha_vencimiento__lt=fecha_corte,
+        pagada=False,
+        concepto__aplica_recargo=True,
+    ).order_by('id')
+
+    procesadas = 0
+    actualizadas = 0
+    reiniciadas = 0
+    cambios = []
+    ultimo_id = 0
+
+    while True:
+        # Paginación por clave para no mantener un cursor abierto entre lotes
+        lote = list(
+            base.filter(id__gt=ultimo_id).values_list(
+                'id', 'monto', 'recargo', 'monto_pagado', 'fecha_vencimiento', 'concepto__porcentaje_recargo',
+                'vivienda_id', 'fecha_emision'
+            )[:batch_size]
+        )
+        if not lote:
+            break
+        ultimo_id = lote[-1][0]
+        procesadas += len(lote)
+
+        modificadas = []
+        claves_resumen = set()
+        for (cuota_id, monto, recargo_actual, monto_pagado, fecha_vencimiento, porcentaje,
+             vivienda_id, fecha_emision) in lote:
+            meses_retraso = calcular_meses_retraso(fecha_vencimiento, fecha_corte)
+            recargo = (monto * Decimal(porcentaje) / 100 * meses_retraso).quantize(CENTAVOS)
+            if recargo != recargo_actual:
+                saldo = max(monto + recargo - monto_pagado, Decimal('0'))
+                modificadas.append(Cuota(id=cuota_id, recargo=recargo, saldo_pendiente=saldo))
+                claves_resumen.add((vivienda_id, fecha_emision))
+                if dry_run:
+                    cambios.append({
+                        'cuota_id': cuota_id,
+                        'recargo_anterior': recargo_actual,
+                        'recargo_nuevo': recargo,
+                    })
+
+        actualizadas += len(modificadas)
+        if modificadas and not dry_run:
+            _guardar_lote(modificadas, claves_resumen)
+
+    if reiniciar_sin_mora:
+        sin_mora = todas.filter(pagada=False).filter(
+            Q(fecha_vencimiento__gte=fecha_corte) | Q(concepto__aplica_recargo=False)
+        ).exclude(recargo=0).order_by('id')
+        ultimo_id = 0
+        while True:
+            lote = list(
+                sin_mora.filter(id__gt=ultimo_id).values_list(
+                    'id', 'monto', 'recargo', 'monto_pagado', 'vivienda_id', 'fecha_emision'
+                )[:batch_size]
+            )
+            if not lote:
+                break
+            ultimo_id = lote[-1][0]
+
+            modificadas = []
+            claves_resumen = set()
+            for cuota_id, monto, recargo_actual, monto_pagado, vivienda_id, fecha_emision in lote:
+                saldo = max(monto - monto_pagado, Decimal('0'))
+                modificadas.append(Cuota(id=cuota_id, recargo=Decimal('0'), saldo_pendiente=saldo))
+                claves_resumen.add((vivienda_id, fecha_emision))
+                if dry_run:
+                    cambios.append({
+                        'cuota_id': cuota_id,
+                        'recargo_anterior': recargo_actual,
+                        'recargo_nuevo': Decimal('0.00'),
+                    })
+
+            reiniciadas += len(modificadas)
+            if not dry_run:
+                _guardar_lote(modificadas, claves_resumen)
+
+    resultado = {
+        'procesadas': procesadas,
+        'actualizadas': actualizadas,
+        'reiniciadas': reiniciadas,
+        'cambios': cambios,
+        'tiempo': round(time.perf_counter() - inicio, 4),
+    }
+    logger.info(
+        f"Recargos al {fecha_corte}{' (simulación)' if dry_run else ''}: "
+        f"{actualizadas} de {procesadas} cuotas actualizadas, {reiniciadas} reiniciadas "
+        f"en {resultado['tiempo']}s"
+    )
+    return resultado
+
+
+def _guardar_lote(modificadas, claves_resumen):
+    with transaction.atomic():
+        Cuota.objects.bulk_update(modificadas, ['recargo', 'saldo_pendiente'])
+        # bulk_update no dispara señales: actualizar resúmenes y saldos afectados
+        actualizar_resumenes(claves_resumen)
+        actualizar_saldos(vivienda_id for vivienda_id, _ in claves_resumen)
@@ -0,0 +1,168 @@
+# financiero/resumenes.py - Resúmenes financieros mensuales precalculados
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import Cuota, Gasto, Pago, ResumenMensual
+
+logger = logging.getLogger(__name__)
+
+CERO = Decimal('0')
+
+
+def inicio_de_mes(fecha):
+    """Devuelve el primer día del mes de una fecha"""
+    if isinstance(fecha, datetime):
+        fecha = timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date()
+    return fecha.replace(day=1)
+
+
+def inicio_mes_siguiente(fecha):
+    """Devuelve el primer día del mes siguiente, usado como límite exclusivo"""
+    if fecha.month == 12:
+        return date(fecha.year + 1, 1, 1)
+    return date(fecha.year, fecha.month + 1, 1)
+
+
+def reconstruir_resumenes(desde, hasta, edificio=None, viviendas=None, incluir_gastos=None):
+    """
+    Recalcula los resúmenes mensuales entre dos fechas (meses completos).
+
+    Los totales se obtienen con una consulta agrupada por vivienda y mes para
+    pagos, otra para cuotas y otra para gastos; las filas del rango se
+    reemplazan en una sola transacción.
+
+    - edificio: limita la reconstrucción a las viviendas de un edificio
+    - viviendas: lista de IDs de vivienda a recalcular
+    - incluir_gastos: recalcular las filas de gastos del condominio. Por defecto
+      solo cuando no se limita por edificio ni por vivienda.
+
+    Devuelve la cantidad de filas de resumen escritas.
+    """
+    desde = inicio_de_mes(desde)
+    limite = inicio_mes_siguiente(hasta)
+    if incluir_gastos is None:
+        incluir_gastos = edificio is None and viviendas is None
+
+    ambito = Q()
+    if edificio is not None:
+        ambito &= Q(vivienda__edificio=edificio)
+    if viviendas is not None:
+        ambito &= Q(vivienda_id__in=viviendas)
+
+    filas = {}
+
+    def fila(vivienda_id, edificio_id, mes):
+        clave = (vivienda_id, mes)
+        if clave not in filas:
+            filas[clave] = ResumenMensual(vivienda_id=vivienda_id, edificio_id=edificio_id, mes=mes)
+        return filas[clave]
+
+    # Ingresos verificados por vivienda y mes
+    pagos = Pago.objects.filter(
+        ambito,
+        estado='VERIFICADO',
+        fecha_pago__gte=desde,
+        fecha_pago__lt=limite,
+    ).annotate(mes=TruncMonth('fecha_pago')).order_by().values(
+        'vivienda_id', 'vivienda__edificio_id', 'mes'
+    ).annotate(total=Sum('monto'))
+    for registro in pagos:
+        fila(registro['vivienda_id'], registro['vivienda__edificio_id'], registro['mes']).ingresos = registro['total']
+
+    # Cuotas emitidas, recargos y saldo pendiente por vivienda y mes de emisión
+    cuotas = Cuota.objects.filter(
+        ambito,
+        fecha_emision__gte=desde,
+        fecha_emision__lt=limite,
+    ).annotate(mes=TruncMonth('fecha_emision')).order_by().values(
+        'vivienda_id', 'vivienda__edificio_id', 'mes'
+    ).annotate(
+        emitidas=Count('id'),
+        total_monto=Sum('monto'),
+        total_recargo=Sum('recargo'),
+        pendientes=Count('id', filter=Q(pagada=False)),
+        saldo=Coalesce(Sum('saldo_pendiente'), CERO, output_field=DecimalField()),
+    )
+    for registro in cuotas:
+        resumen = fila(registro['vivienda_id'], registro['vivienda__edificio_id'], registro['mes'])
+        resumen.cuotas_emitidas = registro['emitidas']
+        resumen.monto_cuotas = registro['total_monto']
+        resumen.recargos = registro['total_recargo']
+        resumen.cuotas_pendientes = registro['pendientes']
+        resumen.saldo_pendiente = registro['saldo']
+
+    # Gastos pagados del condominio (no están asociados a vivienda ni edificio)
+    if incluir_gastos:
+        gastos = Gasto.objects.filter(
+            estado='PAGADO',
+            fecha__gte=desde,
+            fecha__lt=limite,
+        ).annotate(mes=TruncMonth('fecha')).order_by().values('mes').annotate(total=Sum('monto'))
+        for registro in gastos:
+            fila(None, None, registro['mes']).gastos = registro['total']
+
+    anteriores = ResumenMensual.objects.filter(mes__gte=desde, mes__lt=limite)
+    if edificio is not None or viviendas is not None:
+        ambito_resumen = Q(vivienda__isnull=False)
+        if edificio is not None:
+            ambito_resumen &= Q(vivienda__edificio=edificio)
+        if viviendas is not None:
+            ambito_resumen &= Q(vivienda_id__in=viviendas)
+        if incluir_gastos:
+            ambito_resumen |= Q(vivienda__isnull=True)
+        anteriores = anteriores.filter(ambito_resumen)
+    elif not incluir_gastos:
+        anteriores = anteriores.filter(vivienda__isnull=False)
+
+    with transaction.atomic():
+        anteriores.delete()
+        ResumenMensual.objects.bulk_create(filas.values())
+
+    return len(filas)
+
+
+def actualizar_resumen_vivienda(vivienda_id, fecha):
+    """Recalcula el resumen de una vivienda en el mes de la fecha indicada"""
+    if vivienda_id and fecha:
+        reconstruir_resumenes(fecha, fecha, viviendas=[vivienda_id], incluir_gastos=False)
+
+
+def actualizar_resumen_gastos(fecha):
+    """Recalcula la fila de gastos del condominio en el mes de la fecha indicada"""
+    if fecha:
+        reconstruir_resumenes(fecha, fecha, viviendas=[], incluir_gastos=True)
+
+
+def actualizar_resumenes(claves):
+    """
+    Recalcula los resúmenes de un conjunto de pares (vivienda_id, fecha).
+    Pensado para los procesos masivos que escriben con bulk_create/bulk_update
+    y, por lo tanto, no disparan las señales.
+    """
+    por_mes = {}
+    for vivienda_id, fecha in claves:
+        por_mes.setdefault(inicio_de_mes(fecha), set()).add(vivienda_id)
+    for mes, vivienda_ids in por_mes.items():
+        reconstruir_resumenes(mes, mes, viviendas=list(vivienda_ids), incluir_gastos=False)
+
+
+def filtrar_resumenes(edificio_id=None, vivienda_id=None, incluir_gastos=True):
+    """
+    QuerySet de resúmenes para un ámbito: una vivienda, un edificio o todo el
+    condominio. Las filas de gastos del condominio se incluyen si se pide.
+    """
+    if vivienda_id:
+        ambito = Q(vivienda_id=vivienda_id)
+    elif edificio_id:
+        ambito = Q(edificio_id=edificio_id)
+    else:
+        ambito = Q(vivienda__isnull=False)
+    if incluir_gastos:
+        ambito |= Q(vivienda__isnull=True)
+    return ResumenMensual.objects.filter(ambito)
@@ -0,0 +1,238 @@
+# financiero/saldos.py - Saldo de cuenta corriente por vivienda
+import logging
+import time
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from viviendas.models import Vivienda
+from .models import Cuota, Pago, PagoCuota, SaldoVivienda
+
+logger = logging.getLogger(__name__)
+
+CERO = Decimal('0')
+TAMANO_LOTE_SALDOS = 1000
+
+# Campos que se sobrescriben al actualizar un saldo existente
+CAMPOS_SALDO = [
+    'saldo', 'total_adeudado', 'total_vencido', 'cuotas_pendientes', 'cuotas_vencidas',
+    'ultimo_pago', 'fecha_corte', 'fecha_actualizacion',
+]
+
+
+def _ambito(prefijo='', vivienda_ids=None, edificio=None):
+    """Filtro por viviendas o edificio sobre un modelo relacionado con Vivienda"""
+    ambito = Q()
+    if vivienda_ids is not None:
+        ambito &= Q(**{f'{prefijo}vivienda_id__in': vivienda_ids})
+    if edificio is not None:
+        ambito &= Q(**{f'{prefijo}vivienda__edificio': edificio})
+    return ambito
+
+
+def calcular_saldos(vivienda_ids=None, edificio=None, fecha_corte=None):
+    """
+    Calcula el saldo de las viviendas indicadas desde las tablas de cuotas,
+    pagos y detalles, con una consulta agrupada por vivienda para cada una.
+
+    El total adeudado es la suma del saldo pendiente de las cuotas; el saldo
+    descuenta además los pagos verificados que aún no se asignaron a cuotas.
+
+    Devuelve un diccionario {vivienda_id: SaldoVivienda} sin guardar. Las
+    viviendas indicadas sin movimientos aparecen con saldo cero.
+    """
+    fecha_corte = fecha_corte or timezone.now().date()
+    saldos = {}
+
+    def saldo(vivienda_id):
+        if vivienda_id not in saldos:
+            saldos[vivienda_id] = SaldoVivienda(vivienda_id=vivienda_id, fecha_corte=fecha_corte)
+        return saldos[vivienda_id]
+
+    for vivienda_id in vivienda_ids or []:
+        saldo(vivienda_id)
+
+    vencida = Q(fecha_vencimiento__lt=fecha_corte)
+    cuotas = Cuota.objects.filter(
+        _ambito('', vivienda_ids, edificio),
+        pagada=False,
+    ).order_by().values('vivienda_id').annotate(
+        adeudado=Sum('saldo_pendiente'),
+        vencido=Coalesce(Sum('saldo_pendiente', filter=vencida), CERO, output_field=DecimalField()),
+        pendientes=Count('id'),
+        vencidas=Count('id', filter=vencida),
+    )
+    for registro in cuotas:
+        actual = saldo(registro['vivienda_id'])
+        actual.total_adeudado = registro['adeudado']
+        actual.total_vencido = registro['vencido']
+        actual.cuotas_pendientes = registro['pendientes']
+        actual.cuotas_vencidas = registro['vencidas']
+
+    # Crédito a favor: pagos verificados menos lo ya asignado a cuotas
+    credito = {}
+    pagos = Pago.objects.filter(
+        _ambito('', vivienda_ids, edificio),
+        estado='VERIFICADO',
+    ).order_by().values('vivienda_id').annotate(total=Sum('monto'), ultimo=Max('fecha_pago'))
+    for registro in pagos:
+        saldo(registro['vivienda_id']).ultimo_pago = registro['ultimo']
+        credito[registro['vivienda_id']] = registro['total']
+
+    aplicado = PagoCuota.objects.filter(
+        _ambito('pago__', vivienda_ids, edificio),
+        pago__estado='VERIFICADO',
+    ).order_by().values('pago__vivienda_id').annotate(total=Sum('monto_aplicado'))
+    for registro in aplicado:
+        vivienda_id = registro['pago__vivienda_id']
+        credito[vivienda_id] = credito.get(vivienda_id, CERO) - registro['total']
+
+    for vivienda_id, actual in saldos.items():
+        actual.saldo = Decimal(actual.total_adeudado) - credito.get(vivienda_id, CERO)
+
+    return saldos
+
+
+def guardar_saldos(saldos):
+    """Inserta o actualiza los saldos en una sola sentencia"""
+    saldos = list(saldos)
+    if saldos:
+        SaldoVivienda.objects.bulk_create(
+            saldos,
+            update_conflicts=True,
+            unique_fields=['vivienda'],
+            update_fields=CAMPOS_SALDO,
+        )
+    return len(saldos)
+
+
+def actualizar_saldos(vivienda_ids, fecha_corte=None, batch_size=TAMANO_LOTE_SALDOS):
+    """
+    Recalcula y guarda por lotes el saldo de un conjunto de viviendas. Lo usan
+    las señales y los procesos masivos que escriben con bulk_create/bulk_update.
+    """
+    vivienda_ids = sorted({vivienda_id for vivienda_id in vivienda_ids if vivienda_id})
+    guardados = 0
+    for desde in range(0, len(vivienda_ids), batch_size):
+        lote = vivienda_ids[desde:desde + batch_size]
+        guardados += guardar_saldos(calcular_saldos(lote, fecha_corte=fecha_corte).values())
+    return guardados
+
+
+def obtener_saldo(vivienda_id):
+    """
+    Saldo de una vivienda por clave primaria. Solo se recalcula si todavía no
+    existe o si lo vencido se calculó un día anterior.
+    """
+    hoy = timezone.now().date()
+    saldo = SaldoVivienda.objects.filter(pk=vivienda_id, fecha_corte__gte=hoy).first()
+    if saldo is not None:
+        return saldo
+
+    if not Vivienda.objects.filter(pk=vivienda_id).exists():
+        return SaldoVivienda(vivienda_id=vivienda_id, fecha_corte=hoy)
+    saldo = calcular_saldos([vivienda_id], fecha_corte=hoy)[vivienda_id]
+    guardar_saldos([saldo])
+    return saldo
+
+
+def refrescar_saldos_vencidos(edificio_id=None, fecha_corte=None, batch_size=TAMANO_LOTE_SALDOS):
+    """
+    Recalcula los saldos de las viviendas cuya parte vencida se calculó antes
+    de la fecha de corte (o que aún no tienen saldo). Tras el proceso diario
+    de recargos no queda ninguna y la comprobación es una sola consulta.
+    """
+    fecha_corte = fecha_corte or timezone.now().date()
+    viviendas = Vivienda.objects.exclude(saldo__fecha_corte__gte=fecha_corte)
+    if edificio_id:
+        viviendas = viviendas.filter(edificio_id=edificio_id)
+    return actualizar_saldos(viviendas.values_list('id', flat=True), fecha_corte=fecha_corte, batch_size=batch_size)
+
+
+def totales_saldos(edificio_id=None, vivienda_id=None):
+    """
+    Cuotas pendientes y vencidas, total adeudado, total vencido y saldo de
+    una vivienda (por clave primaria), de un edificio o de todo el condominio
+    """
+    if vivienda_id:
+        saldo = obtener_saldo(vivienda_id)
+        return {
+            'cuotas_pendientes': saldo.cuotas_pendientes,
+            'cuotas_vencidas': saldo.cuotas_vencidas,
+            'total_adeudado': saldo.total_adeudado,
+            'total_vencido': saldo.total_vencido,
+            'saldo': saldo.saldo,
+        }
+
+    refrescar_saldos_vencidos(edificio_id)
+    saldos = SaldoVivienda.objects.all()
+    if edificio_id:
+        saldos = saldos.filter(vivienda__edificio_id=edificio_id)
+    return saldos.aggregate(
+        cuotas_pendientes=Coalesce(Sum('cuotas_pendientes'), 0),
+        cuotas_vencidas=Coalesce(Sum('cuotas_vencidas'), 0),
+        total_adeudado=Coalesce(Sum('total_adeudado'), CERO, output_field=DecimalField()),
+        total_vencido=Coalesce(Sum('total_vencido'), CERO, output_field=DecimalField()),
+        saldo=Coalesce(Sum('saldo'), CERO, output_field=DecimalField()),
+    )
+
+
+def reconstruir_saldos(edificio=None, fecha_corte=None, batch_size=TAMANO_LOTE_SALDOS):
+    """
+    Recalcula el saldo de todas las viviendas (o las de un edificio) por lotes.
+    Devuelve la cantidad de viviendas y el tiempo total.
+    """
+    inicio = time.perf_counter()
+    viviendas = Vivienda.objects.all()
+    if edificio is not None:
+        viviendas = viviendas.filter(edificio=edificio)
+    total = actualizar_saldos(viviendas.values_list('id', flat=True), fecha_corte=fecha_corte, batch_size=batch_size)
+
+    resultado = {'viviendas': total, 'tiempo': round(time.perf_counter() - inicio, 4)}
+    logger.info(f"Saldos reconstruidos para {resultado['viviendas']} viviendas en {resultado['tiempo']}s")
+    return resultado
+
+
+def verificar_saldos(edificio=None, batch_size=TAMANO_LOTE_SALDOS):
+    """
+    Compara los saldos guardados con los calculados desde las tablas de
+    cuotas y pagos. Lo vencido solo se compara si se calculó hoy.
+
+    Devuelve una lista de diferencias con vivienda, campo, valor guardado y
+    valor calculado; un saldo inexistente se informa con el campo 'registro'.
+    """
+    hoy = timezone.now().date()
+    viviendas = Vivienda.objects.all()
+    if edificio is not None:
+        viviendas = viviendas.filter(edificio=edificio)
+    vivienda_ids = list(viviendas.order_by('id').values_list('id', flat=True))
+
+    diferencias = []
+    for desde in range(0, len(vivienda_ids), batch_size):
+        lote = vivienda_ids[desde:desde + batch_size]
+        calculados = calcular_saldos(lote, fecha_corte=hoy)
+        guardados = SaldoVivienda.objects.in_bulk(lote)
+        for vivienda_id in lote:
+            guardado = guardados.get(vivienda_id)
+            if guardado is None:
+                diferencias.append({'vivienda_id': vivienda_id, 'campo': 'registro', 'guardado': None, 'calculado': None})
+                continue
+            campos = ['saldo', 'total_adeudado', 'cuotas_pendientes', 'ultimo_pago']
+            if guardado.fecha_corte >= hoy:
+                campos += ['total_vencido', 'cuotas_vencidas']
+            for campo in campos:
+                valor_guardado = getattr(guardado, campo)
+                valor_calculado = getattr(calculados[vivienda_id], campo)
+                if valor_guardado != valor_calculado:
+                    diferencias.append({
+                        'vivienda_id': vivienda_id,
+                        'campo': campo,
+                        'guardado': valor_guardado,
+                        'calculado': valor_calculado,
+                    })
+
+    if diferencias:
+        logger.warning(f"{len(diferencias)} diferencias en los saldos de viviendas")
+    return diferencias
@@ -0,0 +1,142 @@
+# financiero/series.py - Series temporales de ingresos y gastos para gráficos
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek, TruncYear
+
+from .models import Gasto, Pago
+from .resumenes import filtrar_resumenes, inicio_mes_siguiente
+
+CERO = Decimal('0')
+
+GRANULARIDADES = {
+    'dia': TruncDay,
+    'semana': TruncWeek,
+    'mes': TruncMonth,
+    'anio': TruncYear,
+}
+
+FORMATO_ETIQUETAS = {
+    'dia': '%d/%m/%Y',
+    'semana': 'Sem %d/%m/%Y',
+    'mes': '%b %Y',
+    'anio': '%Y',
+}
+
+
+def inicio_periodo(fecha, granularidad):
+    """Trunca una fecha al inicio de su período, igual que Trunc* en la base de datos"""
+    if granularidad == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if granularidad == 'mes':
+        return fecha.replace(day=1)
+    if granularidad == 'anio':
+        return date(fecha.year, 1, 1)
+    return fecha
+
+
+def siguiente_periodo(fecha, granularidad):
+    """Inicio del período siguiente al que empieza en la fecha indicada"""
+    if granularidad == 'semana':
+        return fecha + timedelta(days=7)
+    if granularidad == 'mes':
+        return inicio_mes_siguiente(fecha)
+    if granularidad == 'anio':
+        return date(fecha.year + 1, 1, 1)
+    return fecha + timedelta(days=1)
+
+
+def rango_ultimos_meses(fecha, meses):
+    """Primer día del mes de hace (meses - 1) meses y último día del mes de la fecha"""
+    desde = fecha.replace(day=1)
+    for _ in range(meses - 1):
+        desde = (desde - timedelta(days=1)).replace(day=1)
+    return desde, inicio_mes_siguiente(fecha) - timedelta(days=1)
+
+
+def granularidad_sugerida(desde, hasta):
+    """Granularidad razonable para graficar un rango de fechas"""
+    dias = (hasta - desde).days
+    if dias <= 31:
+        return 'dia'
+    if dias <= 120:
+        return 'semana'
+    if dias <= 3 * 366:
+        return 'mes'
+    return 'anio'
+
+
+def _alineado_a_meses(desde, hasta):
+    """Indica si el rango cubre meses completos y puede leerse de los resúmenes"""
+    return desde.day == 1 and (hasta + timedelta(days=1)).day == 1
+
+
+def _agrupar(queryset, campo_fecha, campo_monto, granularidad):
+    """Suma un campo agrupando por período en una sola consulta"""
+    registros = queryset.annotate(
+        periodo=GRANULARIDADES[granularidad](campo_fecha)
+    ).order_by().values('periodo').annotate(total=Sum(campo_monto))
+    return {registro['periodo']: registro['total'] or CERO for registro in registros}
+
+
+def serie_temporal(desde, hasta, granularidad='mes', edificio_id=None, vivienda_id=None, incluir_gastos=True):
+    """
+    Ingresos verificados, gastos pagados y balance agrupados por día, semana,
+    mes o año entre dos fechas, para una vivienda, un edificio o todo el
+    condominio. La cantidad de consultas no depende de la longitud del rango:
+
+    - mes/año sobre meses completos: una consulta a los resúmenes mensuales
+    - en otro caso: una consulta por métrica sobre pagos y gastos
+
+    Los períodos sin movimientos se completan con ceros. Devuelve una lista
+    ordenada de diccionarios con periodo, etiqueta, ingresos, gastos y balance.
+    """
+    if granularidad not in GRANULARIDADES:
+        raise ValueError(f"Granularidad no soportada: {granularidad}")
+
+    if granularidad in ('mes', 'anio') and _alineado_a_meses(desde, hasta):
+        registros = filtrar_resumenes(edificio_id, vivienda_id, incluir_gastos).filter(
+            mes__gte=desde,
+            mes__lte=hasta,
+        ).annotate(
+            periodo=GRANULARIDADES[granularidad]('mes')
+        ).order_by().values('periodo').annotate(
+            total_ingresos=Sum('ingresos'),
+            total_gastos=Sum('gastos'),
+        )
+        ingresos = {}
+        gastos = {}
+        for registro in registros:
+            ingresos[registro['periodo']] = registro['total_ingresos'] or CERO
+            gastos[registro['periodo']] = registro['total_gastos'] or CERO
+    else:
+        pagos = Pago.objects.filter(estado='VERIFICADO', fecha_pago__gte=desde, fecha_pago__lte=hasta)
+        if vivienda_id:
+            pagos = pagos.filter(vivienda_id=vivienda_id)
+        elif edificio_id:
+            pagos = pagos.filter(vivienda__edificio_id=edificio_id)
+        ingresos = _agrupar(pagos, 'fecha_pago', 'monto', granularidad)
+
+        gastos = {}
+        if incluir_gastos:
+            # Los gastos son del condominio completo: no se filtran por vivienda ni edificio
+            gastos = _agrupar(
+                Gasto.objects.filter(estado='PAGADO', fecha__gte=desde, fecha__lte=hasta),
+                'fecha', 'monto', granularidad
+            )
+
+    serie = []
+    periodo = inicio_periodo(desde, granularidad)
+    while periodo <= hasta:
+        ingreso = ingresos.get(periodo, CERO)
+        gasto = gastos.get(periodo, CERO)
+        serie.append({
+            'periodo': periodo,
+            'etiqueta': periodo.strftime(FORMATO_ETIQUETAS[granularidad]),
+            'ingresos': ingreso,
+            'gastos': gasto,
+            'balance': ingreso - gasto,
+        })
+        periodo = siguiente_periodo(periodo, granularidad)
+    return serie
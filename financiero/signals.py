@@ -1,53 +1,64 @@
 # financiero/signals.py - Señales para manejo automático de cuotas y pagos
 from django.db.models.signals import post_save, post_delete, pre_save
-from django.db import models
+from django.db import models, transaction
 from django.dispatch import receiver
 from django.utils import timezone
 from decimal import Decimal
 import logging
 
-from .models import Pago, PagoCuota, Cuota, EstadoCuenta
+from .models import Pago, PagoCuota, Cuota, EstadoCuenta, Gasto
+from .asignacion import CAMPOS_PAGO_CUOTA, aplicar_detalles_pagos, asignar_pago_a_cuotas
+from .recargos import recalcular_recargos
+from .resumenes import actualizar_resumen_vivienda, actualizar_resumen_gastos, actualizar_resumenes
+from .saldos import actualizar_saldos, verificar_saldos
 from viviendas.models import Residente
 
 logger = logging.getLogger(__name__)
 
+def _registrar_pago_en_cuota(cuota_id, monto):
+    """
+    Suma (o descuenta, si es negativo) un monto pagado a una cuota, bloqueando
+    su fila para que dos pagos simultáneos no pisen el monto pagado
+    """
+    with transaction.atomic():
+        cuota = Cuota.objects.select_for_update().filter(pk=cuota_id).first()
+        if cuota is None:
+            return
+        cuota.registrar_pago(monto)
+        cuota.save(update_fields=CAMPOS_PAGO_CUOTA)
+
+@receiver(pre_save, sender=PagoCuota)
+def recordar_pago_cuota_anterior(sender, instance, **kwargs):
+    """
+    Guardar la cuota y el monto aplicado previos para aplicar solo la diferencia
+    """
+    instance._pago_cuota_anterior = None
+    if instance.pk:
+        instance._pago_cuota_anterior = PagoCuota.objects.filter(pk=instance.pk).values_list(
+            'cuota_id', 'monto_aplicado'
+        ).first()
+
 @receiver(post_save, sender=PagoCuota)
 def actualizar_cuota_al_crear_pago_cuota(sender, instance, created, **kwargs):
     """
-    Cuando se crea o actualiza un PagoCuota, actualiza el estado de la cuota
+    Cuando se crea o actualiza un PagoCuota, actualiza el monto pagado, el
+    saldo y el estado de la cuota
     """
     try:
-        cuota = instance.cuota
-        pago = instance.pago
-        
         # Solo procesar si el pago está verificado
-        if pago.estado != 'VERIFICADO':
+        if instance.pago.estado != 'VERIFICADO':
             return
         
-        # Recalcular si la cuota está completamente pagada
-        total_pagado = PagoCuota.objects.filter(
-            cuota=cuota,
-            pago__estado='VERIFICADO'
-        ).aggregate(
-            total=models.Sum('monto_aplicado')
-        )['total'] or Decimal('0')
-        
-        total_cuota = cuota.total_a_pagar()
+        anterior = getattr(instance, '_pago_cuota_anterior', None)
+        if anterior and anterior[0] != instance.cuota_id:
+            # El detalle cambió de cuota: descontar de la anterior y aplicar completo
+            _registrar_pago_en_cuota(anterior[0], -anterior[1])
+            anterior = None
         
-        if total_pagado >= total_cuota:
-            # Cuota completamente pagada
-            cuota.pagada = True
-            cuota.recargo = Decimal('0')  # Limpiar recargos
-            cuota.save(update_fields=['pagada', 'recargo'])
-            logger.info(f"Cuota {cuota.id} marcada como pagada")
-        else:
-            # Pago parcial - actualizar monto pendiente
-            monto_pendiente = cuota.monto - total_pagado
-            if monto_pendiente > 0:
-                cuota.monto = monto_pendiente
-                cuota.pagada = False
-                cuota.save(update_fields=['monto', 'pagada'])
-                logger.info(f"Cuota {cuota.id} actualizada con pago parcial")
+        diferencia = instance.monto_aplicado - (anterior[1] if anterior else Decimal('0'))
+        if diferencia:
+            _registrar_pago_en_cuota(instance.cuota_id, diferencia)
+            logger.info(f"Cuota {instance.cuota_id}: ${diferencia} aplicado por PagoCuota {instance.id}")
     
     except Exception as e:
         logger.error(f"Error al actualizar cuota en PagoCuota {instance.id}: {e}")
@@ -55,25 +66,15 @@ def actualizar_cuota_al_crear_pago_cuota(sender, instance, created, **kwargs):
 @receiver(post_delete, sender=PagoCuota)
 def revertir_cuota_al_eliminar_pago_cuota(sender, instance, **kwargs):
     """
-    Cuando se elimina un PagoCuota, revierte el estado de la cuota si es necesario
+    Cuando se elimina un PagoCuota, descuenta su monto de la cuota
     """
     try:
-        cuota = instance.cuota
-        pago = instance.pago
-        
         # Solo procesar si el pago estaba verificado
-        if pago.estado != 'VERIFICADO':
+        if instance.pago.estado != 'VERIFICADO':
             return
         
-        # Si la cuota estaba marcada como pagada, revertir
-        if cuota.pagada:
-            cuota.pagada = False
-            
-            # Restaurar el monto original si es necesario
-            # (esto es complejo, por simplicidad recalcular recargos)
-            cuota.actualizar_recargo()
-            cuota.save(update_fields=['pagada', 'recargo'])
-            logger.info(f"Cuota {cuota.id} revertida por eliminación de pago")
+        _registrar_pago_en_cuota(instance.cuota_id, -instance.monto_aplicado)
+        logger.info(f"Cuota {instance.cuota_id} revertida por eliminación de pago")
     
     except Exception as e:
         logger.error(f"Error al revertir cuota en eliminación de PagoCuota: {e}")
@@ -81,17 +82,33 @@ def revertir_cuota_al_eliminar_pago_cuota(sender, instance, **kwargs):
 @receiver(post_save, sender=Pago)
 def procesar_pago_verificado(sender, instance, created, **kwargs):
     """
-    Procesar automáticamente un pago cuando se verifica
+    Procesar automáticamente un pago cuando se verifica o se rechaza
     """
     try:
-        # Solo procesar cuando el pago se marca como verificado
-        if instance.estado == 'VERIFICADO' and not created:
-            # Verificar si ya tiene cuotas asignadas
-            cuotas_asignadas = PagoCuota.objects.filter(pago=instance).exists()
-            
-            if not cuotas_asignadas and instance.monto > 0:
-                # Auto-asignar a cuotas pendientes más antiguas
-                auto_asignar_pago_a_cuotas(instance)
+        if created:
+            return
+        
+        anterior = getattr(instance, '_resumen_anterior', None)
+        estado_anterior = anterior[2] if anterior else None
+        tiene_detalles = PagoCuota.objects.filter(pago=instance).exists()
+        
+        if instance.estado == 'VERIFICADO':
+            if not tiene_detalles:
+                if instance.monto > 0:
+                    # Auto-asignar a cuotas pendientes más antiguas
+                    auto_asignar_pago_a_cuotas(instance)
+            elif estado_anterior != 'VERIFICADO':
+                # Cuotas asignadas a mano: ahora cuentan como pagadas
+                with transaction.atomic():
+                    claves = aplicar_detalles_pagos([instance.pk], signo=1)
+                    actualizar_resumenes(claves)
+                    actualizar_saldos(vivienda_id for vivienda_id, _ in claves)
+        elif estado_anterior == 'VERIFICADO' and tiene_detalles:
+            # Pago rechazado o devuelto a pendiente: descontar lo aplicado
+            with transaction.atomic():
+                claves = aplicar_detalles_pagos([instance.pk], signo=-1)
+                actualizar_resumenes(claves)
+                actualizar_saldos(vivienda_id for vivienda_id, _ in claves)
     
     except Exception as e:
         logger.error(f"Error al procesar pago verificado {instance.id}: {e}")
@@ -101,30 +118,7 @@ def auto_asignar_pago_a_cuotas(pago):
     Asigna automáticamente un pago a las cuotas pendientes más antiguas
     """
     try:
-        # Obtener cuotas pendientes de la vivienda, ordenadas por vencimiento
-        cuotas_pendientes = Cuota.objects.filter(
-            vivienda=pago.vivienda,
-            pagada=False
-        ).order_by('fecha_vencimiento')
-        
-        monto_restante = pago.monto
-        
-        for cuota in cuotas_pendientes:
-            if monto_restante <= Decimal('0'):
-                break
-            
-            total_cuota = cuota.total_a_pagar()
-            monto_aplicado = min(monto_restante, total_cuota)
-            
-            # Crear el PagoCuota
-            PagoCuota.objects.create(
-                pago=pago,
-                cuota=cuota,
-                monto_aplicado=monto_aplicado
-            )
-            
-            monto_restante -= monto_aplicado
-            logger.info(f"Auto-asignado ${monto_aplicado} del pago {pago.id} a cuota {cuota.id}")
+        asignar_pago_a_cuotas(pago)
     
     except Exception as e:
         logger.error(f"Error en auto-asignación de pago {pago.id}: {e}")
@@ -161,6 +155,8 @@ def calcular_recargo_antes_de_guardar(sender, instance, **kwargs):
             if nuevo_recargo != instance.recargo:
                 instance.recargo = nuevo_recargo
                 logger.debug(f"Recargo actualizado para cuota {instance.id}: ${nuevo_recargo}")
+        
+        instance.saldo_pendiente = instance.calcular_saldo()
     
     except Exception as e:
         logger.error(f"Error al calcular recargo para cuota {instance.id}: {e}")
@@ -194,29 +190,112 @@ def generar_pdf_automatico(sender, instance, created, **kwargs):
     except Exception as e:
         logger.error(f"Error al procesar nuevo estado de cuenta {instance.id}: {e}")
 
+# ===== RESÚMENES MENSUALES =====
+
+@receiver(pre_save, sender=Pago)
+@receiver(pre_save, sender=Cuota)
+@receiver(pre_save, sender=Gasto)
+def recordar_mes_anterior(sender, instance, **kwargs):
+    """
+    Guardar la vivienda y la fecha previas para poder recalcular también el
+    resumen del mes anterior si el registro cambia de vivienda o de fecha.
+    En los pagos se guarda además el estado, para detectar verificaciones y rechazos.
+    """
+    instance._resumen_anterior = None
+    if instance.pk:
+        campos = {Pago: ('vivienda_id', 'fecha_pago', 'estado'), Cuota: ('vivienda_id', 'fecha_emision'), Gasto: ('estado', 'fecha')}[sender]
+        instance._resumen_anterior = sender.objects.filter(pk=instance.pk).values_list(*campos).first()
+
+@receiver(post_save, sender=Pago)
+@receiver(post_delete, sender=Pago)
+def actualizar_resumen_por_pago(sender, instance, **kwargs):
+    """
+    Mantener el resumen mensual de la vivienda al crear, modificar o eliminar un pago
+    """
+    try:
+        anterior = getattr(instance, '_resumen_anterior', None)
+        if anterior and anterior[:2] != (instance.vivienda_id, instance.fecha_pago):
+            actualizar_resumen_vivienda(*anterior[:2])
+        actualizar_resumen_vivienda(instance.vivienda_id, instance.fecha_pago)
+    
+    except Exception as e:
+        logger.error(f"Error al actualizar resumen mensual por pago {instance.id}: {e}")
+
+@receiver(post_save, sender=Cuota)
+@receiver(post_delete, sender=Cuota)
+def actualizar_resumen_por_cuota(sender, instance, **kwargs):
+    """
+    Mantener el resumen mensual de la vivienda al crear, modificar o eliminar una cuota
+    """
+    try:
+        anterior = getattr(instance, '_resumen_anterior', None)
+        if anterior and anterior != (instance.vivienda_id, instance.fecha_emision):
+            actualizar_resumen_vivienda(*anterior)
+        actualizar_resumen_vivienda(instance.vivienda_id, instance.fecha_emision)
+    
+    except Exception as e:
+        logger.error(f"Error al actualizar resumen mensual por cuota {instance.id}: {e}")
+
+@receiver(post_save, sender=Gasto)
+@receiver(post_delete, sender=Gasto)
+def actualizar_resumen_por_gasto(sender, instance, **kwargs):
+    """
+    Mantener la fila de gastos del condominio al pagar, modificar o eliminar un gasto
+    """
+    try:
+        anterior = getattr(instance, '_resumen_anterior', None)
+        if anterior and anterior[1] != instance.fecha:
+            actualizar_resumen_gastos(anterior[1])
+        # Solo los gastos pagados cuentan; los demás cambios no afectan al resumen
+        if instance.estado == 'PAGADO' or (anterior and anterior[0] == 'PAGADO'):
+            actualizar_resumen_gastos(instance.fecha)
+    
+    except Exception as e:
+        logger.error(f"Error al actualizar resumen mensual por gasto {instance.id}: {e}")
+
+# ===== SALDOS POR VIVIENDA =====
+
+@receiver(post_save, sender=Pago)
+@receiver(post_delete, sender=Pago)
+@receiver(post_save, sender=Cuota)
+@receiver(post_delete, sender=Cuota)
+def actualizar_saldo_por_movimiento(sender, instance, **kwargs):
+    """
+    Mantener el saldo de la vivienda (y el de la anterior, si cambió) al
+    crear, modificar o eliminar una cuota o un pago
+    """
+    try:
+        anterior = getattr(instance, '_resumen_anterior', None)
+        with transaction.atomic():
+            actualizar_saldos([instance.vivienda_id, anterior[0] if anterior else None])
+    
+    except Exception as e:
+        logger.error(f"Error al actualizar saldo de vivienda por {sender.__name__} {instance.id}: {e}")
+
+@receiver(post_save, sender=PagoCuota)
+@receiver(post_delete, sender=PagoCuota)
+def actualizar_saldo_por_detalle(sender, instance, **kwargs):
+    """
+    Mantener el saldo de la vivienda cuando cambia la parte asignada de un pago verificado
+    """
+    try:
+        if instance.pago.estado == 'VERIFICADO':
+            with transaction.atomic():
+                actualizar_saldos([instance.pago.vivienda_id])
+    
+    except Exception as e:
+        logger.error(f"Error al actualizar saldo de vivienda por PagoCuota {instance.id}: {e}")
+
 # ===== FUNCIONES HELPER PARA PROCESAMIENTO =====
 
-def procesar_cuotas_vencidas():
+def procesar_cuotas_vencidas(fecha_corte=None, edificio=None):
     """
     Función para procesar cuotas vencidas y aplicar recargos
     Puede ser llamada por un cron job o task scheduler
     """
     try:
-        hoy = timezone.now().date()
-        cuotas_vencidas = Cuota.objects.filter(
-            fecha_vencimiento__lt=hoy,
-            pagada=False,
-            concepto__aplica_recargo=True
-        )
-        
-        contador = 0
-        for cuota in cuotas_vencidas:
-            recargo_anterior = cuota.recargo
-            cuota.actualizar_recargo()
-            
-            if cuota.recargo != recargo_anterior:
-                contador += 1
-                logger.info(f"Recargo actualizado para cuota {cuota.id}: ${cuota.recargo}")
+        resultado = recalcular_recargos(fecha_corte=fecha_corte, edificio=edificio)
+        contador = resultado['actualizadas']
         
         logger.info(f"Procesadas {contador} cuotas vencidas con recargos actualizados")
         return contador
@@ -284,6 +363,12 @@ def validar_integridad_financiera():
         if cuotas_pagadas_sin_pagos > 0:
             errores.append(f"{cuotas_pagadas_sin_pagos} cuotas marcadas como pagadas sin pagos verificados")
         
+        # 5. Verificar saldos por vivienda contra cuotas y pagos
+        diferencias_saldos = verificar_saldos()
+        if diferencias_saldos:
+            viviendas = len({diferencia['vivienda_id'] for diferencia in diferencias_saldos})
+            errores.append(f"{viviendas} viviendas con saldo desactualizado")
+        
         if errores:
             logger.warning(f"Errores de integridad financiera encontrados: {errores}")
         else:
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -7,7 +7,20 @@ from decimal import Decimal
 
 from usuarios.models import Rol
 from viviendas.models import Edificio, Vivienda, Residente
-from .models import ConceptoCuota, Cuota, Pago, PagoCuota, CategoriaGasto, Gasto, EstadoCuenta
+from .models import (
+    ConceptoCuota, Cuota, Pago, PagoCuota, CategoriaGasto, Gasto, EstadoCuenta, ResumenMensual, SaldoVivienda
+)
+from .asignacion import asignar_pago_a_cuotas, verificar_pagos
+from .conciliacion import conciliar_cuotas
+from .estados_cuenta import generar_estados_cuenta_masivos, recalcular_estados_cuenta
+from .estados_cuenta_pdf import (
+    datos_estados_cuenta, dibujar_estado_cuenta, obtener_pdf_estado_cuenta, prerenderizar_estados_cuenta
+)
+from .facturacion import generar_cuotas_masivas
+from .recargos import recalcular_recargos
+from .resumenes import reconstruir_resumenes
+from .saldos import obtener_saldo, reconstruir_saldos, verificar_saldos
+from .series import serie_temporal
 
 class ConceptoCuotaModelTest(TestCase):
     """
@@ -541,4 +554,1141 @@ class EstadoCuentaModelTest(TestCase):
                 vivienda=self.vivienda,
                 fecha_inicio=self.fecha_inicio,
                 fecha_fin=self.fecha_inicio - timedelta(days=1)
-            )
\ No newline at end of file
+            )
+
+class GenerarCuotasMasivasTest(TestCase):
+    """
+    Pruebas para el motor de facturación masiva de cuotas
+    """
+    
+    def setUp(self):
+        self.concepto = ConceptoCuota.objects.create(
+            nombre='Cuota de Mantenimiento',
+            monto_base=Decimal('100.00'),
+            periodicidad='MENSUAL'
+        )
+        
+        self.edificio = Edificio.objects.create(
+            nombre='Edificio Test',
+            direccion='Calle Test 123',
+            pisos=10
+        )
+        
+        self.viviendas = [
+            Vivienda.objects.create(
+                edificio=self.edificio,
+                numero=str(100 + i),
+                piso=1,
+                metros_cuadrados=80
+            )
+            for i in range(3)
+        ]
+        
+        # Una vivienda dada de baja no debe recibir cuotas
+        Vivienda.objects.create(
+            edificio=self.edificio,
+            numero='999',
+            piso=1,
+            metros_cuadrados=80,
+            activo=False
+        )
+        
+        self.fecha_emision = timezone.now().date()
+        self.fecha_vencimiento = self.fecha_emision + timedelta(days=30)
+    
+    def test_genera_cuotas_para_viviendas_activas(self):
+        """Verificar que se crea una cuota por cada vivienda activa"""
+        resultado = generar_cuotas_masivas(
+            self.concepto, Vivienda.objects.all(), self.fecha_emision, self.fecha_vencimiento
+        )
+        
+        self.assertEqual(resultado['creadas'], 3)
+        self.assertEqual(resultado['omitidas'], 0)
+        self.assertIn('total', resultado['tiempos'])
+        self.assertEqual(Cuota.objects.filter(concepto=self.concepto).count(), 3)
+        self.assertFalse(Cuota.objects.exclude(monto=Decimal('100.00')).exists())
+    
+    def test_reejecucion_idempotente(self):
+        """Verificar que volver a generar no duplica cuotas"""
+        Cuota.objects.create(
+            concepto=self.concepto,
+            vivienda=self.viviendas[0],
+            monto=Decimal('100.00'),
+            fecha_emision=self.fecha_emision,
+            fecha_vencimiento=self.fecha_vencimiento
+        )
+        
+        resultado = generar_cuotas_masivas(
+            self.concepto, Vivienda.objects.all(), self.fecha_emision, self.fecha_vencimiento
+        )
+        self.assertEqual(resultado['creadas'], 2)
+        self.assertEqual(resultado['omitidas'], 1)
+        
+        resultado = generar_cuotas_masivas(
+            self.concepto, Vivienda.objects.all(), self.fecha_emision, self.fecha_vencimiento
+        )
+        self.assertEqual(resultado['creadas'], 0)
+        self.assertEqual(resultado['omitidas'], 3)
+        self.assertEqual(Cuota.objects.count(), 3)
+    
+    def test_consultas_constantes(self):
+        """Verificar que la cantidad de consultas no depende del número de viviendas"""
+        ids = [v.id for v in self.viviendas]
+        # Viviendas activas + claves existentes + inserción + recuento (+ savepoint)
+        # y la reconstrucción del resumen mensual del lote (+ savepoint)
+        # y los saldos de las viviendas (tres agregados + inserción)
+        with self.assertNumQueries(16):
+            generar_cuotas_masivas(
+                self.concepto, ids, self.fecha_emision, self.fecha_vencimiento, monto=Decimal('80.00')
+            )
+        self.assertEqual(Cuota.objects.filter(monto=Decimal('80.00')).count(), 3)
+    
+    def test_fecha_vencimiento_invalida(self):
+        """Verificar que se rechaza un vencimiento anterior a la emisión"""
+        from django.core.exceptions import ValidationError
+        
+        with self.assertRaises(ValidationError):
+            generar_cuotas_masivas(
+                self.concepto, Vivienda.objects.all(),
+                self.fecha_emision, self.fecha_emision - timedelta(days=1)
+            )
+
+
+class RecalcularRecargosTest(TestCase):
+    """
+    Pruebas para el recálculo masivo de recargos
+    """
+    
+    def setUp(self):
+        self.concepto = ConceptoCuota.objects.create(
+            nombre='Cuota de Mantenimiento',
+            monto_base=Decimal('100.00'),
+            periodicidad='MENSUAL',
+            aplica_recargo=True,
+            porcentaje_recargo=Decimal('2.00')
+        )
+        
+        self.edificio = Edificio.objects.create(
+            nombre='Edificio Test',
+            direccion='Calle Test 123',
+            pisos=10
+        )
+        self.otro_edificio = Edificio.objects.create(
+            nombre='Edificio Norte',
+            direccion='Calle Norte 456',
+            pisos=5
+        )
+        
+        self.cuotas = []
+        for edificio in (self.edificio, self.otro_edificio):
+            vivienda = Vivienda.objects.create(
+                edificio=edificio,
+                numero='101',
+                piso=1,
+                metros_cuadrados=80
+            )
+            self.cuotas.append(Cuota.objects.create(
+                concepto=self.concepto,
+                vivienda=vivienda,
+                monto=Decimal('100.00'),
+                fecha_emision=date(2024, 1, 1),
+                fecha_vencimiento=date(2024, 1, 15)
+            ))
+        
+        # Partir de recargos desactualizados
+        Cuota.objects.update(recargo=Decimal('0.00'))
+        self.fecha_corte = date(2024, 4, 20)
+    
+    def test_actualiza_recargos_vencidos(self):
+        """Verificar que el recargo se calcula por meses de retraso a la fecha de corte"""
+        resultado = recalcular_recargos(fecha_corte=self.fecha_corte)
+        
+        self.assertEqual(resultado['procesadas'], 2)
+        self.assertEqual(resultado['actualizadas'], 2)
+        # 3 meses de retraso al 2% sobre 100
+        self.assertFalse(Cuota.objects.exclude(recargo=Decimal('6.00')).exists())
+        
+        # Una segunda pasada no tiene nada que escribir
+        self.assertEqual(recalcular_recargos(fecha_corte=self.fecha_corte)['actualizadas'], 0)
+    
+    def test_dry_run_no_guarda_cambios(self):
+        """Verificar que la simulación devuelve el diff sin modificar las cuotas"""
+        resultado = recalcular_recargos(fecha_corte=self.fecha_corte, dry_run=True)
+        
+        self.assertEqual(len(resultado['cambios']), 2)
+        self.assertEqual(resultado['cambios'][0]['recargo_anterior'], Decimal('0.00'))
+        self.assertEqual(resultado['cambios'][0]['recargo_nuevo'], Decimal('6.00'))
+        self.assertFalse(Cuota.objects.exclude(recargo=Decimal('0.00')).exists())
+    
+    def test_particion_por_edificio(self):
+        """Verificar que solo se procesan las cuotas del edificio indicado"""
+        resultado = recalcular_recargos(fecha_corte=self.fecha_corte, edificio=self.edificio)
+        
+        self.assertEqual(resultado['actualizadas'], 1)
+        self.cuotas[0].refresh_from_db()
+        self.cuotas[1].refresh_from_db()
+        self.assertEqual(self.cuotas[0].recargo, Decimal('6.00'))
+        self.assertEqual(self.cuotas[1].recargo, Decimal('0.00'))
+    
+    def test_omite_cuotas_pagadas(self):
+        """Verificar que las cuotas pagadas no reciben recargo"""
+        Cuota.objects.filter(pk=self.cuotas[0].pk).update(pagada=True)
+        
+        resultado = recalcular_recargos(fecha_corte=self.fecha_corte, batch_size=1)
+        
+        self.assertEqual(resultado['procesadas'], 1)
+        self.cuotas[0].refresh_from_db()
+        self.assertEqual(self.cuotas[0].recargo, Decimal('0.00'))
+
+    def test_reinicia_recargo_de_cuotas_sin_mora(self):
+        """Verificar que la selección sin mora vuelve a recargo cero solo si se pide"""
+        Cuota.objects.filter(pk=self.cuotas[0].pk).update(
+            recargo=Decimal('6.00'), fecha_vencimiento=date(2024, 5, 1)
+        )
+        seleccion = Cuota.objects.filter(pk=self.cuotas[0].pk)
+
+        resultado = recalcular_recargos(fecha_corte=self.fecha_corte, cuotas=seleccion)
+        self.assertEqual(resultado['reiniciadas'], 0)
+
+        resultado = recalcular_recargos(
+            fecha_corte=self.fecha_corte, cuotas=seleccion, reiniciar_sin_mora=True
+        )
+
+        self.assertEqual(resultado['procesadas'], 0)
+        self.assertEqual(resultado['reiniciadas'], 1)
+        self.cuotas[0].refresh_from_db()
+        self.assertEqual(self.cuotas[0].recargo, Decimal('0.00'))
+        self.assertEqual(self.cuotas[0].saldo_pendiente, Decimal('100.00'))
+
+
+class ResumenMensualTest(TestCase):
+    """
+    Pruebas para los resúmenes financieros mensuales
+    """
+    
+    def setUp(self):
+        self.rol_admin = Rol.objects.create(nombre='Administrador')
+        
+        User = get_user_model()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword',
+            rol=self.rol_admin
+        )
+        
+        self.concepto = ConceptoCuota.objects.create(
+            nombre='Cuota de Mantenimiento',
+            monto_base=Decimal('100.00'),
+            periodicidad='MENSUAL'
+        )
+        self.categoria = CategoriaGasto.objects.create(nombre='Mantenimiento')
+        
+        self.edificio = Edificio.objects.create(
+            nombre='Edificio Test',
+            direccion='Calle Test 123',
+            pisos=10
+        )
+        self.vivienda = Vivienda.objects.create(
+            edificio=self.edificio,
+            numero='101',
+            piso=1,
+            metros_cuadrados=80
+        )
+        
+        self.hoy = timezone.now().date()
+        self.cuota = Cuota.objects.create(
+            concepto=self.concepto,
+            vivienda=self.vivienda,
+            monto=Decimal('100.00'),
+            fecha_emision=self.hoy,
+            fecha_vencimiento=self.hoy + timedelta(days=30)
+        )
+        self.pago = Pago.objects.create(
+            vivienda=self.vivienda,
+            monto=Decimal('80.00'),
+            fecha_pago=self.hoy,
+            metodo_pago='EFECTIVO',
+            estado='VERIFICADO',
+            registrado_por=self.admin_user
+        )
+        Gasto.objects.create(
+            categoria=self.categoria,
+            concepto='Limpieza',
+            monto=Decimal('30.00'),
+            fecha=self.hoy,
+            estado='PAGADO',
+            registrado_por=self.admin_user
+        )
+    
+    def _resumenes(self):
+        return sorted(
+            ResumenMensual.objects.values_list(
+                'vivienda_id', 'mes', 'ingresos', 'gastos', 'cuotas_emitidas',
+                'monto_cuotas', 'cuotas_pendientes', 'saldo_pendiente'
+            ),
+            key=lambda fila: (fila[0] or 0, fila[1])
+        )
+    
+    def test_senales_mantienen_resumen(self):
+        """Verificar que pagos, cuotas y gastos actualizan el resumen del mes"""
+        mes = self.hoy.replace(day=1)
+        resumen = ResumenMensual.objects.get(vivienda=self.vivienda, mes=mes)
+        self.assertEqual(resumen.edificio, self.edificio)
+        self.assertEqual(resumen.ingresos, Decimal('80.00'))
+        self.assertEqual(resumen.cuotas_emitidas, 1)
+        self.assertEqual(resumen.saldo_pendiente, Decimal('100.00'))
+        
+        gastos = ResumenMensual.objects.get(vivienda__isnull=True, mes=mes)
+        self.assertEqual(gastos.gastos, Decimal('30.00'))
+        
+        # Rechazar el pago lo saca de los ingresos
+        self.pago.estado = 'RECHAZADO'
+        self.pago.save()
+        resumen = ResumenMensual.objects.get(vivienda=self.vivienda, mes=mes)
+        self.assertEqual(resumen.ingresos, Decimal('0.00'))
+    
+    def test_cambio_de_mes_actualiza_ambos_resumenes(self):
+        """Verificar que mover un pago de mes recalcula el mes anterior y el nuevo"""
+        mes_anterior = (self.hoy.replace(day=1) - timedelta(days=1)).replace(day=1)
+        self.pago.fecha_pago = mes_anterior
+        self.pago.save()
+        
+        self.assertEqual(
+            ResumenMensual.objects.get(vivienda=self.vivienda, mes=mes_anterior).ingresos,
+            Decimal('80.00')
+        )
+        self.assertEqual(
+            ResumenMensual.objects.get(vivienda=self.vivienda, mes=self.hoy.replace(day=1)).ingresos,
+            Decimal('0.00')
+        )
+    
+    def test_reconstruccion_coincide_con_incremental(self):
+        """Verificar que la reconstrucción completa produce los mismos resúmenes"""
+        incremental = self._resumenes()
+        ResumenMensual.objects.all().delete()
+        
+        reconstruir_resumenes(self.hoy, self.hoy)
+        
+        self.assertEqual(self._resumenes(), incremental)
+    
+    def test_api_resumen_financiero_lee_resumenes(self):
+        """Verificar que la API de resumen usa los totales precalculados"""
+        self.client.login(username='admin', password='adminpassword')
+        
+        response = self.client.get(reverse('api-resumen-financiero'))
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['ingresos_mes'], 80.0)
+        self.assertEqual(data['gastos_mes'], 30.0)
+        self.assertEqual(data['cuotas_pendientes'], 1)
+        self.assertEqual(data['total_por_cobrar'], 100.0)
+    
+    def test_api_graficos_seis_meses(self):
+        """Verificar que la API de gráficos devuelve la serie de los últimos meses"""
+        self.client.login(username='admin', password='adminpassword')
+        
+        response = self.client.get(reverse('dashboard-financiero-api'))
+        
+        datos_meses = response.json()['datos_meses']
+        self.assertEqual(len(datos_meses), 6)
+        self.assertEqual(datos_meses[-1]['ingresos'], 80.0)
+        self.assertEqual(datos_meses[-1]['balance'], 50.0)
+        
+        # Tendencia de 24 meses con granularidad anual
+        response = self.client.get(reverse('dashboard-financiero-api'), {'meses': 24, 'granularidad': 'anio'})
+        data = response.json()
+        self.assertEqual(data['granularidad'], 'anio')
+        self.assertEqual(data['datos_meses'][-1]['ingresos'], 80.0)
+        
+        response = self.client.get(reverse('dashboard-financiero-api'), {'granularidad': 'hora'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SerieTemporalTest(TestCase):
+    """
+    Pruebas para las series temporales de ingresos y gastos
+    """
+    
+    def setUp(self):
+        self.categoria = CategoriaGasto.objects.create(nombre='Mantenimiento')
+        self.edificio = Edificio.objects.create(
+            nombre='Edificio Test',
+            direccion='Calle Test 123',
+            pisos=10
+        )
+        self.vivienda = Vivienda.objects.create(
+            edificio=self.edificio,
+            numero='101',
+            piso=1,
+            metros_cuadrados=80
+        )
+        
+        for fecha, monto in [(date(2024, 1, 10), '100.00'), (date(2024, 1, 20), '50.00'), (date(2024, 3, 5), '70.00')]:
+            Pago.objects.create(
+                vivienda=self.vivienda,
+                monto=Decimal(monto),
+                fecha_pago=fecha,
+                metodo_pago='EFECTIVO',
+                estado='VERIFICADO'
+            )
+        Gasto.objects.create(
+            categoria=self.categoria,
+            concepto='Limpieza',
+            monto=Decimal('40.00'),
+            fecha=date(2024, 1, 15),
+            estado='PAGADO'
+        )
+    
+    def test_serie_mensual_rellena_meses_vacios(self):
+        """Verificar que los meses sin movimientos aparecen con ceros"""
+        serie = serie_temporal(date(2024, 1, 1), date(2024, 3, 31), 'mes')
+        
+        self.assertEqual([p['periodo'] for p in serie], [date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)])
+        self.assertEqual(serie[0]['ingresos'], Decimal('150.00'))
+        self.assertEqual(serie[0]['balance'], Decimal('110.00'))
+        self.assertEqual(serie[1]['ingresos'], Decimal('0'))
+        self.assertEqual(serie[2]['ingresos'], Decimal('70.00'))
+    
+    def test_resumenes_y_tablas_coinciden(self):
+        """Verificar que la lectura desde resúmenes coincide con la agregación directa"""
+        desde_resumenes = serie_temporal(date(2024, 1, 1), date(2024, 3, 31), 'mes')
+        # Un rango no alineado a meses se agrega directamente sobre pagos y gastos
+        directa = serie_temporal(date(2024, 1, 1), date(2024, 3, 30), 'mes')
+        
+        self.assertEqual(
+            [(p['ingresos'], p['gastos']) for p in desde_resumenes],
+            [(p['ingresos'], p['gastos']) for p in directa]
+        )
+    
+    def test_serie_semanal(self):
+        """Verificar la agrupación por semana (lunes a domingo)"""
+        serie = serie_temporal(date(2024, 1, 8), date(2024, 1, 21), 'semana')
+        
+        self.assertEqual([p['periodo'] for p in serie], [date(2024, 1, 8), date(2024, 1, 15)])
+        self.assertEqual(serie[0]['ingresos'], Decimal('100.00'))
+        self.assertEqual(serie[1]['ingresos'], Decimal('50.00'))
+        self.assertEqual(serie[1]['gastos'], Decimal('40.00'))
+    
+    def test_consultas_no_dependen_del_rango(self):
+        """Verificar que 36 meses se resuelven con las mismas consultas que 3"""
+        with self.assertNumQueries(2):
+            serie = serie_temporal(date(2022, 1, 1), date(2024, 12, 30), 'mes')
+        self.assertEqual(len(serie), 36)
+        
+        with self.assertNumQueries(1):
+            serie_temporal(date(2022, 1, 1), date(2024, 12, 31), 'anio', edificio_id=self.edificio.id)
+    
+    def test_granularidad_invalida(self):
+        """Verificar que se rechaza una granularidad desconocida"""
+        with self.assertRaises(ValueError):
+            serie_temporal(date(2024, 1, 1), date(2024, 3, 31), 'quincena')
+
+
+class AsignacionPagosTest(TestCase):
+    """
+    Pruebas para la asignación de pagos a cuotas en bloque
+    """
+    
+    def setUp(self):
+        self.rol_admin = Rol.objects.create(nombre='Administrador')
+        
+        User = get_user_model()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword',
+            rol=self.rol_admin
+        )
+        
+        self.concepto = ConceptoCuota.objects.create(
+            nombre='Cuota de Mantenimiento',
+            monto_base=Decimal('100.00'),
+            periodicidad='MENSUAL'
+        )
+        self.edificio = Edificio.objects.create(
+            nombre='Edificio Test',
+            direccion='Calle Test 123',
+            pisos=10
+        )
+        self.viviendas = [
+            Vivienda.objects.create(
+                edificio=self.edificio,
+                numero=str(101 + i),
+                piso=1,
+                metros_cuadrados=80
+            )
+            for i in range(2)
+        ]
+        
+        hoy = timezone.now().date()
+        self.cuotas = {}
+        for vivienda in self.viviendas:
+            self.cuotas[vivienda.id] = [
+                Cuota.objects.create(
+                    concepto=self.concepto,
+                    vivienda=vivienda,
+                    monto=Decimal('100.00'),
+                    fecha_emision=hoy - timedelta(days=30 * meses),
+                    fecha_vencimiento=hoy + timedelta(days=30 - 30 * meses)
+                )
+                for meses in (1, 0)
+            ]
+    
+    def _pago(self, vivienda, monto, estado='PENDIENTE'):
+        return Pago.objects.create(
+            vivienda=vivienda,
+            monto=Decimal(monto),
+            fecha_pago=timezone.now().date(),
+            metodo_pago='TRANSFERENCIA',
+            estado=estado,
+            registrado_por=self.admin_user
+        )
+    
+    def test_cascada_de_la_cuota_mas_antigua(self):
+        """Verificar que el pago cubre primero la cuota más antigua"""
+        vivienda = self.viviendas[0]
+        pago = self._pago(vivienda, '150.00')
+        
+        pago.verificar_pago(self.admin_user)
+        
+        antigua, reciente = [Cuota.objects.get(pk=c.pk) for c in self.cuotas[vivienda.id]]
+        self.assertTrue(antigua.pagada)
+        self.assertFalse(reciente.pagada)
+        self.assertEqual(reciente.monto, Decimal('100.00'))
+        self.assertEqual(reciente.monto_pagado, Decimal('50.00'))
+        self.assertEqual(reciente.saldo_pendiente, Decimal('50.00'))
+        self.assertEqual(PagoCuota.objects.filter(pago=pago).count(), 2)
+    
+    def test_asignacion_idempotente(self):
+        """Verificar que un pago ya asignado no se vuelve a repartir"""
+        pago = self._pago(self.viviendas[0], '100.00', estado='VERIFICADO')
+        
+        asignar_pago_a_cuotas(pago)
+        resultado = asignar_pago_a_cuotas(pago)
+        
+        self.assertEqual(resultado['detalles'], 0)
+        self.assertEqual(PagoCuota.objects.filter(pago=pago).count(), 1)
+    
+    def test_verificar_pagos_en_bloque(self):
+        """Verificar varios pagos de distintas viviendas en una sola operación"""
+        pagos = [
+            self._pago(self.viviendas[0], '100.00'),
+            self._pago(self.viviendas[0], '100.00'),
+            self._pago(self.viviendas[1], '40.00'),
+        ]
+        
+        resultado = verificar_pagos(Pago.objects.filter(pk__in=[p.pk for p in pagos]), self.admin_user)
+        
+        self.assertEqual(resultado['verificados'], 3)
+        self.assertEqual(resultado['asignado'], Decimal('240.00'))
+        self.assertEqual(resultado['cuotas_pagadas'], 2)
+        self.assertFalse(Pago.objects.exclude(estado='VERIFICADO').exists())
+        self.assertFalse(Cuota.objects.filter(vivienda=self.viviendas[0], pagada=False).exists())
+        self.assertEqual(
+            ResumenMensual.objects.get(vivienda=self.viviendas[1], mes=timezone.now().date().replace(day=1)).ingresos,
+            Decimal('40.00')
+        )
+        
+        # Volver a verificar no tiene efecto
+        self.assertEqual(verificar_pagos([p.pk for p in pagos], self.admin_user)['verificados'], 0)
+    
+    def test_consultas_no_dependen_de_las_cuotas(self):
+        """Verificar que la asignación no hace consultas por cada cuota"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        # Cinco cuotas más para la segunda vivienda, emitidas en el mismo mes
+        hoy = timezone.now().date()
+        for i in range(5):
+            Cuota.objects.create(
+                concepto=ConceptoCuota.objects.create(nombre=f'Extraordinaria {i}', monto_base=Decimal('10.00')),
+                vivienda=self.viviendas[1],
+                monto=Decimal('10.00'),
+                fecha_emision=hoy,
+                fecha_vencimiento=hoy
+            )
+        pocas = self._pago(self.viviendas[0], '200.00', estado='VERIFICADO')
+        muchas = self._pago(self.viviendas[1], '250.00', estado='VERIFICADO')
+        
+        with CaptureQueriesContext(connection) as consultas:
+            asignar_pago_a_cuotas(pocas)
+        with self.assertNumQueries(len(consultas.captured_queries)):
+            asignar_pago_a_cuotas(muchas)
+        self.assertEqual(PagoCuota.objects.filter(pago=muchas).count(), 7)
+
+
+class SaldoCuotaTest(TestCase):
+    """
+    Pruebas para el monto pagado y el saldo pendiente mantenidos en cada cuota
+    """
+    
+    def setUp(self):
+        self.rol_admin = Rol.objects.create(nombre='Administrador')
+        
+        User = get_user_model()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword',
+            rol=self.rol_admin
+        )
+        
+        self.concepto = ConceptoCuota.objects.create(
+            nombre='Cuota de Mantenimiento',
+            monto_base=Decimal('100.00'),
+            periodicidad='MENSUAL'
+        )
+        self.edificio = Edificio.objects.create(
+            nombre='Edificio Test',
+            direccion='Calle Test 123',
+            pisos=10
+        )
+        self.vivienda = Vivienda.objects.create(
+            edificio=self.edificio,
+            numero='101',
+            piso=1,
+            metros_cuadrados=80
+        )
+        
+        hoy = timezone.now().date()
+        self.cuota = Cuota.objects.create(
+            concepto=self.concepto,
+            vivienda=self.vivienda,
+            monto=Decimal('100.00'),
+            fecha_emision=hoy,
+            fecha_vencimiento=hoy + timedelta(days=30)
+        )
+    
+    def _pago(self, monto, estado='PENDIENTE'):
+        return Pago.objects.create(
+            vivienda=self.vivienda,
+            monto=Decimal(monto),
+            fecha_pago=timezone.now().date(),
+            metodo_pago='TRANSFERENCIA',
+            estado=estado,
+            registrado_por=self.admin_user
+        )
+    
+    def _cuota(self):
+        return Cuota.objects.get(pk=self.cuota.pk)
+    
+    def test_cuota_nueva_sin_pagos(self):
+        """Verificar que una cuota nueva tiene todo su monto pendiente"""
+        cuota = self._cuota()
+        self.assertEqual(cuota.monto_pagado, Decimal('0'))
+        self.assertEqual(cuota.saldo_pendiente, Decimal('100.00'))
+    
+    def test_pagos_parciales_conservan_el_monto(self):
+        """Verificar que los pagos parciales se acumulan sin modificar el monto"""
+        self._pago('30.00').verificar_pago(self.admin_user)
+        cuota = self._cuota()
+        self.assertEqual(cuota.monto, Decimal('100.00'))
+        self.assertEqual(cuota.monto_pagado, Decimal('30.00'))
+        self.assertEqual(cuota.saldo_pendiente, Decimal('70.00'))
+        self.assertFalse(cuota.pagada)
+        
+        self._pago('70.00').verificar_pago(self.admin_user)
+        cuota = self._cuota()
+        self.assertTrue(cuota.pagada)
+        self.assertEqual(cuota.monto_pagado, Decimal('100.00'))
+        self.assertEqual(cuota.saldo_pendiente, Decimal('0'))
+    
+    def test_rechazar_pago_revierte_saldo(self):
+        """Verificar que rechazar un pago verificado devuelve el saldo a la cuota"""
+        pago = self._pago('100.00')
+        pago.verificar_pago(self.admin_user)
+        self.assertTrue(self._cuota().pagada)
+        
+        pago.rechazar_pago(self.admin_user, 'Fondos insuficientes')
+        
+        cuota = self._cuota()
+        self.assertFalse(cuota.pagada)
+        self.assertEqual(cuota.monto_pagado, Decimal('0'))
+        self.assertEqual(cuota.saldo_pendiente, Decimal('100.00'))
+    
+    def test_detalle_manual_se_aplica_al_verificar(self):
+        """Verificar que las cuotas asignadas a mano cuentan solo al verificar el pago"""
+        pago = self._pago('40.00')
+        PagoCuota.objects.create(pago=pago, cuota=self.cuota, monto_aplicado=Decimal('40.00'))
+        self.assertEqual(self._cuota().monto_pagado, Decimal('0'))
+        
+        pago.verificar_pago(self.admin_user)
+        
+        self.assertEqual(self._cuota().saldo_pendiente, Decimal('60.00'))
+        self.assertEqual(PagoCuota.objects.filter(pago=pago).count(), 1)
+    
+    def test_eliminar_detalle_revierte_saldo(self):
+        """Verificar que eliminar un PagoCuota de un pago verificado descuenta su monto"""
+        pago = self._pago('25.00', estado='VERIFICADO')
+        detalle = PagoCuota.objects.create(pago=pago, cuota=self.cuota, monto_aplicado=Decimal('25.00'))
+        self.assertEqual(self._cuota().monto_pagado, Decimal('25.00'))
+        
+        detalle.delete()
+        
+        cuota = self._cuota()
+        self.assertEqual(cuota.monto_pagado, Decimal('0'))
+        self.assertEqual(cuota.saldo_pendiente, Decimal('100.00'))
+    
+    def test_conciliacion_corrige_diferencias(self):
+        """Verificar que la conciliación recalcula los valores desincronizados"""
+        self._pago('30.00').verificar_pago(self.admin_user)
+        Cuota.objects.filter(pk=self.cuota.pk).update(monto_pagado=Decimal('0'), saldo_pendiente=Decimal('5.00'))
+        
+        simulacion = conciliar_cuotas(dry_run=True)
+        self.assertEqual(simulacion['corregidas'], 1)
+        self.assertEqual(simulacion['diferencias'][0]['saldo_nuevo'], Decimal('70.00'))
+        self.assertEqual(self._cuota().saldo_pendiente, Decimal('5.00'))
+        
+        resultado = conciliar_cuotas()
+        
+        self.assertEqual(resultado['corregidas'], 1)
+        cuota = self._cuota()
+        self.assertEqual(cuota.monto_pagado, Decimal('30.00'))
+        self.assertEqual(cuota.saldo_pendiente, Decimal('70.00'))
+        self.assertEqual(
+            ResumenMensual.objects.get(vivienda=self.vivienda, mes=cuota.fecha_emision.replace(day=1)).saldo_pendiente,
+            Decimal('70.00')
+        )
+        self.assertEqual(conciliar_cuotas()['corregidas'], 0)
+
+
+class SaldoViviendaTest(TestCase):
+    """
+    Pruebas para el saldo de cuenta corriente por vivienda
+    """
+    
+    def setUp(self):
+        self.rol_admin = Rol.objects.create(nombre='Administrador')
+        
+        User = get_user_model()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword',
+            rol=self.rol_admin
+        )
+        
+        self.concepto = ConceptoCuota.objects.create(
+            nombre='Cuota de Mantenimiento',
+            monto_base=Decimal('100.00'),
+            periodicidad='MENSUAL'
+        )
+        self.edificio = Edificio.objects.create(
+            nombre='Edificio Test',
+            direccion='Calle Test 123',
+            pisos=10
+        )
+        self.vivienda = Vivienda.objects.create(
+            edificio=self.edificio,
+            numero='101',
+            piso=1,
+            metros_cuadrados=80
+        )
+        
+        hoy = timezone.now().date()
+        # Una cuota vencida y otra por vencer
+        for meses in (1, 0):
+            Cuota.objects.create(
+                concepto=self.concepto,
+                vivienda=self.vivienda,
+                monto=Decimal('100.00'),
+                fecha_emision=hoy - timedelta(days=30 * meses + 10),
+                fecha_vencimiento=hoy + timedelta(days=20 - 30 * meses)
+            )
+    
+    def _pago(self, monto):
+        return Pago.objects.create(
+            vivienda=self.vivienda,
+            monto=Decimal(monto),
+            fecha_pago=timezone.now().date(),
+            metodo_pago='TRANSFERENCIA',
+            estado='PENDIENTE',
+            registrado_por=self.admin_user
+        )
+    
+    def test_saldo_al_emitir_cuotas(self):
+        """Verificar que el saldo refleja las cuotas emitidas y vencidas"""
+        saldo = SaldoVivienda.objects.get(pk=self.vivienda.pk)
+        self.assertEqual(saldo.total_adeudado, Decimal('200.00'))
+        self.assertEqual(saldo.total_vencido, Decimal('100.00'))
+        self.assertEqual(saldo.cuotas_pendientes, 2)
+        self.assertEqual(saldo.cuotas_vencidas, 1)
+        self.assertIsNone(saldo.ultimo_pago)
+    
+    def test_saldo_al_verificar_pago(self):
+        """Verificar que un pago verificado reduce el saldo y registra la fecha"""
+        self._pago('150.00').verificar_pago(self.admin_user)
+        
+        saldo = SaldoVivienda.objects.get(pk=self.vivienda.pk)
+        self.assertEqual(saldo.total_adeudado, Decimal('50.00'))
+        self.assertEqual(saldo.total_vencido, Decimal('0'))
+        self.assertEqual(saldo.cuotas_pendientes, 1)
+        self.assertEqual(saldo.saldo, Decimal('50.00'))
+        self.assertEqual(saldo.ultimo_pago, timezone.now().date())
+    
+    def test_pago_sin_cuotas_queda_a_favor(self):
+        """Verificar que lo pagado de más queda como saldo a favor"""
+        self._pago('250.00').verificar_pago(self.admin_user)
+        
+        saldo = SaldoVivienda.objects.get(pk=self.vivienda.pk)
+        self.assertEqual(saldo.total_adeudado, Decimal('0'))
+        self.assertEqual(saldo.saldo, Decimal('-50.00'))
+    
+    def test_marcar_pagadas_desde_admin(self):
+        """Verificar que la acción del admin deja saldos y resúmenes al día"""
+        from unittest import mock
+        
+        from .admin import marcar_cuotas_como_pagadas
+        
+        cuota = Cuota.objects.filter(vivienda=self.vivienda).order_by('fecha_emision').first()
+        Cuota.objects.filter(pk=cuota.pk).update(recargo=Decimal('5.00'), saldo_pendiente=Decimal('105.00'))
+        
+        marcar_cuotas_como_pagadas(mock.Mock(), None, Cuota.objects.filter(pk=cuota.pk))
+        
+        cuota.refresh_from_db()
+        self.assertTrue(cuota.pagada)
+        self.assertEqual(cuota.recargo, Decimal('0.00'))
+        self.assertEqual(cuota.saldo_pendiente, Decimal('0.00'))
+        self.assertEqual(cuota.monto_pagado, Decimal('100.00'))
+        saldo = SaldoVivienda.objects.get(pk=self.vivienda.pk)
+        self.assertEqual(saldo.total_adeudado, Decimal('100.00'))
+        self.assertEqual(saldo.cuotas_pendientes, 1)
+        resumen = ResumenMensual.objects.get(vivienda=self.vivienda, mes=cuota.fecha_emision.replace(day=1))
+        self.assertEqual(resumen.cuotas_pendientes, 0)
+        self.assertEqual(resumen.saldo_pendiente, Decimal('0.00'))
+    
+    def test_consulta_por_clave_primaria(self):
+        """Verificar que el saldo del día se obtiene con una sola consulta"""
+        with self.assertNumQueries(1):
+            saldo = obtener_saldo(self.vivienda.pk)
+        self.assertEqual(saldo.total_adeudado, Decimal('200.00'))
+    
+    def test_api_saldo_vivienda(self):
+        """Verificar la API de saldo de una vivienda"""
+        self.client.login(username='admin', password='adminpassword')
+        
+        response = self.client.get(reverse('api-saldo-vivienda', args=[self.vivienda.pk]))
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total_adeudado'], 200.0)
+        self.assertEqual(data['cuotas_vencidas'], 1)
+        
+        response = self.client.get(reverse('api-saldo-vivienda', args=[self.vivienda.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+    
+    def test_verificar_y_reconstruir(self):
+        """Verificar que la comprobación detecta saldos desactualizados y la reconstrucción los corrige"""
+        self.assertEqual(verificar_saldos(), [])
+        SaldoVivienda.objects.filter(pk=self.vivienda.pk).update(total_adeudado=Decimal('1.00'))
+        
+        diferencias = verificar_saldos()
+        self.assertEqual([d['campo'] for d in diferencias], ['total_adeudado'])
+        
+        resultado = reconstruir_saldos(edificio=self.edificio)
+        
+        self.assertEqual(resultado['viviendas'], 1)
+        self.assertEqual(verificar_saldos(), [])
+
+
+class EstadosCuentaMasivosTest(TestCase):
+    """
+    Pruebas para la generación de estados de cuenta en bloque
+    """
+    
+    def setUp(self):
+        self.rol_admin = Rol.objects.create(nombre='Administrador')
+        
+        User = get_user_model()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword',
+            rol=self.rol_admin
+        )
+        
+        self.concepto = ConceptoCuota.objects.create(
+            nombre='Cuota de Mantenimiento',
+            monto_base=Decimal('100.00'),
+            periodicidad='MENSUAL'
+        )
+        self.edificio = Edificio.objects.create(
+            nombre='Edificio Test',
+            direccion='Calle Test 123',
+            pisos=10
+        )
+        self.viviendas = [
+            Vivienda.objects.create(
+                edificio=self.edificio,
+                numero=str(101 + i),
+                piso=1,
+                metros_cuadrados=80
+            )
+            for i in range(3)
+        ]
+        
+        self.fecha_inicio = date(2024, 3, 1)
+        self.fecha_fin = date(2024, 3, 31)
+        for vivienda in self.viviendas:
+            Cuota.objects.create(
+                concepto=self.concepto,
+                vivienda=vivienda,
+                monto=Decimal('100.00'),
+                fecha_emision=date(2024, 3, 5),
+                fecha_vencimiento=date(2099, 1, 1)
+            )
+        Pago.objects.create(
+            vivienda=self.viviendas[0],
+            monto=Decimal('40.00'),
+            fecha_pago=date(2024, 3, 10),
+            metodo_pago='EFECTIVO',
+            estado='VERIFICADO',
+            registrado_por=self.admin_user
+        )
+        # Estado de cuenta del mes anterior para la primera vivienda
+        EstadoCuenta.objects.create(
+            vivienda=self.viviendas[0],
+            fecha_inicio=date(2024, 2, 1),
+            fecha_fin=date(2024, 2, 29),
+            saldo_anterior=Decimal('50.00')
+        )
+    
+    def test_genera_estados_con_totales(self):
+        """Verificar los totales y el saldo anterior de los estados generados"""
+        resultado = generar_estados_cuenta_masivos(self.viviendas, self.fecha_inicio, self.fecha_fin)
+        
+        self.assertEqual(resultado['creados'], 3)
+        estado = EstadoCuenta.objects.get(vivienda=self.viviendas[0], fecha_inicio=self.fecha_inicio)
+        self.assertEqual(estado.saldo_anterior, Decimal('50.00'))
+        self.assertEqual(estado.total_cuotas, Decimal('100.00'))
+        self.assertEqual(estado.total_pagos, Decimal('40.00'))
+        self.assertEqual(estado.saldo_final, Decimal('110.00'))
+        
+        otro = EstadoCuenta.objects.get(vivienda=self.viviendas[1], fecha_inicio=self.fecha_inicio)
+        self.assertEqual(otro.saldo_anterior, Decimal('0'))
+        self.assertEqual(otro.saldo_final, Decimal('100.00'))
+    
+    def test_coincide_con_calcular_totales(self):
+        """Verificar que el resultado coincide con el cálculo individual"""
+        generar_estados_cuenta_masivos(self.viviendas, self.fecha_inicio, self.fecha_fin)
+        
+        for estado in EstadoCuenta.objects.filter(fecha_inicio=self.fecha_inicio):
+            saldo_final = estado.saldo_final
+            estado.calcular_totales()
+            self.assertEqual(estado.saldo_final, saldo_final)
+    
+    def test_reejecucion_idempotente(self):
+        """Verificar que no se duplican estados ya generados"""
+        generar_estados_cuenta_masivos(self.viviendas, self.fecha_inicio, self.fecha_fin)
+        resultado = generar_estados_cuenta_masivos(self.viviendas, self.fecha_inicio, self.fecha_fin)
+        
+        self.assertEqual(resultado['creados'], 0)
+        self.assertEqual(resultado['omitidos'], 3)
+        self.assertEqual(EstadoCuenta.objects.filter(fecha_inicio=self.fecha_inicio).count(), 3)
+    
+    def test_periodo_generado_en_paralelo(self):
+        """Verificar que los estados que otra ejecución insertó antes no se cuentan como creados"""
+        from unittest import mock
+        
+        from . import estados_cuenta
+        
+        totales_periodo = estados_cuenta._totales_periodo
+        
+        def insertar_en_paralelo(*args):
+            # Otra ejecución inserta el período de la primera vivienda después de leer los existentes
+            EstadoCuenta.objects.create(
+                vivienda=self.viviendas[0], fecha_inicio=self.fecha_inicio, fecha_fin=self.fecha_fin
+            )
+            return totales_periodo(*args)
+        
+        with mock.patch.object(estados_cuenta, '_totales_periodo', side_effect=insertar_en_paralelo):
+            resultado = generar_estados_cuenta_masivos(self.viviendas, self.fecha_inicio, self.fecha_fin)
+        
+        self.assertEqual(resultado['creados'], 2)
+        self.assertEqual(resultado['omitidos'], 1)
+        self.assertEqual(EstadoCuenta.objects.filter(fecha_inicio=self.fecha_inicio).count(), 3)
+    
+    def test_consultas_constantes(self):
+        """Verificar que la cantidad de consultas no depende del número de viviendas"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as consultas:
+            generar_estados_cuenta_masivos(self.viviendas[:1], self.fecha_inicio, self.fecha_fin)
+        with self.assertNumQueries(len(consultas.captured_queries)):
+            generar_estados_cuenta_masivos(self.viviendas[1:], self.fecha_inicio, self.fecha_fin)
+    
+    def test_recalcular_estados(self):
+        """Verificar que el recálculo actualiza los totales de estados existentes"""
+        generar_estados_cuenta_masivos(self.viviendas, self.fecha_inicio, self.fecha_fin)
+        EstadoCuenta.objects.filter(fecha_inicio=self.fecha_inicio).update(total_cuotas=0, saldo_final=0)
+        
+        actualizados = recalcular_estados_cuenta(EstadoCuenta.objects.filter(fecha_inicio=self.fecha_inicio))
+        
+        self.assertEqual(actualizados, 3)
+        self.assertFalse(EstadoCuenta.objects.filter(fecha_inicio=self.fecha_inicio, total_cuotas=0).exists())
+
+
+class EstadoCuentaPdfTest(TestCase):
+    """
+    Pruebas para la caché de PDFs de estados de cuenta
+    """
+    
+    def setUp(self):
+        import shutil
+        import tempfile
+        
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        
+        self.rol_admin = Rol.objects.create(nombre='Administrador')
+        
+        User = get_user_model()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword',
+            rol=self.rol_admin
+        )
+        
+        self.concepto = ConceptoCuota.objects.create(
+            nombre='Cuota de Mantenimiento',
+            monto_base=Decimal('100.00'),
+            periodicidad='MENSUAL'
+        )
+        self.edificio = Edificio.objects.create(
+            nombre='Edificio Test',
+            direccion='Calle Test 123',
+            pisos=10
+        )
+        self.viviendas = [
+            Vivienda.objects.create(
+                edificio=self.edificio,
+                numero=str(101 + i),
+                piso=1,
+                metros_cuadrados=80
+            )
+            for i in range(3)
+        ]
+        for vivienda in self.viviendas:
+            Cuota.objects.create(
+                concepto=self.concepto,
+                vivienda=vivienda,
+                monto=Decimal('100.00'),
+                fecha_emision=date(2024, 3, 5),
+                fecha_vencimiento=date(2099, 1, 1)
+            )
+        generar_estados_cuenta_masivos(self.viviendas, date(2024, 3, 1), date(2024, 3, 31))
+        self.estado = EstadoCuenta.objects.get(vivienda=self.viviendas[0])
+    
+    def _texto_pdf(self, contenido):
+        """Texto de los flujos de contenido de un PDF (ASCII85 + Flate en reportlab)"""
+        import base64
+        import re
+        import zlib
+        
+        texto = b''
+        for flujo in re.findall(rb'stream\r?\n(.*?)endstream', contenido, re.S):
+            try:
+                texto += zlib.decompress(base64.a85decode(flujo.strip(), adobe=True))
+            except (ValueError, zlib.error):
+                texto += flujo
+        return texto
+    
+    def test_pdf_se_reutiliza_si_no_cambian_los_datos(self):
+        """Verificar que un PDF vigente no se vuelve a dibujar"""
+        from django.core.files.storage import default_storage
+        
+        nombre = obtener_pdf_estado_cuenta(self.estado)
+        self.assertTrue(default_storage.exists(nombre))
+        
+        estado = EstadoCuenta.objects.get(pk=self.estado.pk)
+        self.assertEqual(obtener_pdf_estado_cuenta(estado), nombre)
+        self.assertEqual(estado.pdf_huella[:16], nombre.split('_')[-1][:16])
+    
+    def test_cambio_de_datos_regenera_pdf(self):
+        """Verificar que un cambio en los datos genera un PDF nuevo y elimina el anterior"""
+        from django.core.files.storage import default_storage
+        
+        anterior = obtener_pdf_estado_cuenta(self.estado)
+        Pago.objects.create(
+            vivienda=self.viviendas[0],
+            monto=Decimal('40.00'),
+            fecha_pago=date(2024, 3, 10),
+            metodo_pago='EFECTIVO',
+            estado='VERIFICADO',
+            registrado_por=self.admin_user
+        )
+        
+        nuevo = obtener_pdf_estado_cuenta(EstadoCuenta.objects.get(pk=self.estado.pk))
+        
+        self.assertNotEqual(nuevo, anterior)
+        self.assertTrue(default_storage.exists(nuevo))
+        self.assertFalse(default_storage.exists(anterior))
+    
+    def test_numeracion_de_paginas(self):
+        """Verificar que el pie muestra el número de página sobre el total"""
+        datos = datos_estados_cuenta([self.estado])[self.estado.id]
+        datos['cuotas'] = datos['cuotas'] * 60
+        
+        texto = self._texto_pdf(dibujar_estado_cuenta(datos))
+        
+        self.assertIn(b' 1 de 2)', texto)
+        self.assertIn(b' 2 de 2)', texto)
+    
+    def test_prerenderizar_periodo(self):
+        """Verificar el prerenderizado de un período y que la segunda vez no dibuja nada"""
+        estados = EstadoCuenta.objects.filter(fecha_inicio=date(2024, 3, 1))
+        
+        resultado = prerenderizar_estados_cuenta(estados, procesos=2)
+        
+        self.assertEqual(resultado['generados'], 3)
+        self.assertFalse(estados.filter(pdf_huella='').exists())
+        self.assertEqual(prerenderizar_estados_cuenta(estados, procesos=1)['vigentes'], 3)
+    
+    def test_vista_descarga_pdf(self):
+        """Verificar que la vista sirve el PDF guardado"""
+        self.client.login(username='admin', password='adminpassword')
+        
+        response = self.client.get(reverse('estado-cuenta-pdf', args=[self.estado.pk]))
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+    
+    def test_exportar_zip_estados_cuenta(self):
+        """Verificar que el ZIP exportado contiene un PDF por estado de cuenta"""
+        import io
+        import zipfile
+        
+        obtener_pdf_estado_cuenta(self.estado)
+        self.client.login(username='admin', password='adminpassword')
+        
+        response = self.client.get(reverse('estado-cuenta-exportar-zip'), {
+            'edificio': self.edificio.pk,
+            'desde': '2024-03-01',
+            'hasta': '2024-03-31',
+        })
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archivo = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archivo.testzip())
+        self.assertEqual(
+            sorted(archivo.namelist()),
+            [f'Estado_Cuenta_{numero}_20240301.pdf' for numero in ('101', '102', '103')]
+        )
+        self.assertTrue(archivo.read('Estado_Cuenta_101_20240301.pdf').startswith(b'%PDF'))
+        self.assertFalse(EstadoCuenta.objects.filter(pdf_huella='').exists())
+    
+    def test_exportar_zip_requiere_periodo(self):
+        """Verificar que la exportación rechaza un período inválido"""
+        self.client.login(username='admin', password='adminpassword')
+        
+        response = self.client.get(reverse('estado-cuenta-exportar-zip'), {'edificio': self.edificio.pk})
+        
+        self.assertEqual(response.status_code, 400)
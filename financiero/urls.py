@@ -7,6 +7,7 @@ urlpatterns = [
 
     # APIs para actualización asíncrona
     path('api/cuotas-por-vivienda/<int:vivienda_id>/', views.api_cuotas_por_vivienda, name='api-cuotas-por-vivienda'),
+    path('api/saldo-vivienda/<int:vivienda_id>/', views.api_saldo_vivienda, name='api-saldo-vivienda'),
     path('api/resumen-financiero/', views.api_resumen_financiero, name='api-resumen-financiero'),
     path('api/datos-chart/', views.dashboard_financiero_api, name='dashboard-financiero-api'),
     
@@ -54,6 +55,7 @@ urlpatterns = [
     path('estados-cuenta/<int:pk>/pdf/', views.estado_cuenta_pdf, name='estado-cuenta-pdf'),
     path('estados-cuenta/<int:pk>/enviar/', views.enviar_estado_cuenta, name='estado-cuenta-enviar'),
     path('estados-cuenta/generar-masivos/', views.generar_estados_cuenta, name='estado-cuenta-generar-masivos'),
+    path('estados-cuenta/exportar-zip/', views.exportar_estados_cuenta_zip, name='estado-cuenta-exportar-zip'),
     
     
 ]
\ No newline at end of file
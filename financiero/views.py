@@ -3,8 +3,8 @@ from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse,FileResponse, HttpResponse
-from django.db.models import Sum, Q, F, DecimalField
+from django.http import JsonResponse,FileResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.db.models import Count, Sum, Q, F, DecimalField
 from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.contrib import messages
@@ -13,14 +13,13 @@ from django.core.exceptions import PermissionDenied
 from django.db import transaction
 from django.core.mail import send_mail
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.template.loader import render_to_string
+from django.utils.text import slugify
 
 import json
 from decimal import Decimal
-from datetime import timedelta
-import io
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+from datetime import date, timedelta
 
 from usuarios.views import AccesoWebPermitidoMixin
 
@@ -28,6 +27,10 @@ from .models import (
     ConceptoCuota, Cuota, Pago, PagoCuota, 
     CategoriaGasto, Gasto, EstadoCuenta
 )
+from .estados_cuenta import generar_estados_cuenta_masivos
+from .facturacion import generar_cuotas_masivas
+from .saldos import obtener_saldo, totales_saldos
+from .series import GRANULARIDADES, rango_ultimos_meses, serie_temporal
 from .forms import (
     ConceptoCuotaForm, CuotaForm, GenerarCuotasForm, PagoForm,
     CategoriaGastoForm, GastoForm, EstadoCuentaForm, GenerarEstadosCuentaForm
@@ -35,6 +38,9 @@ from .forms import (
 from viviendas.models import Vivienda, Edificio, Residente
 from usuarios.models import Usuario
 
+# Máximo de meses que se pueden pedir al API de gráficos
+MAXIMO_MESES_SERIE = 60
+
 # Vistas para ConceptoCuota
 class ConceptoCuotaListView(LoginRequiredMixin, AccesoWebPermitidoMixin, ListView):
     model = ConceptoCuota
@@ -274,30 +280,19 @@ def generar_cuotas(request):
             else:
                 viviendas = viviendas_seleccionadas
             
-            # Monto a aplicar
-            monto = monto_personalizado if monto_personalizado else concepto.monto_base
-            
-            # Crear cuotas para cada vivienda
-            cuotas_creadas = 0
-            for vivienda in viviendas:
-                # Verificar si ya existe una cuota para esta vivienda con este concepto en la misma fecha
-                existe = Cuota.objects.filter(
-                    concepto=concepto,
-                    vivienda=vivienda,
-                    fecha_emision=fecha_emision
-                ).exists()
-                
-                if not existe:
-                    Cuota.objects.create(
-                        concepto=concepto,
-                        vivienda=vivienda,
-                        monto=monto,
-                        fecha_emision=fecha_emision,
-                        fecha_vencimiento=fecha_vencimiento
-                    )
-                    cuotas_creadas += 1
+            # Generar en bloque las cuotas que aún no existen
+            resultado = generar_cuotas_masivas(
+                concepto=concepto,
+                viviendas=viviendas,
+                fecha_emision=fecha_emision,
+                fecha_vencimiento=fecha_vencimiento,
+                monto=monto_personalizado,
+            )
             
-            messages.success(request, f'Se han generado {cuotas_creadas} cuotas exitosamente.')
+            mensaje = f'Se han generado {resultado["creadas"]} cuotas exitosamente.'
+            if resultado['omitidas']:
+                mensaje += f' {resultado["omitidas"]} viviendas ya tenían esta cuota y se omitieron.'
+            messages.success(request, mensaje)
             return redirect('cuota-list')
     else:
         form = GenerarCuotasForm()
@@ -462,15 +457,17 @@ class PagoDetailView(LoginRequiredMixin, DetailView):
         context['cuotas_pago'] = PagoCuota.objects.filter(pago=pago)
         
         # Calcular cuotas pendientes de la vivienda
-        cuotas_pendientes = Cuota.objects.filter(
+        pendientes = Cuota.objects.filter(
             vivienda=pago.vivienda,
             pagada=False
+        ).aggregate(
+            cantidad=Count('id'),
+            saldo=Coalesce(Sum('saldo_pendiente'), Decimal('0'), output_field=DecimalField()),
         )
-        context['cuotas_pendientes_count'] = cuotas_pendientes.count()
+        context['cuotas_pendientes_count'] = pendientes['cantidad']
         
-        # Calcular monto pendiente total
-        monto_total = sum(cuota.total_a_pagar() for cuota in cuotas_pendientes)
-        context['monto_pendiente_total'] = Decimal(str(monto_total))
+        # Monto pendiente total a partir del saldo de cada cuota
+        context['monto_pendiente_total'] = pendientes['saldo']
         
         return context
 
@@ -935,150 +932,44 @@ def estado_cuenta_pdf(request, pk):
         if not Residente.objects.filter(usuario=request.user, vivienda=estado_cuenta.vivienda).exists():
             raise PermissionDenied
     
-    # Crear un buffer para el PDF
-    buffer = io.BytesIO()
-    
-    # Crear el PDF
-    p = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    
-    # Título
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(30, height - 50, "Estado de Cuenta")
-    
-    # Información básica
-    p.setFont("Helvetica", 12)
-    p.drawString(30, height - 80, f"Vivienda: {estado_cuenta.vivienda}")
-    p.drawString(30, height - 100, f"Período: {estado_cuenta.fecha_inicio.strftime('%d/%m/%Y')} - {estado_cuenta.fecha_fin.strftime('%d/%m/%Y')}")
-    p.drawString(30, height - 120, f"Generado el: {estado_cuenta.fecha_generacion.strftime('%d/%m/%Y %H:%M')}")
-    
-    # Detalle de saldos
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(30, height - 160, "Resumen de Saldos")
-    
-    p.setFont("Helvetica", 12)
-    p.drawString(50, height - 180, f"Saldo Anterior: ${estado_cuenta.saldo_anterior}")
-    p.drawString(50, height - 200, f"Total Cuotas: ${estado_cuenta.total_cuotas}")
-    p.drawString(50, height - 220, f"Total Recargos: ${estado_cuenta.total_recargos}")
-    p.drawString(50, height - 240, f"Total Pagos: ${estado_cuenta.total_pagos}")
-    
-    p.setFont("Helvetica-Bold", 12)
-    p.drawString(50, height - 270, f"Saldo Final: ${estado_cuenta.saldo_final}")
-    
-    # Detalle de cuotas
-    y_pos = height - 320
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(30, y_pos, "Detalle de Cuotas")
-    y_pos -= 20
-    
-    p.setFont("Helvetica", 10)
-    cuotas = estado_cuenta.obtener_detalle_cuotas()
-    if cuotas:
-        # Cabecera
-        p.drawString(30, y_pos, "Concepto")
-        p.drawString(200, y_pos, "Emisión")
-        p.drawString(280, y_pos, "Vencimiento")
-        p.drawString(380, y_pos, "Monto")
-        p.drawString(450, y_pos, "Estado")
-        y_pos -= 20
-        
-        # Detalle
-        for cuota in cuotas:
-            if y_pos < 50:  # Nueva página si no hay espacio
-                p.showPage()
-                y_pos = height - 50
-                
-                # Cabecera nueva página
-                p.setFont("Helvetica-Bold", 14)
-                p.drawString(30, y_pos, "Detalle de Cuotas (continuación)")
-                y_pos -= 20
-                
-                p.setFont("Helvetica", 10)
-                p.drawString(30, y_pos, "Concepto")
-                p.drawString(200, y_pos, "Emisión")
-                p.drawString(280, y_pos, "Vencimiento")
-                p.drawString(380, y_pos, "Monto")
-                p.drawString(450, y_pos, "Estado")
-                y_pos -= 20
-            
-            p.drawString(30, y_pos, str(cuota.concepto)[:30])
-            p.drawString(200, y_pos, cuota.fecha_emision.strftime('%d/%m/%Y'))
-            p.drawString(280, y_pos, cuota.fecha_vencimiento.strftime('%d/%m/%Y'))
-            p.drawString(380, y_pos, f"${cuota.monto}")
-            p.drawString(450, y_pos, "Pagada" if cuota.pagada else "Pendiente")
-            y_pos -= 15
-    else:
-        p.drawString(30, y_pos, "No hay cuotas en este período")
-        y_pos -= 15
-    
-    # Detalle de pagos
-    y_pos -= 20
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(30, y_pos, "Detalle de Pagos")
-    y_pos -= 20
-    
-    p.setFont("Helvetica", 10)
-    pagos = estado_cuenta.obtener_detalle_pagos()
-    if pagos:
-        # Cabecera
-        p.drawString(30, y_pos, "Fecha")
-        p.drawString(100, y_pos, "Monto")
-        p.drawString(170, y_pos, "Método")
-        p.drawString(250, y_pos, "Referencia")
-        p.drawString(400, y_pos, "Estado")
-        y_pos -= 20
-        
-        # Detalle
-        for pago in pagos:
-            if y_pos < 50:  # Nueva página si no hay espacio
-                p.showPage()
-                y_pos = height - 50
-                
-                # Cabecera nueva página
-                p.setFont("Helvetica-Bold", 14)
-                p.drawString(30, y_pos, "Detalle de Pagos (continuación)")
-                y_pos -= 20
-                
-                p.setFont("Helvetica", 10)
-                p.drawString(30, y_pos, "Fecha")
-                p.drawString(100, y_pos, "Monto")
-                p.drawString(170, y_pos, "Método")
-                p.drawString(250, y_pos, "Referencia")
-                p.drawString(400, y_pos, "Estado")
-                y_pos -= 20
-            
-            p.drawString(30, y_pos, pago.fecha_pago.strftime('%d/%m/%Y'))
-            p.drawString(100, y_pos, f"${pago.monto}")
-            p.drawString(170, y_pos, pago.get_metodo_pago_display())
-            p.drawString(250, y_pos, pago.referencia[:30])
-            p.drawString(400, y_pos, pago.get_estado_display())
-            y_pos -= 15
-    else:
-        p.drawString(30, y_pos, "No hay pagos en este período")
-    
-    # Pie de página
-    p.setFont("Helvetica", 8)
-    p.drawString(30, 30, f"Sistema Torre Segura - Estado de Cuenta #{estado_cuenta.id}")
-    p.drawString(width - 150, 30, f"Página 1")
-    
-    # Guardar el PDF
-    p.showPage()
-    p.save()
-    
-    # Crear respuesta
-    buffer.seek(0)
+    # reportlab se importa aquí y no al cargar las vistas: solo lo necesitan las descargas de PDF
+    from .estados_cuenta_pdf import obtener_pdf_estado_cuenta
+
+    # El PDF se sirve desde el almacenamiento y solo se redibuja si cambiaron sus datos
+    nombre = obtener_pdf_estado_cuenta(estado_cuenta)
     
-    # Generar nombre del archivo
     filename = f"Estado_Cuenta_{estado_cuenta.vivienda.numero}_{estado_cuenta.fecha_inicio.strftime('%Y%m%d')}.pdf"
+    return FileResponse(default_storage.open(nombre, 'rb'), as_attachment=True, filename=filename)
+
+@login_required
+def exportar_estados_cuenta_zip(request):
+    """Vista para descargar en un ZIP los PDF de los estados de cuenta de un edificio y período"""
+    if not request.user.rol or request.user.rol.nombre != 'Administrador':
+        raise PermissionDenied
     
-    # Actualizar el archivo en el modelo si no existe
-    if not estado_cuenta.pdf_generado:
-        # Guardar el PDF en el modelo
-        from django.core.files.base import ContentFile
-        estado_cuenta.pdf_generado.save(filename, ContentFile(buffer.getvalue()), save=True)
+    try:
+        fecha_inicio = date.fromisoformat(request.GET.get('desde', ''))
+        fecha_fin = date.fromisoformat(request.GET.get('hasta', ''))
+    except ValueError:
+        return HttpResponseBadRequest('Indique el período con desde y hasta en formato YYYY-MM-DD.')
+    edificio = get_object_or_404(Edificio, pk=request.GET.get('edificio') or 0)
+    
+    estados = EstadoCuenta.objects.filter(
+        vivienda__edificio=edificio,
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+    )
     
-    # Devolver el PDF como respuesta
-    return FileResponse(buffer, as_attachment=True, filename=filename)
+    from .estados_cuenta_pdf import PROCESOS_PDF_ESTADOS_CUENTA, iterar_zip_estados_cuenta
+
+    # El ZIP se envía por partes a medida que cada PDF se dibuja o se lee de la caché
+    response = StreamingHttpResponse(
+        iterar_zip_estados_cuenta(estados, procesos=getattr(settings, 'PROCESOS_PDF_ESTADOS_CUENTA', PROCESOS_PDF_ESTADOS_CUENTA)),
+        content_type='application/zip',
+    )
+    filename = f"Estados_Cuenta_{slugify(edificio.nombre)}_{fecha_inicio.strftime('%Y%m%d')}_{fecha_fin.strftime('%Y%m%d')}.zip"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 @login_required
 def enviar_estado_cuenta(request, pk):
@@ -1147,38 +1038,9 @@ def generar_estados_cuenta(request):
             else:
                 viviendas = viviendas_seleccionadas
             
-            # Crear estados de cuenta para cada vivienda
-            estados_creados = 0
-            for vivienda in viviendas:
-                # Verificar si ya existe un estado de cuenta para esta vivienda en el mismo período
-                existe = EstadoCuenta.objects.filter(
-                    vivienda=vivienda,
-                    fecha_inicio=fecha_inicio,
-                    fecha_fin=fecha_fin
-                ).exists()
-                
-                if not existe:
-                    # Obtener el saldo anterior (último estado de cuenta)
-                    saldo_anterior = 0
-                    ultimo_estado = EstadoCuenta.objects.filter(
-                        vivienda=vivienda,
-                        fecha_fin__lt=fecha_inicio
-                    ).order_by('-fecha_fin').first()
-                    
-                    if ultimo_estado:
-                        saldo_anterior = ultimo_estado.saldo_final
-                    
-                    # Crear el estado de cuenta
-                    estado = EstadoCuenta.objects.create(
-                        vivienda=vivienda,
-                        fecha_inicio=fecha_inicio,
-                        fecha_fin=fecha_fin,
-                        saldo_anterior=saldo_anterior
-                    )
-                    
-                    # Calcular totales
-                    estado.calcular_totales()
-                    estados_creados += 1
+            # Crear los estados de cuenta en bloque; se omiten los períodos ya generados
+            resultado = generar_estados_cuenta_masivos(viviendas, fecha_inicio, fecha_fin)
+            estados_creados = resultado['creados']
             
             messages.success(request, f'Se han generado {estados_creados} estados de cuenta exitosamente.')
             return redirect('estado-cuenta-list')
@@ -1246,70 +1108,33 @@ def dashboard_financiero(request):
     else:
         fin_mes_actual = hoy.replace(month=hoy.month + 1, day=1) - timedelta(days=1)
     
-    # Mes anterior
-    if hoy.month == 1:
-        inicio_mes_anterior = hoy.replace(year=hoy.year - 1, month=12, day=1)
-        fin_mes_anterior = hoy.replace(day=1) - timedelta(days=1)
-    else:
-        inicio_mes_anterior = hoy.replace(month=hoy.month - 1, day=1)
-        fin_mes_anterior = inicio_mes_actual - timedelta(days=1)
-    
     # APLICAR FILTROS SEGÚN PERMISOS
     filters_pagos = {'estado': 'VERIFICADO'}
     filters_gastos = {'estado': 'PAGADO'}
-    filters_cuotas = {'pagada': False}
     
     if vivienda_id:
         filters_pagos['vivienda_id'] = vivienda_id
-        filters_cuotas['vivienda_id'] = vivienda_id
     elif edificio_id:
         filters_pagos['vivienda__edificio_id'] = edificio_id
-        filters_cuotas['vivienda__edificio_id'] = edificio_id
-    
-    # CÁLCULOS FINANCIEROS DEL MES ACTUAL
-    
-    # Ingresos del mes actual
-    ingresos_mes_actual = Pago.objects.filter(
-        fecha_pago__gte=inicio_mes_actual,
-        fecha_pago__lte=fin_mes_actual,
-        **filters_pagos
-    ).aggregate(total=Coalesce(Sum('monto', output_field=DecimalField()), Decimal('0')))['total']
     
-    # Gastos del mes actual (solo para admin/gerente)
-    gastos_mes_actual = Decimal('0')
-    if es_admin or es_gerente:
-        gastos_filters = filters_gastos.copy()
-        if edificio_id and not es_admin:
-            gastos_filters['edificio_id'] = edificio_id
-            
-        gastos_mes_actual = Gasto.objects.filter(
-            fecha__gte=inicio_mes_actual,
-            fecha__lte=fin_mes_actual,
-            **gastos_filters
-        ).aggregate(total=Coalesce(Sum('monto', output_field=DecimalField()), Decimal('0')))['total']
+    # CÁLCULOS FINANCIEROS DESDE LOS RESÚMENES MENSUALES
+    # Los gastos son del condominio (no tienen edificio), solo para admin/gerente
+    incluir_gastos = es_admin or es_gerente
+    desde_serie, hasta_serie = rango_ultimos_meses(hoy, 6)
+    serie = serie_temporal(
+        desde_serie, hasta_serie, 'mes',
+        edificio_id=edificio_id, vivienda_id=vivienda_id, incluir_gastos=incluir_gastos
+    )
+    
+    # Mes actual y mes anterior para tendencias
+    ingresos_mes_actual = serie[-1]['ingresos']
+    gastos_mes_actual = serie[-1]['gastos']
+    ingresos_mes_anterior = serie[-2]['ingresos']
+    gastos_mes_anterior = serie[-2]['gastos']
     
     # Balance del mes
     balance_mes_actual = ingresos_mes_actual - gastos_mes_actual
     
-    # CÁLCULOS DEL MES ANTERIOR PARA TENDENCIAS
-    ingresos_mes_anterior = Pago.objects.filter(
-        fecha_pago__gte=inicio_mes_anterior,
-        fecha_pago__lte=fin_mes_anterior,
-        **filters_pagos
-    ).aggregate(total=Coalesce(Sum('monto', output_field=DecimalField()), Decimal('0')))['total']
-    
-    gastos_mes_anterior = Decimal('0')
-    if es_admin or es_gerente:
-        gastos_filters = filters_gastos.copy()
-        if edificio_id and not es_admin:
-            gastos_filters['edificio_id'] = edificio_id
-            
-        gastos_mes_anterior = Gasto.objects.filter(
-            fecha__gte=inicio_mes_anterior,
-            fecha__lte=fin_mes_anterior,
-            **gastos_filters
-        ).aggregate(total=Coalesce(Sum('monto', output_field=DecimalField()), Decimal('0')))['total']
-    
     # Calcular tendencias
     if ingresos_mes_anterior > 0:
         tendencia_ingresos = float((ingresos_mes_actual - ingresos_mes_anterior) / ingresos_mes_anterior * 100)
@@ -1321,71 +1146,33 @@ def dashboard_financiero(request):
     else:
         tendencia_gastos = 100.0 if gastos_mes_actual > 0 else 0.0
     
-    # CUOTAS PENDIENTES Y VENCIDAS
-    cuotas_pendientes = Cuota.objects.filter(**filters_cuotas).count()
-    cuotas_vencidas = Cuota.objects.filter(
-        fecha_vencimiento__lt=hoy,
-        **filters_cuotas
-    ).count()
-    
-    # Total por cobrar
-    total_pendiente = Cuota.objects.filter(**filters_cuotas).aggregate(
-        total=Coalesce(Sum(F('monto') + F('recargo')), Decimal('0'))
-    )['total']
+    # CUOTAS PENDIENTES Y VENCIDAS DESDE LOS SALDOS POR VIVIENDA
+    saldos = totales_saldos(edificio_id=edificio_id, vivienda_id=vivienda_id)
+    cuotas_pendientes = saldos['cuotas_pendientes']
+    cuotas_vencidas = saldos['cuotas_vencidas']
+    total_pendiente = saldos['total_adeudado']
     
     # DATOS PARA GRÁFICOS - ÚLTIMOS 6 MESES
-    datos_meses = []
+    datos_meses = [
+        {
+            'mes': dato['etiqueta'],
+            'ingresos': float(dato['ingresos']),
+            'gastos': float(dato['gastos']),
+            'balance': float(dato['balance'])
+        }
+        for dato in serie
+    ]
     colores_categorias = [
         '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', 
         '#9966FF', '#FF9F40', '#FF6384', '#C9CBCF'
     ]
     
-    for i in range(5, -1, -1):  # Últimos 6 meses
-        if hoy.month - i <= 0:
-            mes_calculo = hoy.replace(year=hoy.year - 1, month=12 + (hoy.month - i))
-        else:
-            mes_calculo = hoy.replace(month=hoy.month - i)
-        
-        inicio_mes = mes_calculo.replace(day=1)
-        if mes_calculo.month == 12:
-            fin_mes = mes_calculo.replace(year=mes_calculo.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            fin_mes = mes_calculo.replace(month=mes_calculo.month + 1, day=1) - timedelta(days=1)
-        
-        # Ingresos del mes
-        ingresos = Pago.objects.filter(
-            fecha_pago__gte=inicio_mes,
-            fecha_pago__lte=fin_mes,
-            **filters_pagos
-        ).aggregate(total=Coalesce(Sum('monto', output_field=DecimalField()), Decimal('0')))['total']
-        
-        # Gastos del mes
-        gastos = Decimal('0')
-        if es_admin or es_gerente:
-            gastos_filters = filters_gastos.copy()
-            if edificio_id and not es_admin:
-                gastos_filters['edificio_id'] = edificio_id
-                
-            gastos = Gasto.objects.filter(
-                fecha__gte=inicio_mes,
-                fecha__lte=fin_mes,
-                **gastos_filters
-            ).aggregate(total=Coalesce(Sum('monto', output_field=DecimalField()), Decimal('0')))['total']
-        
-        datos_meses.append({
-            'mes': mes_calculo.strftime('%b %Y'),
-            'ingresos': float(ingresos),
-            'gastos': float(gastos),
-            'balance': float(ingresos - gastos)
-        })
-    
     # DATOS PARA GRÁFICO DE GASTOS POR CATEGORÍA
     datos_categorias = []
     if es_admin or es_gerente:
+        # Gasto no tiene edificio: los gastos son del condominio completo
         gastos_filters = filters_gastos.copy()
-        if edificio_id and not es_admin:
-            gastos_filters['edificio_id'] = edificio_id
-            
+        
         categorias_gastos = Gasto.objects.filter(
             fecha__gte=inicio_mes_actual,
             fecha__lte=fin_mes_actual,
@@ -1409,9 +1196,7 @@ def dashboard_financiero(request):
     ultimos_gastos = []
     if es_admin or es_gerente:
         gastos_filters = filters_gastos.copy()
-        if edificio_id and not es_admin:
-            gastos_filters['edificio_id'] = edificio_id
-            
+        
         ultimos_gastos = Gasto.objects.filter(**gastos_filters).select_related(
             'categoria'
         ).order_by('-fecha')[:5]
@@ -1520,6 +1305,8 @@ def api_cuotas_por_vivienda(request, vivienda_id):
             'monto': float(cuota.monto),
             'recargo': float(cuota.recargo),
             'total': float(cuota.total_a_pagar()),
+            'monto_pagado': float(cuota.monto_pagado),
+            'saldo_pendiente': float(cuota.saldo_pendiente),
             'fecha_emision': cuota.fecha_emision.strftime('%Y-%m-%d'),
             'fecha_vencimiento': cuota.fecha_vencimiento.strftime('%Y-%m-%d'),
             'pagada': cuota.pagada,
@@ -1528,6 +1315,39 @@ def api_cuotas_por_vivienda(request, vivienda_id):
     
     return JsonResponse({"cuotas": data})
 
+@login_required
+def api_saldo_vivienda(request, vivienda_id):
+    """API para obtener el saldo de cuenta corriente de una vivienda"""
+    user = request.user
+    
+    es_admin = user.rol and user.rol.nombre == 'Administrador'
+    es_gerente = user.rol and user.rol.nombre == 'Gerente'
+    es_residente = hasattr(user, 'residente') and user.rol and user.rol.nombre == 'Residente'
+    
+    # Verificar acceso a la vivienda específica
+    if es_residente:
+        if user.residente.vivienda_id != vivienda_id:
+            return JsonResponse({"error": "No tienes permisos para ver este saldo"}, status=403)
+    elif es_gerente and hasattr(user, 'gerente'):
+        if not Vivienda.objects.filter(pk=vivienda_id, edificio=user.gerente.edificio).exists():
+            return JsonResponse({"error": "No tienes permisos para ver este saldo"}, status=403)
+    elif not es_admin:
+        return JsonResponse({"error": "No tienes permisos para ver este saldo"}, status=403)
+    
+    if not Vivienda.objects.filter(pk=vivienda_id).exists():
+        return JsonResponse({"error": "Vivienda no encontrada"}, status=404)
+    
+    saldo = obtener_saldo(vivienda_id)
+    return JsonResponse({
+        "vivienda": vivienda_id,
+        "saldo": float(saldo.saldo),
+        "total_adeudado": float(saldo.total_adeudado),
+        "total_vencido": float(saldo.total_vencido),
+        "cuotas_pendientes": saldo.cuotas_pendientes,
+        "cuotas_vencidas": saldo.cuotas_vencidas,
+        "ultimo_pago": saldo.ultimo_pago.strftime('%Y-%m-%d') if saldo.ultimo_pago else None,
+    })
+
 @login_required
 def api_resumen_financiero(request):
     """API para obtener resumen financiero"""
@@ -1549,61 +1369,27 @@ def api_resumen_financiero(request):
     
     # Período
     hoy = timezone.now().date()
-    inicio_mes = hoy.replace(day=1)
-    if hoy.month == 12:
-        fin_mes = hoy.replace(year=hoy.year + 1, month=1, day=1) - timedelta(days=1)
-    else:
-        fin_mes = hoy.replace(month=hoy.month + 1, day=1) - timedelta(days=1)
     
-    # Filtros
-    filters_pagos = {'estado': 'VERIFICADO'}
-    filters_cuotas = {'pagada': False}
+    # Ingresos y gastos del mes desde los resúmenes (gastos solo para administradores)
+    inicio_mes, fin_mes = rango_ultimos_meses(hoy, 1)
+    totales_mes = serie_temporal(
+        inicio_mes, fin_mes, 'mes', edificio_id=edificio_id, vivienda_id=vivienda_id, incluir_gastos=es_admin
+    )[0]
+    ingresos_mes = totales_mes['ingresos']
+    gastos_mes = totales_mes['gastos']
+    balance_mes = totales_mes['balance']
     
-    if vivienda_id:
-        filters_pagos['vivienda_id'] = vivienda_id
-        filters_cuotas['vivienda_id'] = vivienda_id
-    elif edificio_id:
-        filters_pagos['vivienda__edificio_id'] = edificio_id
-        filters_cuotas['vivienda__edificio_id'] = edificio_id
-    
-    # Calcular ingresos del mes
-    ingresos_mes = Pago.objects.filter(
-        fecha_pago__gte=inicio_mes,
-        fecha_pago__lte=fin_mes,
-        **filters_pagos
-    ).aggregate(total=Coalesce(Sum('monto', output_field=DecimalField()), Decimal('0')))['total']
-    
-    # Calcular gastos del mes (solo para administradores)
-    gastos_mes = Decimal('0')
-    if es_admin:
-        gastos_mes = Gasto.objects.filter(
-            fecha__gte=inicio_mes,
-            fecha__lte=fin_mes,
-            estado='PAGADO'
-        ).aggregate(total=Coalesce(Sum('monto', output_field=DecimalField()), Decimal('0')))['total']
-    
-    # Calcular balance
-    balance_mes = ingresos_mes - gastos_mes
-    
-    # Calcular cuotas pendientes y vencidas
-    cuotas_pendientes = Cuota.objects.filter(**filters_cuotas).count()
-    cuotas_vencidas = Cuota.objects.filter(
-        fecha_vencimiento__lt=hoy,
-        **filters_cuotas
-    ).count()
-    
-    # Calcular total por cobrar
-    total_por_cobrar = Cuota.objects.filter(**filters_cuotas).aggregate(
-        total=Coalesce(Sum(F('monto') + F('recargo')), Decimal('0'))
-    )['total']
+    # Cuotas pendientes, vencidas y total por cobrar desde los saldos por vivienda
+    saldos = totales_saldos(edificio_id=edificio_id, vivienda_id=vivienda_id)
     
     data = {
         "ingresos_mes": float(ingresos_mes),
         "gastos_mes": float(gastos_mes),
         "balance_mes": float(balance_mes),
-        "cuotas_pendientes": cuotas_pendientes,
-        "cuotas_vencidas": cuotas_vencidas,
-        "total_por_cobrar": float(total_por_cobrar)
+        "cuotas_pendientes": saldos['cuotas_pendientes'],
+        "cuotas_vencidas": saldos['cuotas_vencidas'],
+        "total_por_cobrar": float(saldos['total_adeudado']),
+        "total_vencido": float(saldos['total_vencido']),
     }
     
     return JsonResponse(data)
@@ -1639,60 +1425,36 @@ def dashboard_financiero_api(request):
     hoy = timezone.now().date()
     
     # Filtros base
-    filters_pagos = {'estado': 'VERIFICADO'}
     filters_gastos = {'estado': 'PAGADO'}
     
-    if vivienda_id:
-        filters_pagos['vivienda_id'] = vivienda_id
-    elif edificio_id:
-        filters_pagos['vivienda__edificio_id'] = edificio_id
-    
-    # DATOS PARA GRÁFICOS - ÚLTIMOS 6 MESES
-    datos_meses = []
+    # DATOS PARA GRÁFICOS - ÚLTIMOS N MESES (6 por defecto) CON LA GRANULARIDAD PEDIDA
+    granularidad = request.GET.get('granularidad', 'mes')
+    if granularidad not in GRANULARIDADES:
+        return JsonResponse({"error": "Granularidad no válida"}, status=400)
+    try:
+        meses = min(max(int(request.GET.get('meses', 6)), 1), MAXIMO_MESES_SERIE)
+    except ValueError:
+        meses = 6
+    
+    desde_serie, hasta_serie = rango_ultimos_meses(hoy, meses)
+    serie = serie_temporal(
+        desde_serie, hasta_serie, granularidad,
+        edificio_id=edificio_id, vivienda_id=vivienda_id, incluir_gastos=es_admin or es_gerente
+    )
+    datos_meses = [
+        {
+            'mes': dato['etiqueta'],
+            'ingresos': float(dato['ingresos']),
+            'gastos': float(dato['gastos']),
+            'balance': float(dato['balance'])
+        }
+        for dato in serie
+    ]
     colores_categorias = [
         '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', 
         '#9966FF', '#FF9F40', '#FF6384', '#C9CBCF'
     ]
     
-    for i in range(5, -1, -1):  # Últimos 6 meses
-        if hoy.month - i <= 0:
-            mes_calculo = hoy.replace(year=hoy.year - 1, month=12 + (hoy.month - i))
-        else:
-            mes_calculo = hoy.replace(month=hoy.month - i)
-        
-        inicio_mes = mes_calculo.replace(day=1)
-        if mes_calculo.month == 12:
-            fin_mes = mes_calculo.replace(year=mes_calculo.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            fin_mes = mes_calculo.replace(month=mes_calculo.month + 1, day=1) - timedelta(days=1)
-        
-        # Ingresos del mes
-        ingresos = Pago.objects.filter(
-            fecha_pago__gte=inicio_mes,
-            fecha_pago__lte=fin_mes,
-            **filters_pagos
-        ).aggregate(total=Coalesce(Sum('monto', output_field=DecimalField()), Decimal('0')))['total']
-        
-        # Gastos del mes
-        gastos = Decimal('0')
-        if es_admin or es_gerente:
-            gastos_filters = filters_gastos.copy()
-            if edificio_id and not es_admin:
-                gastos_filters['edificio_id'] = edificio_id
-                
-            gastos = Gasto.objects.filter(
-                fecha__gte=inicio_mes,
-                fecha__lte=fin_mes,
-                **gastos_filters
-            ).aggregate(total=Coalesce(Sum('monto', output_field=DecimalField()), Decimal('0')))['total']
-        
-        datos_meses.append({
-            'mes': mes_calculo.strftime('%b %Y'),
-            'ingresos': float(ingresos),
-            'gastos': float(gastos),
-            'balance': float(ingresos - gastos)
-        })
-    
     # DATOS PARA GRÁFICO DE GASTOS POR CATEGORÍA DEL MES ACTUAL
     inicio_mes_actual = hoy.replace(day=1)
     if hoy.month == 12:
@@ -1703,9 +1465,7 @@ def dashboard_financiero_api(request):
     datos_categorias = []
     if es_admin or es_gerente:
         gastos_filters = filters_gastos.copy()
-        if edificio_id and not es_admin:
-            gastos_filters['edificio_id'] = edificio_id
-            
+        
         categorias_gastos = Gasto.objects.filter(
             fecha__gte=inicio_mes_actual,
             fecha__lte=fin_mes_actual,
@@ -1722,6 +1482,7 @@ def dashboard_financiero_api(request):
             })
     
     return JsonResponse({
+        'granularidad': granularidad,
         'datos_meses': datos_meses,
         'datos_categorias': datos_categorias
     })
\ No newline at end of file
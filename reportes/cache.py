@@ -0,0 +1,203 @@
+# reportes/cache.py - Caché de archivos de reportes por huella de datos
+import hashlib
+import json
+import logging
+import tempfile
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+
+from financiero.models import ResumenMensual
+from .datos import (
+    TAMANO_LOTE_EXPORTACION, empleados_reporte, gastos_reporte, pagos_reporte, periodo_reporte, residentes_reporte,
+    visitas_reporte, viviendas_reporte,
+)
+from .generacion import EXTENSIONES, escribir_reporte
+from .models import Reporte, ResultadoReporte
+
+logger = logging.getLogger(__name__)
+
+# Cambiar al modificar plantillas o gráficos para invalidar los archivos guardados
+VERSION_CACHE = 3
+
+# Días tras los cuales se eliminan los archivos que no se volvieron a generar
+DIAS_RETENCION_CACHE = 30
+
+# El CSV se envía por partes desde la base de datos y no pasa por la caché
+FORMATOS_EN_CACHE = ('PDF', 'HTML', 'EXCEL')
+
+
+def _digesto_filas(queryset, columnas):
+    """
+    Hash de las columnas que muestran los archivos, fila por fila y leídas por
+    lotes: cambia al editar un registro o los de tablas relacionadas (nombres
+    de edificios o de usuarios) y no solo al agregar o eliminar filas.
+    """
+    digesto = hashlib.sha256()
+    filas = 0
+    for fila in queryset.order_by('id').values_list(*columnas).iterator(chunk_size=TAMANO_LOTE_EXPORTACION):
+        digesto.update(json.dumps(fila, default=str).encode('utf-8'))
+        filas += 1
+    return {'filas': filas, 'digesto': digesto.hexdigest()}
+
+
+def _huella_accesos(reporte):
+    return _digesto_filas(visitas_reporte(reporte), [
+        'id', 'nombre_visitante', 'documento_visitante', 'motivo', 'fecha_hora_entrada', 'fecha_hora_salida',
+        'vivienda_destino__numero', 'vivienda_destino__piso', 'vivienda_destino__edificio__nombre',
+    ])
+
+
+def _huella_residentes(reporte):
+    return _digesto_filas(residentes_reporte(reporte), [
+        'id', 'fecha_ingreso', 'activo', 'es_propietario', 'vehiculos',
+        'usuario__first_name', 'usuario__last_name', 'usuario__email',
+        'vivienda__numero', 'vivienda__piso', 'vivienda__edificio__nombre',
+    ])
+
+
+def _huella_viviendas(reporte):
+    return _digesto_filas(viviendas_reporte(reporte), [
+        'id', 'numero', 'piso', 'metros_cuadrados', 'habitaciones', 'baños', 'estado', 'activo',
+        'edificio__nombre',
+    ])
+
+
+def _huella_personal(reporte):
+    return _digesto_filas(empleados_reporte(reporte), [
+        'id', 'fecha_contratacion', 'tipo_contrato', 'especialidad', 'activo',
+        'usuario__first_name', 'usuario__last_name', 'puesto__nombre', 'edificio__nombre',
+    ])
+
+
+def _huella_financiero(reporte):
+    fecha_desde, fecha_hasta = periodo_reporte(reporte)
+    huella = ResumenMensual.objects.filter(
+        mes__gte=fecha_desde.replace(day=1),
+        mes__lte=fecha_hasta,
+    ).aggregate(actualizado=Max('fecha_actualizacion'), resumenes=Count('id'))
+    huella.update(pagos_reporte(reporte).aggregate(pagos=Count('id'), ultimo_pago=Max('id'), ingresos=Sum('monto')))
+    huella.update(gastos_reporte(reporte).aggregate(gastos=Count('id'), ultimo_gasto=Max('id'), egresos=Sum('monto')))
+    return huella
+
+
+# Datos de los que depende cada tipo de reporte: las columnas de cada fila en
+# los listados y los agregados de los resúmenes mensuales en el financiero
+HUELLAS = {
+    'ACCESOS': _huella_accesos,
+    'RESIDENTES': _huella_residentes,
+    'VIVIENDAS': _huella_viviendas,
+    'PERSONAL': _huella_personal,
+    'FINANCIERO': _huella_financiero,
+}
+
+
+def _hash(datos):
+    return hashlib.sha256(json.dumps(datos, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def clave_reporte(reporte, formato, granularidad=None, por_edificio=False):
+    """Hash de los parámetros que definen el contenido del archivo"""
+    fecha_desde, fecha_hasta = periodo_reporte(reporte)
+    return _hash({
+        'version': VERSION_CACHE,
+        'tipo': reporte.tipo,
+        # El nombre aparece en el encabezado de los PDF y HTML
+        'nombre': reporte.nombre,
+        'formato': formato,
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+        'edificio': reporte.edificio_id,
+        'granularidad': granularidad or '',
+        'por_edificio': por_edificio,
+    })
+
+
+def huella_datos(reporte):
+    """Hash de los datos de origen de un reporte"""
+    return _hash(HUELLAS[reporte.tipo](reporte))
+
+
+def _vigente(resultado, huella):
+    return resultado is not None and resultado.huella == huella and default_storage.exists(resultado.archivo.name)
+
+
+def _contar_acierto(reporte):
+    Reporte.objects.filter(pk=reporte.pk).update(cache_aciertos=F('cache_aciertos') + 1)
+
+
+def buscar_reporte_en_cache(reporte, formato, granularidad=None, por_edificio=False, contar=True):
+    """
+    Devuelve el archivo guardado de un reporte si sigue vigente, o None si
+    no existe o cambió la huella de sus datos; nunca lo genera. Lo usan las
+    vistas para servir los aciertos y encolar la generación de los fallos.
+    """
+    clave = clave_reporte(reporte, formato, granularidad, por_edificio)
+    resultado = ResultadoReporte.objects.filter(clave=clave).first()
+    if not _vigente(resultado, huella_datos(reporte)):
+        return None
+    if contar:
+        _contar_acierto(reporte)
+    return resultado
+
+
+def obtener_reporte_en_cache(reporte, formato, granularidad=None, por_edificio=False, contar=True):
+    """
+    Devuelve el archivo guardado de un reporte y si se sirvió desde la caché.
+    Solo se genera de nuevo si no existe o si cambió la huella de sus datos;
+    el archivo anterior se elimina y se registra la última generación del
+    reporte. Con contar, los contadores del reporte registran aciertos y
+    fallos; la pregeneración programada no cuenta como descarga.
+    """
+    clave = clave_reporte(reporte, formato, granularidad, por_edificio)
+    huella = huella_datos(reporte)
+
+    resultado = ResultadoReporte.objects.filter(clave=clave).first()
+    if _vigente(resultado, huella):
+        if contar:
+            _contar_acierto(reporte)
+        return resultado, True
+
+    anterior = resultado.archivo.name if resultado else None
+    with tempfile.TemporaryFile() as archivo:
+        escribir_reporte(reporte, formato, archivo, granularidad, por_edificio)
+        archivo.seek(0)
+        nombre = default_storage.save(
+            f"reportes/cache/{clave[:16]}_{huella[:12]}.{EXTENSIONES[formato]}", File(archivo)
+        )
+
+    ahora = timezone.now()
+    resultado, _ = ResultadoReporte.objects.update_or_create(clave=clave, defaults={
+        'huella': huella,
+        'tipo': reporte.tipo,
+        'formato': formato,
+        'archivo': nombre,
+        'fecha_generacion': ahora,
+    })
+    if anterior and anterior != nombre:
+        default_storage.delete(anterior)
+
+    actualizacion = {'ultima_generacion': ahora}
+    if contar:
+        actualizacion['cache_fallos'] = F('cache_fallos') + 1
+    Reporte.objects.filter(pk=reporte.pk).update(**actualizacion)
+    logger.info(f"Reporte {reporte.pk} ({reporte.tipo}, {formato}) generado y guardado en caché")
+    return resultado, False
+
+
+def eliminar_resultados_antiguos(dias=DIAS_RETENCION_CACHE):
+    """
+    Elimina los archivos generados hace más de los días indicados. Los
+    períodos móviles cambian de clave cada día y sus archivos anteriores no se
+    vuelven a pedir; si alguno se pide, se genera de nuevo.
+    """
+    antiguos = ResultadoReporte.objects.filter(fecha_generacion__lt=timezone.now() - timedelta(days=dias))
+    eliminados = 0
+    for resultado in antiguos.only('id', 'archivo'):
+        default_storage.delete(resultado.archivo.name)
+        resultado.delete()
+        eliminados += 1
+    return eliminados
@@ -0,0 +1,289 @@
+# reportes/datos.py - Datos de cada tipo de reporte, compartidos por todos los formatos
+import copy
+import heapq
+from datetime import datetime, time, timedelta
+from itertools import islice
+from operator import itemgetter
+
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from accesos.models import Visita
+from financiero.models import Gasto, Pago
+from financiero.series import GRANULARIDADES, granularidad_sugerida, serie_temporal
+from personal.models import Empleado
+from viviendas.models import Residente, Vivienda
+
+# Filas que se leen de la base de datos en cada viaje del cursor
+TAMANO_LOTE_EXPORTACION = 2000
+
+
+def con_periodo_movil(reporte, hoy=None):
+    """
+    Copia del reporte con su período móvil (los últimos ventana_dias días
+    hasta hoy) convertido en fechas; sin período móvil, el mismo reporte.
+    """
+    if not reporte.ventana_dias:
+        return reporte
+    hoy = hoy or timezone.localdate()
+    copia = copy.copy(reporte)
+    copia.fecha_desde = hoy - timedelta(days=reporte.ventana_dias - 1)
+    copia.fecha_hasta = hoy
+    return copia
+
+
+def periodo_reporte(reporte):
+    """Período del reporte financiero; por defecto, el mes en curso"""
+    hoy = timezone.now().date()
+    return reporte.fecha_desde or hoy.replace(day=1), reporte.fecha_hasta or hoy
+
+
+def _inicio_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _filtrar(queryset, reporte, campo_fecha=None, campo_edificio=None, fecha_hora=False):
+    """
+    Aplica el período y el edificio del reporte. En campos de fecha y hora el
+    período se convierte en un rango de instantes para poder usar los índices.
+    """
+    if campo_fecha and reporte.fecha_desde:
+        desde = _inicio_dia(reporte.fecha_desde) if fecha_hora else reporte.fecha_desde
+        queryset = queryset.filter(**{f'{campo_fecha}__gte': desde})
+    if campo_fecha and reporte.fecha_hasta:
+        if fecha_hora:
+            queryset = queryset.filter(**{f'{campo_fecha}__lt': _inicio_dia(reporte.fecha_hasta + timedelta(days=1))})
+        else:
+            queryset = queryset.filter(**{f'{campo_fecha}__lte': reporte.fecha_hasta})
+    if campo_edificio and reporte.edificio_id:
+        queryset = queryset.filter(**{campo_edificio: reporte.edificio_id})
+    return queryset
+
+
+def visitas_reporte(reporte):
+    """Visitas que entraron en el período, con destino en el edificio del reporte"""
+    return _filtrar(
+        Visita.objects.all(), reporte, 'fecha_hora_entrada', 'vivienda_destino__edificio_id', fecha_hora=True
+    )
+
+
+def residentes_reporte(reporte):
+    """Residentes que ingresaron en el período, de viviendas del edificio del reporte"""
+    return _filtrar(Residente.objects.all(), reporte, 'fecha_ingreso', 'vivienda__edificio_id')
+
+
+def viviendas_reporte(reporte):
+    """Viviendas del edificio del reporte; no tienen fecha a la que aplicar el período"""
+    return _filtrar(Vivienda.objects.all(), reporte, campo_edificio='edificio_id')
+
+
+def empleados_reporte(reporte):
+    """Empleados contratados en el período, asignados al edificio del reporte"""
+    return _filtrar(Empleado.objects.all(), reporte, 'fecha_contratacion', 'edificio_id')
+
+
+# Registros que listan los reportes que no son financieros
+LISTADOS = {
+    'ACCESOS': visitas_reporte,
+    'RESIDENTES': residentes_reporte,
+    'VIVIENDAS': viviendas_reporte,
+    'PERSONAL': empleados_reporte,
+}
+
+
+def contar_filas(reporte):
+    """Cantidad de filas de detalle de un reporte de listado"""
+    return LISTADOS[reporte.tipo](reporte).count()
+
+
+def pagos_reporte(reporte):
+    """Pagos verificados del período, de viviendas del edificio del reporte"""
+    fecha_desde, fecha_hasta = periodo_reporte(reporte)
+    pagos = Pago.objects.filter(estado='VERIFICADO', fecha_pago__gte=fecha_desde, fecha_pago__lte=fecha_hasta)
+    if reporte.edificio_id:
+        pagos = pagos.filter(vivienda__edificio_id=reporte.edificio_id)
+    return pagos
+
+
+def gastos_reporte(reporte):
+    """Gastos pagados del período; son del condominio completo y no se filtran por edificio"""
+    fecha_desde, fecha_hasta = periodo_reporte(reporte)
+    return Gasto.objects.filter(estado='PAGADO', fecha__gte=fecha_desde, fecha__lte=fecha_hasta)
+
+
+def visitas_por_dia(reporte):
+    """Visitas por día del período: lista de (fecha, total) ordenada"""
+    return list(
+        visitas_reporte(reporte).annotate(dia=TruncDate('fecha_hora_entrada')).order_by('dia').values_list(
+            'dia'
+        ).annotate(total=Count('id'))
+    )
+
+
+def visitas_por_edificio(reporte):
+    """Visitas activas y finalizadas por edificio: lista de (edificio, activas, finalizadas)"""
+    return [
+        (edificio, activas, total - activas)
+        for edificio, total, activas in visitas_reporte(reporte).order_by().values_list(
+            'vivienda_destino__edificio__nombre'
+        ).annotate(
+            total=Count('id'),
+            activas=Count('id', filter=Q(fecha_hora_salida__isnull=True)),
+        ).order_by('vivienda_destino__edificio__nombre')
+    ]
+
+
+def movimientos_reporte(reporte, limite=None):
+    """
+    Ingresos y egresos del período de la fecha más reciente a la más antigua,
+    como iterador de diccionarios. Cada tabla se lee ya ordenada y por lotes,
+    y ambas se intercalan con heapq.merge sin ordenar en memoria.
+    """
+    ingresos = pagos_reporte(reporte).order_by('-fecha_pago', '-id').values_list('fecha_pago', 'monto')
+    egresos = gastos_reporte(reporte).order_by('-fecha', '-id').values_list('fecha', 'concepto', 'monto')
+    if limite is not None:
+        ingresos = ingresos[:limite]
+        egresos = egresos[:limite]
+
+    movimientos = heapq.merge(
+        (
+            {'fecha': fecha, 'concepto': 'Ingreso', 'tipo': 'Ingreso', 'monto': monto}
+            for fecha, monto in ingresos.iterator(chunk_size=TAMANO_LOTE_EXPORTACION)
+        ),
+        (
+            {'fecha': fecha, 'concepto': concepto, 'tipo': 'Egreso', 'monto': monto}
+            for fecha, concepto, monto in egresos.iterator(chunk_size=TAMANO_LOTE_EXPORTACION)
+        ),
+        key=itemgetter('fecha'),
+        reverse=True,
+    )
+    return islice(movimientos, limite) if limite is not None else movimientos
+
+
+def _filas(queryset, limite):
+    """Filas para las plantillas: completas, o solo las primeras en la vista previa"""
+    return list(queryset[:limite]) if limite is not None else queryset
+
+
+def _datos_accesos(reporte, granularidad, limite):
+    visitas = visitas_reporte(reporte)
+    conteos = visitas.aggregate(
+        total=Count('id'),
+        activas=Count('id', filter=Q(fecha_hora_salida__isnull=True)),
+    )
+    return {
+        'visitas': _filas(
+            visitas.select_related('vivienda_destino').only(
+                'id', 'nombre_visitante', 'documento_visitante', 'fecha_hora_entrada', 'fecha_hora_salida',
+                'vivienda_destino__numero', 'vivienda_destino__piso',
+            ).order_by('-fecha_hora_entrada', '-id'),
+            limite,
+        ),
+        'total_visitas': conteos['total'],
+        'visitas_activas': conteos['activas'],
+        'visitas_finalizadas': conteos['total'] - conteos['activas'],
+    }
+
+
+def _datos_residentes(reporte, granularidad, limite):
+    residentes = residentes_reporte(reporte)
+    conteos = residentes.aggregate(
+        total=Count('id'),
+        activos=Count('id', filter=Q(activo=True)),
+        propietarios=Count('id', filter=Q(es_propietario=True)),
+    )
+    return {
+        'residentes': _filas(
+            residentes.select_related('usuario', 'vivienda').only(
+                'id', 'fecha_ingreso', 'activo', 'es_propietario',
+                'usuario__first_name', 'usuario__last_name', 'vivienda__numero', 'vivienda__piso',
+            ).order_by('id'),
+            limite,
+        ),
+        'total_residentes': conteos['total'],
+        'activos': conteos['activos'],
+        'inactivos': conteos['total'] - conteos['activos'],
+        'propietarios': conteos['propietarios'],
+        'inquilinos': conteos['total'] - conteos['propietarios'],
+    }
+
+
+def _datos_viviendas(reporte, granularidad, limite):
+    viviendas = viviendas_reporte(reporte)
+    conteos = viviendas.aggregate(
+        total=Count('id'),
+        ocupadas=Count('id', filter=Q(estado='OCUPADO')),
+        desocupadas=Count('id', filter=Q(estado='DESOCUPADO')),
+        mantenimiento=Count('id', filter=Q(estado='MANTENIMIENTO')),
+    )
+    return {
+        'viviendas': _filas(
+            viviendas.select_related('edificio').only(
+                'id', 'numero', 'piso', 'metros_cuadrados', 'habitaciones', 'baños', 'estado', 'edificio__nombre',
+            ).order_by('edificio__nombre', 'piso', 'numero'),
+            limite,
+        ),
+        'total_viviendas': conteos['total'],
+        'ocupadas': conteos['ocupadas'],
+        'desocupadas': conteos['desocupadas'],
+        'mantenimiento': conteos['mantenimiento'],
+        'porcentaje_ocupacion': (conteos['ocupadas'] / conteos['total']) * 100 if conteos['total'] else 0,
+    }
+
+
+def _datos_personal(reporte, granularidad, limite):
+    empleados = empleados_reporte(reporte)
+    conteos = empleados.aggregate(total=Count('id'), activos=Count('id', filter=Q(activo=True)))
+    return {
+        'empleados': _filas(
+            empleados.select_related('usuario', 'puesto').only(
+                'id', 'fecha_contratacion', 'tipo_contrato', 'especialidad', 'activo',
+                'usuario__first_name', 'usuario__last_name', 'puesto__nombre',
+            ).order_by('id'),
+            limite,
+        ),
+        'total_empleados': conteos['total'],
+        'activos': conteos['activos'],
+        'inactivos': conteos['total'] - conteos['activos'],
+    }
+
+
+def _datos_financiero(reporte, granularidad, limite):
+    fecha_desde, fecha_hasta = periodo_reporte(reporte)
+    if granularidad not in GRANULARIDADES:
+        granularidad = granularidad_sugerida(fecha_desde, fecha_hasta)
+
+    # Totales y evolución por período: una consulta por métrica
+    serie = serie_temporal(fecha_desde, fecha_hasta, granularidad, edificio_id=reporte.edificio_id)
+    total_ingresos = sum(periodo['ingresos'] for periodo in serie)
+    total_egresos = sum(periodo['gastos'] for periodo in serie)
+    return {
+        'movimientos': list(movimientos_reporte(reporte, limite)),
+        'total_ingresos': total_ingresos,
+        'total_egresos': total_egresos,
+        'balance': total_ingresos - total_egresos,
+        'serie': serie,
+    }
+
+
+DATOS = {
+    'ACCESOS': _datos_accesos,
+    'RESIDENTES': _datos_residentes,
+    'VIVIENDAS': _datos_viviendas,
+    'PERSONAL': _datos_personal,
+    'FINANCIERO': _datos_financiero,
+}
+
+
+def datos_reporte(reporte, granularidad=None, limite=None):
+    """
+    Contadores y filas de un reporte con su período y edificio. Los contadores
+    salen de una sola consulta con agregados condicionales y las filas traen
+    solo las columnas que usan las plantillas, con sus relaciones en la misma
+    consulta. Con limite solo se leen las primeras filas (vista previa).
+    """
+    datos = DATOS[reporte.tipo](reporte, granularidad, limite)
+    if reporte.edificio_id:
+        datos['nombre_edificio'] = reporte.edificio.nombre
+    return datos
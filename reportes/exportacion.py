@@ -0,0 +1,285 @@
+# reportes/exportacion.py - Exportación de reportes por partes (streaming)
+import csv
+from datetime import datetime
+
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .datos import (
+    TAMANO_LOTE_EXPORTACION, empleados_reporte, gastos_reporte, movimientos_reporte, pagos_reporte,
+    periodo_reporte, residentes_reporte, visitas_reporte, viviendas_reporte,
+)
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: write() devuelve la línea en lugar de guardarla"""
+
+    def write(self, valor):
+        return valor
+
+
+def _formatear(valor):
+    """Valor de una celda: fechas locales, booleanos legibles y vacío para None"""
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sí' if valor else 'No'
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M')
+    return valor
+
+
+def _iterar(queryset, campos):
+    """Recorre un QuerySet por lotes leyendo solo las columnas indicadas"""
+    return queryset.values_list(*campos).iterator(chunk_size=TAMANO_LOTE_EXPORTACION)
+
+
+def _filas_accesos(reporte):
+    return _iterar(
+        visitas_reporte(reporte).order_by('-fecha_hora_entrada', '-id'),
+        ['id', 'nombre_visitante', 'documento_visitante', 'vivienda_destino__edificio__nombre',
+         'vivienda_destino__numero', 'fecha_hora_entrada', 'fecha_hora_salida', 'motivo'],
+    )
+
+
+def _filas_residentes(reporte):
+    return _iterar(
+        residentes_reporte(reporte).order_by('id'),
+        ['id', 'usuario__first_name', 'usuario__last_name', 'usuario__email', 'vivienda__edificio__nombre',
+         'vivienda__numero', 'es_propietario', 'activo', 'fecha_ingreso', 'vehiculos'],
+    )
+
+
+def _filas_viviendas(reporte):
+    return _iterar(
+        viviendas_reporte(reporte).order_by('edificio__nombre', 'piso', 'numero'),
+        ['id', 'edificio__nombre', 'numero', 'piso', 'metros_cuadrados', 'habitaciones', 'baños',
+         'estado', 'activo'],
+    )
+
+
+def _filas_personal(reporte):
+    return _iterar(
+        empleados_reporte(reporte).order_by('id'),
+        ['id', 'usuario__first_name', 'usuario__last_name', 'puesto__nombre', 'edificio__nombre',
+         'tipo_contrato', 'fecha_contratacion', 'especialidad', 'activo'],
+    )
+
+
+def _filas_financiero(reporte):
+    """Ingresos y egresos del período, intercalados por fecha sin cargarlos en memoria"""
+    return (
+        (movimiento['fecha'], movimiento['concepto'], movimiento['tipo'], movimiento['monto'])
+        for movimiento in movimientos_reporte(reporte)
+    )
+
+
+def _resumen_accesos(reporte):
+    visitas = visitas_reporte(reporte)
+    totales = visitas.aggregate(
+        total=Count('id'),
+        activas=Count('id', filter=Q(fecha_hora_salida__isnull=True)),
+    )
+    por_edificio = visitas.order_by().values_list('vivienda_destino__edificio__nombre').annotate(
+        total=Count('id'),
+        activas=Count('id', filter=Q(fecha_hora_salida__isnull=True)),
+    ).order_by('vivienda_destino__edificio__nombre')
+    return (
+        [
+            ('Total de visitas', totales['total']),
+            ('Visitas activas', totales['activas']),
+            ('Visitas finalizadas', totales['total'] - totales['activas']),
+        ],
+        ['Edificio', 'Visitas', 'Activas'],
+        por_edificio,
+    )
+
+
+def _resumen_residentes(reporte):
+    residentes = residentes_reporte(reporte)
+    conteos = dict(
+        total=Count('id'),
+        activos=Count('id', filter=Q(activo=True)),
+        propietarios=Count('id', filter=Q(es_propietario=True)),
+    )
+    totales = residentes.aggregate(**conteos)
+    por_edificio = residentes.order_by().values_list('vivienda__edificio__nombre').annotate(
+        **conteos
+    ).order_by('vivienda__edificio__nombre')
+    return (
+        [
+            ('Total de residentes', totales['total']),
+            ('Activos', totales['activos']),
+            ('Inactivos', totales['total'] - totales['activos']),
+            ('Propietarios', totales['propietarios']),
+            ('Inquilinos', totales['total'] - totales['propietarios']),
+        ],
+        ['Edificio', 'Residentes', 'Activos', 'Propietarios'],
+        por_edificio,
+    )
+
+
+def _resumen_viviendas(reporte):
+    viviendas = viviendas_reporte(reporte)
+    conteos = dict(
+        total=Count('id'),
+        ocupadas=Count('id', filter=Q(estado='OCUPADO')),
+        desocupadas=Count('id', filter=Q(estado='DESOCUPADO')),
+        mantenimiento=Count('id', filter=Q(estado='MANTENIMIENTO')),
+    )
+    totales = viviendas.aggregate(**conteos)
+    por_edificio = viviendas.order_by().values_list('edificio__nombre').annotate(**conteos).order_by('edificio__nombre')
+    return (
+        [
+            ('Total de viviendas', totales['total']),
+            ('Ocupadas', totales['ocupadas']),
+            ('Desocupadas', totales['desocupadas']),
+            ('En mantenimiento', totales['mantenimiento']),
+        ],
+        ['Edificio', 'Viviendas', 'Ocupadas', 'Desocupadas', 'En mantenimiento'],
+        por_edificio,
+    )
+
+
+def _resumen_personal(reporte):
+    empleados = empleados_reporte(reporte)
+    conteos = dict(total=Count('id'), activos=Count('id', filter=Q(activo=True)))
+    totales = empleados.aggregate(**conteos)
+    por_edificio = empleados.order_by().values_list('edificio__nombre').annotate(**conteos).order_by('edificio__nombre')
+    return (
+        [
+            ('Total de empleados', totales['total']),
+            ('Activos', totales['activos']),
+            ('Inactivos', totales['total'] - totales['activos']),
+        ],
+        ['Edificio', 'Empleados', 'Activos'],
+        por_edificio,
+    )
+
+
+def _resumen_financiero(reporte):
+    fecha_desde, fecha_hasta = periodo_reporte(reporte)
+    cero = Coalesce(Sum('monto'), 0, output_field=DecimalField())
+    pagos = pagos_reporte(reporte)
+    total_ingresos = pagos.aggregate(total=cero)['total']
+    total_egresos = gastos_reporte(reporte).aggregate(total=cero)['total']
+    # Los gastos son del condominio completo: por edificio solo se desglosan los ingresos
+    por_edificio = pagos.order_by().values_list('vivienda__edificio__nombre').annotate(
+        pagos=Count('id'),
+        total=cero,
+    ).order_by('vivienda__edificio__nombre')
+    return (
+        [
+            ('Desde', fecha_desde),
+            ('Hasta', fecha_hasta),
+            ('Total ingresos', total_ingresos),
+            ('Total egresos', total_egresos),
+            ('Balance', total_ingresos - total_egresos),
+        ],
+        ['Edificio', 'Pagos', 'Ingresos'],
+        por_edificio,
+    )
+
+
+# Encabezados, filas y resumen (totales y desglose por edificio) de cada tipo de reporte
+EXPORTACIONES = {
+    'ACCESOS': (
+        ['ID', 'Visitante', 'Documento', 'Edificio', 'Vivienda', 'Entrada', 'Salida', 'Motivo'],
+        _filas_accesos,
+        _resumen_accesos,
+    ),
+    'RESIDENTES': (
+        ['ID', 'Nombre', 'Apellido', 'Email', 'Edificio', 'Vivienda', 'Propietario', 'Activo',
+         'Fecha de ingreso', 'Vehículos'],
+        _filas_residentes,
+        _resumen_residentes,
+    ),
+    'VIVIENDAS': (
+        ['ID', 'Edificio', 'Número', 'Piso', 'Metros cuadrados', 'Habitaciones', 'Baños', 'Estado', 'Activo'],
+        _filas_viviendas,
+        _resumen_viviendas,
+    ),
+    'PERSONAL': (
+        ['ID', 'Nombre', 'Apellido', 'Puesto', 'Edificio', 'Tipo de contrato', 'Fecha de contratación',
+         'Especialidad', 'Activo'],
+        _filas_personal,
+        _resumen_personal,
+    ),
+    'FINANCIERO': (
+        ['Fecha', 'Concepto', 'Tipo', 'Monto'],
+        _filas_financiero,
+        _resumen_financiero,
+    ),
+}
+
+
+def filas_reporte(reporte):
+    """Encabezados y un iterador perezoso de filas para un reporte"""
+    encabezados, filas, _ = EXPORTACIONES[reporte.tipo]
+    return encabezados, filas(reporte)
+
+
+def iterar_csv(reporte):
+    """Produce el CSV de un reporte línea a línea"""
+    encabezados, filas = filas_reporte(reporte)
+    writer = csv.writer(_Eco())
+    yield writer.writerow(encabezados)
+    for fila in filas:
+        yield writer.writerow([_formatear(valor) for valor in fila])
+
+
+def respuesta_csv(reporte, filename):
+    """Respuesta que envía el CSV a medida que se leen las filas"""
+    response = StreamingHttpResponse(iterar_csv(reporte), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _valor_excel(valor):
+    """Valor de una celda de Excel: fechas y horas en hora local, sin zona horaria"""
+    if isinstance(valor, datetime) and timezone.is_aware(valor):
+        return timezone.localtime(valor)
+    return valor
+
+
+def _escribir_hoja(workbook, nombre, encabezados, filas, negrita):
+    """
+    Escribe una hoja fila a fila. En modo constant_memory cada fila se vuelca
+    a disco al pasar a la siguiente, por lo que las filas deben ir en orden.
+    """
+    hoja = workbook.add_worksheet(nombre)
+    hoja.write_row(0, 0, encabezados, negrita)
+    hoja.set_column(0, len(encabezados) - 1, 18)
+    fila = 0
+    for fila, valores in enumerate(filas, start=1):
+        hoja.write_row(fila, 0, [_valor_excel(valor) for valor in valores])
+    hoja.autofilter(0, 0, max(fila, 1), len(encabezados) - 1)
+    return fila
+
+
+def escribir_excel(reporte, destino):
+    """
+    Escribe el reporte en un libro de Excel con una hoja de detalle, una de
+    totales y una con el desglose por edificio. XlsxWriter trabaja en modo
+    constant_memory y las filas de detalle se leen por lotes, de modo que la
+    memoria usada no depende de la cantidad de filas.
+    """
+    import xlsxwriter
+
+    encabezados, filas, resumen = EXPORTACIONES[reporte.tipo]
+    totales, encabezados_edificio, por_edificio = resumen(reporte)
+
+    workbook = xlsxwriter.Workbook(destino, {
+        'constant_memory': True,
+        'default_date_format': 'dd/mm/yyyy',
+        'remove_timezone': True,
+    })
+    negrita = workbook.add_format({'bold': True})
+    try:
+        _escribir_hoja(workbook, 'Detalle', encabezados, filas(reporte), negrita)
+        _escribir_hoja(workbook, 'Totales', ['Concepto', 'Valor'], totales, negrita)
+        _escribir_hoja(workbook, 'Por edificio', encabezados_edificio, por_edificio, negrita)
+    finally:
+        workbook.close()
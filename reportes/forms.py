@@ -1,12 +1,13 @@
 from django import forms
 from .models import Reporte
+from .programacion import parsear_cron
 
 class ReporteForm(forms.ModelForm):
     class Meta:
         model = Reporte
         fields = [
             'nombre', 'tipo', 'formato_preferido', 'fecha_desde', 'fecha_hasta',
-            'es_favorito', 'puesto', 'edificio'
+            'ventana_dias', 'es_favorito', 'programacion', 'puesto', 'edificio'
         ]
         widgets = {
             'fecha_desde': forms.DateInput(attrs={'type': 'date'}),
@@ -17,4 +18,13 @@ class ReporteForm(forms.ModelForm):
         tipo_inicial = kwargs.get('initial', {}).get('tipo')
         super().__init__(*args, **kwargs)
         if tipo_inicial or self.instance.pk is None:
-            self.fields['tipo'].widget = forms.HiddenInput()
\ No newline at end of file
+            self.fields['tipo'].widget = forms.HiddenInput()
+
+    def clean_programacion(self):
+        programacion = self.cleaned_data.get('programacion', '').strip()
+        if programacion:
+            try:
+                parsear_cron(programacion)
+            except ValueError as e:
+                raise forms.ValidationError(str(e))
+        return programacion
@@ -0,0 +1,206 @@
+# reportes/generacion.py - Generación de reportes fuera de la petición
+import base64
+import logging
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import motor_pdf
+from .datos import LISTADOS, contar_filas, datos_reporte, visitas_por_dia, visitas_por_edificio
+from .exportacion import escribir_excel, iterar_csv
+from .graficos import (
+    grafico_agrupado, grafico_barras, grafico_serie_temporal, renderizar_graficos
+)
+
+logger = logging.getLogger(__name__)
+
+# Procesos de WeasyPrint y PDF que genera cada uno antes de reemplazarse, si no se configuran
+# PROCESOS_PDF_REPORTES y TRABAJOS_POR_PROCESO_PDF; con 0 procesos se genera en el proceso actual
+PROCESOS_PDF_REPORTES = 2
+TRABAJOS_POR_PROCESO_PDF = 50
+
+# Los listados con al menos esta cantidad de filas (FILAS_PDF_TABULAR) se dibujan con reportlab
+FILAS_PDF_TABULAR = 1000
+
+# Formatos que puede generar un reporte y la extensión de su archivo
+EXTENSIONES = {
+    'PDF': 'pdf',
+    'HTML': 'html',
+    'CSV': 'csv',
+    'EXCEL': 'xlsx',
+}
+
+
+def _graficos_accesos(reporte, datos, formato):
+    por_dia = visitas_por_dia(reporte)
+    por_edificio = visitas_por_edificio(reporte)
+    return [
+        grafico_serie_temporal(
+            [dia.strftime('%d/%m') for dia, _ in por_dia],
+            [('Visitas', [total for _, total in por_dia])],
+            'Visitas por Día', formato=formato
+        ),
+        grafico_barras(
+            ['Activas', 'Finalizadas'], [datos['visitas_activas'], datos['visitas_finalizadas']],
+            'Visitas Activas vs Finalizadas', formato=formato
+        ),
+        grafico_agrupado(
+            [edificio for edificio, _, _ in por_edificio],
+            [('Activas', [activas for _, activas, _ in por_edificio]),
+             ('Finalizadas', [finalizadas for _, _, finalizadas in por_edificio])],
+            'Visitas por Edificio', apilado=True, formato=formato
+        ),
+    ]
+
+
+def _graficos_residentes(reporte, datos, formato):
+    return [
+        grafico_barras(['Propietarios', 'Inquilinos'], [datos['propietarios'], datos['inquilinos']],
+                       'Propietarios vs Inquilinos', formato=formato),
+        grafico_barras(['Activos', 'Inactivos'], [datos['activos'], datos['inactivos']],
+                       'Estado de Residentes', formato=formato),
+    ]
+
+
+def _graficos_viviendas(reporte, datos, formato):
+    return [
+        grafico_barras(['Ocupadas', 'Desocupadas'], [datos['ocupadas'], datos['desocupadas']],
+                       'Ocupadas vs Desocupadas', formato=formato),
+        grafico_barras(['Total'], [datos['total_viviendas']], 'Total de Viviendas', formato=formato),
+    ]
+
+
+def _graficos_personal(reporte, datos, formato):
+    return [
+        grafico_barras(['Activos', 'Inactivos'], [datos['activos'], datos['inactivos']],
+                       'Estado de Empleados', formato=formato),
+        grafico_barras(['Total'], [datos['total_empleados']], 'Total de Empleados', formato=formato),
+    ]
+
+
+def _graficos_financiero(reporte, datos, formato):
+    etiquetas = [periodo['etiqueta'] for periodo in datos['serie']]
+    return [
+        grafico_agrupado(
+            etiquetas,
+            [('Ingresos', [periodo['ingresos'] for periodo in datos['serie']]),
+             ('Egresos', [periodo['gastos'] for periodo in datos['serie']])],
+            'Ingresos vs Egresos', formato=formato
+        ),
+        grafico_serie_temporal(
+            etiquetas, [('Balance', [periodo['balance'] for periodo in datos['serie']])],
+            'Balance por período', formato=formato
+        ),
+    ]
+
+
+# Gráficos de las plantillas PDF/HTML de cada tipo, en el orden de grafico1, grafico2...
+GRAFICOS = {
+    'ACCESOS': _graficos_accesos,
+    'RESIDENTES': _graficos_residentes,
+    'VIVIENDAS': _graficos_viviendas,
+    'PERSONAL': _graficos_personal,
+    'FINANCIERO': _graficos_financiero,
+}
+
+
+def contexto_reporte(reporte, granularidad=None, formato_graficos='png'):
+    """
+    Contexto de las plantillas PDF/HTML de un reporte con sus gráficos.
+    La granularidad de la serie financiera se elige según el período si no se indica.
+    Los gráficos se dibujan juntos fuera del proceso y se reutilizan desde la caché;
+    con formato_graficos=None no se dibujan.
+    """
+    context = {
+        'reporte': reporte,
+        'fecha_generacion': timezone.now(),
+        'logo_path': os.path.join(settings.STATIC_ROOT, 'img/logo_ofi.png'),
+    }
+    context.update(datos_reporte(reporte, granularidad))
+    if formato_graficos is None:
+        return context
+    graficos = renderizar_graficos(GRAFICOS[reporte.tipo](reporte, context, formato_graficos))
+    for numero, grafico in enumerate(graficos, start=1):
+        context[f'grafico{numero}'] = grafico
+    return context
+
+
+def html_reporte(reporte, context):
+    """HTML de un reporte con la plantilla de su tipo"""
+    return render_to_string('reportes/pdf/reporte_%s.html' % reporte.tipo.lower(), context)
+
+
+@lru_cache(maxsize=1)
+def logo_base64():
+    """Logo para incrustar en los PDF como data URI; se busca primero en static/ y luego en STATIC_ROOT"""
+    for logo_path in (
+        os.path.join(settings.BASE_DIR, 'static', 'img', 'logo_ofi.png'),
+        os.path.join(settings.STATIC_ROOT, 'img', 'logo_ofi.png'),
+    ):
+        if os.path.exists(logo_path):
+            with open(logo_path, 'rb') as image_file:
+                return f"data:image/png;base64,{base64.b64encode(image_file.read()).decode('utf-8')}"
+    logger.warning("Logo no encontrado en static/img ni en STATIC_ROOT/img; los PDF se generan sin logo")
+    return ''
+
+
+def renderizar_pdf(html):
+    """PDF de un HTML en los procesos persistentes de WeasyPrint"""
+    try:
+        return motor_pdf.renderizar(
+            html,
+            procesos=getattr(settings, 'PROCESOS_PDF_REPORTES', PROCESOS_PDF_REPORTES),
+            trabajos_por_proceso=getattr(settings, 'TRABAJOS_POR_PROCESO_PDF', TRABAJOS_POR_PROCESO_PDF),
+        )
+    except (ImportError, OSError) as e:
+        raise RuntimeError('WeasyPrint no está disponible para generar PDF') from e
+
+
+def usar_pdf_tabular(reporte):
+    """Los listados grandes se dibujan como tabla con reportlab, sin pasar por WeasyPrint"""
+    return (
+        reporte.tipo in LISTADOS
+        and contar_filas(reporte) >= getattr(settings, 'FILAS_PDF_TABULAR', FILAS_PDF_TABULAR)
+    )
+
+
+def escribir_pdf(reporte, destino, granularidad=None, contexto_extra=None):
+    """Escribe el PDF de un reporte: tabla con reportlab para listados grandes, plantilla HTML para el resto"""
+    if usar_pdf_tabular(reporte):
+        from .pdf_tabular import escribir_pdf_tabular
+
+        escribir_pdf_tabular(reporte, destino)
+        return
+    context = contexto_reporte(reporte, granularidad)
+    # Las plantillas muestran el logo incrustado y ocultan lo interactivo cuando es_pdf
+    context.update({'logo_src': logo_base64(), 'es_pdf': True})
+    context.update(contexto_extra or {})
+    destino.write(renderizar_pdf(html_reporte(reporte, context)))
+
+
+def escribir_reporte(reporte, formato, destino, granularidad=None, por_edificio=False):
+    """
+    Escribe el reporte en el formato indicado en un archivo binario abierto.
+    Con por_edificio cada edificio se genera en su propio proceso y las partes
+    se unen en un solo archivo.
+    """
+    if por_edificio:
+        from .particiones import escribir_por_edificio
+
+        escribir_por_edificio(reporte, formato, destino, granularidad)
+    elif formato == 'CSV':
+        for linea in iterar_csv(reporte):
+            destino.write(linea.encode('utf-8'))
+    elif formato == 'EXCEL':
+        escribir_excel(reporte, destino)
+    elif formato == 'PDF':
+        escribir_pdf(reporte, destino, granularidad)
+    elif formato == 'HTML':
+        # Fuera del PDF las plantillas dibujan los gráficos en el navegador con Chart.js
+        html = html_reporte(reporte, contexto_reporte(reporte, granularidad, formato_graficos=None))
+        destino.write(html.encode('utf-8'))
+    else:
+        raise ValueError(f"Formato no soportado: {formato}")
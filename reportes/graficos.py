@@ -0,0 +1,179 @@
+# reportes/graficos.py - Gráficos de los reportes con caché y dibujo en procesos separados
+import atexit
+import base64
+import hashlib
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Segundos que un gráfico dibujado se conserva en la caché
+TIEMPO_CACHE_GRAFICOS = 60 * 60 * 24
+
+# Procesos que dibujan gráficos si no se configura PROCESOS_GRAFICOS; con 1 se dibuja en este proceso
+PROCESOS_GRAFICOS = 2
+
+COLORES = ['#007bff', '#dc3545', '#28a745', '#ffc107', '#6f42c1', '#17a2b8']
+
+TIPOS_MIME = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _especificacion(tipo, etiquetas, series, titulo, formato):
+    """Descripción serializable de un gráfico; los valores se pasan a float para poder dibujarlos y compararlos"""
+    if formato not in TIPOS_MIME:
+        raise ValueError(f"Formato de gráfico no soportado: {formato}")
+    return {
+        'tipo': tipo,
+        'titulo': titulo,
+        'etiquetas': [str(etiqueta) for etiqueta in etiquetas],
+        'series': [(nombre, [float(valor or 0) for valor in valores]) for nombre, valores in series],
+        'formato': formato,
+    }
+
+
+def grafico_barras(etiquetas, valores, titulo, formato='png'):
+    """Barras simples: un valor por etiqueta"""
+    return _especificacion('barras', etiquetas, [(titulo, valores)], titulo, formato)
+
+
+def grafico_agrupado(etiquetas, series, titulo, apilado=False, formato='png'):
+    """Barras de varias series por etiqueta, lado a lado o apiladas. series: [(nombre, valores), ...]"""
+    return _especificacion('apilado' if apilado else 'agrupado', etiquetas, series, titulo, formato)
+
+
+def grafico_serie_temporal(etiquetas, series, titulo, formato='png'):
+    """Líneas con la evolución de una o más series por período. series: [(nombre, valores), ...]"""
+    return _especificacion('serie', etiquetas, series, titulo, formato)
+
+
+def clave_grafico(especificacion):
+    """Clave de caché: hash del tipo, título, etiquetas, valores y formato"""
+    contenido = json.dumps(especificacion, sort_keys=True).encode('utf-8')
+    return f"grafico_{hashlib.sha256(contenido).hexdigest()}"
+
+
+def dibujar_grafico(especificacion):
+    """
+    Dibuja un gráfico y lo devuelve como data URI. No usa la base de datos ni
+    la configuración de Django para poder ejecutarse en los procesos del pool.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    etiquetas = especificacion['etiquetas']
+    series = especificacion['series']
+    tipo = especificacion['tipo']
+    formato = especificacion['formato']
+    posiciones = list(range(len(etiquetas)))
+
+    # En SVG el texto se guarda como texto y no como trazos: el archivo pesa mucho menos
+    with matplotlib.rc_context({'svg.fonttype': 'none', 'svg.hashsalt': 'reportes'}):
+        fig, ax = plt.subplots(figsize=(5, 2.5))
+        try:
+            if tipo == 'serie':
+                for (nombre, valores), color in zip(series, COLORES):
+                    ax.plot(posiciones, valores, marker='o', markersize=3, color=color, label=nombre)
+            elif tipo == 'apilado':
+                base = [0.0] * len(etiquetas)
+                for (nombre, valores), color in zip(series, COLORES):
+                    ax.bar(posiciones, valores, bottom=base, color=color, label=nombre)
+                    base = [acumulado + valor for acumulado, valor in zip(base, valores)]
+            else:
+                ancho = 0.8 / len(series)
+                for indice, ((nombre, valores), color) in enumerate(zip(series, COLORES)):
+                    desplazamiento = (indice - (len(series) - 1) / 2) * ancho
+                    ax.bar([posicion + desplazamiento for posicion in posiciones], valores, ancho,
+                           color=color, label=nombre)
+
+            # En series largas solo se rotulan algunas posiciones para que las etiquetas no se monten
+            paso = max(1, len(etiquetas) // 12)
+            ax.set_xticks(posiciones[::paso])
+            ax.set_xticklabels(etiquetas[::paso])
+            if len(etiquetas) > 6:
+                ax.tick_params(axis='x', labelrotation=45, labelsize=7)
+            if len(series) > 1:
+                ax.legend(fontsize=7)
+            ax.set_title(especificacion['titulo'])
+            fig.tight_layout()
+
+            buf = io.BytesIO()
+            fig.savefig(buf, format=formato, metadata={'Date': None} if formato == 'svg' else None)
+        finally:
+            plt.close(fig)
+
+    contenido = base64.b64encode(buf.getvalue()).decode('utf-8')
+    return f"data:{TIPOS_MIME[formato]};base64,{contenido}"
+
+
+def _obtener_pool():
+    """Pool de procesos compartido por las peticiones de este worker; None si se dibuja aquí"""
+    global _pool
+    procesos = getattr(settings, 'PROCESOS_GRAFICOS', PROCESOS_GRAFICOS)
+    if procesos <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=procesos)
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def _descartar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _dibujar(especificaciones):
+    """Dibuja varios gráficos a la vez en el pool; si el pool falla se dibujan en este proceso"""
+    pool = _obtener_pool()
+    if pool is None or len(especificaciones) == 0:
+        return [dibujar_grafico(especificacion) for especificacion in especificaciones]
+    try:
+        return list(pool.map(dibujar_grafico, especificaciones))
+    except BrokenProcessPool:
+        logger.warning("Pool de gráficos detenido; se dibujan en el proceso actual")
+        _descartar_pool()
+        return [dibujar_grafico(especificacion) for especificacion in especificaciones]
+
+
+def renderizar_graficos(especificaciones):
+    """
+    Data URI de cada gráfico, en el mismo orden. Los que ya están en la caché
+    no se vuelven a dibujar; el resto se dibuja en una sola tanda en el pool.
+    """
+    claves = [clave_grafico(especificacion) for especificacion in especificaciones]
+    en_cache = cache.get_many(claves)
+
+    pendientes = {
+        clave: especificacion
+        for clave, especificacion in zip(claves, especificaciones)
+        if clave not in en_cache
+    }
+    if pendientes:
+        dibujados = dict(zip(pendientes, _dibujar(list(pendientes.values()))))
+        cache.set_many(dibujados, TIEMPO_CACHE_GRAFICOS)
+        en_cache.update(dibujados)
+
+    return [en_cache[clave] for clave in claves]
+
+
+def renderizar_grafico(especificacion):
+    """Data URI de un solo gráfico"""
+    return renderizar_graficos([especificacion])[0]
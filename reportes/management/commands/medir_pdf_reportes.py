@@ -0,0 +1,119 @@
+import io
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from reportes import motor_pdf
+from reportes.exportacion import EXPORTACIONES
+from reportes.generacion import PROCESOS_PDF_REPORTES, TRABAJOS_POR_PROCESO_PDF
+from reportes.models import Reporte
+from reportes.pdf_tabular import dibujar_pdf_tabular
+
+ESTADOS = ['OCUPADO', 'DESOCUPADO', 'MANTENIMIENTO']
+
+
+def _viviendas(cantidad):
+    """Viviendas de prueba en memoria, con los campos que usan la plantilla y el listado"""
+    for indice in range(cantidad):
+        yield {
+            'id': indice + 1,
+            'edificio': {'nombre': f'Edificio {indice % 20 + 1}'},
+            'numero': f'{indice % 50 + 1:02d}{indice % 8}',
+            'piso': indice % 20 + 1,
+            'metros_cuadrados': Decimal('65.50') + indice % 40,
+            'habitaciones': 1 + indice % 4,
+            'baños': 1 + indice % 3,
+            'estado': ESTADOS[indice % 3],
+            'activo': indice % 7 != 0,
+        }
+
+
+def _fila(vivienda):
+    """Fila del listado de viviendas, en el orden de sus encabezados de exportación"""
+    return [
+        vivienda['id'], vivienda['edificio']['nombre'], vivienda['numero'], vivienda['piso'],
+        vivienda['metros_cuadrados'], vivienda['habitaciones'], vivienda['baños'], vivienda['estado'],
+        vivienda['activo'],
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compara el tiempo de generación de PDF de listados con reportlab y con WeasyPrint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--filas',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help='Cantidades de filas a medir (por defecto 1000 10000 100000)',
+        )
+        parser.add_argument(
+            '--max-filas-weasyprint',
+            type=int,
+            default=10000,
+            help='No medir WeasyPrint por encima de esta cantidad de filas (por defecto 10000)',
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            help='Procesos de WeasyPrint; 0 para generar en este proceso (por defecto PROCESOS_PDF_REPORTES)',
+        )
+
+    def handle(self, *args, **options):
+        if any(cantidad < 1 for cantidad in options['filas']):
+            raise CommandError('--filas debe contener cantidades positivas')
+
+        procesos = options['procesos']
+        if procesos is None:
+            procesos = getattr(settings, 'PROCESOS_PDF_REPORTES', PROCESOS_PDF_REPORTES)
+        trabajos_por_proceso = getattr(settings, 'TRABAJOS_POR_PROCESO_PDF', TRABAJOS_POR_PROCESO_PDF)
+        encabezados = EXPORTACIONES['VIVIENDAS'][0]
+        reporte = Reporte(nombre='Medición de PDF', tipo='VIVIENDAS')
+
+        weasyprint_disponible = True
+        inicio = time.perf_counter()
+        try:
+            motor_pdf.renderizar('<p>PDF</p>', procesos, trabajos_por_proceso)
+        except (ImportError, OSError) as e:
+            weasyprint_disponible = False
+            self.stdout.write(self.style.WARNING(f'⚠️ WeasyPrint no disponible, solo se mide reportlab: {e}'))
+        else:
+            self.stdout.write(f'🔥 WeasyPrint listo en {procesos} proceso(s) en {time.perf_counter() - inicio:.2f}s')
+
+        for cantidad in options['filas']:
+            destino = io.BytesIO()
+            inicio = time.perf_counter()
+            dibujar_pdf_tabular(
+                destino,
+                reporte.nombre,
+                f'{cantidad} viviendas',
+                [('Total de viviendas', cantidad)],
+                encabezados,
+                map(_fila, _viviendas(cantidad)),
+            )
+            linea = (
+                f'📄 {cantidad:>7} filas | reportlab {time.perf_counter() - inicio:7.2f}s '
+                f'({len(destino.getvalue()) // 1024} KB)'
+            )
+
+            if weasyprint_disponible and cantidad > options['max_filas_weasyprint']:
+                linea += ' | WeasyPrint omitido'
+            elif weasyprint_disponible:
+                inicio = time.perf_counter()
+                html = render_to_string('reportes/pdf/reporte_viviendas.html', {
+                    'reporte': reporte,
+                    'fecha_generacion': timezone.now(),
+                    'viviendas': list(_viviendas(cantidad)),
+                    'total_viviendas': cantidad,
+                })
+                contenido = motor_pdf.renderizar(html, procesos, trabajos_por_proceso)
+                linea += f' | WeasyPrint {time.perf_counter() - inicio:7.2f}s ({len(contenido) // 1024} KB)'
+
+            self.stdout.write(linea)
+
+        self.stdout.write(self.style.SUCCESS('✅ Medición terminada'))
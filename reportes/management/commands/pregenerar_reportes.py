@@ -0,0 +1,66 @@
+# reportes/management/commands/pregenerar_reportes.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reportes.cache import DIAS_RETENCION_CACHE, eliminar_resultados_antiguos
+from reportes.programacion import pregenerar_favoritos
+
+
+class Command(BaseCommand):
+    help = (
+        'Pregenera los reportes favoritos activos según su programación (por defecto, todas las noches) '
+        'para que la descarga sirva el archivo guardado'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todos',
+            action='store_true',
+            help='Pregenerar todos los favoritos activos sin mirar su programación',
+        )
+        parser.add_argument(
+            '--continuo',
+            action='store_true',
+            help='Seguir revisando la programación en lugar de terminar tras una vuelta',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=60,
+            help='Segundos entre revisiones en modo continuo (por defecto 60)',
+        )
+        parser.add_argument(
+            '--dias-retencion',
+            type=int,
+            default=DIAS_RETENCION_CACHE,
+            help=f'Eliminar los archivos generados hace más de estos días (por defecto {DIAS_RETENCION_CACHE})',
+        )
+
+    def handle(self, *args, **options):
+        if options['dias_retencion'] < 1:
+            raise CommandError('--dias-retencion debe ser al menos 1')
+
+        try:
+            while True:
+                resultado = pregenerar_favoritos(todos=options['todos'])
+                if resultado['GENERADO'] or resultado['SIN_CAMBIOS'] or resultado['OMITIDO']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"✅ {resultado['GENERADO']} favorito(s) generado(s), "
+                        f"{resultado['SIN_CAMBIOS']} sin cambios en sus datos, "
+                        f"{resultado['OMITIDO']} en CSV omitido(s)"
+                    ))
+                if resultado['ERROR']:
+                    self.stdout.write(self.style.WARNING(f"⚠️ {resultado['ERROR']} favorito(s) con error"))
+
+                eliminados = eliminar_resultados_antiguos(options['dias_retencion'])
+                if eliminados:
+                    self.stdout.write(f"🧹 {eliminados} archivo(s) antiguos eliminados de la caché")
+
+                if not options['continuo']:
+                    break
+                # Las revisiones siguientes solo toman los favoritos cuya programación se cumplió
+                options['todos'] = False
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('⚠️ Programador detenido'))
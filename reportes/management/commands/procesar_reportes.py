@@ -0,0 +1,63 @@
+# reportes/management/commands/procesar_reportes.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reportes.trabajos import liberar_trabajos_atascados, procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Worker que genera los reportes encolados y guarda los archivos en media/reportes/'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrencia',
+            type=int,
+            default=2,
+            help='Cantidad de reportes que se generan en paralelo',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=5,
+            help='Segundos de espera cuando no hay trabajos pendientes',
+        )
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesar los trabajos pendientes y terminar',
+        )
+        parser.add_argument(
+            '--minutos-atascado',
+            type=int,
+            default=30,
+            help='Minutos tras los cuales un trabajo en proceso vuelve a la cola',
+        )
+
+    def handle(self, *args, **options):
+        concurrencia = options['concurrencia']
+        if concurrencia < 1:
+            raise CommandError('La concurrencia debe ser al menos 1.')
+
+        liberar_trabajos_atascados(options['minutos_atascado'])
+        self.stdout.write(f"🔄 Procesando reportes con concurrencia {concurrencia}")
+
+        try:
+            while True:
+                # Lotes acotados: los trabajos encolados mientras tanto entran en la siguiente vuelta
+                resultado = procesar_pendientes(concurrencia, limite=concurrencia * 4)
+                procesados = resultado['completados'] + resultado['errores']
+                if procesados:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"✅ {resultado['completados']} reporte(s) generado(s)"
+                    ))
+                    if resultado['errores']:
+                        self.stdout.write(self.style.WARNING(
+                            f"⚠️ {resultado['errores']} reporte(s) con error"
+                        ))
+                    continue
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('⚠️ Worker detenido'))
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.10 on 2026-10-18 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0009_trabajo_reporte'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultadoReporte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(help_text='Hash de tipo, formato, período, edificio y granularidad', max_length=64, unique=True)),
+                ('huella', models.CharField(help_text='Hash de los datos de origen al generar el archivo', max_length=64)),
+                ('tipo', models.CharField(choices=[('ACCESOS', 'Accesos'), ('RESIDENTES', 'Residentes'), ('VIVIENDAS', 'Viviendas'), ('PERSONAL', 'Personal'), ('FINANCIERO', 'Financiero')], max_length=20)),
+                ('formato', models.CharField(choices=[('PDF', 'PDF'), ('EXCEL', 'Excel'), ('CSV', 'CSV'), ('HTML', 'HTML')], max_length=10)),
+                ('archivo', models.FileField(upload_to='reportes/cache/')),
+                ('fecha_generacion', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reporte',
+            name='cache_aciertos',
+            field=models.PositiveIntegerField(default=0, help_text='Descargas servidas desde la caché'),
+        ),
+        migrations.AddField(
+            model_name='reporte',
+            name='cache_fallos',
+            field=models.PositiveIntegerField(default=0, help_text='Descargas que tuvieron que generarse'),
+        ),
+    ]
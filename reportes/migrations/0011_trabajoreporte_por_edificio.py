@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0010_resultado_reporte_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoreporte',
+            name='por_edificio',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.10 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0011_trabajoreporte_por_edificio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reporte',
+            name='programacion',
+            field=models.CharField(blank=True, help_text='Expresión cron (minuto hora día mes día_semana) para pregenerar el favorito; vacío: todas las noches', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='reporte',
+            name='ultima_programacion',
+            field=models.DateTimeField(blank=True, help_text='Última vez que el programador revisó el reporte favorito', null=True),
+        ),
+        migrations.AddField(
+            model_name='reporte',
+            name='ventana_dias',
+            field=models.PositiveIntegerField(blank=True, help_text='Período móvil: los últimos N días hasta hoy, en lugar de las fechas fijas', null=True),
+        ),
+    ]
@@ -32,7 +32,79 @@ class Reporte(models.Model):
         blank=True,
         related_name='reportes_creados'
     )
+    ventana_dias = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Período móvil: los últimos N días hasta hoy, en lugar de las fechas fijas"
+    )
+    programacion = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Expresión cron (minuto hora día mes día_semana) para pregenerar el favorito; vacío: todas las noches"
+    )
     ultima_generacion = models.DateTimeField(null=True, blank=True)
+    ultima_programacion = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Última vez que el programador revisó el reporte favorito"
+    )
+    cache_aciertos = models.PositiveIntegerField(default=0, help_text="Descargas servidas desde la caché")
+    cache_fallos = models.PositiveIntegerField(default=0, help_text="Descargas que tuvieron que generarse")
 
     def __str__(self):
-        return self.nombre
\ No newline at end of file
+        return self.nombre
+
+class TrabajoReporte(models.Model):
+    """Generación de un reporte encolada para procesarse fuera de la petición"""
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('COMPLETADO', 'Completado'),
+        ('ERROR', 'Error'),
+    ]
+    FORMATO_CHOICES = Reporte.FORMATO_CHOICES + [('HTML', 'HTML')]
+
+    reporte = models.ForeignKey(Reporte, on_delete=models.CASCADE, related_name='trabajos')
+    formato = models.CharField(max_length=10, choices=FORMATO_CHOICES)
+    granularidad = models.CharField(max_length=10, blank=True)
+    # Cada edificio se genera en su propio proceso y el archivo une las partes
+    por_edificio = models.BooleanField(default=False)
+    estado = models.CharField(max_length=15, choices=ESTADO_CHOICES, default='PENDIENTE')
+    archivo = models.FileField(upload_to='reportes/', blank=True)
+    error = models.TextField(blank=True)
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='trabajos_reporte'
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion']),
+        ]
+
+    def __str__(self):
+        return f"{self.reporte} ({self.formato}) - {self.get_estado_display()}"
+
+
+class ResultadoReporte(models.Model):
+    """
+    Archivo generado de un reporte, compartido por las descargas con los mismos
+    parámetros mientras la huella de los datos de origen no cambie
+    """
+    clave = models.CharField(max_length=64, unique=True, help_text="Hash de tipo, formato, período, edificio y granularidad")
+    huella = models.CharField(max_length=64, help_text="Hash de los datos de origen al generar el archivo")
+    tipo = models.CharField(max_length=20, choices=Reporte.TIPO_CHOICES)
+    formato = models.CharField(max_length=10, choices=TrabajoReporte.FORMATO_CHOICES)
+    archivo = models.FileField(upload_to='reportes/cache/')
+    fecha_generacion = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} ({self.formato}) - {self.fecha_generacion:%d/%m/%Y %H:%M}"
+
@@ -0,0 +1,78 @@
+# reportes/motor_pdf.py - Procesos persistentes que convierten HTML en PDF con WeasyPrint
+#
+# Este módulo no importa Django: los procesos del pool se inician con spawn y
+# solo cargan WeasyPrint, que queda importado y con las fuentes inicializadas
+# entre un PDF y el siguiente.
+import atexit
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_config = None
+_pool_lock = threading.Lock()
+
+
+def _iniciar_proceso():
+    """Carga WeasyPrint y dibuja un documento mínimo para dejar fontconfig y Pango listos"""
+    try:
+        import weasyprint
+        weasyprint.HTML(string='<p>PDF</p>').write_pdf()
+    except (ImportError, OSError):
+        # El error se informa al convertir el primer documento
+        pass
+
+
+def html_a_pdf(html):
+    """Contenido del PDF de un documento HTML"""
+    import weasyprint
+
+    return weasyprint.HTML(string=html).write_pdf()
+
+
+def _obtener_pool(procesos, trabajos_por_proceso):
+    global _pool, _pool_config
+    with _pool_lock:
+        if _pool is not None and _pool_config != (procesos, trabajos_por_proceso):
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            # Cada proceso se reemplaza tras trabajos_por_proceso PDF para acotar el crecimiento de memoria
+            _pool = ProcessPoolExecutor(
+                max_workers=procesos,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_iniciar_proceso,
+                max_tasks_per_child=trabajos_por_proceso,
+            )
+            _pool_config = (procesos, trabajos_por_proceso)
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def detener():
+    """Detiene los procesos; el siguiente PDF los vuelve a crear"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def renderizar(html, procesos=2, trabajos_por_proceso=50):
+    """
+    Convierte HTML en PDF en uno de los procesos persistentes. Con procesos=0
+    la conversión se hace en el proceso actual. Si un proceso muere a mitad de
+    un trabajo, el pool se recrea y el documento se reintenta una vez.
+    """
+    if procesos <= 0:
+        return html_a_pdf(html)
+    try:
+        return _obtener_pool(procesos, trabajos_por_proceso).submit(html_a_pdf, html).result()
+    except BrokenProcessPool:
+        logger.warning("Pool de PDF detenido; se reinicia y se reintenta el documento")
+        detener()
+        return _obtener_pool(procesos, trabajos_por_proceso).submit(html_a_pdf, html).result()
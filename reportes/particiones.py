@@ -0,0 +1,265 @@
+# reportes/particiones.py - Reportes repartidos por edificio y generados en procesos paralelos
+import copy
+import csv
+import io
+import logging
+import os
+import pickle
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections
+
+from viviendas.models import Edificio
+from . import graficos, motor_pdf
+from .datos import LISTADOS, TAMANO_LOTE_EXPORTACION
+from .exportacion import EXPORTACIONES, _Eco, _escribir_hoja, iterar_csv
+from .generacion import escribir_pdf
+from .pdf_tabular import dibujar_pdf_tabular, subtitulo_reporte
+
+logger = logging.getLogger(__name__)
+
+# Procesos que generan partes a la vez si no se configura PROCESOS_POR_EDIFICIO; con 1 se generan en este proceso
+PROCESOS_POR_EDIFICIO = 4
+
+# Formatos que se pueden unir: secciones de PDF, hojas de Excel y un solo CSV
+FORMATOS_POR_EDIFICIO = ('PDF', 'EXCEL', 'CSV')
+
+# Bytes que se leen de cada parte CSV por vez al unirlas
+TAMANO_BLOQUE_CSV = 64 * 1024
+
+
+def puede_repartirse(reporte, formato):
+    """
+    Los listados se reparten por edificio en PDF, Excel y CSV. El financiero
+    no: los gastos son del condominio completo y se repetirían en cada parte.
+    """
+    return reporte.tipo in LISTADOS and formato in FORMATOS_POR_EDIFICIO
+
+
+def partes_reporte(reporte):
+    """
+    Copias sin guardar del reporte, una por edificio ordenadas por nombre; si
+    el reporte ya tiene edificio es la única parte. Los registros sin
+    edificio no pertenecen a ninguna parte.
+    """
+    if reporte.tipo not in LISTADOS:
+        raise ValueError(f"El reporte {reporte.tipo} no se puede repartir por edificio")
+    edificios = [reporte.edificio] if reporte.edificio_id else Edificio.objects.order_by('nombre', 'id')
+    partes = []
+    for edificio in edificios:
+        parte = copy.copy(reporte)
+        parte.edificio = edificio
+        partes.append(parte)
+    return partes
+
+
+def _iniciar_proceso():
+    # La parte ya tiene su propio proceso: gráficos y PDF se generan en él. Los pools
+    # heredados del proceso padre no tienen sus hilos en el hijo y no se pueden usar
+    graficos._pool = None
+    motor_pdf._pool = None
+    settings.PROCESOS_GRAFICOS = 1
+    settings.PROCESOS_PDF_REPORTES = 0
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+
+def _generar_parte(parte, formato, granularidad=None):
+    """
+    Escribe la parte de un edificio en un archivo temporal y devuelve la ruta
+    junto con el nombre y los totales del edificio. CSV: líneas sin
+    encabezado; EXCEL: lotes de filas serializados para que el proceso
+    principal escriba la hoja; PDF: el documento completo del edificio.
+    """
+    _, filas, resumen = EXPORTACIONES[parte.tipo]
+    descriptor, ruta = tempfile.mkstemp(prefix='reporte_parte_')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            if formato == 'CSV':
+                for linea in islice(iterar_csv(parte), 1, None):
+                    archivo.write(linea.encode('utf-8'))
+            elif formato == 'EXCEL':
+                filas_parte = iter(filas(parte))
+                while lote := list(islice(filas_parte, TAMANO_LOTE_EXPORTACION)):
+                    pickle.dump(lote, archivo)
+            else:
+                escribir_pdf(parte, archivo, granularidad)
+        totales = resumen(parte)[0]
+    except BaseException:
+        _borrar(ruta)
+        raise
+    return {'edificio': parte.edificio.nombre, 'totales': totales, 'archivo': ruta}
+
+
+def iterar_partes(partes, formato, granularidad=None, procesos=None):
+    """
+    Genera las partes y las entrega en orden a medida que están listas. Con
+    varios procesos cada edificio se genera en el suyo y el tiempo total se
+    acerca al del edificio más grande. Quien recibe una parte borra su
+    archivo; las no entregadas se borran aquí.
+    """
+    if procesos is None:
+        procesos = getattr(settings, 'PROCESOS_POR_EDIFICIO', PROCESOS_POR_EDIFICIO)
+    procesos = min(procesos, len(partes))
+
+    if procesos <= 1:
+        for parte in partes:
+            yield _generar_parte(parte, formato, granularidad)
+        return
+
+    # Los procesos hijos no deben heredar la conexión abierta del padre
+    connections.close_all()
+    pool = ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso)
+    futuros = [pool.submit(_generar_parte, parte, formato, granularidad) for parte in partes]
+    entregados = 0
+    try:
+        for futuro in futuros:
+            resultado = futuro.result()
+            entregados += 1
+            yield resultado
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        for futuro in futuros[entregados:]:
+            if futuro.done() and not futuro.cancelled() and futuro.exception() is None:
+                _borrar(futuro.result()['archivo'])
+
+
+def _subtotales(resultados):
+    """Encabezados y filas con los totales de cada edificio y una última fila que los suma"""
+    conceptos = [concepto for concepto, _ in resultados[0]['totales']] if resultados else []
+    filas = [[resultado['edificio']] + [valor for _, valor in resultado['totales']] for resultado in resultados]
+    suma = ['Total'] + [sum(fila[columna] for fila in filas) for columna in range(1, len(conceptos) + 1)]
+    return ['Edificio'] + conceptos, filas + [suma]
+
+
+def iterar_csv_por_edificio(reporte, procesos=None):
+    """CSV de todos los edificios: un encabezado y a continuación las filas de cada edificio"""
+    encabezados = EXPORTACIONES[reporte.tipo][0]
+    yield csv.writer(_Eco()).writerow(encabezados)
+    with closing(iterar_partes(partes_reporte(reporte), 'CSV', procesos=procesos)) as resultados:
+        for resultado in resultados:
+            try:
+                with open(resultado['archivo'], encoding='utf-8', newline='') as archivo:
+                    while bloque := archivo.read(TAMANO_BLOQUE_CSV):
+                        yield bloque
+            finally:
+                _borrar(resultado['archivo'])
+
+
+def _nombre_hoja(nombre, usados):
+    """Nombre de hoja válido para Excel (hasta 31 caracteres, sin []:*?/\\) y distinto de los anteriores"""
+    base = re.sub(r'[\[\]:*?/\\]', ' ', nombre).strip()[:31] or 'Edificio'
+    candidato, numero = base, 2
+    while candidato.lower() in usados:
+        sufijo = f' ({numero})'
+        candidato = base[:31 - len(sufijo)] + sufijo
+        numero += 1
+    usados.add(candidato.lower())
+    return candidato
+
+
+def _leer_lotes(ruta):
+    with open(ruta, 'rb') as archivo:
+        while True:
+            try:
+                lote = pickle.load(archivo)
+            except EOFError:
+                return
+            yield from lote
+
+
+def escribir_excel_por_edificio(reporte, destino, procesos=None):
+    """
+    Libro con una hoja de resumen (totales de cada edificio y del conjunto)
+    y una hoja de detalle por edificio. Las filas de cada edificio se leen en
+    su proceso; aquí solo se escriben las hojas, en orden y en modo
+    constant_memory.
+    """
+    import xlsxwriter
+
+    encabezados = EXPORTACIONES[reporte.tipo][0]
+    workbook = xlsxwriter.Workbook(destino, {
+        'constant_memory': True,
+        'default_date_format': 'dd/mm/yyyy',
+        'remove_timezone': True,
+    })
+    negrita = workbook.add_format({'bold': True})
+    try:
+        # La hoja de resumen va primero aunque se escribe al final, con los totales de todas las partes
+        hoja_resumen = workbook.add_worksheet('Resumen')
+        usados = {'resumen'}
+        resultados = []
+        with closing(iterar_partes(partes_reporte(reporte), 'EXCEL', procesos=procesos)) as partes:
+            for resultado in partes:
+                try:
+                    _escribir_hoja(
+                        workbook, _nombre_hoja(resultado['edificio'], usados), encabezados,
+                        _leer_lotes(resultado['archivo']), negrita,
+                    )
+                finally:
+                    _borrar(resultado['archivo'])
+                resultados.append(resultado)
+
+        encabezados_resumen, filas = _subtotales(resultados)
+        hoja_resumen.write_row(0, 0, encabezados_resumen, negrita)
+        hoja_resumen.set_column(0, len(encabezados_resumen) - 1, 18)
+        for fila, valores in enumerate(filas, start=1):
+            hoja_resumen.write_row(fila, 0, valores, negrita if fila == len(filas) else None)
+    finally:
+        workbook.close()
+
+
+def escribir_pdf_por_edificio(reporte, destino, granularidad=None, procesos=None):
+    """
+    PDF con una portada de totales por edificio y a continuación la sección
+    de cada edificio, con un marcador por sección. Cada sección es el PDF
+    completo del edificio (tabla de reportlab o plantilla con gráficos)
+    generado en su propio proceso.
+    """
+    from pypdf import PdfWriter
+
+    resultados = []
+    try:
+        with closing(iterar_partes(partes_reporte(reporte), 'PDF', granularidad, procesos)) as partes:
+            for resultado in partes:
+                resultados.append(resultado)
+
+        portada = io.BytesIO()
+        encabezados, filas = _subtotales(resultados)
+        dibujar_pdf_tabular(
+            portada, reporte.nombre, subtitulo_reporte(reporte),
+            [('Edificios', len(resultados))], encabezados, filas,
+        )
+        writer = PdfWriter()
+        writer.append(portada, outline_item='Totales por edificio')
+        for resultado in resultados:
+            writer.append(resultado['archivo'], outline_item=resultado['edificio'])
+        writer.write(destino)
+    finally:
+        for resultado in resultados:
+            _borrar(resultado['archivo'])
+
+    logger.info(f"Reporte {reporte.pk} ({reporte.tipo}) generado en PDF por edificio: {len(resultados)} sección(es)")
+
+
+def escribir_por_edificio(reporte, formato, destino, granularidad=None, procesos=None):
+    """Escribe el reporte repartido por edificio en un archivo binario abierto"""
+    if not puede_repartirse(reporte, formato):
+        raise ValueError(f"El reporte {reporte.tipo} en {formato} no se puede repartir por edificio")
+    if formato == 'CSV':
+        for linea in iterar_csv_por_edificio(reporte, procesos):
+            destino.write(linea.encode('utf-8'))
+    elif formato == 'EXCEL':
+        escribir_excel_por_edificio(reporte, destino, procesos)
+    else:
+        escribir_pdf_por_edificio(reporte, destino, granularidad, procesos)
@@ -0,0 +1,145 @@
+# reportes/pdf_tabular.py - PDF de listados grandes dibujado con reportlab página a página
+from itertools import chain, islice
+
+from django.utils import timezone
+
+from .exportacion import EXPORTACIONES, _formatear
+
+MARGEN = 36
+FUENTE = 'Helvetica'
+FUENTE_NEGRITA = 'Helvetica-Bold'
+TAMANO_FUENTE = 7
+ALTO_FILA = 11
+
+# Filas que se miden para calcular el ancho de las columnas
+FILAS_MUESTRA = 200
+
+GRIS_ENCABEZADO = '#dfe6ee'
+GRIS_ALTERNADO = '#f4f6f8'
+
+
+def _texto(valor):
+    return str(_formatear(valor))
+
+
+def _recortar(texto, ancho, string_width):
+    """Recorta el texto con puntos suspensivos para que entre en la columna"""
+    if string_width(texto, FUENTE, TAMANO_FUENTE) <= ancho:
+        return texto
+    while texto and string_width(texto + '…', FUENTE, TAMANO_FUENTE) > ancho:
+        texto = texto[:-1]
+    return texto + '…'
+
+
+def _anchos(encabezados, muestra, ancho_total, string_width):
+    """Ancho de cada columna proporcional al texto más largo de la muestra, con un máximo por columna"""
+    naturales = []
+    for indice, encabezado in enumerate(encabezados):
+        textos = [encabezado] + [fila[indice] for fila in muestra]
+        naturales.append(min(max(string_width(texto, FUENTE, TAMANO_FUENTE) for texto in textos), 200) + 6)
+    escala = ancho_total / sum(naturales)
+    return [ancho * escala for ancho in naturales]
+
+
+def dibujar_pdf_tabular(destino, titulo, subtitulo, totales, encabezados, filas):
+    """
+    Dibuja un listado en hojas horizontales: título, totales y una tabla que
+    continúa en las páginas necesarias con su encabezado repetido. Las filas
+    se consumen de a una a medida que se dibujan, por lo que un iterador de la
+    base de datos nunca se carga completo; solo se miden las primeras para
+    calcular los anchos de columna.
+    """
+    from reportlab.lib.colors import HexColor
+    from reportlab.lib.pagesizes import landscape, letter
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    from reportlab.pdfgen import canvas
+
+    ancho_pagina, alto_pagina = landscape(letter)
+    filas = (list(map(_texto, fila)) for fila in filas)
+    muestra = list(islice(filas, FILAS_MUESTRA))
+    anchos = _anchos(encabezados, muestra, ancho_pagina - 2 * MARGEN, stringWidth)
+
+    pdf = canvas.Canvas(destino, pagesize=(ancho_pagina, alto_pagina))
+    pdf.setTitle(titulo)
+    pagina = 0
+
+    def nueva_pagina():
+        nonlocal pagina
+        if pagina:
+            pdf.showPage()
+        pagina += 1
+        y = alto_pagina - MARGEN
+        pdf.setFont(FUENTE_NEGRITA, 12)
+        pdf.drawString(MARGEN, y - 12, titulo)
+        pdf.setFont(FUENTE, TAMANO_FUENTE)
+        pdf.drawRightString(ancho_pagina - MARGEN, y - 12, f"Página {pagina}")
+        pdf.drawString(MARGEN, y - 24, subtitulo)
+        return y - 36
+
+    def encabezado_tabla(y):
+        pdf.setFillColor(HexColor(GRIS_ENCABEZADO))
+        pdf.rect(MARGEN, y - 3, sum(anchos), ALTO_FILA, stroke=0, fill=1)
+        pdf.setFillColor(HexColor('#000000'))
+        pdf.setFont(FUENTE_NEGRITA, TAMANO_FUENTE)
+        x = MARGEN
+        for encabezado, ancho in zip(encabezados, anchos):
+            pdf.drawString(x + 3, y, encabezado)
+            x += ancho
+        pdf.setFont(FUENTE, TAMANO_FUENTE)
+        return y - ALTO_FILA
+
+    y = nueva_pagina()
+    pdf.setFont(FUENTE, 9)
+    for concepto, valor in totales:
+        pdf.drawString(MARGEN, y, f"{concepto}: {_texto(valor)}")
+        y -= ALTO_FILA + 2
+    y = encabezado_tabla(y - ALTO_FILA)
+
+    # Un solo objeto de texto por página: crear uno por celda es lo más costoso de reportlab
+    ancho_tabla = sum(anchos)
+    gris = HexColor(GRIS_ALTERNADO)
+
+    def nuevo_texto():
+        # El texto lleva su propio color: el relleno actual puede ser el gris de las filas
+        texto = pdf.beginText()
+        texto.setFont(FUENTE, TAMANO_FUENTE)
+        texto.setFillColor(HexColor('#000000'))
+        return texto
+
+    texto_pagina = nuevo_texto()
+    for numero, fila in enumerate(chain(muestra, filas)):
+        if y < MARGEN:
+            pdf.drawText(texto_pagina)
+            y = encabezado_tabla(nueva_pagina())
+            texto_pagina = nuevo_texto()
+        if numero % 2:
+            pdf.setFillColor(gris)
+            pdf.rect(MARGEN, y - 3, ancho_tabla, ALTO_FILA, stroke=0, fill=1)
+        texto_pagina.setTextOrigin(MARGEN + 3, y)
+        for texto, ancho in zip(fila, anchos):
+            texto_pagina.textOut(_recortar(texto, ancho - 6, stringWidth))
+            texto_pagina.moveCursor(ancho, 0)
+        y -= ALTO_FILA
+
+    pdf.drawText(texto_pagina)
+    pdf.save()
+
+
+def subtitulo_reporte(reporte):
+    """Período, edificio y fecha de generación de un reporte en una línea"""
+    partes = []
+    if reporte.fecha_desde or reporte.fecha_hasta:
+        desde = reporte.fecha_desde.strftime('%d/%m/%Y') if reporte.fecha_desde else '...'
+        hasta = reporte.fecha_hasta.strftime('%d/%m/%Y') if reporte.fecha_hasta else '...'
+        partes.append(f"Período: {desde} - {hasta}")
+    if reporte.edificio_id:
+        partes.append(f"Edificio: {reporte.edificio.nombre}")
+    partes.append(f"Generado: {timezone.localtime().strftime('%d/%m/%Y %H:%M')}")
+    return ' | '.join(partes)
+
+
+def escribir_pdf_tabular(reporte, destino):
+    """PDF de un reporte de listado con sus totales y todas sus filas, sin gráficos"""
+    encabezados, filas, resumen = EXPORTACIONES[reporte.tipo]
+    totales = resumen(reporte)[0]
+    dibujar_pdf_tabular(destino, reporte.nombre, subtitulo_reporte(reporte), totales, encabezados, filas(reporte))
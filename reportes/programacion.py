@@ -0,0 +1,163 @@
+# reportes/programacion.py - Pregeneración programada de los reportes favoritos
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import FORMATOS_EN_CACHE, obtener_reporte_en_cache
+from .datos import con_periodo_movil
+from .models import Reporte
+
+logger = logging.getLogger(__name__)
+
+# Programación de los favoritos sin expresión propia si no se configura PROGRAMACION_REPORTES_FAVORITOS:
+# todas las noches a las 3:00, fuera del horario de uso
+PROGRAMACION_FAVORITOS = '0 3 * * *'
+
+# Nombre, mínimo y máximo de cada campo de una expresión cron
+CAMPOS_CRON = [
+    ('minuto', 0, 59),
+    ('hora', 0, 23),
+    ('día del mes', 1, 31),
+    ('mes', 1, 12),
+    ('día de la semana', 0, 7),
+]
+
+# Hasta dónde se busca la siguiente ejecución antes de dar la expresión por imposible (p. ej. 30 de febrero)
+_LIMITE_BUSQUEDA = timedelta(days=5 * 366)
+
+
+def _valores_campo(texto, nombre, minimo, maximo):
+    """Valores de un campo cron: *, números, rangos a-b, listas con comas y pasos /n"""
+    valores = set()
+    for parte in texto.split(','):
+        rango, barra, paso = parte.partition('/')
+        try:
+            paso = int(paso) if barra else 1
+            if rango == '*':
+                inicio, fin = minimo, maximo
+            elif '-' in rango:
+                inicio, fin = (int(valor) for valor in rango.split('-', 1))
+            else:
+                inicio = int(rango)
+                fin = maximo if barra else inicio
+        except ValueError:
+            raise ValueError(f"Valor inválido en el campo {nombre} de la expresión cron: {parte}")
+        if paso < 1 or not minimo <= inicio <= fin <= maximo:
+            raise ValueError(f"Valor fuera de rango en el campo {nombre} de la expresión cron: {parte}")
+        valores.update(range(inicio, fin + 1, paso))
+    return valores
+
+
+def parsear_cron(expresion):
+    """
+    Valores permitidos de cada campo de una expresión cron de cinco campos
+    (minuto hora día mes día_semana, con 0 o 7 para el domingo). Lanza
+    ValueError si la expresión no es válida.
+    """
+    campos = expresion.split()
+    if len(campos) != len(CAMPOS_CRON):
+        raise ValueError("La expresión cron debe tener cinco campos: minuto hora día mes día_semana")
+    minutos, horas, dias, meses, dias_semana = (
+        _valores_campo(texto, *campo) for texto, campo in zip(campos, CAMPOS_CRON)
+    )
+    if 7 in dias_semana:
+        dias_semana = (dias_semana - {7}) | {0}
+    return {
+        'minutos': minutos,
+        'horas': horas,
+        'dias': dias,
+        'meses': meses,
+        'dias_semana': dias_semana,
+        # Como en cron, si se restringen el día del mes y el de la semana basta con que coincida uno
+        'un_dia_libre': campos[2].startswith('*') or campos[4].startswith('*'),
+    }
+
+
+def _coincide_dia(cron, momento):
+    en_mes = momento.day in cron['dias']
+    en_semana = momento.isoweekday() % 7 in cron['dias_semana']
+    if cron['un_dia_libre']:
+        return en_mes and en_semana
+    return en_mes or en_semana
+
+
+def siguiente_ejecucion(expresion, desde):
+    """Primer minuto posterior a desde, en hora local, que coincide con la expresión cron"""
+    cron = parsear_cron(expresion)
+    momento = timezone.localtime(desde).replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limite = momento + _LIMITE_BUSQUEDA
+    # Se avanza de a meses, días u horas completos mientras el campo mayor no coincide
+    while momento < limite:
+        if momento.month not in cron['meses']:
+            momento = (momento.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+        elif not _coincide_dia(cron, momento):
+            momento = momento.replace(hour=0, minute=0) + timedelta(days=1)
+        elif momento.hour not in cron['horas']:
+            momento = momento.replace(minute=0) + timedelta(hours=1)
+        elif momento.minute not in cron['minutos']:
+            momento += timedelta(minutes=1)
+        else:
+            return momento
+    raise ValueError(f"La expresión cron nunca se cumple: {expresion}")
+
+
+def programacion_reporte(reporte):
+    """Expresión cron del reporte, o la programación nocturna por defecto"""
+    return reporte.programacion or getattr(settings, 'PROGRAMACION_REPORTES_FAVORITOS', PROGRAMACION_FAVORITOS)
+
+
+def toca_pregenerar(reporte, ahora):
+    """El reporte toca si su programación se cumplió desde la última revisión (o desde su creación)"""
+    referencia = reporte.ultima_programacion or reporte.fecha_creacion
+    return siguiente_ejecucion(programacion_reporte(reporte), referencia) <= ahora
+
+
+def _tomar_reporte(reporte, ahora):
+    """
+    Registra la revisión del reporte. La actualización condicionada a la
+    revisión anterior garantiza que, con varios programadores, solo uno lo toma.
+    """
+    return Reporte.objects.filter(pk=reporte.pk, ultima_programacion=reporte.ultima_programacion).update(
+        ultima_programacion=ahora,
+    ) == 1
+
+
+def pregenerar_reporte(reporte, ahora=None):
+    """
+    Deja guardado el archivo del formato preferido del reporte, con su período
+    móvil calculado para el día. Devuelve 'GENERADO', 'SIN_CAMBIOS' si la
+    huella de los datos no cambió y el archivo guardado sigue sirviendo, u
+    'OMITIDO' para el CSV, que se envía por partes y no se guarda.
+    """
+    ahora = ahora or timezone.now()
+    if reporte.formato_preferido not in FORMATOS_EN_CACHE:
+        return 'OMITIDO'
+    _, desde_cache = obtener_reporte_en_cache(
+        con_periodo_movil(reporte, timezone.localdate(ahora)), reporte.formato_preferido, contar=False
+    )
+    return 'SIN_CAMBIOS' if desde_cache else 'GENERADO'
+
+
+def pregenerar_favoritos(ahora=None, todos=False):
+    """
+    Pregenera los reportes favoritos activos cuya programación se cumplió
+    (todos, con todos=True). Un reporte con error se reintenta en su siguiente
+    ejecución programada. Devuelve la cantidad de reportes por resultado.
+    """
+    ahora = ahora or timezone.now()
+    resultados = {'GENERADO': 0, 'SIN_CAMBIOS': 0, 'OMITIDO': 0, 'ERROR': 0}
+    favoritos = Reporte.objects.filter(es_favorito=True, activo=True).select_related('edificio').order_by('id')
+    for reporte in favoritos:
+        try:
+            if not todos and not toca_pregenerar(reporte, ahora):
+                continue
+            if not _tomar_reporte(reporte, ahora):
+                continue
+            estado = pregenerar_reporte(reporte, ahora)
+        except Exception:
+            logger.exception(f"Error pregenerando el reporte favorito {reporte.pk}")
+            estado = 'ERROR'
+        resultados[estado] += 1
+    return resultados
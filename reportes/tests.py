@@ -0,0 +1,853 @@
+import base64
+import csv
+import io
+import os
+import re
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accesos.models import Visita
+from financiero.models import CategoriaGasto, Gasto, Pago
+from usuarios.models import Rol
+from viviendas.models import Edificio, Residente, Vivienda
+from .cache import obtener_reporte_en_cache
+from .datos import con_periodo_movil, datos_reporte
+from .exportacion import escribir_excel, iterar_csv
+from .forms import ReporteForm
+from . import motor_pdf
+from .generacion import contexto_reporte, escribir_reporte
+from .graficos import (
+    clave_grafico, dibujar_grafico, grafico_agrupado, grafico_barras, grafico_serie_temporal, renderizar_graficos
+)
+from .models import Reporte, ResultadoReporte, TrabajoReporte
+from .particiones import partes_reporte
+from .programacion import parsear_cron, pregenerar_favoritos, siguiente_ejecucion
+from .trabajos import encolar_reporte, liberar_trabajos_atascados, procesar_pendientes, procesar_trabajo
+
+
+def usar_media_temporal(test):
+    """Guarda los archivos generados durante la prueba en un directorio temporal"""
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media, ignore_errors=True)
+    ajustes = override_settings(MEDIA_ROOT=media)
+    ajustes.enable()
+    test.addCleanup(ajustes.disable)
+
+
+class ExportacionReportesTest(TestCase):
+    """
+    Pruebas para la exportación de reportes a CSV y Excel por lotes
+    """
+    
+    def setUp(self):
+        usar_media_temporal(self)
+        
+        self.rol_admin = Rol.objects.create(nombre='Administrador')
+        
+        User = get_user_model()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword',
+            rol=self.rol_admin
+        )
+        
+        self.edificio = Edificio.objects.create(
+            nombre='Edificio Test',
+            direccion='Calle Test 123',
+            pisos=10
+        )
+        self.vivienda = Vivienda.objects.create(
+            edificio=self.edificio,
+            numero='101',
+            piso=1,
+            metros_cuadrados=80
+        )
+        self.residente = Residente.objects.create(
+            usuario=User.objects.create_user(
+                username='residente',
+                password='password',
+                first_name='Juan',
+                last_name='Pérez'
+            ),
+            vivienda=self.vivienda,
+            es_propietario=True
+        )
+    
+    def _leer(self, reporte):
+        return list(csv.reader(io.StringIO(''.join(iterar_csv(reporte)))))
+    
+    def test_csv_financiero_intercala_por_fecha(self):
+        """Verificar que ingresos y egresos salen intercalados de la fecha más reciente a la más antigua"""
+        categoria = CategoriaGasto.objects.create(nombre='Mantenimiento', presupuesto_mensual=Decimal('1000.00'))
+        for dia, monto in ((5, '100.00'), (20, '150.00')):
+            Pago.objects.create(
+                vivienda=self.vivienda,
+                monto=Decimal(monto),
+                fecha_pago=date(2024, 3, dia),
+                metodo_pago='EFECTIVO',
+                estado='VERIFICADO',
+                registrado_por=self.admin_user
+            )
+        Gasto.objects.create(
+            categoria=categoria,
+            concepto='Reparación de bomba',
+            monto=Decimal('80.00'),
+            fecha=date(2024, 3, 10),
+            estado='PAGADO',
+            registrado_por=self.admin_user
+        )
+        reporte = Reporte.objects.create(
+            nombre='Marzo', tipo='FINANCIERO', fecha_desde=date(2024, 3, 1), fecha_hasta=date(2024, 3, 31)
+        )
+        
+        with self.assertNumQueries(2):
+            filas = self._leer(reporte)
+        
+        self.assertEqual(filas, [
+            ['Fecha', 'Concepto', 'Tipo', 'Monto'],
+            ['2024-03-20', 'Ingreso', 'Ingreso', '150.00'],
+            ['2024-03-10', 'Reparación de bomba', 'Egreso', '80.00'],
+            ['2024-03-05', 'Ingreso', 'Ingreso', '100.00'],
+        ])
+    
+    def test_csv_de_todos_los_tipos(self):
+        """Verificar que cada tipo de reporte exporta sus filas con una sola consulta"""
+        Visita.objects.create(
+            nombre_visitante='Ana Gómez',
+            documento_visitante='12345678',
+            vivienda_destino=self.vivienda,
+            residente_autoriza=self.residente,
+            motivo='Visita familiar',
+            registrado_por=self.admin_user
+        )
+        esperado = {
+            'ACCESOS': 'Ana Gómez',
+            'RESIDENTES': 'Pérez',
+            'VIVIENDAS': '101',
+            'PERSONAL': None,
+        }
+        for tipo, valor in esperado.items():
+            reporte = Reporte.objects.create(nombre=tipo, tipo=tipo)
+            with self.assertNumQueries(1):
+                filas = self._leer(reporte)
+            if valor is None:
+                self.assertEqual(len(filas), 1)
+            else:
+                self.assertEqual(len(filas), 2)
+                self.assertIn(valor, filas[1])
+    
+    def test_vista_descarga_csv(self):
+        """Verificar que la descarga en CSV se envía por partes"""
+        reporte = Reporte.objects.create(nombre='Viviendas', tipo='VIVIENDAS')
+        
+        response = self.client.get(reverse('reporte-descargar', args=[reporte.pk]), {'formato': 'CSV'})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(contenido.startswith('ID,Edificio,Número'))
+        self.assertIn('Edificio Test,101', contenido)
+    
+    def test_excel_con_hojas_de_detalle_totales_y_edificio(self):
+        """Verificar que el Excel incluye detalle, totales y desglose por edificio"""
+        from openpyxl import load_workbook
+        
+        Vivienda.objects.create(edificio=self.edificio, numero='102', piso=1, metros_cuadrados=80, estado='MANTENIMIENTO')
+        reporte = Reporte.objects.create(nombre='Viviendas', tipo='VIVIENDAS')
+        archivo = io.BytesIO()
+        
+        escribir_excel(reporte, archivo)
+        
+        libro = load_workbook(archivo, read_only=True)
+        self.assertEqual(libro.sheetnames, ['Detalle', 'Totales', 'Por edificio'])
+        detalle = list(libro['Detalle'].iter_rows(values_only=True))
+        self.assertEqual(len(detalle), 3)
+        self.assertEqual(detalle[1][1:3], ('Edificio Test', '101'))
+        totales = dict(libro['Totales'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(totales['Total de viviendas'], 2)
+        self.assertEqual(totales['Ocupadas'], 1)
+        por_edificio = list(libro['Por edificio'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(por_edificio, [('Edificio Test', 2, 1, 0, 1)])
+    
+    def test_vista_descarga_excel_financiero(self):
+        """Verificar la descarga en Excel de un reporte financiero"""
+        from openpyxl import load_workbook
+        
+        Pago.objects.create(
+            vivienda=self.vivienda,
+            monto=Decimal('100.00'),
+            fecha_pago=date(2024, 3, 5),
+            metodo_pago='EFECTIVO',
+            estado='VERIFICADO',
+            registrado_por=self.admin_user
+        )
+        reporte = Reporte.objects.create(
+            nombre='Marzo', tipo='FINANCIERO', fecha_desde=date(2024, 3, 1), fecha_hasta=date(2024, 3, 31)
+        )
+        
+        self.client.force_login(self.admin_user)
+        
+        # Sin archivo vigente en la caché la descarga se encola para el worker
+        response = self.client.get(reverse('reporte-descargar', args=[reporte.pk]), {'formato': 'EXCEL'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(procesar_trabajo(response.json()['id']), 'COMPLETADO')
+        
+        response = self.client.get(reverse('reporte-descargar', args=[reporte.pk]), {'formato': 'EXCEL'})
+        self.assertEqual(response.status_code, 200)
+        libro = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        totales = dict(libro['Totales'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(totales['Balance'], 100)
+        self.assertEqual(list(libro['Por edificio'].iter_rows(min_row=2, values_only=True)), [('Edificio Test', 1, 100)])
+
+
+class TrabajoReporteTest(TestCase):
+    """
+    Pruebas para la cola de generación de reportes
+    """
+    
+    def setUp(self):
+        usar_media_temporal(self)
+        
+        self.rol_admin = Rol.objects.create(nombre='Administrador')
+        User = get_user_model()
+        self.admin_user = User.objects.create_user(
+            username='admin',
+            email='admin@example.com',
+            password='adminpassword',
+            rol=self.rol_admin
+        )
+        edificio = Edificio.objects.create(nombre='Edificio Test', direccion='Calle Test 123', pisos=10)
+        Vivienda.objects.create(edificio=edificio, numero='101', piso=1, metros_cuadrados=80)
+        self.reporte = Reporte.objects.create(nombre='Viviendas', tipo='VIVIENDAS')
+    
+    def test_worker_genera_archivo_y_actualiza_reporte(self):
+        """Verificar que el worker genera el archivo y marca la última generación del reporte"""
+        trabajo = encolar_reporte(self.reporte, 'csv', self.admin_user)
+        self.assertEqual(trabajo.estado, 'PENDIENTE')
+        
+        resultado = procesar_pendientes()
+        
+        self.assertEqual(resultado, {'completados': 1, 'errores': 0})
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'COMPLETADO')
+        self.assertTrue(trabajo.archivo.name.startswith('reportes/'))
+        with trabajo.archivo.open('rb') as archivo:
+            self.assertIn(b'Edificio Test,101', archivo.read())
+        self.reporte.refresh_from_db()
+        self.assertEqual(self.reporte.ultima_generacion, trabajo.fecha_fin)
+    
+    def test_trabajo_tomado_no_se_procesa_dos_veces(self):
+        """Verificar que un trabajo en proceso no lo toma otro worker"""
+        trabajo = encolar_reporte(self.reporte, 'EXCEL')
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(estado='PROCESANDO', fecha_inicio=timezone.now())
+        
+        self.assertIsNone(procesar_trabajo(trabajo.pk))
+        self.assertEqual(liberar_trabajos_atascados(minutos=0), 1)
+        self.assertEqual(procesar_trabajo(trabajo.pk), 'COMPLETADO')
+    
+    def test_error_queda_registrado(self):
+        """Verificar que un error de generación se guarda en el trabajo"""
+        trabajo = encolar_reporte(self.reporte, 'CSV')
+        Reporte.objects.filter(pk=self.reporte.pk).update(tipo='DESCONOCIDO')
+        
+        with self.assertLogs('reportes.trabajos', level='ERROR'):
+            self.assertEqual(procesar_pendientes(), {'completados': 0, 'errores': 1})
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'ERROR')
+        self.assertTrue(trabajo.error)
+    
+    def test_endpoints_encolar_estado_y_descarga(self):
+        """Verificar el flujo completo: encolar, consultar el estado y descargar"""
+        self.client.login(username='admin', password='adminpassword')
+        
+        response = self.client.post(reverse('reporte-generar', args=[self.reporte.pk]), {'formato': 'HTML'})
+        self.assertEqual(response.status_code, 202)
+        datos = response.json()
+        self.assertEqual(datos['estado'], 'PENDIENTE')
+        self.assertIsNone(datos['url_descarga'])
+        
+        procesar_pendientes()
+        
+        datos = self.client.get(datos['url_estado']).json()
+        self.assertEqual(datos['estado'], 'COMPLETADO')
+        response = self.client.get(datos['url_descarga'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'101', b''.join(response.streaming_content))
+    
+    def test_trabajos_ajenos_no_son_visibles(self):
+        """Verificar que un usuario no administrador solo ve sus propios trabajos"""
+        trabajo = encolar_reporte(self.reporte, 'CSV', self.admin_user)
+        procesar_pendientes()
+        get_user_model().objects.create_user(
+            username='residente',
+            password='residentepassword',
+            rol=Rol.objects.create(nombre='Residente')
+        )
+        self.client.login(username='residente', password='residentepassword')
+        
+        response = self.client.get(reverse('reporte-trabajo-estado', args=[trabajo.pk]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('reporte-trabajo-descargar', args=[trabajo.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ResultadoReporteCacheTest(TestCase):
+    """
+    Pruebas para la caché de archivos de reportes
+    """
+    
+    def setUp(self):
+        usar_media_temporal(self)
+        
+        self.edificio = Edificio.objects.create(nombre='Edificio Test', direccion='Calle Test 123', pisos=10)
+        Vivienda.objects.create(edificio=self.edificio, numero='101', piso=1, metros_cuadrados=80)
+        self.reporte = Reporte.objects.create(nombre='Viviendas', tipo='VIVIENDAS')
+    
+    def test_acierto_y_fallo(self):
+        """Verificar que la segunda descarga se sirve desde la caché"""
+        primero, en_cache = obtener_reporte_en_cache(self.reporte, 'HTML')
+        self.assertFalse(en_cache)
+        
+        segundo, en_cache = obtener_reporte_en_cache(self.reporte, 'HTML')
+        
+        self.assertTrue(en_cache)
+        self.assertEqual(segundo.archivo.name, primero.archivo.name)
+        self.reporte.refresh_from_db()
+        self.assertEqual((self.reporte.cache_aciertos, self.reporte.cache_fallos), (1, 1))
+    
+    def test_cambio_de_datos_regenera(self):
+        """Verificar que un cambio en los datos de origen genera un archivo nuevo"""
+        from django.core.files.storage import default_storage
+        
+        anterior, _ = obtener_reporte_en_cache(self.reporte, 'EXCEL')
+        anterior_nombre = anterior.archivo.name
+        Vivienda.objects.create(edificio=self.edificio, numero='102', piso=1, metros_cuadrados=80)
+        
+        nuevo, en_cache = obtener_reporte_en_cache(self.reporte, 'EXCEL')
+        
+        self.assertFalse(en_cache)
+        self.assertNotEqual(nuevo.archivo.name, anterior_nombre)
+        self.assertFalse(default_storage.exists(anterior_nombre))
+        self.assertEqual(ResultadoReporte.objects.count(), 1)
+    
+    def test_edicion_de_filas_regenera(self):
+        """Verificar que editar una fila o un registro relacionado invalida el archivo"""
+        obtener_reporte_en_cache(self.reporte, 'EXCEL')
+        
+        Vivienda.objects.filter(numero='101').update(metros_cuadrados=95)
+        _, en_cache = obtener_reporte_en_cache(self.reporte, 'EXCEL')
+        self.assertFalse(en_cache)
+        
+        Edificio.objects.filter(pk=self.edificio.pk).update(nombre='Edificio Norte')
+        _, en_cache = obtener_reporte_en_cache(self.reporte, 'EXCEL')
+        self.assertFalse(en_cache)
+        
+        _, en_cache = obtener_reporte_en_cache(self.reporte, 'EXCEL')
+        self.assertTrue(en_cache)
+    
+    def test_reportes_con_mismos_parametros_comparten_archivo(self):
+        """Verificar que la clave depende de los parámetros y no del reporte"""
+        obtener_reporte_en_cache(self.reporte, 'EXCEL')
+        copia = Reporte.objects.create(nombre='Viviendas', tipo='VIVIENDAS')
+        
+        _, en_cache = obtener_reporte_en_cache(copia, 'EXCEL')
+        
+        self.assertTrue(en_cache)
+        _, en_cache = obtener_reporte_en_cache(self.reporte, 'HTML')
+        self.assertFalse(en_cache)
+    
+    def test_vista_descarga_usa_cache(self):
+        """Verificar que la vista de descarga encola los fallos y sirve los aciertos"""
+        url = reverse('reporte-descargar', args=[self.reporte.pk])
+        response = self.client.get(url, {'formato': 'HTML'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(TrabajoReporte.objects.exists())
+        
+        self.client.force_login(get_user_model().objects.create_user(username='usuario', password='password'))
+        response = self.client.get(url, {'formato': 'HTML'})
+        self.assertEqual(response.status_code, 202)
+        self.assertIsNone(response.json()['url_descarga'])
+        self.assertEqual(procesar_pendientes()['completados'], 1)
+        
+        for _ in range(2):
+            response = self.client.get(url, {'formato': 'HTML'})
+            self.assertEqual(response.status_code, 200)
+            b''.join(response.streaming_content)
+        
+        self.reporte.refresh_from_db()
+        self.assertEqual((self.reporte.cache_aciertos, self.reporte.cache_fallos), (2, 1))
+
+
+class DatosReporteTest(TestCase):
+    """
+    Pruebas para los datos compartidos por la vista previa, el PDF y las descargas
+    """
+    
+    def setUp(self):
+        User = get_user_model()
+        self.admin_user = User.objects.create_user(username='admin', password='adminpassword')
+        self.edificio = Edificio.objects.create(nombre='Edificio Norte', direccion='Calle 1', pisos=5)
+        self.otro_edificio = Edificio.objects.create(nombre='Edificio Sur', direccion='Calle 2', pisos=5)
+        
+        # Varias filas por edificio: la cantidad de consultas no debe depender de ellas
+        for edificio in (self.edificio, self.otro_edificio):
+            for numero in range(3):
+                vivienda = Vivienda.objects.create(
+                    edificio=edificio, numero=f'{numero + 1}01', piso=numero + 1, metros_cuadrados=80
+                )
+                residente = Residente.objects.create(
+                    usuario=User.objects.create_user(
+                        username=f'residente_{edificio.pk}_{numero}',
+                        password='password',
+                        first_name='Residente',
+                        last_name=f'{edificio.nombre} {numero}'
+                    ),
+                    vivienda=vivienda,
+                    es_propietario=numero == 0
+                )
+                Visita.objects.create(
+                    nombre_visitante=f'Visitante {edificio.nombre} {numero}',
+                    documento_visitante='12345678',
+                    vivienda_destino=vivienda,
+                    residente_autoriza=residente,
+                    fecha_hora_salida=timezone.now() if numero else None,
+                    registrado_por=self.admin_user
+                )
+    
+    def _recorrer_filas(self, datos):
+        """Accede a los campos que muestran las plantillas"""
+        for visita in datos.get('visitas', []):
+            str(visita.vivienda_destino), visita.nombre_visitante, visita.fecha_hora_salida
+        for residente in datos.get('residentes', []):
+            residente.usuario.last_name, str(residente.vivienda), residente.tipo_residente
+        for vivienda in datos.get('viviendas', []):
+            vivienda.edificio.nombre, vivienda.metros_cuadrados, vivienda.estado
+        for empleado in datos.get('empleados', []):
+            empleado.usuario.first_name, empleado.puesto.nombre, empleado.get_tipo_contrato_display()
+    
+    def test_presupuesto_de_consultas_por_tipo(self):
+        """Verificar que contadores y filas salen de una cantidad fija de consultas"""
+        presupuesto = {
+            # Contadores en una consulta con agregados condicionales y filas en otra
+            'ACCESOS': 2,
+            'RESIDENTES': 2,
+            'VIVIENDAS': 2,
+            'PERSONAL': 2,
+            # Serie por período (pagos y gastos) y movimientos (pagos y gastos)
+            'FINANCIERO': 4,
+        }
+        for tipo, consultas in presupuesto.items():
+            reporte = Reporte.objects.create(
+                nombre=tipo, tipo=tipo, fecha_desde=date(2024, 3, 1), fecha_hasta=date(2024, 3, 15)
+            )
+            for limite in (10, None):
+                with self.subTest(tipo=tipo, limite=limite), self.assertNumQueries(consultas):
+                    self._recorrer_filas(datos_reporte(reporte, limite=limite))
+    
+    def test_contadores_del_edificio(self):
+        """Verificar que el edificio del reporte filtra contadores y filas"""
+        reporte = Reporte.objects.create(nombre='Accesos', tipo='ACCESOS', edificio=self.edificio)
+        
+        datos = datos_reporte(reporte)
+        
+        self.assertEqual(datos['nombre_edificio'], 'Edificio Norte')
+        self.assertEqual((datos['total_visitas'], datos['visitas_activas'], datos['visitas_finalizadas']), (3, 1, 2))
+        self.assertEqual({visita.vivienda_destino.edificio_id for visita in datos['visitas']}, {self.edificio.pk})
+        
+        reporte = Reporte.objects.create(nombre='Residentes', tipo='RESIDENTES', edificio=self.otro_edificio)
+        datos = datos_reporte(reporte)
+        self.assertEqual((datos['total_residentes'], datos['propietarios'], datos['inquilinos']), (3, 1, 2))
+    
+    def test_periodo_de_visitas(self):
+        """Verificar que el período incluye el día completo de fecha_hasta"""
+        Visita.objects.filter(nombre_visitante='Visitante Edificio Norte 0').update(
+            fecha_hora_entrada=timezone.make_aware(datetime(2024, 3, 15, 23, 30))
+        )
+        Visita.objects.filter(nombre_visitante='Visitante Edificio Norte 1').update(
+            fecha_hora_entrada=timezone.make_aware(datetime(2024, 3, 16, 0, 0))
+        )
+        reporte = Reporte.objects.create(
+            nombre='Marzo', tipo='ACCESOS', fecha_desde=date(2024, 3, 1), fecha_hasta=date(2024, 3, 15)
+        )
+        
+        datos = datos_reporte(reporte)
+        
+        self.assertEqual(datos['total_visitas'], 1)
+        self.assertEqual([visita.nombre_visitante for visita in datos['visitas']], ['Visitante Edificio Norte 0'])
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_vista_previa_con_pocas_consultas(self):
+        """Verificar que la vista previa muestra los totales sin cargar todas las filas"""
+        reporte = Reporte.objects.create(nombre='Residentes', tipo='RESIDENTES')
+        
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('reporte-preview', args=[reporte.pk]))
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_residentes'], 6)
+        self.assertEqual(response.context['inquilinos'], 4)
+
+
+class GraficosReporteTest(TestCase):
+    """
+    Pruebas para el servicio de gráficos de los reportes
+    """
+    
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+    
+    def _decodificar(self, data_uri):
+        cabecera, contenido = data_uri.split(',', 1)
+        return cabecera, base64.b64decode(contenido)
+    
+    @override_settings(PROCESOS_GRAFICOS=1)
+    def test_png_y_svg(self):
+        """Verificar que el mismo gráfico se genera en PNG y en SVG con el texto como texto"""
+        png, svg = renderizar_graficos([
+            grafico_barras(['Ocupadas', 'Desocupadas'], [3, 1], 'Ocupación'),
+            grafico_barras(['Ocupadas', 'Desocupadas'], [3, 1], 'Ocupación', formato='svg'),
+        ])
+        
+        cabecera, contenido = self._decodificar(png)
+        self.assertEqual(cabecera, 'data:image/png;base64')
+        self.assertTrue(contenido.startswith(b'\x89PNG'))
+        cabecera, contenido = self._decodificar(svg)
+        self.assertEqual(cabecera, 'data:image/svg+xml;base64')
+        self.assertIn('Ocupación', contenido.decode('utf-8'))
+    
+    @override_settings(PROCESOS_GRAFICOS=1)
+    def test_grafico_en_cache(self):
+        """Verificar que un gráfico con el mismo título, etiquetas y valores no se vuelve a dibujar"""
+        especificacion = grafico_serie_temporal(['Ene', 'Feb'], [('Balance', [Decimal('10.50'), 4])], 'Balance')
+        primero = renderizar_graficos([especificacion])[0]
+        
+        self.assertEqual(cache.get(clave_grafico(especificacion)), primero)
+        with mock.patch('reportes.graficos.dibujar_grafico') as dibujar:
+            self.assertEqual(renderizar_graficos([especificacion])[0], primero)
+        dibujar.assert_not_called()
+        
+        otra = grafico_serie_temporal(['Ene', 'Feb'], [('Balance', [10.5, 5])], 'Balance')
+        self.assertNotEqual(clave_grafico(otra), clave_grafico(especificacion))
+    
+    @override_settings(PROCESOS_GRAFICOS=2)
+    def test_dibujo_en_pool(self):
+        """Verificar que los gráficos agrupados y apilados se dibujan en el pool de procesos"""
+        series = [('Activas', [1, 2]), ('Finalizadas', [3, 0])]
+        especificaciones = [
+            grafico_agrupado(['Norte', 'Sur'], series, 'Visitas', formato='svg'),
+            grafico_agrupado(['Norte', 'Sur'], series, 'Visitas', apilado=True, formato='svg'),
+        ]
+        
+        graficos = renderizar_graficos(especificaciones)
+        
+        self.assertEqual(graficos, [dibujar_grafico(especificacion) for especificacion in especificaciones])
+    
+    @override_settings(PROCESOS_GRAFICOS=1)
+    def test_contexto_de_accesos(self):
+        """Verificar que el reporte de accesos incluye los tres gráficos de su plantilla"""
+        reporte = Reporte.objects.create(nombre='Accesos', tipo='ACCESOS')
+        
+        context = contexto_reporte(reporte, formato_graficos='svg')
+        
+        for nombre in ('grafico1', 'grafico2', 'grafico3'):
+            self.assertTrue(context[nombre].startswith('data:image/svg+xml;base64,'))
+    
+    def test_html_no_dibuja_graficos(self):
+        """Verificar que el HTML no pasa por el servicio de gráficos: sus plantillas usan Chart.js"""
+        reporte = Reporte.objects.create(nombre='Accesos', tipo='ACCESOS')
+        
+        with mock.patch('reportes.generacion.renderizar_graficos') as renderizar:
+            escribir_reporte(reporte, 'HTML', io.BytesIO())
+        
+        renderizar.assert_not_called()
+
+
+class PdfReporteTest(TestCase):
+    """
+    Pruebas para la generación de PDF de reportes: procesos de WeasyPrint y listados con reportlab
+    """
+    
+    def setUp(self):
+        edificio = Edificio.objects.create(nombre='Edificio Test', direccion='Calle Test 123', pisos=10)
+        Vivienda.objects.bulk_create([
+            Vivienda(edificio=edificio, numero=f'{numero:03d}', piso=numero // 10 + 1, metros_cuadrados=80)
+            for numero in range(100)
+        ])
+        self.reporte = Reporte.objects.create(nombre='Viviendas', tipo='VIVIENDAS')
+    
+    @override_settings(FILAS_PDF_TABULAR=50)
+    def test_listado_grande_con_reportlab(self):
+        """Verificar que un listado sobre el umbral se dibuja con reportlab en varias páginas"""
+        destino = io.BytesIO()
+        with mock.patch('reportes.motor_pdf.renderizar') as renderizar:
+            escribir_reporte(self.reporte, 'PDF', destino)
+        
+        renderizar.assert_not_called()
+        contenido = destino.getvalue()
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        self.assertEqual(len(re.findall(rb'/Type /Page[^s]', contenido)), 3)
+    
+    @override_settings(FILAS_PDF_TABULAR=1000, PROCESOS_PDF_REPORTES=3, TRABAJOS_POR_PROCESO_PDF=7)
+    def test_listado_chico_con_weasyprint(self):
+        """Verificar que un listado bajo el umbral usa la plantilla HTML en los procesos de WeasyPrint"""
+        destino = io.BytesIO()
+        with mock.patch('reportes.motor_pdf.renderizar', return_value=b'%PDF-prueba') as renderizar, \
+                mock.patch('reportes.generacion.renderizar_graficos', return_value=[]):
+            escribir_reporte(self.reporte, 'PDF', destino)
+        
+        self.assertEqual(destino.getvalue(), b'%PDF-prueba')
+        html = renderizar.call_args.args[0]
+        self.assertIn('Viviendas', html)
+        self.assertEqual(renderizar.call_args.kwargs, {'procesos': 3, 'trabajos_por_proceso': 7})
+    
+    def test_procesos_se_reemplazan_tras_n_trabajos(self):
+        """Verificar que cada proceso del pool se reemplaza después de la cantidad de trabajos configurada"""
+        self.addCleanup(motor_pdf.detener)
+        pool = motor_pdf._obtener_pool(1, 2)
+        
+        pids = [pool.submit(os.getpid).result() for _ in range(3)]
+        
+        self.assertEqual(pids[0], pids[1])
+        self.assertNotEqual(pids[1], pids[2])
+        self.assertNotIn(os.getpid(), pids)
+    
+    def test_comando_de_medicion(self):
+        """Verificar que el comando compara ambos caminos"""
+        salida = StringIO()
+        call_command('medir_pdf_reportes', filas=[60], procesos=0, stdout=salida)
+        
+        self.assertIn('reportlab', salida.getvalue())
+        self.assertIn('✅ Medición terminada', salida.getvalue())
+
+
+class ParticionesReporteTest(TestCase):
+    """
+    Pruebas para los reportes separados por edificio: una parte por edificio unida en un solo archivo
+    """
+    
+    def setUp(self):
+        usar_media_temporal(self)
+        
+        for nombre, cantidad in [('Torre B', 2), ('Torre A', 3), ('Torre C', 1)]:
+            edificio = Edificio.objects.create(nombre=nombre, direccion='Calle Test 123', pisos=5)
+            Vivienda.objects.bulk_create([
+                Vivienda(edificio=edificio, numero=f'{numero:03d}', piso=1, metros_cuadrados=80,
+                         estado='OCUPADO' if numero else 'DESOCUPADO')
+                for numero in range(cantidad)
+            ])
+        self.reporte = Reporte.objects.create(nombre='Viviendas', tipo='VIVIENDAS')
+    
+    def test_partes_por_edificio(self):
+        """Verificar que hay una parte por edificio en orden y que el reporte original no cambia"""
+        partes = partes_reporte(self.reporte)
+        
+        self.assertEqual([parte.edificio.nombre for parte in partes], ['Torre A', 'Torre B', 'Torre C'])
+        self.assertIsNone(self.reporte.edificio_id)
+        
+        self.reporte.edificio = Edificio.objects.get(nombre='Torre B')
+        self.assertEqual([parte.edificio.nombre for parte in partes_reporte(self.reporte)], ['Torre B'])
+    
+    @override_settings(PROCESOS_POR_EDIFICIO=1)
+    def test_csv_con_un_encabezado(self):
+        """Verificar que el CSV une las filas de todos los edificios bajo un solo encabezado"""
+        destino = io.BytesIO()
+        escribir_reporte(self.reporte, 'CSV', destino, por_edificio=True)
+        
+        filas = list(csv.reader(io.StringIO(destino.getvalue().decode('utf-8'))))
+        self.assertEqual(filas[0][:2], ['ID', 'Edificio'])
+        self.assertEqual([fila[1] for fila in filas[1:]], ['Torre A'] * 3 + ['Torre B'] * 2 + ['Torre C'])
+    
+    @override_settings(PROCESOS_POR_EDIFICIO=1)
+    def test_excel_con_una_hoja_por_edificio(self):
+        """Verificar que el Excel tiene el resumen por edificio y una hoja de detalle por cada uno"""
+        from openpyxl import load_workbook
+        
+        destino = io.BytesIO()
+        escribir_reporte(self.reporte, 'EXCEL', destino, por_edificio=True)
+        
+        libro = load_workbook(io.BytesIO(destino.getvalue()), read_only=True)
+        self.assertEqual(libro.sheetnames, ['Resumen', 'Torre A', 'Torre B', 'Torre C'])
+        resumen = list(libro['Resumen'].iter_rows(values_only=True))
+        self.assertEqual(resumen[0][:3], ('Edificio', 'Total de viviendas', 'Ocupadas'))
+        self.assertEqual(resumen[1][:3], ('Torre A', 3, 2))
+        self.assertEqual(resumen[-1][:3], ('Total', 6, 3))
+        self.assertEqual(len(list(libro['Torre B'].iter_rows(values_only=True))), 3)
+    
+    @override_settings(PROCESOS_POR_EDIFICIO=1, FILAS_PDF_TABULAR=1)
+    def test_pdf_con_una_seccion_por_edificio(self):
+        """Verificar que el PDF une una portada de totales y la sección de cada edificio con marcadores"""
+        from pypdf import PdfReader
+        
+        destino = io.BytesIO()
+        escribir_reporte(self.reporte, 'PDF', destino, por_edificio=True)
+        
+        pdf = PdfReader(io.BytesIO(destino.getvalue()))
+        self.assertEqual(len(pdf.pages), 4)
+        self.assertEqual(
+            [marcador.title for marcador in pdf.outline],
+            ['Totales por edificio', 'Torre A', 'Torre B', 'Torre C'],
+        )
+        self.assertIn('Torre C', pdf.pages[0].extract_text())
+    
+    @override_settings(PROCESOS_POR_EDIFICIO=1)
+    def test_vista_y_trabajo_por_edificio(self):
+        """Verificar la descarga separada por edificio y que el financiero no se puede separar"""
+        usuario = get_user_model().objects.create_user(
+            username='admin', password='adminpassword', rol=Rol.objects.create(nombre='Administrador')
+        )
+        self.client.force_login(usuario)
+        
+        # La descarga separada por edificio no se genera en la petición: se encola para el worker
+        response = self.client.get(
+            reverse('reporte-descargar', args=[self.reporte.pk]), {'formato': 'CSV', 'por_edificio': '1'}
+        )
+        self.assertEqual(response.status_code, 202)
+        trabajo = TrabajoReporte.objects.get(pk=response.json()['id'])
+        self.assertTrue(trabajo.por_edificio)
+        self.assertEqual(trabajo.solicitado_por, usuario)
+        self.assertEqual(procesar_trabajo(trabajo.id), 'COMPLETADO')
+        response = self.client.get(reverse('reporte-trabajo-descargar', args=[trabajo.id]))
+        contenido = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(contenido.count('ID,Edificio'), 1)
+        self.assertEqual(contenido.count('Torre'), 6)
+        
+        response = self.client.get(
+            reverse('reporte-descargar', args=[self.reporte.pk]), {'formato': 'HTML', 'por_edificio': '1'}
+        )
+        self.assertEqual(response.status_code, 400)
+        
+        # La vista previa envía la descarga separada al endpoint que encola y consulta el estado
+        response = self.client.get(reverse('reporte-preview', args=[self.reporte.pk]))
+        self.assertContains(response, f'data-url-generar="{reverse("reporte-generar", args=[self.reporte.pk])}"')
+        self.assertContains(response, 'name="por_edificio"')
+        self.assertContains(response, 'js/reportes_trabajos.js')
+        
+        financiero = Reporte.objects.create(nombre='Finanzas', tipo='FINANCIERO')
+        with self.assertRaises(ValueError):
+            encolar_reporte(financiero, 'PDF', por_edificio=True)
+        
+        trabajo = encolar_reporte(self.reporte, 'CSV', por_edificio=True)
+        self.assertEqual(procesar_trabajo(trabajo.id), 'COMPLETADO')
+        trabajo.refresh_from_db()
+        with trabajo.archivo.open('rb') as archivo:
+            self.assertEqual(archivo.read().decode('utf-8').count('Torre'), 6)
+
+
+class ProgramacionReporteTest(TestCase):
+    """
+    Pruebas para la pregeneración programada de los reportes favoritos
+    """
+    
+    def setUp(self):
+        usar_media_temporal(self)
+        
+        self.edificio = Edificio.objects.create(nombre='Edificio Test', direccion='Calle Test 123', pisos=10)
+        Vivienda.objects.create(edificio=self.edificio, numero='101', piso=1, metros_cuadrados=80)
+        self.favorito = Reporte.objects.create(
+            nombre='Viviendas', tipo='VIVIENDAS', formato_preferido='EXCEL', es_favorito=True
+        )
+        self.ahora = timezone.now() + timedelta(days=1)
+    
+    def _local(self, *args):
+        return timezone.make_aware(datetime(*args))
+    
+    def test_siguiente_ejecucion(self):
+        """Verificar el cálculo de la siguiente ejecución de distintas expresiones cron"""
+        desde = self._local(2026, 10, 18, 10, 7)  # domingo
+        
+        self.assertEqual(siguiente_ejecucion('0 3 * * *', desde), self._local(2026, 10, 19, 3, 0))
+        self.assertEqual(siguiente_ejecucion('*/15 * * * *', desde), self._local(2026, 10, 18, 10, 15))
+        self.assertEqual(siguiente_ejecucion('30 8 * * 1-5', desde), self._local(2026, 10, 19, 8, 30))
+        self.assertEqual(siguiente_ejecucion('0 6 1 1,7 *', desde), self._local(2027, 1, 1, 6, 0))
+        # Con día del mes y de la semana restringidos basta con que coincida uno
+        self.assertEqual(siguiente_ejecucion('0 0 1 * 5', desde), self._local(2026, 10, 23, 0, 0))
+        
+        for expresion in ['61 * * * *', '0 3 * *', 'a b c d e', '0 0 30 2 *', '*/0 * * * *']:
+            with self.assertRaises(ValueError):
+                siguiente_ejecucion(expresion, desde)
+        self.assertEqual(parsear_cron('0 0 * * 7')['dias_semana'], {0})
+    
+    def test_formulario_valida_programacion(self):
+        """Verificar que el formulario rechaza expresiones cron inválidas"""
+        datos = {'nombre': 'Viviendas', 'tipo': 'VIVIENDAS', 'formato_preferido': 'PDF', 'programacion': '0 25 * * *'}
+        form = ReporteForm(data=datos)
+        self.assertFalse(form.is_valid())
+        self.assertIn('programacion', form.errors)
+        
+        form = ReporteForm(data=dict(datos, programacion='0 2 * * 1'))
+        self.assertTrue(form.is_valid(), form.errors)
+    
+    def test_periodo_movil(self):
+        """Verificar que el período móvil se convierte en fechas sin modificar el reporte"""
+        self.favorito.ventana_dias = 7
+        
+        copia = con_periodo_movil(self.favorito, date(2026, 10, 18))
+        
+        self.assertEqual((copia.fecha_desde, copia.fecha_hasta), (date(2026, 10, 12), date(2026, 10, 18)))
+        self.assertIsNone(self.favorito.fecha_desde)
+    
+    def test_pregenera_solo_cuando_toca_y_cambian_los_datos(self):
+        """Verificar que se genera al cumplirse la programación y se omite si la huella no cambió"""
+        Reporte.objects.create(nombre='No favorito', tipo='VIVIENDAS', formato_preferido='EXCEL')
+        Reporte.objects.create(
+            nombre='Inactivo', tipo='VIVIENDAS', formato_preferido='EXCEL', es_favorito=True, activo=False
+        )
+        Reporte.objects.create(nombre='En CSV', tipo='VIVIENDAS', formato_preferido='CSV', es_favorito=True)
+        
+        self.assertEqual(
+            pregenerar_favoritos(self.ahora), {'GENERADO': 1, 'SIN_CAMBIOS': 0, 'OMITIDO': 1, 'ERROR': 0}
+        )
+        self.favorito.refresh_from_db()
+        self.assertEqual(self.favorito.ultima_programacion, self.ahora)
+        self.assertIsNotNone(self.favorito.ultima_generacion)
+        self.assertEqual((self.favorito.cache_aciertos, self.favorito.cache_fallos), (0, 0))
+        
+        # La programación no volvió a cumplirse
+        self.assertEqual(sum(pregenerar_favoritos(self.ahora + timedelta(hours=1)).values()), 0)
+        
+        # A la noche siguiente los datos no cambiaron
+        manana = self.ahora + timedelta(days=1)
+        self.assertEqual(pregenerar_favoritos(manana)['SIN_CAMBIOS'], 1)
+        
+        Vivienda.objects.create(edificio=self.edificio, numero='102', piso=1, metros_cuadrados=80)
+        self.assertEqual(pregenerar_favoritos(manana + timedelta(days=1))['GENERADO'], 1)
+        self.assertEqual(ResultadoReporte.objects.count(), 1)
+    
+    @override_settings(FILAS_PDF_TABULAR=1)
+    def test_descarga_sirve_el_archivo_pregenerado(self):
+        """Verificar que las descargas del favorito, con período móvil, se sirven desde lo pregenerado"""
+        usuario = get_user_model().objects.create_user(
+            username='admin', password='adminpassword', rol=Rol.objects.create(nombre='Administrador')
+        )
+        self.client.force_login(usuario)
+        self.favorito.ventana_dias = 30
+        self.favorito.save()
+        
+        salida = StringIO()
+        call_command('pregenerar_reportes', todos=True, stdout=salida)
+        self.assertIn('1 favorito(s) generado(s)', salida.getvalue())
+        
+        response = self.client.get(reverse('reporte-descargar', args=[self.favorito.pk]))
+        self.assertEqual(response.status_code, 200)
+        b''.join(response.streaming_content)
+        
+        Reporte.objects.filter(pk=self.favorito.pk).update(formato_preferido='PDF')
+        call_command('pregenerar_reportes', todos=True, stdout=StringIO())
+        response = self.client.get(reverse('reporte-pdf', args=[self.favorito.pk]))
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        
+        self.favorito.refresh_from_db()
+        self.assertEqual((self.favorito.cache_aciertos, self.favorito.cache_fallos), (2, 0))
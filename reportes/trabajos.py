@@ -0,0 +1,138 @@
+# reportes/trabajos.py - Cola de generación de reportes en la base de datos
+import logging
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import connections
+from django.utils import timezone
+
+from .cache import FORMATOS_EN_CACHE, obtener_reporte_en_cache
+from .datos import con_periodo_movil
+from .generacion import EXTENSIONES, escribir_reporte
+from .models import Reporte, TrabajoReporte
+from .particiones import puede_repartirse
+
+logger = logging.getLogger(__name__)
+
+
+def encolar_reporte(reporte, formato, usuario=None, granularidad='', por_edificio=False):
+    """Registra un trabajo pendiente para generar el reporte en el formato indicado"""
+    formato = formato.upper()
+    if formato not in EXTENSIONES:
+        raise ValueError(f"Formato no soportado: {formato}")
+    if por_edificio and not puede_repartirse(reporte, formato):
+        raise ValueError(f"El reporte {reporte.tipo} en {formato} no se puede repartir por edificio")
+    return TrabajoReporte.objects.create(
+        reporte=reporte,
+        formato=formato,
+        granularidad=granularidad or '',
+        por_edificio=por_edificio,
+        solicitado_por=usuario,
+    )
+
+
+def _tomar_trabajo(trabajo_id):
+    """
+    Marca un trabajo pendiente como en proceso. La actualización condicionada
+    al estado garantiza que, con varios workers, solo uno lo toma.
+    """
+    return TrabajoReporte.objects.filter(pk=trabajo_id, estado='PENDIENTE').update(
+        estado='PROCESANDO',
+        fecha_inicio=timezone.now(),
+    ) == 1
+
+
+def procesar_trabajo(trabajo_id):
+    """
+    Genera el archivo de un trabajo y lo guarda en media/reportes/. Devuelve el
+    estado final, o None si otro worker ya había tomado el trabajo.
+    """
+    if not _tomar_trabajo(trabajo_id):
+        return None
+
+    trabajo = TrabajoReporte.objects.select_related('reporte').get(pk=trabajo_id)
+    reporte = con_periodo_movil(trabajo.reporte)
+    inicio = time.perf_counter()
+    try:
+        nombre = f"reporte_{trabajo.reporte_id}_{trabajo.id}.{EXTENSIONES[trabajo.formato]}"
+        if trabajo.formato in FORMATOS_EN_CACHE:
+            # Se copia el archivo de la caché: puede reemplazarse cuando cambien los datos
+            resultado, _ = obtener_reporte_en_cache(
+                reporte, trabajo.formato, trabajo.granularidad or None, trabajo.por_edificio
+            )
+            with resultado.archivo.open('rb') as archivo:
+                trabajo.archivo.save(nombre, File(archivo), save=False)
+        else:
+            # Se escribe en un temporal en disco para no mantener el archivo en memoria
+            with tempfile.TemporaryFile() as archivo:
+                escribir_reporte(
+                    reporte, trabajo.formato, archivo, trabajo.granularidad or None, trabajo.por_edificio
+                )
+                archivo.seek(0)
+                trabajo.archivo.save(nombre, File(archivo), save=False)
+    except Exception as e:
+        logger.exception(f"Error generando el reporte del trabajo {trabajo.id}")
+        TrabajoReporte.objects.filter(pk=trabajo.pk).update(
+            estado='ERROR',
+            error=str(e),
+            fecha_fin=timezone.now(),
+        )
+        return 'ERROR'
+
+    trabajo.estado = 'COMPLETADO'
+    trabajo.fecha_fin = timezone.now()
+    trabajo.save(update_fields=['estado', 'archivo', 'fecha_fin'])
+    Reporte.objects.filter(pk=trabajo.reporte_id).update(ultima_generacion=trabajo.fecha_fin)
+
+    logger.info(
+        f"Trabajo {trabajo.id}: reporte {trabajo.reporte_id} en {trabajo.formato} "
+        f"generado en {time.perf_counter() - inicio:.2f}s"
+    )
+    return 'COMPLETADO'
+
+
+def procesar_pendientes(concurrencia=1, limite=None):
+    """
+    Procesa los trabajos pendientes por orden de llegada. Con concurrencia > 1
+    los reportes se generan en paralelo en procesos separados (WeasyPrint y
+    matplotlib no son seguros entre hilos); cada proceso abre su propia
+    conexión a la base de datos.
+
+    Devuelve un diccionario con los trabajos completados y con error.
+    """
+    trabajo_ids = list(
+        TrabajoReporte.objects.filter(estado='PENDIENTE').order_by('fecha_creacion', 'id').values_list(
+            'id', flat=True
+        )[:limite]
+    )
+
+    if concurrencia == 1 or len(trabajo_ids) <= 1:
+        resultados = [procesar_trabajo(trabajo_id) for trabajo_id in trabajo_ids]
+    else:
+        # Los procesos hijos no deben heredar la conexión abierta del padre
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=concurrencia) as pool:
+            resultados = list(pool.map(procesar_trabajo, trabajo_ids))
+
+    return {
+        'completados': resultados.count('COMPLETADO'),
+        'errores': resultados.count('ERROR'),
+    }
+
+
+def liberar_trabajos_atascados(minutos=30):
+    """
+    Devuelve a la cola los trabajos que siguen en proceso después de los
+    minutos indicados, por ejemplo porque el worker se detuvo a la mitad.
+    """
+    limite = timezone.now() - timedelta(minutes=minutos)
+    liberados = TrabajoReporte.objects.filter(estado='PROCESANDO', fecha_inicio__lt=limite).update(
+        estado='PENDIENTE',
+        fecha_inicio=None,
+    )
+    if liberados:
+        logger.warning(f"{liberados} trabajo(s) de reporte atascados devueltos a la cola")
+    return liberados
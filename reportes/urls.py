@@ -14,4 +14,9 @@ urlpatterns = [
     path('<int:pk>/pdf/', views.reporte_pdf, name='reporte-pdf'),
     path('<int:pk>/reactivar/', views.reporte_reactivar, name='reporte-reactivar'),
     path('<int:pk>/descargar/', views.reporte_descargar, name='reporte-descargar'),
+
+    # Generación en segundo plano
+    path('<int:pk>/generar/', views.reporte_generar, name='reporte-generar'),
+    path('trabajos/<int:pk>/', views.reporte_trabajo_estado, name='reporte-trabajo-estado'),
+    path('trabajos/<int:pk>/descargar/', views.reporte_trabajo_descargar, name='reporte-trabajo-descargar'),
 ]
\ No newline at end of file
@@ -1,32 +1,22 @@
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from .models import Reporte
+from .models import Reporte, TrabajoReporte
 from django.shortcuts import redirect, render, get_object_or_404
 from .forms import ReporteForm
-from django.template.loader import render_to_string
-from django.http import HttpResponse
-from django.contrib import messages
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.urls import reverse
 from django.utils import timezone
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import io
-import base64
-import os
-from django.conf import settings
-from financiero.models import Pago, Gasto
-from django.db.models import Sum
-import csv
-import pandas as pd  # Asegúrate de tener pandas instalado para Excel
-
-# Safe WeasyPrint import - Won't crash if not available
-try:
-    import weasyprint
-    WEASYPRINT_AVAILABLE = True
-except ImportError:
-    weasyprint = None
-    WEASYPRINT_AVAILABLE = False
-    print("⚠️ WeasyPrint no disponible - Funcionalidad PDF deshabilitada")
+from .cache import buscar_reporte_en_cache
+from .datos import con_periodo_movil, datos_reporte
+from .exportacion import respuesta_csv
+from .generacion import EXTENSIONES
+from .particiones import puede_repartirse
+from .trabajos import encolar_reporte
+
+# Filas de detalle que muestra la vista previa de un reporte
+FILAS_VISTA_PREVIA = 10
 
 class ReporteListView(ListView):
     model = Reporte
@@ -131,88 +121,13 @@ class ReporteDeleteView(DeleteView):
         return redirect(self.success_url)
 
 def reporte_preview(request, pk):
-    from viviendas.models import Residente, Vivienda
-    from personal.models import Empleado
-    from accesos.models import Visita
-
-    reporte = get_object_or_404(Reporte, pk=pk)
+    reporte = con_periodo_movil(get_object_or_404(Reporte, pk=pk))
     context = {
         'reporte': reporte,
         'fecha_generacion': timezone.now(),
     }
-
-    if reporte.tipo == 'RESIDENTES':
-        residentes = Residente.objects.all()
-        context['residentes'] = residentes
-        context['total_residentes'] = residentes.count()
-        context['activos'] = residentes.filter(activo=True).count()
-        context['propietarios'] = residentes.filter(es_propietario=True).count()
-        context['inquilinos'] = residentes.filter(es_propietario=False).count()
-    elif reporte.tipo == 'VIVIENDAS':
-        viviendas = Vivienda.objects.all()
-        context['viviendas'] = viviendas
-        context['total_viviendas'] = viviendas.count()
-        context['ocupadas'] = viviendas.filter(estado='OCUPADO').count()
-        context['desocupadas'] = viviendas.filter(estado='DESOCUPADO').count()
-        context['mantenimiento'] = viviendas.filter(estado='MANTENIMIENTO').count()
-        if context['total_viviendas']:
-            context['porcentaje_ocupacion'] = (context['ocupadas'] / context['total_viviendas']) * 100
-        else:
-            context['porcentaje_ocupacion'] = 0
-    elif reporte.tipo == 'ACCESOS':
-        visitas = Visita.objects.all()
-        context['visitas'] = visitas
-        context['total_visitas'] = visitas.count()
-        context['visitas_activas'] = visitas.filter(fecha_hora_salida__isnull=True).count()
-        context['visitas_finalizadas'] = visitas.filter(fecha_hora_salida__isnull=False).count()
-    elif reporte.tipo == 'PERSONAL':
-        empleados = Empleado.objects.all()
-        context['empleados'] = empleados
-        context['total_empleados'] = empleados.count()
-        context['activos'] = empleados.filter(activo=True).count()
-        context['inactivos'] = empleados.filter(activo=False).count()
-    elif reporte.tipo == 'FINANCIERO':
-        fecha_desde = reporte.fecha_desde or timezone.now().date().replace(day=1)
-        fecha_hasta = reporte.fecha_hasta or timezone.now().date()
-
-        ingresos = Pago.objects.filter(
-            estado='VERIFICADO',
-            fecha_pago__gte=fecha_desde,
-            fecha_pago__lte=fecha_hasta
-        )
-        total_ingresos = ingresos.aggregate(total=Sum('monto'))['total'] or 0
-
-        egresos = Gasto.objects.filter(
-            estado='PAGADO',
-            fecha__gte=fecha_desde,
-            fecha__lte=fecha_hasta
-        )
-        total_egresos = egresos.aggregate(total=Sum('monto'))['total'] or 0
-
-        movimientos = []
-        for pago in ingresos:
-            movimientos.append({
-                'fecha': pago.fecha_pago,
-                'concepto': 'Ingreso',
-                'tipo': 'Ingreso',
-                'monto': pago.monto,
-            })
-        for gasto in egresos:
-            movimientos.append({
-                'fecha': gasto.fecha,
-                'concepto': gasto.concepto,
-                'tipo': 'Egreso',
-                'monto': gasto.monto,
-            })
-        movimientos = sorted(movimientos, key=lambda x: x['fecha'], reverse=True)
-
-        balance = total_ingresos - total_egresos
-
-        context['movimientos'] = movimientos
-        context['total_ingresos'] = total_ingresos
-        context['total_egresos'] = total_egresos
-        context['balance'] = balance
-
+    # La vista previa muestra los totales completos y solo las primeras filas
+    context.update(datos_reporte(reporte, request.GET.get('granularidad'), limite=FILAS_VISTA_PREVIA))
     return render(request, 'reportes/reporte_preview.html', context)
 
 def reporte_toggle_favorito(request, pk):
@@ -231,6 +146,7 @@ def reporte_duplicar(request, pk):
         formato_preferido=reporte_original.formato_preferido,
         fecha_desde=reporte_original.fecha_desde,
         fecha_hasta=reporte_original.fecha_hasta,
+        ventana_dias=reporte_original.ventana_dias,
         es_favorito=False,  # Las copias no son favoritas por defecto
         puesto=reporte_original.puesto,
         activo=True  # Las copias se crean activas
@@ -238,586 +154,108 @@ def reporte_duplicar(request, pk):
     
     return redirect('reporte-list')
 
-def reporte_pdf(request, pk):
-    # Check if WeasyPrint is available
-    if not WEASYPRINT_AVAILABLE:
-        messages.error(request, "Funcionalidad PDF no disponible en este sistema. Instale WeasyPrint para usar esta función.")
-        return redirect('reporte-list')
-    
-    from viviendas.models import Residente, Vivienda
-    from personal.models import Empleado
-    from accesos.models import Visita
-
-    reporte = get_object_or_404(Reporte, pk=pk)
-    reporte.ultima_generacion = timezone.now()
-    reporte.save(update_fields=['ultima_generacion'])
-    context = {
-        'reporte': reporte,
-        'fecha_generacion': timezone.now(),
-        'logo_path': os.path.join(settings.STATIC_ROOT, 'img/logo_ofi.png'),
-        'logo_src': get_logo_base64(),
-        'es_pdf': True,  # Para que el template sepa que es PDF
-    }
-
-    if reporte.tipo == 'RESIDENTES':
-        residentes = Residente.objects.all()
-        context['residentes'] = residentes
-        context['total_residentes'] = residentes.count()
-        context['activos'] = residentes.filter(activo=True).count()
-        context['inactivos'] = residentes.filter(activo=False).count()
-        # Usa el campo es_propietario directamente
-        context['propietarios'] = residentes.filter(es_propietario=True).count()
-        context['inquilinos'] = residentes.filter(es_propietario=False).count()
-        grafico1 = generar_grafico_barras(
-            ['Propietarios', 'Inquilinos'],
-            [context['propietarios'], context['inquilinos']],
-            'Propietarios vs Inquilinos'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Activos', 'Inactivos'],
-            [context['activos'], context['inactivos']],
-            'Estado de Residentes'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    elif reporte.tipo == 'VIVIENDAS':
-        viviendas = Vivienda.objects.all()
-        context['viviendas'] = viviendas
-        context['total_viviendas'] = viviendas.count()
-        context['ocupadas'] = viviendas.filter(estado='OCUPADO').count()
-        context['desocupadas'] = viviendas.filter(estado='DESOCUPADO').count()
-        # Ejemplo de gráficos
-        grafico1 = generar_grafico_barras(
-            ['Ocupadas', 'Desocupadas'],
-            [context['ocupadas'], context['desocupadas']],
-            'Ocupadas vs Desocupadas'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Total'],
-            [context['total_viviendas']],
-            'Total de Viviendas'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    elif reporte.tipo == 'PERSONAL':
-        empleados = Empleado.objects.all()
-        context['empleados'] = empleados
-        context['total_empleados'] = empleados.count()
-        context['activos'] = empleados.filter(activo=True).count()
-        context['inactivos'] = empleados.filter(activo=False).count()
-        # Ejemplo de gráficos
-        grafico1 = generar_grafico_barras(
-            ['Activos', 'Inactivos'],
-            [context['activos'], context['inactivos']],
-            'Estado de Empleados'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Total'],
-            [context['total_empleados']],
-            'Total de Empleados'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    elif reporte.tipo == 'ACCESOS':
-        visitas = Visita.objects.all()
-        context['visitas'] = visitas
-        context['total_visitas'] = visitas.count()
-        context['visitas_activas'] = visitas.filter(fecha_hora_salida__isnull=True).count()
-        context['visitas_finalizadas'] = visitas.filter(fecha_hora_salida__isnull=False).count()
-        # Ejemplo de gráficos
-        grafico1 = generar_grafico_barras(
-            ['Activas', 'Finalizadas'],
-            [context['visitas_activas'], context['visitas_finalizadas']],
-            'Visitas Activas vs Finalizadas'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Total'],
-            [context['total_visitas']],
-            'Total de Visitas'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    elif reporte.tipo == 'FINANCIERO':
-        # Filtra por el período del reporte
-        fecha_desde = reporte.fecha_desde or timezone.now().date().replace(day=1)
-        fecha_hasta = reporte.fecha_hasta or timezone.now().date()
-        
-        # Ingresos: pagos verificados en el periodo
-        ingresos = Pago.objects.filter(
-            estado='VERIFICADO',
-            fecha_pago__gte=fecha_desde,
-            fecha_pago__lte=fecha_hasta
-        )
-        total_ingresos = ingresos.aggregate(total=Sum('monto'))['total'] or 0
-
-        # Egresos: gastos pagados en el periodo
-        egresos = Gasto.objects.filter(
-            estado='PAGADO',
-            fecha__gte=fecha_desde,
-            fecha__lte=fecha_hasta
-        )
-        total_egresos = egresos.aggregate(total=Sum('monto'))['total'] or 0
-
-        # Movimientos: lista combinada de ingresos y egresos
-        movimientos = []
-        for pago in ingresos:
-            movimientos.append({
-                'fecha': pago.fecha_pago,
-                'concepto': 'Ingreso',
-                'tipo': 'Ingreso',
-                'monto': pago.monto,
-            })
-        for gasto in egresos:
-            movimientos.append({
-                'fecha': gasto.fecha,
-                'concepto': gasto.concepto,
-                'tipo': 'Egreso',
-                'monto': gasto.monto,
-            })
-        # Ordena por fecha descendente
-        movimientos = sorted(movimientos, key=lambda x: x['fecha'], reverse=True)
-
-        balance = total_ingresos - total_egresos
-
-        context['movimientos'] = movimientos
-        context['total_ingresos'] = total_ingresos
-        context['total_egresos'] = total_egresos
-        context['balance'] = balance
-
-        grafico1 = generar_grafico_barras(
-            ['Ingresos', 'Egresos'],
-            [total_ingresos, total_egresos],
-            'Ingresos vs Egresos'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Balance'],
-            [balance],
-            'Balance'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    # Selecciona el template
-    template_map = {
-        'ACCESOS': 'reportes/pdf/reporte_accesos.html',
-        'RESIDENTES': 'reportes/pdf/reporte_residentes.html',
-        'VIVIENDAS': 'reportes/pdf/reporte_viviendas.html',
-        'PERSONAL': 'reportes/pdf/reporte_personal.html',
-        'FINANCIERO': 'reportes/pdf/reporte_financiero.html',
-    }
-    template = template_map.get(reporte.tipo, 'reportes/pdf/reporte_generico.html')
-
-    try:
-        html = render_to_string(template, context)
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'filename="reporte_{reporte.nombre}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-        weasyprint.HTML(string=html).write_pdf(target=response)
-        return response
-    except Exception as e:
-        messages.error(request, f"Error generando PDF: {str(e)}")
-        return redirect('reporte-list')
-
 def reporte_reactivar(request, pk):
     reporte = get_object_or_404(Reporte, pk=pk)
     reporte.activo = True
     reporte.save()
     return redirect('reporte-list')
 
-def generar_grafico_barras(labels, values, titulo):
-    fig, ax = plt.subplots(figsize=(5, 2.5))
-    ax.bar(labels, values, color='#007bff')
-    ax.set_title(titulo)
-    plt.tight_layout()
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    plt.close(fig)
-    buf.seek(0)
-    image_base64 = base64.b64encode(buf.read()).decode('utf-8')
-    return f'data:image/png;base64,{image_base64}'
-
 def reporte_descargar(request, pk):
-    from viviendas.models import Residente, Vivienda
-    from personal.models import Empleado
-    from accesos.models import Visita
-
-    reporte = get_object_or_404(Reporte, pk=pk)
+    reporte = con_periodo_movil(get_object_or_404(Reporte, pk=pk))
     formato = request.GET.get('formato', reporte.formato_preferido or 'PDF').upper()
-
-    context = {
-        'reporte': reporte,
-        'fecha_generacion': timezone.now(),
-        'logo_path': os.path.join(settings.STATIC_ROOT, 'img/logo_ofi.png'),
-    }
-
-    # --- Genera el contexto igual que en reporte_pdf/reporte_preview ---
-    if reporte.tipo == 'FINANCIERO':
-        fecha_desde = reporte.fecha_desde or timezone.now().date().replace(day=1)
-        fecha_hasta = reporte.fecha_hasta or timezone.now().date()
-
-        ingresos = Pago.objects.filter(
-            estado='VERIFICADO',
-            fecha_pago__gte=fecha_desde,
-            fecha_pago__lte=fecha_hasta
-        )
-        total_ingresos = ingresos.aggregate(total=Sum('monto'))['total'] or 0
-
-        egresos = Gasto.objects.filter(
-            estado='PAGADO',
-            fecha__gte=fecha_desde,
-            fecha__lte=fecha_hasta
-        )
-        total_egresos = egresos.aggregate(total=Sum('monto'))['total'] or 0
-
-        movimientos = []
-        for pago in ingresos:
-            movimientos.append({
-                'fecha': pago.fecha_pago,
-                'concepto': 'Ingreso',
-                'tipo': 'Ingreso',
-                'monto': pago.monto,
-            })
-        for gasto in egresos:
-            movimientos.append({
-                'fecha': gasto.fecha,
-                'concepto': gasto.concepto,
-                'tipo': 'Egreso',
-                'monto': gasto.monto,
-            })
-        movimientos = sorted(movimientos, key=lambda x: x['fecha'], reverse=True)
-
-        balance = total_ingresos - total_egresos
-
-        context['movimientos'] = movimientos
-        context['total_ingresos'] = total_ingresos
-        context['total_egresos'] = total_egresos
-        context['balance'] = balance
-
-    elif reporte.tipo == 'RESIDENTES':
-        residentes = Residente.objects.all()
-        context['residentes'] = residentes
-        context['total_residentes'] = residentes.count()
-        context['activos'] = residentes.filter(activo=True).count()
-        context['inactivos'] = residentes.filter(activo=False).count()
-        context['propietarios'] = residentes.filter(es_propietario=True).count()
-        context['inquilinos'] = residentes.filter(es_propietario=False).count()
-        grafico1 = generar_grafico_barras(
-            ['Propietarios', 'Inquilinos'],
-            [context['propietarios'], context['inquilinos']],
-            'Propietarios vs Inquilinos'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Activos', 'Inactivos'],
-            [context['activos'], context['inactivos']],
-            'Estado de Residentes'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    elif reporte.tipo == 'VIVIENDAS':
-        viviendas = Vivienda.objects.all()
-        context['viviendas'] = viviendas
-        context['total_viviendas'] = viviendas.count()
-        context['ocupadas'] = viviendas.filter(estado='OCUPADO').count()
-        context['desocupadas'] = viviendas.filter(estado='DESOCUPADO').count()
-        grafico1 = generar_grafico_barras(
-            ['Ocupadas', 'Desocupadas'],
-            [context['ocupadas'], context['desocupadas']],
-            'Ocupadas vs Desocupadas'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Total'],
-            [context['total_viviendas']],
-            'Total de Viviendas'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    elif reporte.tipo == 'PERSONAL':
-        empleados = Empleado.objects.all()
-        context['empleados'] = empleados
-        context['total_empleados'] = empleados.count()
-        context['activos'] = empleados.filter(activo=True).count()
-        context['inactivos'] = empleados.filter(activo=False).count()
-        grafico1 = generar_grafico_barras(
-            ['Activos', 'Inactivos'],
-            [context['activos'], context['inactivos']],
-            'Estado de Empleados'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Total'],
-            [context['total_empleados']],
-            'Total de Empleados'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    elif reporte.tipo == 'ACCESOS':
-        visitas = Visita.objects.all()
-        context['visitas'] = visitas
-        context['total_visitas'] = visitas.count()
-        context['visitas_activas'] = visitas.filter(fecha_hora_salida__isnull=True).count()
-        context['visitas_finalizadas'] = visitas.filter(fecha_hora_salida__isnull=False).count()
-        grafico1 = generar_grafico_barras(
-            ['Activas', 'Finalizadas'],
-            [context['visitas_activas'], context['visitas_finalizadas']],
-            'Visitas Activas vs Finalizadas'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Total'],
-            [context['total_visitas']],
-            'Total de Visitas'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    # --- Generación según formato ---
-    if formato == 'PDF':
-        template = 'reportes/pdf/reporte_%s.html' % reporte.tipo.lower()
-        html = render_to_string(template, context)
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="reporte_{reporte.nombre}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-        weasyprint.HTML(string=html).write_pdf(target=response)
-        return response
-
-    elif formato == 'CSV':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="reporte_{reporte.nombre}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-        writer = csv.writer(response)
-        # Ejemplo para tipo FINANCIERO
-        if reporte.tipo == 'FINANCIERO':
-            writer.writerow(['Fecha', 'Concepto', 'Tipo', 'Monto'])
-            for mov in context['movimientos']:
-                writer.writerow([mov['fecha'], mov['concepto'], mov['tipo'], mov['monto']])
-        # Agrega lógica para otros tipos
-        return response
-
-    elif formato == 'EXCEL':
-        import io
-        output = io.BytesIO()
-        if reporte.tipo == 'FINANCIERO':
-            df = pd.DataFrame(context['movimientos'])
-            if df.empty:
-                df = pd.DataFrame(columns=['fecha', 'concepto', 'tipo', 'monto'])
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False)
-        output.seek(0)
-        response = HttpResponse(
-            output.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = f'attachment; filename="reporte_{reporte.nombre}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-        return response
-
-    elif formato == 'HTML':
-        template = 'reportes/pdf/reporte_%s.html' % reporte.tipo.lower()
-        html = render_to_string(template, context)
-        response = HttpResponse(html, content_type='text/html')
-        response['Content-Disposition'] = f'attachment; filename="reporte_{reporte.nombre}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.html"'
-        return response
-
-    else:
+    if formato not in EXTENSIONES:
         return HttpResponse("Formato no soportado", status=400)
+    por_edificio = request.GET.get('por_edificio') == '1'
+    if por_edificio:
+        if not puede_repartirse(reporte, formato):
+            return HttpResponse("Este reporte no se puede separar por edificio en ese formato", status=400)
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        # Cada edificio se genera en su propio proceso: solo en el worker procesar_reportes, no en la petición
+        trabajo = encolar_reporte(reporte, formato, request.user, request.GET.get('granularidad', ''), True)
+        return JsonResponse(_estado_trabajo(trabajo), status=202)
+    filename = f'reporte_{reporte.nombre}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.{EXTENSIONES[formato]}'
+
+    # El CSV no necesita contexto ni gráficos: se envía por partes a medida que se leen las filas
+    if formato == 'CSV':
+        return respuesta_csv(reporte, filename)
+
+    return _servir_o_encolar(request, reporte, formato, request.GET.get('granularidad'), filename)
+
+def _servir_o_encolar(request, reporte, formato, granularidad, filename):
+    """
+    PDF, HTML y Excel se sirven desde la caché mientras no cambien los datos de
+    origen; si no están vigentes se generan en el worker procesar_reportes, no
+    en la petición, y se responde con el estado del trabajo para consultarlo.
+    """
+    resultado = buscar_reporte_en_cache(reporte, formato, granularidad)
+    if resultado:
+        return FileResponse(resultado.archivo.open('rb'), as_attachment=True, filename=filename)
+    if not request.user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    trabajo = encolar_reporte(reporte, formato, request.user, granularidad or '')
+    return JsonResponse(_estado_trabajo(trabajo), status=202)
+
+def _estado_trabajo(trabajo):
+    """Datos de un trabajo de reporte para la consulta de estado"""
+    return {
+        'id': trabajo.id,
+        'reporte': trabajo.reporte_id,
+        'formato': trabajo.formato,
+        'por_edificio': trabajo.por_edificio,
+        'estado': trabajo.estado,
+        'error': trabajo.error,
+        'fecha_creacion': trabajo.fecha_creacion.isoformat(),
+        'fecha_fin': trabajo.fecha_fin.isoformat() if trabajo.fecha_fin else None,
+        'url_estado': reverse('reporte-trabajo-estado', args=[trabajo.id]),
+        'url_descarga': (
+            reverse('reporte-trabajo-descargar', args=[trabajo.id]) if trabajo.estado == 'COMPLETADO' else None
+        ),
+    }
 
-def get_logo_base64():
-    # Busca primero en static/, luego en staticfiles/
-    static_path = os.path.join(settings.BASE_DIR, 'static', 'img', 'logo_ofi.png')
-    staticfiles_path = os.path.join(settings.STATIC_ROOT, 'img', 'logo_ofi.png')
-    logo_path = static_path if os.path.exists(static_path) else staticfiles_path
-    if not os.path.exists(logo_path):
-        # Opcional: puedes devolver un logo por defecto o lanzar un error más claro
-        raise FileNotFoundError(f'Logo no encontrado en {static_path} ni en {staticfiles_path}')
-    with open(logo_path, 'rb') as image_file:
-        encoded = base64.b64encode(image_file.read()).decode('utf-8')
-    return f'data:image/png;base64,{encoded}'
-
-def reporte_pdf(request, pk):
-    from viviendas.models import Residente, Vivienda
-    from personal.models import Empleado
-    from accesos.models import Visita
+@login_required
+def reporte_generar(request, pk):
+    """Encola la generación del reporte; el worker procesar_reportes genera el archivo"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
 
     reporte = get_object_or_404(Reporte, pk=pk)
-    reporte.ultima_generacion = timezone.now()
-    reporte.save(update_fields=['ultima_generacion'])
-    context = {
-        'reporte': reporte,
-        'fecha_generacion': timezone.now(),
-        'logo_path': os.path.join(settings.STATIC_ROOT, 'img/logo_ofi.png'),
-        'logo_src': get_logo_base64(),
-        'es_pdf': True,  # Para que el template sepa que es PDF
-    }
+    formato = request.POST.get('formato', reporte.formato_preferido or 'PDF').upper()
+    if formato not in EXTENSIONES:
+        return JsonResponse({'error': 'Formato no soportado'}, status=400)
+
+    por_edificio = request.POST.get('por_edificio') == '1'
+    if por_edificio and not puede_repartirse(reporte, formato):
+        return JsonResponse({'error': 'Este reporte no se puede separar por edificio en ese formato'}, status=400)
+
+    trabajo = encolar_reporte(reporte, formato, request.user, request.POST.get('granularidad', ''), por_edificio)
+    return JsonResponse(_estado_trabajo(trabajo), status=202)
+
+def _trabajos_visibles(user):
+    """Trabajos que puede consultar un usuario: los propios, o todos si es administrador"""
+    trabajos = TrabajoReporte.objects.all()
+    if not (user.rol and user.rol.nombre == 'Administrador'):
+        trabajos = trabajos.filter(solicitado_por=user)
+    return trabajos
+
+@login_required
+def reporte_trabajo_estado(request, pk):
+    trabajo = get_object_or_404(_trabajos_visibles(request.user), pk=pk)
+    return JsonResponse(_estado_trabajo(trabajo))
+
+@login_required
+def reporte_trabajo_descargar(request, pk):
+    trabajo = get_object_or_404(
+        _trabajos_visibles(request.user).select_related('reporte'), pk=pk, estado='COMPLETADO'
+    )
+    filename = (
+        f'reporte_{trabajo.reporte.nombre}_{trabajo.fecha_fin.strftime("%Y%m%d_%H%M%S")}.'
+        f'{EXTENSIONES[trabajo.formato]}'
+    )
+    return FileResponse(trabajo.archivo.open('rb'), as_attachment=True, filename=filename)
 
-    if reporte.tipo == 'RESIDENTES':
-        residentes = Residente.objects.all()
-        context['residentes'] = residentes
-        context['total_residentes'] = residentes.count()
-        context['activos'] = residentes.filter(activo=True).count()
-        context['inactivos'] = residentes.filter(activo=False).count()
-        # Usa el campo es_propietario directamente
-        context['propietarios'] = residentes.filter(es_propietario=True).count()
-        context['inquilinos'] = residentes.filter(es_propietario=False).count()
-        grafico1 = generar_grafico_barras(
-            ['Propietarios', 'Inquilinos'],
-            [context['propietarios'], context['inquilinos']],
-            'Propietarios vs Inquilinos'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Activos', 'Inactivos'],
-            [context['activos'], context['inactivos']],
-            'Estado de Residentes'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    elif reporte.tipo == 'VIVIENDAS':
-        viviendas = Vivienda.objects.all()
-        context['viviendas'] = viviendas
-        context['total_viviendas'] = viviendas.count()
-        context['ocupadas'] = viviendas.filter(estado='OCUPADO').count()
-        context['desocupadas'] = viviendas.filter(estado='DESOCUPADO').count()
-        # Ejemplo de gráficos
-        grafico1 = generar_grafico_barras(
-            ['Ocupadas', 'Desocupadas'],
-            [context['ocupadas'], context['desocupadas']],
-            'Ocupadas vs Desocupadas'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Total'],
-            [context['total_viviendas']],
-            'Total de Viviendas'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    elif reporte.tipo == 'PERSONAL':
-        empleados = Empleado.objects.all()
-        context['empleados'] = empleados
-        context['total_empleados'] = empleados.count()
-        context['activos'] = empleados.filter(activo=True).count()
-        context['inactivos'] = empleados.filter(activo=False).count()
-        # Ejemplo de gráficos
-        grafico1 = generar_grafico_barras(
-            ['Activos', 'Inactivos'],
-            [context['activos'], context['inactivos']],
-            'Estado de Empleados'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Total'],
-            [context['total_empleados']],
-            'Total de Empleados'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    elif reporte.tipo == 'ACCESOS':
-        visitas = Visita.objects.all()
-        context['visitas'] = visitas
-        context['total_visitas'] = visitas.count()
-        context['visitas_activas'] = visitas.filter(fecha_hora_salida__isnull=True).count()
-        context['visitas_finalizadas'] = visitas.filter(fecha_hora_salida__isnull=False).count()
-        # Ejemplo de gráficos
-        grafico1 = generar_grafico_barras(
-            ['Activas', 'Finalizadas'],
-            [context['visitas_activas'], context['visitas_finalizadas']],
-            'Visitas Activas vs Finalizadas'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Total'],
-            [context['total_visitas']],
-            'Total de Visitas'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    elif reporte.tipo == 'FINANCIERO':
-        # Filtra por el período del reporte
-        fecha_desde = reporte.fecha_desde or timezone.now().date().replace(day=1)
-        fecha_hasta = reporte.fecha_hasta or timezone.now().date()
-        
-        # Ingresos: pagos verificados en el periodo
-        ingresos = Pago.objects.filter(
-            estado='VERIFICADO',
-            fecha_pago__gte=fecha_desde,
-            fecha_pago__lte=fecha_hasta
-        )
-        total_ingresos = ingresos.aggregate(total=Sum('monto'))['total'] or 0
-
-        # Egresos: gastos pagados en el periodo
-        egresos = Gasto.objects.filter(
-            estado='PAGADO',
-            fecha__gte=fecha_desde,
-            fecha__lte=fecha_hasta
-        )
-        total_egresos = egresos.aggregate(total=Sum('monto'))['total'] or 0
-
-        # Movimientos: lista combinada de ingresos y egresos
-        movimientos = []
-        for pago in ingresos:
-            movimientos.append({
-                'fecha': pago.fecha_pago,
-                'concepto': 'Ingreso',
-                'tipo': 'Ingreso',
-                'monto': pago.monto,
-            })
-        for gasto in egresos:
-            movimientos.append({
-                'fecha': gasto.fecha,
-                'concepto': gasto.concepto,
-                'tipo': 'Egreso',
-                'monto': gasto.monto,
-            })
-        # Ordena por fecha descendente
-        movimientos = sorted(movimientos, key=lambda x: x['fecha'], reverse=True)
-
-        balance = total_ingresos - total_egresos
-
-        context['movimientos'] = movimientos
-        context['total_ingresos'] = total_ingresos
-        context['total_egresos'] = total_egresos
-        context['balance'] = balance
-
-        grafico1 = generar_grafico_barras(
-            ['Ingresos', 'Egresos'],
-            [total_ingresos, total_egresos],
-            'Ingresos vs Egresos'
-        )
-        grafico2 = generar_grafico_barras(
-            ['Balance'],
-            [balance],
-            'Balance'
-        )
-        context['grafico1'] = grafico1
-        context['grafico2'] = grafico2
-
-    # Selecciona el template
-    template_map = {
-        'ACCESOS': 'reportes/pdf/reporte_accesos.html',
-        'RESIDENTES': 'reportes/pdf/reporte_residentes.html',
-        'VIVIENDAS': 'reportes/pdf/reporte_viviendas.html',
-        'PERSONAL': 'reportes/pdf/reporte_personal.html',
-        'FINANCIERO': 'reportes/pdf/reporte_financiero.html',
-    }
-    template = template_map.get(reporte.tipo, 'reportes/pdf/reporte_generico.html')
-
-    html = render_to_string(template, context)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="reporte_{reporte.nombre}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.pdf"'
-    weasyprint.HTML(string=html).write_pdf(target=response)
-    return response
-    """ try:
-        fig, ax = plt.subplots(figsize=(5, 2.5))
-        ax.bar(labels, values, color='#007bff')
-        ax.set_title(titulo)
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        plt.close(fig)
-        buf.seek(0)
-        image_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        return f'data:image/png;base64,{image_base64}'
-    except Exception as e:
-        print(f"Error generando gráfico: {e}")
-        return None """
+def reporte_pdf(request, pk):
+    reporte = con_periodo_movil(get_object_or_404(Reporte, pk=pk))
+    # Los favoritos quedan pregenerados por pregenerar_reportes y se sirven desde la caché
+    filename = f'reporte_{reporte.nombre}_{timezone.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+    return _servir_o_encolar(request, reporte, 'PDF', request.GET.get('granularidad'), filename)
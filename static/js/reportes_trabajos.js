@@ -0,0 +1,109 @@
+// Generación de reportes en segundo plano: encola el trabajo, consulta su estado y descarga el archivo al terminar
+document.addEventListener('DOMContentLoaded', function() {
+    // Milisegundos entre consultas del estado de un trabajo
+    const INTERVALO_CONSULTA = 2000;
+
+    function getCSRFToken() {
+        const token = document.querySelector('[name=csrfmiddlewaretoken]');
+        if (token) return token.value;
+        for (let cookie of document.cookie.split(';')) {
+            if (cookie.trim().startsWith('csrftoken=')) {
+                return cookie.trim().substring('csrftoken='.length);
+            }
+        }
+        return '';
+    }
+
+    function leerJSON(response) {
+        return response.json().then(data => {
+            if (!response.ok) {
+                throw new Error(data.error || 'Error de red: ' + response.status);
+            }
+            return data;
+        });
+    }
+
+    function restaurar(boton, contenido) {
+        boton.disabled = false;
+        boton.innerHTML = contenido;
+    }
+
+    // Consulta el estado hasta que el worker termina y sigue la URL de descarga
+    function esperarTrabajo(trabajo, boton, contenido) {
+        if (trabajo.estado === 'COMPLETADO') {
+            restaurar(boton, contenido);
+            window.location.href = trabajo.url_descarga;
+            return;
+        }
+        if (trabajo.estado === 'ERROR') {
+            restaurar(boton, contenido);
+            alert('No se pudo generar el reporte: ' + trabajo.error);
+            return;
+        }
+        setTimeout(function() {
+            fetch(trabajo.url_estado)
+                .then(leerJSON)
+                .then(data => esperarTrabajo(data, boton, contenido))
+                .catch(error => {
+                    restaurar(boton, contenido);
+                    alert('No se pudo consultar el estado del reporte: ' + error.message);
+                });
+        }, INTERVALO_CONSULTA);
+    }
+
+    function generarReporte(url, datos, boton) {
+        const contenido = boton.innerHTML;
+        boton.disabled = true;
+        boton.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Generando...';
+
+        fetch(url, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': getCSRFToken() },
+            body: datos
+        })
+            .then(leerJSON)
+            .then(trabajo => esperarTrabajo(trabajo, boton, contenido))
+            .catch(error => {
+                restaurar(boton, contenido);
+                alert('No se pudo generar el reporte: ' + error.message);
+            });
+    }
+
+    // Botones con data-url-generar y data-formato
+    document.querySelectorAll('button[data-url-generar]').forEach(function(boton) {
+        boton.addEventListener('click', function() {
+            const datos = new FormData();
+            datos.append('formato', boton.dataset.formato);
+            generarReporte(boton.dataset.urlGenerar, datos, boton);
+        });
+    });
+
+    // Formularios de exportación: el CSV completo se descarga directamente, ya que se envía por partes
+    document.querySelectorAll('form[data-url-generar]').forEach(function(formulario) {
+        const formato = formulario.querySelector('[name=formato]');
+        const porEdificio = formulario.querySelector('[name=por_edificio]');
+
+        // El HTML no se puede separar por edificio
+        function actualizarPorEdificio() {
+            if (!porEdificio) return;
+            const disponible = formato.value !== 'HTML';
+            porEdificio.closest('.form-check').classList.toggle('d-none', !disponible);
+            if (!disponible) porEdificio.checked = false;
+        }
+        formato.addEventListener('change', actualizarPorEdificio);
+        actualizarPorEdificio();
+
+        formulario.addEventListener('submit', function(e) {
+            e.preventDefault();
+            if (formato.value === 'CSV' && !(porEdificio && porEdificio.checked)) {
+                window.location.href = formulario.action + '?formato=CSV';
+                return;
+            }
+            generarReporte(
+                formulario.dataset.urlGenerar,
+                new FormData(formulario),
+                formulario.querySelector('button[type=submit]')
+            );
+        });
+    });
+});
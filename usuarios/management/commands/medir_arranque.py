@@ -0,0 +1,58 @@
+# usuarios/management/commands/medir_arranque.py
+from django.core.management.base import BaseCommand, CommandError
+
+from condominio_app.arranque import PRESUPUESTO_RSS_MB, PRESUPUESTO_SEGUNDOS, medir_arranque
+
+
+class Command(BaseCommand):
+    help = 'Mide el arranque en frío de un worker (tiempo de importación y memoria) y lo compara con el presupuesto'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=3,
+            help='Arranques a medir; se informa la mediana del tiempo (por defecto 3)',
+        )
+        parser.add_argument(
+            '--max-segundos',
+            type=float,
+            default=PRESUPUESTO_SEGUNDOS,
+            help=f'Tiempo máximo de importación en segundos (por defecto {PRESUPUESTO_SEGUNDOS})',
+        )
+        parser.add_argument(
+            '--max-rss-mb',
+            type=float,
+            default=PRESUPUESTO_RSS_MB,
+            help=f'Memoria residente máxima por worker en MB (por defecto {PRESUPUESTO_RSS_MB})',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser al menos 1')
+
+        self.stdout.write(f"⏱️ Midiendo {options['repeticiones']} arranque(s) en frío...")
+        try:
+            resultado = medir_arranque(options['repeticiones'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        for numero, medicion in enumerate(resultado['mediciones'], start=1):
+            self.stdout.write(f"   {numero}. {medicion['segundos']:.3f}s, {medicion['rss_mb']:.1f} MB")
+
+        self.stdout.write(
+            f"📊 Mediana: {resultado['segundos']:.3f}s (máx. {options['max_segundos']}s) | "
+            f"RSS: {resultado['rss_mb']:.1f} MB (máx. {options['max_rss_mb']} MB)"
+        )
+
+        errores = []
+        if resultado['modulos_pesados']:
+            errores.append(f"módulos pesados cargados al arrancar: {', '.join(resultado['modulos_pesados'])}")
+        if resultado['segundos'] > options['max_segundos']:
+            errores.append(f"el arranque tarda {resultado['segundos']:.3f}s")
+        if resultado['rss_mb'] > options['max_rss_mb']:
+            errores.append(f"cada worker ocupa {resultado['rss_mb']:.1f} MB")
+        if errores:
+            raise CommandError(f"❌ Fuera de presupuesto: {'; '.join(errores)}")
+
+        self.stdout.write(self.style.SUCCESS('✅ Arranque dentro del presupuesto'))
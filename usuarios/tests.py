@@ -1,6 +1,11 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from condominio_app.arranque import PRESUPUESTO_RSS_MB, PRESUPUESTO_SEGUNDOS, medir_arranque
 from .models import Rol, Usuario
 
 class RolModelTest(TestCase):
@@ -139,4 +144,26 @@ class UsuarioViewTest(TestCase):
         
         response = self.client.post(reverse('usuario-change-state', args=[self.admin_user.id]))
         self.admin_user.refresh_from_db()
-        self.assertTrue(self.admin_user.is_active)  # Sigue activo
\ No newline at end of file
+        self.assertTrue(self.admin_user.is_active)  # Sigue activo
+
+class ArranqueWorkerTest(TestCase):
+    """
+    Pruebas del presupuesto de arranque de un worker web
+    """
+    
+    def test_arranque_dentro_del_presupuesto(self):
+        """Verificar que cargar la aplicación y las URLs no importa dependencias pesadas ni excede el presupuesto"""
+        resultado = medir_arranque(repeticiones=1)
+        
+        self.assertEqual(resultado['modulos_pesados'], [])
+        self.assertLess(resultado['segundos'], PRESUPUESTO_SEGUNDOS)
+        self.assertLess(resultado['rss_mb'], PRESUPUESTO_RSS_MB)
+    
+    def test_comando_informa_el_presupuesto(self):
+        """Verificar que el comando informa las mediciones y falla fuera de presupuesto"""
+        salida = StringIO()
+        call_command('medir_arranque', repeticiones=1, stdout=salida)
+        self.assertIn('✅ Arranque dentro del presupuesto', salida.getvalue())
+        
+        with self.assertRaises(CommandError):
+            call_command('medir_arranque', repeticiones=1, max_rss_mb=1, stdout=StringIO())